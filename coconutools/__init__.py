@@ -1,12 +1,16 @@
 from coconutools.annotations import Annotation
+from coconutools.builder import COCOBuilder
 from coconutools.dataset import COCO, Info
+from coconutools.diffs import diff
 from coconutools.images import Category, Image, License
 
 __all__ = (
     "COCO",
+    "COCOBuilder",
     "Image",
     "Category",
     "Info",
     "License",
     "Annotation",
+    "diff",
 )
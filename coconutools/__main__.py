@@ -0,0 +1,5 @@
+import sys
+
+from coconutools.cli import main
+
+sys.exit(main())
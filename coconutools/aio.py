@@ -0,0 +1,331 @@
+"""
+Asyncio-friendly dataset loading and image iteration.
+All blocking work (file I/O, JSON parsing and building the dataset) is done in a thread pool.
+JSON arrays are parsed record by record and annotations are built in chunks, so the worker thread
+gives up the GIL regularly and the event loop stays responsive
+"""
+
+import asyncio
+import gc
+import json
+import os
+import threading
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import contextmanager
+from os import PathLike
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
+
+from coconutools.annotations import Annotation
+from coconutools.detections import WHITESPACE
+from coconutools.fingerprints import FileFingerprint
+from coconutools.images import Image
+
+if TYPE_CHECKING:
+    from coconutools.dataset import COCO
+
+# stage ("read", "parse" or "build"), done and total units (bytes or annotations)
+ProgressCallbackT = Callable[[str, int, int], None]
+
+
+_gc_lock = threading.Lock()
+_gc_pauses = 0
+_gc_enabled = True
+
+
+class ImageItem(NamedTuple):
+    image: Image
+    annotations: List[Annotation]
+    data: Optional[bytes]  # raw image file content
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as file:
+        return file.read()
+
+
+@contextmanager
+def paused_gc() -> Iterator[None]:
+    """
+    Disable the cyclic garbage collector while large object graphs are built.
+    Full collections get slower as the graph grows and they stall all threads including the event loop one
+    (parsed datasets have no reference cycles, so nothing is left uncollected).
+    Pauses can overlap, the collector is re-enabled after the last one if it was enabled before the first one
+    """
+    global _gc_pauses, _gc_enabled
+
+    with _gc_lock:
+        if not _gc_pauses:
+            _gc_enabled = gc.isenabled()
+            gc.disable()
+
+        _gc_pauses += 1
+
+    try:
+        yield
+    finally:
+        with _gc_lock:
+            _gc_pauses -= 1
+
+            if not _gc_pauses and _gc_enabled:
+                # objects created during the pause are moved to the oldest generation,
+                # otherwise the first young collection would walk all of them at once
+                gc.freeze()
+                gc.unfreeze()
+                gc.enable()
+
+
+def _build_chunk(
+    dataset: "COCO", annotation_infos: List[Dict[str, Any]], start: int, end: int
+) -> None:
+    dataset._build_annotations(annotation_infos[start:end])
+
+    # built records are released here, otherwise the whole list would be deallocated at once in the loop thread
+    annotation_infos[start:end] = [{}] * len(annotation_infos[start:end])
+
+
+def _skip(text: str, position: int) -> int:
+    return WHITESPACE.match(text, position).end()  # type: ignore
+
+
+def _expect(text: str, position: int, char: str) -> int:
+    position = _skip(text, position)
+
+    if not text.startswith(char, position):
+        raise json.JSONDecodeError(f"Expecting '{char}'", text, position)
+
+    return _skip(text, position + 1)
+
+
+def _decode_array(
+    text: str, position: int, decode: Callable[[str, int], Tuple[Any, int]]
+) -> Tuple[List[Any], int]:
+    items: List[Any] = []
+    position = _expect(text, position, "[")
+
+    if text.startswith("]", position):
+        return items, position + 1
+
+    while True:
+        item, position = decode(text, position)
+        items.append(item)
+        position = _skip(text, position)
+
+        if not text.startswith(",", position):
+            return items, _expect(text, position, "]")
+
+        position = _skip(text, position + 1)
+
+
+def loads_incrementally(content: Union[str, bytes]) -> Any:
+    """
+    Parse a JSON document like json.loads(), but decode arrays of the top-level object record by record.
+    One json.loads() call holds the GIL until the whole document is parsed, so the event loop thread
+    stalls for seconds on large files. Between records the interpreter can switch threads
+
+    :param content: JSON document
+    :return: Parsed document
+    """
+    text = content.decode() if isinstance(content, bytes) else content
+    decode = json.JSONDecoder().raw_decode
+    position = _skip(text, 0)
+
+    if not text.startswith("{", position):
+        return json.loads(text)
+
+    document: Dict[str, Any] = {}
+    position = _expect(text, position, "{")
+
+    while not text.startswith("}", position):
+        key, position = decode(text, position)
+
+        if not isinstance(key, str):
+            raise json.JSONDecodeError("Expecting property name", text, position)
+
+        position = _expect(text, position, ":")
+
+        if text.startswith("[", position):
+            document[key], position = _decode_array(text, position, decode)
+        else:
+            document[key], position = decode(text, position)
+
+        position = _skip(text, position)
+
+        if not text.startswith(",", position):
+            break
+
+        position = _skip(text, position + 1)
+
+    position = _expect(text, position, "}")
+
+    if position != len(text):
+        raise json.JSONDecodeError("Extra data", text, position)
+
+    return document
+
+
+async def load_dataset(
+    dataset_class: Type["COCO"],
+    annotation_file: PathLike,
+    image_dir: Optional[PathLike] = None,
+    progress: Optional[ProgressCallbackT] = None,
+    executor: Optional[Executor] = None,
+    read_chunk_size: int = 16 * 1024 * 1024,
+    build_chunk_size: int = 50_000,
+) -> "COCO":
+    """
+    Load a COCO dataset without blocking the event loop.
+    The file is read and annotations are built in chunks, so the loading can be cancelled between them
+    (cancelling the awaiting task stops the loading after the current chunk).
+    Blocking work shares the dataset being built with the loop, so it's done in threads (process pools are rejected)
+
+    :param dataset_class: COCO class to instantiate
+    :param annotation_file: Path to the annotation file
+    :param image_dir: Path to the image directory
+    :param progress: Callback called on the event loop after every chunk with (stage, done, total)
+    :param executor: Thread pool to run blocking work in (the loop default one if not given)
+    :param read_chunk_size: Number of bytes read at once
+    :param build_chunk_size: Number of annotations built at once
+    :return: Loaded COCO dataset
+    """
+    if executor is not None and not isinstance(executor, ThreadPoolExecutor):
+        raise TypeError(
+            f"Datasets are loaded in threads, got {type(executor).__name__} instead of ThreadPoolExecutor"
+        )
+
+    loop = asyncio.get_running_loop()
+
+    def report(stage: str, done: int, total: int) -> None:
+        if progress is not None:
+            progress(stage, done, total)
+
+    file = await loop.run_in_executor(executor, open, annotation_file, "rb")
+
+    try:
+        stat = await loop.run_in_executor(executor, os.fstat, file.fileno())
+        total_size = stat.st_size
+        chunks: List[bytes] = []
+        read_size = 0
+
+        while True:
+            chunk = await loop.run_in_executor(executor, file.read, read_chunk_size)
+
+            if not chunk:
+                break
+
+            chunks.append(chunk)
+            read_size += len(chunk)
+            report("read", read_size, total_size)
+    finally:
+        await loop.run_in_executor(executor, file.close)
+
+    # parsing and building create millions of objects, every full collection would walk all of them
+    with paused_gc():
+        report("parse", 0, 1)
+        raw_content = b"".join(chunks)
+        del chunks
+
+        content = await loop.run_in_executor(
+            executor,
+            dataset_class._parse_annotation_file,
+            raw_content,
+            annotation_file,
+            loads_incrementally,
+        )
+        fingerprint = await loop.run_in_executor(
+            executor, FileFingerprint.from_dataset, raw_content, stat, content
+        )
+        del raw_content
+        report("parse", 1, 1)
+
+        # the dataset is not exposed until it's completely built, so cancellation doesn't leave partial datasets
+        dataset = dataset_class._create(image_dir)
+        dataset.annotation_file = annotation_file
+
+        await loop.run_in_executor(executor, dataset._build_header, content)
+
+        annotation_infos = content.get("annotations", [])
+        total_count = len(annotation_infos)
+
+        for start in range(0, total_count, build_chunk_size):
+            end = start + build_chunk_size
+
+            await loop.run_in_executor(
+                executor, _build_chunk, dataset, annotation_infos, start, end
+            )
+            report("build", min(end, total_count), total_count)
+
+    dataset._fingerprint = fingerprint
+
+    return dataset
+
+
+async def iter_images(
+    dataset: "COCO",
+    read_bytes: bool = True,
+    concurrency: int = 8,
+    executor: Optional[Executor] = None,
+) -> AsyncIterator[ImageItem]:
+    """
+    Iterate over dataset images with their annotations, reading image files from the image directory.
+    Up to `concurrency` files are read ahead at once, images are yielded in the dataset order
+
+    :param dataset: COCO dataset
+    :param read_bytes: Read image files (otherwise ImageItem.data is None)
+    :param concurrency: Maximum number of files read at once
+    :param executor: Executor to read files in (the loop default one if not given)
+    :return: Async iterator over (image, annotations, data) items
+    """
+    if concurrency < 1:
+        raise ValueError(f"Concurrency has to be positive, got {concurrency}")
+
+    if read_bytes and dataset.image_dir is None:
+        raise ValueError("Image directory is required to read image files")
+
+    loop = asyncio.get_running_loop()
+    columns = dataset._get_columns()
+    annotations = dataset.annotations
+
+    def image_annotations(image: Image) -> List[Annotation]:
+        return [annotations[i] for i in columns.image_positions(image.id).tolist()]
+
+    if not read_bytes:
+        for image in dataset.images:
+            yield ImageItem(image, image_annotations(image), None)
+
+        return
+
+    image_dir = str(dataset.image_dir)
+    images = iter(dataset.images)
+    pending: Deque["asyncio.Future[bytes]"] = deque()
+
+    def read_ahead() -> None:
+        for image in images:
+            path = os.path.join(image_dir, image.file_name)
+            pending.append(loop.run_in_executor(executor, _read_file, path))
+
+            if len(pending) >= concurrency:
+                break
+
+    try:
+        for image in dataset.images:
+            read_ahead()
+
+            yield ImageItem(image, image_annotations(image), await pending.popleft())
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,503 @@
+"""
+TIDE-style error analysis of box detections (https://arxiv.org/abs/2008.08115).
+
+False positives are attributed to classification, localization, both (classification and localization),
+duplicate and background errors, not detected ground truth is counted as missed. The impact of every error type
+is its dAP: the gain of AP at the foreground IoU threshold after an oracle fixes all errors of the type.
+
+Detections of all images are analyzed at once: IoU is computed for all detection and ground truth pairs
+of the same image and the greedy COCO matching goes rank by rank, so every step matches detections
+of all (image, category) groups together
+"""
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, Mapping, Sequence, Tuple, Union
+
+import numpy as np
+
+from coconutools.boxes import paired_iou
+from coconutools.columns import id_positions
+from coconutools.detections import Detections
+from coconutools.evaluation import _precision_recall
+from coconutools.segmentations import _concat_ranges
+
+if TYPE_CHECKING:
+    from coconutools.dataset import COCO
+
+ERROR_TYPES = (
+    "classification",
+    "localization",
+    "both",
+    "duplicate",
+    "background",
+    "missed",
+)
+
+
+@dataclass
+class ErrorAnalysis:
+    """
+    Detection errors, AP before and after fixing every error type and the category confusion matrix
+    """
+
+    category_ids: np.ndarray  # (C,)
+    # (C,) AP at the foreground IoU threshold, -1 for categories without ground truth
+    ap: np.ndarray
+    # error type -> (C,) AP after fixing all errors of the type
+    fixed_ap: Dict[str, np.ndarray]
+    # (D,) analyzed detections ordered by images and descending scores
+    detections: Detections
+    # (D,) int8 positions in ERROR_TYPES, -1 for true positives and detections in crowds
+    errors: np.ndarray
+    missed: np.ndarray  # (N,) bool mask of missed annotations (in the dataset order)
+    # (C + 1, C + 1) ground truth x detected categories, background goes last
+    confusion: np.ndarray
+
+    def error_counts(self) -> Dict[str, int]:
+        """
+        :return: Error type -> number of errors
+        """
+        counts = np.bincount(self.errors[self.errors >= 0], minlength=len(ERROR_TYPES))
+        counts[ERROR_TYPES.index("missed")] = np.count_nonzero(self.missed)
+
+        return dict(zip(ERROR_TYPES, counts.tolist()))
+
+    def _dap(self, error: str) -> np.ndarray:
+        """
+        :return: (C,) AP gain per category, NaN for categories without AP before or after the fix
+        """
+        fixed = self.fixed_ap[error]
+        defined = (self.ap > -1) & (fixed > -1)
+
+        dap: np.ndarray = np.where(defined, fixed - self.ap, np.nan)
+
+        return dap
+
+    def category_dap(self) -> Dict[str, Dict[int, float]]:
+        """
+        :return: Error type -> category ID -> AP gain after fixing errors of the type
+        """
+        category_dap: Dict[str, Dict[int, float]] = {}
+
+        for error in ERROR_TYPES:
+            dap = self._dap(error)
+
+            category_dap[error] = {
+                int(category_id): float(value)
+                for category_id, value in zip(self.category_ids, dap)
+                if not np.isnan(value)
+            }
+
+        return category_dap
+
+    def summary(self) -> Dict[str, float]:
+        """
+        :return: AP (averaged over categories with ground truth) and mean dAP of every error type
+        """
+        defined = self.ap[self.ap > -1]
+        summary = {"AP": float(defined.mean()) if len(defined) else -1.0}
+
+        for error in ERROR_TYPES:
+            dap = self._dap(error)
+            dap = dap[~np.isnan(dap)]
+
+            summary[error] = float(dap.mean()) if len(dap) else 0.0
+
+        return summary
+
+
+def _image_pairs(
+    dt_image_ids: np.ndarray, gt_image_ids: np.ndarray, gt_order: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param gt_order: Ground truth positions stably sorted by image IDs
+    :return: Detection and ground truth positions of all pairs from the same image
+    """
+    sorted_ids = gt_image_ids[gt_order]
+    starts = np.searchsorted(sorted_ids, dt_image_ids, side="left")
+    counts = np.searchsorted(sorted_ids, dt_image_ids, side="right") - starts
+
+    pair_dt = np.repeat(np.arange(len(dt_image_ids)), counts)
+    pair_gt = gt_order[_concat_ranges(starts, counts)]
+
+    return pair_dt, pair_gt
+
+
+def _group_ranks(image_ids: np.ndarray, categories: np.ndarray) -> np.ndarray:
+    """
+    :return: Positions of detections in their (image, category) groups (detections go in their order)
+    """
+    order = np.lexsort((categories, image_ids))
+    count = len(order)
+
+    group_starts = np.ones(count, dtype=bool)
+    group_starts[1:] = (image_ids[order][1:] != image_ids[order][:-1]) | (
+        categories[order][1:] != categories[order][:-1]
+    )
+
+    positions = np.arange(count)
+    ranks = np.empty(count, dtype=np.int64)
+    ranks[order] = positions - np.maximum.accumulate(
+        np.where(group_starts, positions, 0)
+    )
+
+    return ranks
+
+
+def _last_per_detection(pairs: np.ndarray, pair_dt: np.ndarray) -> np.ndarray:
+    """
+    :param pairs: Pair positions grouped by detections
+    :return: Last pair of every detection
+    """
+    if not len(pairs):
+        return pairs
+
+    dt = pair_dt[pairs]
+    last = np.ones(len(pairs), dtype=bool)
+    last[:-1] = dt[1:] != dt[:-1]
+
+    last_pairs: np.ndarray = pairs[last]
+
+    return last_pairs
+
+
+def _match(
+    pair_dt: np.ndarray,
+    pair_gt: np.ndarray,
+    iou: np.ndarray,
+    candidates: np.ndarray,
+    ranks: np.ndarray,
+    gt_crowd: np.ndarray,
+    detection_count: int,
+) -> np.ndarray:
+    """
+    Greedily match detections with ground truth as the COCO evaluation does (see match_detections()).
+    Detections of the same rank belong to different groups and never compete for ground truth,
+    so each rank is matched in one step
+
+    :param candidates: (P,) mask of pairs of the same category above the IoU threshold
+    :return: (D,) matched ground truth positions, -1 for not matched detections
+    """
+    dt_gt = np.full(detection_count, -1, dtype=np.int64)
+    gt_matched = np.zeros(len(gt_crowd), dtype=bool)
+
+    pairs = np.flatnonzero(candidates)
+    pairs = pairs[np.argsort(ranks[pair_dt[pairs]], kind="stable")]
+    bounds = np.searchsorted(
+        ranks[pair_dt[pairs]], np.arange(int(ranks.max(initial=0)) + 2)
+    ).tolist()
+
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        step = pairs[start:end]
+        gt = pair_gt[step]
+        step = step[~gt_matched[gt] | gt_crowd[gt]]
+
+        if not len(step):
+            continue
+
+        # not crowd ground truth is preferred, then the highest IoU and the last of equally overlapping ones
+        gt = pair_gt[step]
+        step = step[np.lexsort((gt, iou[step], ~gt_crowd[gt], pair_dt[step]))]
+        best = _last_per_detection(step, pair_dt)
+
+        dt_gt[pair_dt[best]] = pair_gt[best]
+        gt_matched[pair_gt[best]] = True
+
+    return dt_gt
+
+
+def _best_overlaps(
+    pair_dt: np.ndarray,
+    pair_gt: np.ndarray,
+    iou: np.ndarray,
+    mask: np.ndarray,
+    detection_count: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :return: (D,) the highest IoU of every detection among the masked pairs and the ground truth position of it
+        (0 and -1 for detections without pairs)
+    """
+    best_iou = np.zeros(detection_count)
+    best_gt = np.full(detection_count, -1, dtype=np.int64)
+
+    pairs = np.flatnonzero(mask)
+    best = _last_per_detection(pairs[np.lexsort((iou[pairs], pair_dt[pairs]))], pair_dt)
+
+    best_iou[pair_dt[best]] = iou[best]
+    best_gt[pair_dt[best]] = pair_gt[best]
+
+    return best_iou, best_gt
+
+
+def _category_ap(
+    categories: np.ndarray,
+    scores: np.ndarray,
+    true_positives: np.ndarray,
+    ignored: np.ndarray,
+    gt_counts: np.ndarray,
+) -> np.ndarray:
+    """
+    :return: (C,) AP per category, -1 for categories without ground truth
+    """
+    ap = -np.ones(len(gt_counts))
+
+    # detections keep their image and score order inside categories as in the evaluation
+    order = np.argsort(categories, kind="stable")
+    bounds = np.searchsorted(categories[order], np.arange(len(gt_counts) + 1))
+
+    for category in np.flatnonzero(gt_counts > 0).tolist():
+        start, end = bounds[category], bounds[category + 1]
+        dt = order[start:end]
+
+        precision, _ = _precision_recall(
+            scores[dt],
+            (true_positives[dt] | ignored[dt])[None],
+            ignored[dt][None],
+            int(gt_counts[category]),
+        )
+        ap[category] = precision.mean()
+
+    return ap
+
+
+def _claim(
+    positions: np.ndarray,
+    targets: np.ndarray,
+    scores: np.ndarray,
+    gt_matched: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fixed detections take their not matched target ground truth, the top scoring one wins
+    (the others become duplicates and are dropped)
+
+    :return: Positions of detections turned into true positives and their ground truth
+    """
+    available = ~gt_matched[targets]
+    positions, targets = positions[available], targets[available]
+
+    order = np.lexsort((-scores[positions], targets))
+    positions, targets = positions[order], targets[order]
+
+    first = np.ones(len(targets), dtype=bool)
+    first[1:] = targets[1:] != targets[:-1]
+
+    return positions[first], targets[first]
+
+
+def _confusion_matrix(
+    pair_dt: np.ndarray,
+    pair_gt: np.ndarray,
+    candidates: np.ndarray,
+    iou: np.ndarray,
+    dt_categories: np.ndarray,
+    gt_categories: np.ndarray,
+    confident: np.ndarray,
+    counted_gt: np.ndarray,
+    category_count: int,
+) -> np.ndarray:
+    """
+    Pairs are matched one to one in the order of IoU regardless of categories.
+    Not matched ground truth goes to the background column, not matched detections go to the background row
+
+    :param candidates: (P,) mask of pairs above the IoU threshold
+    :param confident: (D,) mask of counted detections
+    :param counted_gt: (G,) mask of counted ground truth
+    :return: (C + 1, C + 1) matrix of ground truth x detected category counts
+    """
+    pairs = np.flatnonzero(candidates & confident[pair_dt] & counted_gt[pair_gt])
+    pairs = pairs[np.argsort(-iou[pairs], kind="stable")]
+
+    _, first = np.unique(pair_dt[pairs], return_index=True)
+    pairs = pairs[np.sort(first)]
+    _, first = np.unique(pair_gt[pairs], return_index=True)
+    pairs = pairs[np.sort(first)]
+
+    dt_matched = np.zeros(len(dt_categories), dtype=bool)
+    dt_matched[pair_dt[pairs]] = True
+    gt_matched = np.zeros(len(gt_categories), dtype=bool)
+    gt_matched[pair_gt[pairs]] = True
+
+    missed = counted_gt & ~gt_matched
+    background = confident & ~dt_matched
+
+    rows = np.concatenate(
+        (
+            gt_categories[pair_gt[pairs]],
+            gt_categories[missed],
+            np.full(np.count_nonzero(background), category_count),
+        )
+    )
+    columns = np.concatenate(
+        (
+            dt_categories[pair_dt[pairs]],
+            np.full(np.count_nonzero(missed), category_count),
+            dt_categories[background],
+        )
+    )
+
+    size = category_count + 1
+    confusion: np.ndarray = np.bincount(
+        rows * size + columns, minlength=size * size
+    ).reshape(size, size)
+
+    return confusion
+
+
+def analyze_errors(
+    dataset: "COCO",
+    detections: Union[Sequence[Mapping[str, Any]], Detections],
+    foreground_iou: float = 0.5,
+    background_iou: float = 0.1,
+    max_detections: int = 100,
+    confusion_score: float = 0.5,
+) -> ErrorAnalysis:
+    """
+    Attribute box detection errors to TIDE error types and measure their impact on AP.
+
+    Detections not matched at the foreground IoU threshold are checked against the ground truth of their image in
+    the order: duplicate (IoU above the foreground threshold with already matched ground truth of the category),
+    localization (the background threshold with the category), classification (the foreground threshold with
+    other categories), background (below the background threshold with everything) and both.
+    Not matched ground truth that isn't the target of a localization or classification error is missed
+
+    :param dataset: Ground truth COCO dataset
+    :param detections: Detection records with image_id, category_id, bbox (xywh) and score fields
+        or loaded detections (see COCO.load_results())
+    :param foreground_iou: IoU threshold of true positives
+    :param background_iou: IoU threshold below which detections are background errors
+    :param max_detections: Maximum number of top scoring detections per image and category
+    :param confusion_score: Minimum score of detections counted in the confusion matrix
+    :return: Error analysis (see ErrorAnalysis.summary())
+    """
+    columns = dataset._get_columns()
+    category_ids = np.array(
+        sorted(category.id for category in dataset.categories), dtype=np.int64
+    )
+    category_count = len(category_ids)
+
+    if not isinstance(detections, Detections):
+        detections = Detections.from_records(detections)
+
+    detections = detections.take(
+        id_positions(category_ids, detections.category_ids) >= 0
+    ).top_k(max_detections, per_category=True)
+    detections = detections.take(np.lexsort((-detections.scores, detections.image_ids)))
+
+    detection_count = len(detections)
+    dt_categories = id_positions(category_ids, detections.category_ids)
+    gt_categories = id_positions(category_ids, columns.category_ids)
+    gt_crowd = columns.iscrowd
+
+    pair_dt, pair_gt = _image_pairs(
+        detections.image_ids, columns.image_ids, columns.image_order
+    )
+    iou = paired_iou(
+        detections.bboxes[pair_dt], columns.bboxes[pair_gt], crowd=gt_crowd[pair_gt]
+    )
+    same = dt_categories[pair_dt] == gt_categories[pair_gt]
+    regular = ~gt_crowd[pair_gt]
+    foreground = min(foreground_iou, 1 - 1e-10)
+
+    dt_gt = _match(
+        pair_dt,
+        pair_gt,
+        iou,
+        same & (iou >= foreground),
+        _group_ranks(detections.image_ids, dt_categories),
+        gt_crowd,
+        detection_count,
+    )
+    matched = dt_gt >= 0
+    ignored = matched & gt_crowd[np.maximum(dt_gt, 0)]
+    true_positives = matched & ~ignored
+
+    gt_matched = np.zeros(len(gt_crowd), dtype=bool)
+    gt_matched[dt_gt[true_positives]] = True
+
+    same_iou, same_gt = _best_overlaps(
+        pair_dt, pair_gt, iou, same & regular, detection_count
+    )
+    other_iou, other_gt = _best_overlaps(
+        pair_dt, pair_gt, iou, ~same & regular, detection_count
+    )
+
+    errors = np.full(detection_count, -1, dtype=np.int8)
+    unassigned = ~matched
+
+    for error, mask in (
+        ("duplicate", same_iou >= foreground),
+        ("localization", (same_gt >= 0) & (same_iou >= background_iou)),
+        ("classification", other_iou >= foreground),
+        ("background", np.maximum(same_iou, other_iou) < background_iou),
+        ("both", np.ones(detection_count, dtype=bool)),
+    ):
+        errors[unassigned & mask] = ERROR_TYPES.index(error)
+        unassigned &= ~mask
+
+    targets: Dict[str, np.ndarray] = {
+        "classification": other_gt,
+        "localization": same_gt,
+    }
+
+    missed = ~gt_crowd & ~gt_matched
+
+    for error, error_targets in targets.items():
+        missed[error_targets[errors == ERROR_TYPES.index(error)]] = False
+
+    gt_counts = np.bincount(gt_categories[~gt_crowd], minlength=category_count)
+    fixed_ap: Dict[str, np.ndarray] = {}
+
+    for code, error in enumerate(ERROR_TYPES):
+        keep = errors != code
+        fixed_categories, fixed_true_positives = dt_categories, true_positives
+        fixed_counts = gt_counts
+
+        if error in targets:
+            positions = np.flatnonzero(errors == code)
+            winners, winner_targets = _claim(
+                positions, targets[error][positions], detections.scores, gt_matched
+            )
+
+            keep[winners] = True
+            fixed_true_positives = true_positives.copy()
+            fixed_true_positives[winners] = True
+
+            if error == "classification":
+                fixed_categories = dt_categories.copy()
+                fixed_categories[winners] = gt_categories[winner_targets]
+        elif error == "missed":
+            fixed_counts = gt_counts - np.bincount(
+                gt_categories[missed], minlength=category_count
+            )
+
+        fixed_ap[error] = _category_ap(
+            fixed_categories[keep],
+            detections.scores[keep],
+            fixed_true_positives[keep],
+            ignored[keep],
+            fixed_counts,
+        )
+
+    confusion = _confusion_matrix(
+        pair_dt,
+        pair_gt,
+        regular & (iou >= foreground),
+        iou,
+        dt_categories,
+        gt_categories,
+        (detections.scores >= confusion_score) & ~ignored,
+        ~gt_crowd,
+        category_count,
+    )
+
+    return ErrorAnalysis(
+        category_ids=category_ids,
+        ap=_category_ap(
+            dt_categories, detections.scores, true_positives, ignored, gt_counts
+        ),
+        fixed_ap=fixed_ap,
+        detections=detections,
+        errors=errors,
+        missed=missed,
+        confusion=confusion,
+    )
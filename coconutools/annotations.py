@@ -1,14 +1,24 @@
 from dataclasses import dataclass
 from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
 
+import numpy as np
+
 from coconutools.exceptions import DatasetNotReferenced
 from coconutools.images import Category, Image
-from coconutools.segmentations import CompressedRLE_T, PolygonT, UncompressedRLE_T
+from coconutools.keypoints import KeypointsT
+from coconutools.segmentations import (
+    CompressedRLE_T,
+    PolygonT,
+    UncompressedRLE_T,
+    decode,
+    to_rle,
+)
 
 if TYPE_CHECKING:
     from coconutools.dataset import COCO
 
 BBoxT = Tuple[float, float, float, float]
+SegmentationT = Union[List[PolygonT], UncompressedRLE_T, CompressedRLE_T]
 
 
 @dataclass
@@ -25,7 +35,11 @@ class Annotation:
         "id",
         "image_id",
         "category_id",
-        "segmentation",
+        "_segmentation",
+        "_polygon_index",
+        "_keypoints",
+        "_keypoint_index",
+        "num_keypoints",
         "bbox",
         "iscrowd",
         "area",
@@ -39,7 +53,16 @@ class Annotation:
 
     iscrowd: bool
 
-    segmentation: Union[List[PolygonT], UncompressedRLE_T, CompressedRLE_T]
+    # polygons of annotations that belong to a dataset are kept in the dataset PolygonStore,
+    # so _segmentation holds only RLEs and polygons of standalone annotations
+    _segmentation: Optional[SegmentationT]
+    _polygon_index: Optional[int]
+
+    # keypoints of annotations that belong to a dataset are kept in the dataset KeypointStore
+    _keypoints: Optional[KeypointsT]
+    _keypoint_index: Optional[int]
+    num_keypoints: Optional[int]
+
     bbox: BBox
     area: float
 
@@ -53,10 +76,12 @@ class Annotation:
         image_id: int,
         category_id: int,
         iscrowd: bool,
-        segmentation: Union[List[PolygonT], UncompressedRLE_T, CompressedRLE_T],
+        segmentation: SegmentationT,
         bbox: BBoxT,
         area: float,
         dataset: Optional["COCO"] = None,
+        keypoints: Optional[KeypointsT] = None,
+        num_keypoints: Optional[int] = None,
         **extra: Optional[Dict[str, Any]]
     ) -> None:
         self._dataset = dataset
@@ -68,10 +93,98 @@ class Annotation:
         self.area = area
 
         self.bbox = BBox(*bbox)
-        self.segmentation = segmentation
+        # datasets attach polygons to their PolygonStore in bulk after the annotation is created
+        self._set_segmentation(segmentation)
+        self.keypoints = keypoints
+        self.num_keypoints = num_keypoints
 
         self.extra = extra
 
+    @property
+    def segmentation(self) -> SegmentationT:
+        if self._polygon_index is not None and self._dataset:
+            return self._dataset._get_polygons(self._polygon_index)
+
+        return self._segmentation  # type: ignore
+
+    @segmentation.setter
+    def segmentation(self, segmentation: SegmentationT) -> None:
+        # polygons of dataset annotations are written through to the dataset PolygonStore
+        if self._dataset is not None:
+            self._dataset._store_segmentation(self, segmentation)
+        else:
+            self._set_segmentation(segmentation)
+
+    @property
+    def keypoints(self) -> Optional[np.ndarray]:
+        """
+        (K, 3) float32 array of keypoint (x, y, visibility) rows or None if the annotation has no keypoints
+        """
+        if self._keypoint_index is not None and self._dataset:
+            return self._dataset._get_keypoints(self._keypoint_index)
+
+        if self._keypoints is None:
+            return None
+
+        return np.asarray(self._keypoints, dtype=np.float32).reshape(-1, 3)
+
+    @keypoints.setter
+    def keypoints(self, keypoints: Optional[KeypointsT]) -> None:
+        # keypoints are kept as given (a flat list or an array) and converted on access
+        self._keypoints = keypoints
+        self._keypoint_index = None
+
+    @property
+    def has_keypoints(self) -> bool:
+        return self._keypoint_index is not None or self._keypoints is not None
+
+    def _keypoint_dict(self) -> Dict[str, Any]:
+        keypoints = self.keypoints
+
+        if keypoints is None:
+            return {}
+
+        keypoint_dict: Dict[str, Any] = {"keypoints": keypoints.ravel().tolist()}
+
+        if self.num_keypoints is not None:
+            keypoint_dict["num_keypoints"] = self.num_keypoints
+
+        return keypoint_dict
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "image_id": self.image_id,
+            "category_id": self.category_id,
+            "segmentation": self.segmentation,
+            "bbox": [self.bbox.x, self.bbox.y, self.bbox.width, self.bbox.height],
+            "area": self.area,
+            "iscrowd": self.iscrowd,
+            **self._keypoint_dict(),
+            **self.extra,
+        }
+
+    def _set_segmentation(self, segmentation: SegmentationT) -> None:
+        """
+        Keep the segmentation on the annotation itself instead of referencing the dataset PolygonStore
+        """
+        self._segmentation = segmentation
+        self._polygon_index = None
+
+    def _attach_polygons(self, polygon_index: int) -> None:
+        """
+        Reference polygons stored in the dataset PolygonStore instead of keeping them as Python lists
+        """
+        self._segmentation = None
+        self._polygon_index = polygon_index
+
+    def _attach_keypoints(self, keypoint_index: int) -> None:
+        """
+        Reference keypoints stored in the dataset KeypointStore instead of keeping them as Python lists
+        """
+        self._keypoints = None
+        self._keypoint_index = keypoint_index
+
     @property
     def image(self) -> Image:
         if not self._dataset:
@@ -92,10 +205,25 @@ class Annotation:
 
         return self._dataset._get_category(self.category_id)
 
-    def mask(self):
-        # TODO: convert annotation to the mask
-        pass
+    def mask(self) -> np.ndarray:
+        """
+        Convert the annotation segmentation into a dense binary mask
+
+        :return: (H, W) uint8 mask
+        """
+        return decode(self.rle())
+
+    def rle(self) -> CompressedRLE_T:
+        """
+        Convert the annotation segmentation into a compressed RLE (polygons are rasterized with the image size)
+
+        :return: Compressed RLE
+        """
+        segmentation = self.segmentation
+
+        if isinstance(segmentation, list):
+            image = self.image
+
+            return to_rle(segmentation, image.height, image.width)
 
-    def rle(self):
-        # convert annotation to RLE
-        pass
+        return to_rle(segmentation, *segmentation["size"])
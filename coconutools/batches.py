@@ -0,0 +1,251 @@
+import os
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, Generator, List, Optional
+
+import numpy as np
+
+from coconutools.annotations import Annotation
+from coconutools.boxes import BoxFormat, BoxFormatT, convert_boxes, normalize_boxes
+from coconutools.parallel import ordered_map, prefetched
+from coconutools.segmentations import (
+    _concat_ranges,
+    decode,
+    from_polygons,
+    to_rle,
+)
+
+if TYPE_CHECKING:
+    from coconutools.dataset import COCO
+
+BatchT = Dict[str, Any]
+
+
+@dataclass
+class _BatchSource:
+    """
+    Per-image annotation groupings and annotation columns precomputed once for all batches
+    """
+
+    image_ids: np.ndarray  # (I,) int64
+    image_sizes: np.ndarray  # (I, 2) int64 width and height
+    image_paths: List[str]
+    starts: np.ndarray  # (I,) first position of image annotations in annotation_order
+    counts: np.ndarray  # (I,) number of image annotations
+
+    annotation_order: np.ndarray  # annotation positions grouped by image
+    annotation_ids: np.ndarray
+    boxes: np.ndarray  # (N, 4) float32 in the requested format
+    category_ids: np.ndarray
+    iscrowd: np.ndarray
+    areas: np.ndarray
+
+    polygon_indexes: np.ndarray
+    polygon_points: np.ndarray
+    polygon_offsets: np.ndarray
+    annotation_polygon_offsets: np.ndarray
+    # annotations by position (only when masks are requested)
+    annotations: List[Annotation]
+
+    @classmethod
+    def from_dataset(
+        cls,
+        dataset: "COCO",
+        format: BoxFormatT,
+        normalized: bool,
+        masks: bool,
+    ) -> "_BatchSource":
+        columns = dataset._get_columns()
+        images = dataset.images
+
+        slices = [columns.image_slices.get(image.id, slice(0, 0)) for image in images]
+        image_dir = None if dataset.image_dir is None else str(dataset.image_dir)
+
+        boxes = convert_boxes(columns.bboxes, BoxFormat.xywh, format)
+
+        if normalized:
+            boxes = normalize_boxes(
+                boxes, columns.image_sizes[:, 0], columns.image_sizes[:, 1]
+            )
+
+        polygons = dataset._polygons
+
+        return cls(
+            image_ids=np.fromiter(
+                (image.id for image in images), np.int64, len(images)
+            ),
+            image_sizes=np.array(
+                [(image.width, image.height) for image in images], np.int64
+            ).reshape(-1, 2),
+            image_paths=[
+                (
+                    image.file_name
+                    if image_dir is None
+                    else os.path.join(image_dir, image.file_name)
+                )
+                for image in images
+            ],
+            starts=np.fromiter((s.start for s in slices), np.int64, len(slices)),
+            counts=np.fromiter(
+                (s.stop - s.start for s in slices), np.int64, len(slices)
+            ),
+            annotation_order=columns.image_order,
+            annotation_ids=columns.ids,
+            boxes=boxes,
+            category_ids=columns.category_ids,
+            iscrowd=columns.iscrowd,
+            areas=columns.areas,
+            polygon_indexes=columns.polygon_indexes,
+            polygon_points=polygons.points,
+            polygon_offsets=polygons.polygon_offsets,
+            annotation_polygon_offsets=polygons.annotation_offsets,
+            annotations=list(dataset.annotations) if masks else [],
+        )
+
+    def _mask(self, position: int, height: int, width: int) -> Optional[np.ndarray]:
+        polygon_index = int(self.polygon_indexes[position])
+
+        if polygon_index >= 0:
+            first, last = self.annotation_polygon_offsets[
+                [polygon_index, polygon_index + 1]
+            ]
+            bounds = self.polygon_offsets[np.arange(first, last + 1)].tolist()
+
+            return decode(
+                from_polygons(
+                    [
+                        self.polygon_points[start:end]
+                        for start, end in zip(bounds[:-1], bounds[1:])
+                    ],
+                    height,
+                    width,
+                )
+            )
+
+        segmentation = self.annotations[position]._segmentation
+
+        if isinstance(segmentation, dict):
+            return decode(to_rle(segmentation, height, width))
+
+        # polygons kept outside of the dataset PolygonStore
+        return self.annotations[position].mask() if segmentation else None
+
+    def assemble(self, indexes: np.ndarray, masks: bool) -> BatchT:
+        """
+        Assemble padded arrays for a batch of images
+
+        :param indexes: Positions of batch images in COCO.images
+        :param masks: Rasterize annotation masks
+        :return: Batch dictionary
+        """
+        batch_size = len(indexes)
+        counts = self.counts[indexes]
+        max_count = int(counts.max(initial=0))
+
+        positions = self.annotation_order[_concat_ranges(self.starts[indexes], counts)]
+        rows = np.repeat(np.arange(batch_size), counts)
+        columns = _concat_ranges(np.zeros(batch_size, np.int64), counts)
+
+        def padded(values: np.ndarray, fill: Any, dtype: Any) -> np.ndarray:
+            shape = (batch_size, max_count, *values.shape[1:])
+            array = np.full(shape, fill, dtype=dtype)
+            array[rows, columns] = values[positions]
+
+            return array
+
+        image_sizes = self.image_sizes[indexes]
+        valid = np.zeros((batch_size, max_count), dtype=bool)
+        valid[rows, columns] = True
+
+        batch: BatchT = {
+            "image_ids": self.image_ids[indexes],
+            "image_paths": [self.image_paths[index] for index in indexes.tolist()],
+            "image_sizes": image_sizes,
+            "annotation_ids": padded(self.annotation_ids, -1, np.int64),
+            "boxes": padded(self.boxes, 0, np.float32),
+            "labels": padded(self.category_ids, -1, np.int64),
+            "iscrowd": padded(self.iscrowd, False, bool),
+            "areas": padded(self.areas, 0, np.float32),
+            "valid": valid,
+        }
+
+        if masks:
+            max_width, max_height = image_sizes.max(axis=0, initial=0).tolist()
+            batch_masks = np.zeros(
+                (batch_size, max_count, max_height, max_width), dtype=np.uint8
+            )
+
+            for row, column, position in zip(
+                rows.tolist(), columns.tolist(), positions.tolist()
+            ):
+                width, height = image_sizes[row].tolist()
+                mask = self._mask(position, height, width)
+
+                if mask is not None:
+                    batch_masks[row, column, :height, :width] = mask
+
+            batch["masks"] = batch_masks
+
+        return batch
+
+
+def iter_batches(
+    dataset: "COCO",
+    batch_size: int,
+    shuffle: bool = False,
+    seed: Optional[int] = None,
+    workers: Optional[int] = None,
+    prefetch: int = 2,
+    masks: bool = False,
+    drop_last: bool = False,
+    format: BoxFormatT = BoxFormat.xywh,
+    normalized: bool = False,
+) -> Generator[BatchT, None, None]:
+    """
+    Iterate over batches of images with their annotations padded into NumPy arrays.
+    See COCO.batches() for the batch content
+
+    :param dataset: COCO dataset
+    :param batch_size: Number of images per batch
+    :param shuffle: Shuffle images
+    :param seed: Random seed for shuffling
+    :param workers: Number of worker threads assembling batches
+    :param prefetch: Number of batches prepared ahead in background (0 to assemble batches on demand)
+    :param masks: Add rasterized annotation masks
+    :param drop_last: Drop the last incomplete batch
+    :param format: Box format
+    :param normalized: Normalize box coordinates by image sizes
+    :return: Iterator over batches
+    """
+    if batch_size < 1:
+        raise ValueError(f"Batch size has to be positive, got {batch_size}")
+
+    source = _BatchSource.from_dataset(dataset, format, normalized, masks)
+    image_count = len(source.image_ids)
+
+    order = (
+        np.random.default_rng(seed).permutation(image_count)
+        if shuffle
+        else np.arange(image_count)
+    )
+
+    last = image_count - image_count % batch_size if drop_last else image_count
+    starts = range(0, last, batch_size)
+    index_batches = (
+        order[start:end] for start, end in zip(starts, [*starts[1:], last])
+    )
+
+    def assemble(indexes: np.ndarray) -> BatchT:
+        return source.assemble(indexes, masks)
+
+    batches = ordered_map(
+        assemble,
+        index_batches,
+        workers=workers,
+        processes=False,
+        max_pending=max(prefetch, 1) * max(workers or 1, 1),
+    )
+
+    if prefetch > 0:
+        batches = prefetched(batches, prefetch)
+
+    yield from batches
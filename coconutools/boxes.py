@@ -0,0 +1,183 @@
+from enum import Enum, unique
+from typing import Optional, Union
+
+import numpy as np
+
+
+@unique
+class BoxFormat(str, Enum):
+    """
+    Bounding box coordinate formats
+
+    - xywh: top-left corner, width and height (native COCO format)
+    - xyxy: top-left and bottom-right corners
+    - cxcywh: box center, width and height
+    """
+
+    xywh = "xywh"
+    xyxy = "xyxy"
+    cxcywh = "cxcywh"
+
+
+BoxFormatT = Union[BoxFormat, str]
+SizesT = Union[np.ndarray, float]
+
+
+def convert_boxes(
+    boxes: np.ndarray, source: BoxFormatT, target: BoxFormatT
+) -> np.ndarray:
+    """
+    Convert an (N, 4) array of boxes between coordinate formats
+
+    :param boxes: (N, 4) array of boxes in the source format
+    :param source: Format of the given boxes
+    :param target: Format to convert boxes to
+    :return: (N, 4) contiguous float32 array of boxes in the target format
+    """
+    source, target = BoxFormat(source), BoxFormat(target)
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+
+    if source == target:
+        return np.ascontiguousarray(boxes)
+
+    # convert everything to xywh first, so we need only 2 * (len(BoxFormat) - 1) cases
+    if source == BoxFormat.xyxy:
+        boxes = np.concatenate((boxes[:, :2], boxes[:, 2:] - boxes[:, :2]), axis=1)
+    elif source == BoxFormat.cxcywh:
+        boxes = np.concatenate((boxes[:, :2] - boxes[:, 2:] / 2, boxes[:, 2:]), axis=1)
+
+    if target == BoxFormat.xyxy:
+        boxes = np.concatenate((boxes[:, :2], boxes[:, :2] + boxes[:, 2:]), axis=1)
+    elif target == BoxFormat.cxcywh:
+        boxes = np.concatenate((boxes[:, :2] + boxes[:, 2:] / 2, boxes[:, 2:]), axis=1)
+
+    return np.ascontiguousarray(boxes, dtype=np.float32)
+
+
+def normalize_boxes(boxes: np.ndarray, widths: SizesT, heights: SizesT) -> np.ndarray:
+    """
+    Normalize box coordinates by their image sizes.
+    All supported formats keep x-coordinates in the columns 0 and 2, so normalization doesn't depend on the format
+
+    :param boxes: (N, 4) array of boxes
+    :param widths: (N,) array of image widths (or a scalar)
+    :param heights: (N,) array of image heights (or a scalar)
+    :return: (N, 4) float32 array of boxes with coordinates in [0, 1] range
+    """
+    scale = np.stack(
+        np.broadcast_arrays(widths, heights, widths, heights), axis=-1
+    ).astype(np.float32)
+
+    return np.ascontiguousarray(boxes / scale, dtype=np.float32)
+
+
+def clip_boxes(
+    boxes: np.ndarray,
+    widths: SizesT,
+    heights: SizesT,
+    format: BoxFormatT = BoxFormat.xywh,
+) -> np.ndarray:
+    """
+    Clip boxes to image boundaries
+
+    :param boxes: (N, 4) array of boxes in the given format
+    :param widths: (N,) array of image widths (or a scalar)
+    :param heights: (N,) array of image heights (or a scalar)
+    :param format: Format of the given boxes
+    :return: (N, 4) float32 array of clipped boxes in the same format
+    """
+    corners = convert_boxes(boxes, format, BoxFormat.xyxy)
+    widths = np.asarray(widths, dtype=np.float32)
+    heights = np.asarray(heights, dtype=np.float32)
+
+    np.clip(corners[:, 0], 0, widths, out=corners[:, 0])
+    np.clip(corners[:, 1], 0, heights, out=corners[:, 1])
+    np.clip(corners[:, 2], 0, widths, out=corners[:, 2])
+    np.clip(corners[:, 3], 0, heights, out=corners[:, 3])
+
+    return convert_boxes(corners, BoxFormat.xyxy, format)
+
+
+def degenerate_boxes(
+    boxes: np.ndarray, format: BoxFormatT = BoxFormat.xywh, min_size: float = 0.0
+) -> np.ndarray:
+    """
+    Find degenerate boxes (boxes that have their width or height not greater than min_size)
+
+    :param boxes: (N, 4) array of boxes in the given format
+    :param format: Format of the given boxes
+    :param min_size: Boxes with any side not greater than this value are considered degenerate
+    :return: (N,) boolean mask of degenerate boxes
+    """
+    sizes = convert_boxes(boxes, format, BoxFormat.xywh)[:, 2:]
+
+    return np.asarray(np.any(~(sizes > min_size), axis=1))
+
+
+def paired_iou(
+    boxes: np.ndarray,
+    other: np.ndarray,
+    format: BoxFormatT = BoxFormat.xywh,
+    crowd: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Compute IoU of pairs of boxes (row by row)
+
+    :param boxes: (N, 4) array of boxes in the given format
+    :param other: (N, 4) array of boxes in the given format
+    :param format: Format of the given boxes
+    :param crowd: (N,) boolean mask of pairs with crowd boxes in other (the union is the area of the first box)
+    :return: (N,) float64 array of IoU values (0 for pairs with an empty union)
+    """
+    boxes = convert_boxes(boxes, format, BoxFormat.xyxy).astype(np.float64)
+    other = convert_boxes(other, format, BoxFormat.xyxy).astype(np.float64)
+
+    top_left = np.maximum(boxes[:, :2], other[:, :2])
+    bottom_right = np.minimum(boxes[:, 2:], other[:, 2:])
+    intersections = np.prod(np.clip(bottom_right - top_left, 0, None), axis=1)
+    areas = np.prod(boxes[:, 2:] - boxes[:, :2], axis=1)
+    unions = areas + np.prod(other[:, 2:] - other[:, :2], axis=1) - intersections
+
+    if crowd is not None:
+        unions = np.where(np.asarray(crowd, dtype=bool), areas, unions)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        iou: np.ndarray = np.where(unions > 0, intersections / unions, 0.0)
+
+    return iou
+
+
+def box_iou(
+    boxes: np.ndarray,
+    other: np.ndarray,
+    crowd: Optional[np.ndarray] = None,
+    format: BoxFormatT = BoxFormat.xywh,
+) -> np.ndarray:
+    """
+    Compute the IoU matrix of two sets of boxes
+
+    :param boxes: (N, 4) array of boxes in the given format (e.g. detections)
+    :param other: (M, 4) array of boxes in the given format (e.g. ground truth)
+    :param crowd: (M,) boolean mask of crowd boxes. The union with a crowd box is the area of the first box
+        (as in the COCO evaluation), so a box inside a crowd region fully overlaps it
+    :param format: Format of the given boxes
+    :return: (N, M) float64 IoU matrix
+    """
+    boxes = convert_boxes(boxes, format, BoxFormat.xyxy).astype(np.float64)
+    other = convert_boxes(other, format, BoxFormat.xyxy).astype(np.float64)
+
+    top_left = np.maximum(boxes[:, None, :2], other[None, :, :2])
+    bottom_right = np.minimum(boxes[:, None, 2:], other[None, :, 2:])
+    intersections = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+
+    areas = np.prod(boxes[:, 2:] - boxes[:, :2], axis=1)[:, None]
+    other_areas = np.prod(other[:, 2:] - other[:, :2], axis=1)[None, :]
+    unions = areas + other_areas - intersections
+
+    if crowd is not None:
+        unions = np.where(np.asarray(crowd, dtype=bool)[None, :], areas, unions)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        iou: np.ndarray = np.where(unions > 0, intersections / unions, 0.0)
+
+    return iou
@@ -0,0 +1,455 @@
+"""
+Programmatic construction of datasets (pseudo-labels, synthetic data) without JSON round trips.
+
+Images and annotations are appended in batches of arrays to buffers that grow geometrically,
+so appends are amortized O(1). Indexes and annotation columns are built once when the dataset is finalized
+"""
+
+from os import PathLike
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+
+from coconutools.annotations import Annotation, SegmentationT
+from coconutools.columns import AnnotationColumns, id_positions, image_slices
+from coconutools.dataset import COCO, EMPTY_INFO, Info
+from coconutools.images import Category, Image, License
+from coconutools.keypoints import KeypointsT, KeypointStore
+from coconutools.segmentations import RLE_T, PolygonStore, _append, area
+
+# an array, a sequence or a scalar broadcast to the batch size
+ColumnT = Union[np.ndarray, Sequence[Any], int, float]
+
+
+def _column(values: ColumnT, count: int, dtype: Any, name: str) -> np.ndarray:
+    column = np.asarray(values, dtype=dtype)
+
+    if column.ndim == 0:
+        return np.full(count, column, dtype=dtype)
+
+    if len(column) != count:
+        raise ValueError(f"Expected {count} {name} values, got {len(column)}")
+
+    return column
+
+
+def _check_unique(ids: np.ndarray, name: str) -> None:
+    unique_ids, counts = np.unique(ids, return_counts=True)
+    duplicates = unique_ids[counts > 1]
+
+    if len(duplicates):
+        examples = ", ".join(str(id) for id in duplicates[:5].tolist())
+
+        raise ValueError(
+            f"{len(duplicates)} {name} IDs are not unique (e.g. {examples})"
+        )
+
+
+class COCOBuilder:
+    """
+    Incremental builder of in-memory COCO datasets.
+
+    IDs of images, categories and annotations are assigned automatically (continuing after the largest ID
+    added so far) unless they are given explicitly
+    """
+
+    def __init__(
+        self,
+        categories: Sequence[Mapping[str, Any]] = (),
+        info: Optional[Mapping[str, Any]] = None,
+        licenses: Sequence[Mapping[str, Any]] = (),
+        image_dir: Optional[PathLike] = None,
+    ) -> None:
+        self.image_dir = image_dir
+
+        self._info = dict(info or {})
+        self._licenses = [License(**license) for license in licenses]
+        self._categories: List[Category] = []
+
+        self._file_names: List[str] = []
+        self._image_count = 0
+        self._image_ids = np.empty(0, dtype=np.int64)
+        self._image_sizes = np.empty((0, 2), dtype=np.int64)
+
+        self._annotation_count = 0
+        self._ids = np.empty(0, dtype=np.int64)
+        self._annotation_image_ids = np.empty(0, dtype=np.int64)
+        self._category_ids = np.empty(0, dtype=np.int64)
+        self._bboxes = np.empty((0, 4), dtype=np.float64)
+        # NaN areas are computed when the dataset is built
+        self._areas = np.empty(0, dtype=np.float64)
+        self._iscrowd = np.empty(0, dtype=bool)
+        self._polygon_indexes = np.empty(0, dtype=np.int64)
+        self._keypoint_indexes = np.empty(0, dtype=np.int64)
+
+        self._polygons = PolygonStore()
+        self._keypoints = KeypointStore()
+        self._rles: Dict[int, RLE_T] = {}  # annotation position -> RLE segmentation
+
+        self._next_image_id = 1
+        self._next_annotation_id = 1
+
+        for category in categories:
+            self.add_category(**category)
+
+    @property
+    def image_count(self) -> int:
+        return self._image_count
+
+    @property
+    def annotation_count(self) -> int:
+        return self._annotation_count
+
+    def add_category(
+        self,
+        name: str,
+        supercategory: Optional[str] = None,
+        keypoints: Optional[List[str]] = None,
+        skeleton: Optional[List[List[int]]] = None,
+        id: Optional[int] = None,
+    ) -> int:
+        """
+        :param name: Category name
+        :param supercategory: Supercategory name
+        :param keypoints: Keypoint names (keypoint categories only)
+        :param skeleton: 1-based keypoint index pairs connected by limbs
+        :param id: Category ID (the next one after the largest category ID by default)
+        :return: Category ID
+        """
+        known_ids = {category.id for category in self._categories}
+
+        if id is None:
+            id = max(known_ids, default=0) + 1
+        elif id in known_ids:
+            raise ValueError(f"Category {id} already exists")
+
+        self._categories.append(
+            Category(
+                id=id,
+                name=name,
+                supercategory=supercategory,
+                keypoints=keypoints,
+                skeleton=skeleton,
+            )
+        )
+
+        return id
+
+    def _ids_for(
+        self, ids: Optional[ColumnT], count: int, next_id: int, name: str
+    ) -> np.ndarray:
+        if ids is None:
+            return np.arange(next_id, next_id + count, dtype=np.int64)
+
+        return _column(ids, count, np.int64, f"{name} ID")
+
+    def add_images(
+        self,
+        file_names: Sequence[str],
+        widths: ColumnT,
+        heights: ColumnT,
+        ids: Optional[ColumnT] = None,
+    ) -> np.ndarray:
+        """
+        Append a batch of images
+
+        :param file_names: (N,) image file names
+        :param widths: (N,) image widths (or one width of all images)
+        :param heights: (N,) image heights (or one height of all images)
+        :param ids: (N,) image IDs (assigned automatically by default)
+        :return: (N,) int64 array of image IDs
+        """
+        count = len(file_names)
+        image_ids = self._ids_for(ids, count, self._next_image_id, "image")
+        sizes = np.stack(
+            (
+                _column(widths, count, np.int64, "width"),
+                _column(heights, count, np.int64, "height"),
+            ),
+            axis=1,
+        )
+
+        self._image_ids = _append(self._image_ids, self._image_count, image_ids)
+        self._image_sizes = _append(self._image_sizes, self._image_count, sizes)
+        self._file_names.extend(file_names)
+        self._image_count += count
+
+        if count:
+            self._next_image_id = max(self._next_image_id, int(image_ids.max()) + 1)
+
+        return image_ids
+
+    def add_annotations(
+        self,
+        image_ids: ColumnT,
+        category_ids: ColumnT,
+        bboxes: Union[np.ndarray, Sequence[Sequence[float]]],
+        areas: Optional[ColumnT] = None,
+        iscrowd: ColumnT = False,
+        segmentations: Optional[Sequence[SegmentationT]] = None,
+        keypoints: Optional[Union[np.ndarray, Sequence[Optional[KeypointsT]]]] = None,
+        ids: Optional[ColumnT] = None,
+    ) -> np.ndarray:
+        """
+        Append a batch of annotations
+
+        :param image_ids: (N,) image IDs (or one ID of all annotations)
+        :param category_ids: (N,) category IDs (or one ID of all annotations)
+        :param bboxes: (N, 4) boxes in the xywh format
+        :param areas: (N,) annotation areas (polygon, RLE or box areas are computed by default)
+        :param iscrowd: (N,) crowd flags
+        :param segmentations: N polygon segmentations (lists of flat [x1, y1, x2, y2, ...] lists) or RLEs
+        :param keypoints: (N, K, 3) array of (x, y, visibility) keypoints or N flat keypoint lists
+            (None for annotations without keypoints)
+        :param ids: (N,) annotation IDs (assigned automatically by default)
+        :return: (N,) int64 array of annotation IDs
+        """
+        boxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        count = len(boxes)
+        start = self._annotation_count
+
+        annotation_ids = self._ids_for(
+            ids, count, self._next_annotation_id, "annotation"
+        )
+        polygon_indexes = np.full(count, -1, dtype=np.int64)
+        keypoint_indexes = np.full(count, -1, dtype=np.int64)
+
+        if segmentations is not None:
+            if len(segmentations) != count:
+                raise ValueError(
+                    f"Expected {count} segmentations, got {len(segmentations)}"
+                )
+
+            polygon_positions: List[int] = []
+            polygons: List[Any] = []
+
+            for position, segmentation in enumerate(segmentations):
+                if isinstance(segmentation, dict):
+                    self._rles[start + position] = segmentation
+                elif segmentation:
+                    polygon_positions.append(position)
+                    polygons.append(segmentation)
+
+            polygon_indexes[polygon_positions] = np.asarray(
+                self._polygons.extend(polygons), dtype=np.int64
+            )
+
+        if keypoints is not None:
+            if isinstance(keypoints, np.ndarray):
+                keypoint_array = keypoints.reshape(count, -1, 3)
+                added = self._keypoints.extend_arrays(
+                    keypoint_array.reshape(-1, 3),
+                    np.full(count, keypoint_array.shape[1], dtype=np.int64),
+                )
+                keypoint_indexes[:] = np.asarray(added, dtype=np.int64)
+            else:
+                if len(keypoints) != count:
+                    raise ValueError(
+                        f"Expected {count} keypoints, got {len(keypoints)}"
+                    )
+
+                keypoint_positions: List[int] = []
+                keypoint_lists: List[KeypointsT] = []
+
+                for position, annotation_keypoints in enumerate(keypoints):
+                    if annotation_keypoints is not None:
+                        keypoint_positions.append(position)
+                        keypoint_lists.append(annotation_keypoints)
+
+                added = self._keypoints.extend(keypoint_lists)
+                keypoint_indexes[keypoint_positions] = np.asarray(added, dtype=np.int64)
+
+        for name, buffer, values in (
+            ("_ids", self._ids, annotation_ids),
+            (
+                "_annotation_image_ids",
+                self._annotation_image_ids,
+                _column(image_ids, count, np.int64, "image ID"),
+            ),
+            (
+                "_category_ids",
+                self._category_ids,
+                _column(category_ids, count, np.int64, "category ID"),
+            ),
+            ("_bboxes", self._bboxes, boxes),
+            (
+                "_areas",
+                self._areas,
+                (
+                    np.full(count, np.nan)
+                    if areas is None
+                    else _column(areas, count, np.float64, "area")
+                ),
+            ),
+            ("_iscrowd", self._iscrowd, _column(iscrowd, count, bool, "iscrowd")),
+            ("_polygon_indexes", self._polygon_indexes, polygon_indexes),
+            ("_keypoint_indexes", self._keypoint_indexes, keypoint_indexes),
+        ):
+            setattr(self, name, _append(buffer, start, values))
+
+        self._annotation_count += count
+
+        if count:
+            self._next_annotation_id = max(
+                self._next_annotation_id, int(annotation_ids.max()) + 1
+            )
+
+        return annotation_ids
+
+    def _computed_areas(self) -> np.ndarray:
+        """
+        :return: (N,) areas of annotations with computed ones filled in
+        """
+        count = self._annotation_count
+        areas = self._areas[:count].copy()
+        bboxes = self._bboxes[:count]
+        missing = np.isnan(areas)
+
+        areas[missing] = bboxes[missing, 2] * bboxes[missing, 3]
+
+        polygon_indexes = self._polygon_indexes[:count]
+        polygons = missing & (polygon_indexes >= 0)
+        areas[polygons] = self._polygons.areas()[polygon_indexes[polygons]]
+
+        rle_positions = np.array(
+            [position for position in self._rles if missing[position]], dtype=np.int64
+        )
+
+        if len(rle_positions):
+            areas[rle_positions] = area(
+                [self._rles[position] for position in rle_positions.tolist()]
+            )
+
+        return areas
+
+    def build(self) -> COCO:
+        """
+        Finalize the dataset: check IDs and references, compute missing areas and build indexes at once.
+        Segmentations and keypoints are shared with the builder (it can still be extended and built again)
+
+        :return: In-memory COCO dataset
+        """
+        image_count, count = self._image_count, self._annotation_count
+        image_ids = self._image_ids[:image_count]
+        image_sizes = self._image_sizes[:image_count]
+        annotation_image_ids = self._annotation_image_ids[:count]
+        category_ids = self._category_ids[:count]
+
+        _check_unique(image_ids, "image")
+        _check_unique(self._ids[:count], "annotation")
+
+        image_positions = id_positions(image_ids, annotation_image_ids)
+        known_category_ids = np.array(
+            [category.id for category in self._categories], dtype=np.int64
+        )
+
+        for name, positions, ids in (
+            ("image", image_positions, annotation_image_ids),
+            ("category", id_positions(known_category_ids, category_ids), category_ids),
+        ):
+            unknown = np.unique(ids[positions < 0])
+
+            if len(unknown):
+                examples = ", ".join(str(id) for id in unknown[:5].tolist())
+
+                raise ValueError(
+                    f"Annotations reference {len(unknown)} unknown {name} IDs (e.g. {examples})"
+                )
+
+        areas = self._computed_areas()
+        polygon_indexes = self._polygon_indexes[:count].copy()
+        keypoint_indexes = self._keypoint_indexes[:count].copy()
+
+        keypoint_counts = self._keypoints.counts
+        labelled_counts = np.bincount(
+            np.repeat(np.arange(len(keypoint_counts)), keypoint_counts),
+            weights=self._keypoints.keypoints[:, 2] > 0,
+            minlength=len(keypoint_counts),
+        ).astype(np.int64)
+
+        dataset = COCO._create(image_dir=self.image_dir)
+        dataset._info = Info(**{**EMPTY_INFO, **self._info})
+        dataset._polygons = self._polygons
+        dataset._keypoints = self._keypoints
+
+        for category in self._categories:
+            dataset._add_category(Category(**category.to_dict()))
+
+        for licence in self._licenses:
+            dataset._add_licence(License(**licence.to_dict()))
+
+        for image_id, file_name, (width, height) in zip(
+            image_ids.tolist(), self._file_names, image_sizes.tolist()
+        ):
+            dataset._add_image(
+                Image(
+                    id=image_id,
+                    file_name=file_name,
+                    width=width,
+                    height=height,
+                    dataset=dataset,
+                )
+            )
+
+        for position, (
+            annotation_id,
+            image_id,
+            category_id,
+            bbox,
+            annotation_area,
+            crowd,
+            polygon_index,
+            keypoint_index,
+        ) in enumerate(
+            zip(
+                self._ids[:count].tolist(),
+                annotation_image_ids.tolist(),
+                category_ids.tolist(),
+                self._bboxes[:count].tolist(),
+                areas.tolist(),
+                self._iscrowd[:count].tolist(),
+                polygon_indexes.tolist(),
+                keypoint_indexes.tolist(),
+            )
+        ):
+            annotation = Annotation(
+                id=annotation_id,
+                image_id=image_id,
+                category_id=category_id,
+                iscrowd=crowd,
+                segmentation=self._rles.get(position, []),
+                bbox=bbox,
+                area=annotation_area,
+                dataset=dataset,
+                num_keypoints=(
+                    int(labelled_counts[keypoint_index])
+                    if keypoint_index >= 0
+                    else None
+                ),
+            )
+
+            if polygon_index >= 0:
+                annotation._attach_polygons(polygon_index)
+
+            if keypoint_index >= 0:
+                annotation._attach_keypoints(keypoint_index)
+
+            dataset._add_annotation(annotation)
+
+        image_order = np.argsort(annotation_image_ids, kind="stable")
+
+        dataset._columns = AnnotationColumns(
+            ids=self._ids[:count].copy(),
+            image_ids=annotation_image_ids.copy(),
+            category_ids=category_ids.copy(),
+            iscrowd=self._iscrowd[:count].copy(),
+            areas=areas.astype(np.float32),
+            bboxes=self._bboxes[:count].astype(np.float32),
+            image_sizes=image_sizes[image_positions].astype(np.float32),
+            polygon_indexes=polygon_indexes,
+            keypoint_indexes=keypoint_indexes,
+            image_order=image_order,
+            image_slices=image_slices(annotation_image_ids, image_order),
+        )
+
+        return dataset
@@ -0,0 +1,255 @@
+"""
+Category remapping: merging, dropping and renumbering categories or collapsing them to their supercategories.
+
+Category IDs of all annotations are rewritten through a lookup array in one NumPy operation.
+The remapped dataset shares polygon and keypoint stores with the source one,
+so segmentations and keypoints are neither copied nor parsed again
+"""
+
+from os import PathLike
+from typing import TYPE_CHECKING, Dict, List, Mapping, Optional, Tuple, Union
+
+import numpy as np
+
+from coconutools.annotations import Annotation
+from coconutools.columns import id_positions
+from coconutools.images import Category, Image, License
+from coconutools.writers import DatasetWriter
+
+if TYPE_CHECKING:
+    from coconutools.dataset import COCO
+
+SUPERCATEGORY = "supercategory"
+
+# category ID -> ID of the category to merge it into (None to drop it) or "supercategory"
+CategoryMappingT = Union[Mapping[int, Optional[int]], str]
+
+
+def _supercategory_groups(
+    categories: List[Category],
+) -> Tuple[List[List[Category]], np.ndarray]:
+    """
+    :return: Categories grouped by supercategories (categories without one form their own groups)
+        and (C,) group positions of the given categories
+    """
+    group_positions: Dict[str, int] = {}
+    groups: List[List[Category]] = []
+    positions = np.empty(len(categories), dtype=np.int64)
+
+    for position, category in enumerate(categories):
+        name = category.supercategory or category.name
+
+        if name not in group_positions:
+            group_positions[name] = len(groups)
+            groups.append([])
+
+        groups[group_positions[name]].append(category)
+        positions[position] = group_positions[name]
+
+    return groups, positions
+
+
+def _mapping_groups(
+    categories: List[Category], mapping: Mapping[int, Optional[int]]
+) -> Tuple[List[List[Category]], np.ndarray]:
+    """
+    :return: Kept categories with categories merged into them (the kept one goes first)
+        and (C,) group positions of the given categories (-1 for dropped categories)
+    """
+    category_ids = [category.id for category in categories]
+    unknown = sorted(set(mapping) - set(category_ids))
+
+    if unknown:
+        raise ValueError(f"Category mapping references unknown categories {unknown}")
+
+    kept_ids = [
+        category_id
+        for category_id in category_ids
+        if mapping.get(category_id, category_id) == category_id
+    ]
+    group_positions = {
+        category_id: position for position, category_id in enumerate(kept_ids)
+    }
+    groups: List[List[Category]] = [[] for _ in kept_ids]
+    positions = np.full(len(categories), -1, dtype=np.int64)
+
+    for position, category in enumerate(categories):
+        target = mapping.get(category.id, category.id)
+
+        if target is None:
+            continue
+
+        if target not in group_positions:
+            raise ValueError(
+                f"Category {category.id} is mapped to {target} which is not a kept category"
+            )
+
+        positions[position] = group_positions[target]
+
+        if target == category.id:
+            groups[positions[position]].insert(0, category)
+        else:
+            groups[positions[position]].append(category)
+
+    return groups, positions
+
+
+def remap_category_ids(
+    categories: List[Category], mapping: CategoryMappingT, renumber: bool = True
+) -> Tuple[List[Category], np.ndarray]:
+    """
+    Resolve a category mapping into the list of remapped categories and an ID lookup array
+
+    :param categories: Categories of the dataset
+    :param mapping: Category ID -> ID of a kept category to merge it into (None to drop it) or "supercategory"
+        to collapse categories to their supercategories. Categories missing in the mapping are kept
+    :param renumber: Assign contiguous IDs starting from 1 to remapped categories in the order of the dataset
+        (otherwise kept categories keep their IDs and supercategories take the ID of their first category)
+    :return: Remapped categories and (C,) array of new IDs of the given categories (-1 for dropped categories)
+    """
+    collapse = isinstance(mapping, str)
+
+    if isinstance(mapping, str):
+        if mapping != SUPERCATEGORY:
+            raise ValueError(
+                f"Categories can be collapsed only to '{SUPERCATEGORY}', got '{mapping}'"
+            )
+
+        groups, positions = _supercategory_groups(categories)
+    else:
+        groups, positions = _mapping_groups(categories, mapping)
+
+    remapped: List[Category] = []
+
+    for position, group in enumerate(groups):
+        first = group[0]
+        new_id = position + 1 if renumber else first.id
+
+        # keypoint definitions survive only if all merged categories share them
+        same_keypoints = all(
+            category.keypoints == first.keypoints
+            and category.skeleton == first.skeleton
+            for category in group
+        )
+
+        remapped.append(
+            Category(
+                id=new_id,
+                name=(first.supercategory or first.name) if collapse else first.name,
+                supercategory=first.supercategory,
+                keypoints=first.keypoints if same_keypoints else None,
+                skeleton=first.skeleton if same_keypoints else None,
+            )
+        )
+
+    # dropped categories are looked up at -1, that is the trailing -1
+    new_ids = np.array([category.id for category in remapped] + [-1], dtype=np.int64)
+    lookup: np.ndarray = new_ids[positions]
+
+    return remapped, lookup
+
+
+def remap_categories(
+    dataset: "COCO",
+    mapping: CategoryMappingT,
+    renumber: bool = True,
+    output_file: Optional[PathLike] = None,
+    chunk_size: int = 10_000,
+) -> "COCO":
+    """
+    Merge, drop and renumber categories or collapse them to their supercategories.
+    Annotations of dropped categories are removed, images are kept
+
+    :param dataset: COCO dataset
+    :param mapping: Category ID -> ID of a kept category to merge it into (None to drop it) or "supercategory"
+        to collapse categories to their supercategories. Categories missing in the mapping are kept
+    :param renumber: Assign contiguous IDs starting from 1 to remapped categories (see remap_category_ids())
+    :param output_file: Path to write the remapped dataset to
+    :param chunk_size: Number of annotations converted to records and written at once
+    :return: Remapped in-memory COCO dataset (backed by the output file if it's given)
+    """
+    categories, lookup = remap_category_ids(dataset.categories, mapping, renumber)
+    category_ids = np.fromiter(
+        (category.id for category in dataset.categories),
+        np.int64,
+        len(dataset.categories),
+    )
+
+    columns = dataset._get_columns()
+    positions = id_positions(category_ids, columns.category_ids)
+    # annotations of unknown categories are dropped together with dropped categories
+    new_category_ids = np.append(lookup, -1)[positions]
+    kept = np.flatnonzero(new_category_ids >= 0)
+
+    remapped = type(dataset)._create(image_dir=dataset.image_dir)
+    remapped._info = dataset.info
+    remapped._polygons = dataset._polygons
+    remapped._keypoints = dataset._keypoints
+
+    for category in categories:
+        remapped._add_category(category)
+
+    for licence in dataset.licences:
+        remapped._add_licence(License(**licence.to_dict()))
+
+    for image in dataset.images:
+        remapped._add_image(Image(**image.to_dict(), dataset=remapped))
+
+    annotations = dataset.annotations
+
+    for position, category_id in zip(kept.tolist(), new_category_ids[kept].tolist()):
+        annotation = annotations[position]
+        remapped_annotation = Annotation(
+            id=annotation.id,
+            image_id=annotation.image_id,
+            category_id=category_id,
+            iscrowd=annotation.iscrowd,
+            segmentation=annotation._segmentation or [],
+            bbox=(
+                annotation.bbox.x,
+                annotation.bbox.y,
+                annotation.bbox.width,
+                annotation.bbox.height,
+            ),
+            area=annotation.area,
+            dataset=remapped,
+            keypoints=annotation._keypoints,
+            num_keypoints=annotation.num_keypoints,
+            **annotation.extra,
+        )
+
+        # indexes point to the stores shared with the source dataset
+        if annotation._polygon_index is not None:
+            remapped_annotation._attach_polygons(annotation._polygon_index)
+
+        if annotation._keypoint_index is not None:
+            remapped_annotation._attach_keypoints(annotation._keypoint_index)
+
+        remapped._add_annotation(remapped_annotation)
+
+    remapped._columns = columns.take(kept)
+    remapped._columns.category_ids = new_category_ids[kept]
+
+    if output_file is not None:
+        _write(remapped, output_file, chunk_size)
+        remapped.annotation_file = output_file
+
+    return remapped
+
+
+def _write(dataset: "COCO", output_file: PathLike, chunk_size: int) -> None:
+    annotations = dataset.annotations
+
+    with DatasetWriter(
+        output_file,
+        info=dataset.info.to_dict(),
+        categories=[category.to_dict() for category in dataset.categories],
+        licenses=[licence.to_dict() for licence in dataset.licences],
+    ) as writer:
+        writer.write_images([image.to_dict() for image in dataset.images])
+
+        for start in range(0, len(annotations), chunk_size):
+            end = start + chunk_size
+            writer.write_annotations(
+                [annotation.to_dict() for annotation in annotations[start:end]]
+            )
@@ -0,0 +1,502 @@
+"""
+Command-line interface for bulk dataset operations.
+
+Every subcommand prints its result as JSON to stdout and a timing/peak memory summary to stderr.
+Datasets are written in chunks of images, so outputs are never materialized in memory as a whole
+"""
+
+import argparse
+import json
+import sys
+import time
+import warnings
+from contextlib import suppress
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import numpy as np
+
+from coconutools.dataset import COCO
+from coconutools.exceptions import DatasetCorrupted, DatasetFormatNotValid
+from coconutools.formats.files import batched
+from coconutools.writers import DatasetWriter, _default
+
+ResultT = Dict[str, Any]
+CommandT = Callable[[argparse.Namespace], Tuple[ResultT, int]]
+
+CHUNK_SIZE = 1000
+
+
+def _load(annotation_file: Path, image_dir: Optional[Path] = None) -> COCO:
+    return COCO(annotation_file=annotation_file, image_dir=image_dir)
+
+
+def _image_chunks(
+    dataset: COCO, image_ids: Sequence[int], chunk_size: int
+) -> Iterator[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+    """
+    :return: Iterator over (image records, annotation records) chunks of the given images
+    """
+    columns = dataset._get_columns()
+    annotations = dataset.annotations
+
+    for chunk_ids in batched(list(image_ids), chunk_size):
+        images = [dataset._get_image(image_id).to_dict() for image_id in chunk_ids]
+        records = [
+            annotations[position].to_dict()
+            for image_id in chunk_ids
+            for position in columns.image_positions(image_id).tolist()
+        ]
+
+        yield images, records
+
+
+def _write_subset(
+    dataset: COCO, output_file: Path, image_ids: Sequence[int], chunk_size: int
+) -> ResultT:
+    """
+    Stream the given images and their annotations to a new annotation file
+    """
+    with DatasetWriter(
+        output_file,
+        info=dataset.info.to_dict(),
+        categories=[category.to_dict() for category in dataset.categories],
+        licenses=[licence.to_dict() for licence in dataset.licences],
+    ) as writer:
+        for images, annotations in _image_chunks(dataset, image_ids, chunk_size):
+            writer.write_images(images)
+            writer.write_annotations(annotations)
+
+    return {
+        "file": str(output_file),
+        "images": writer.image_count,
+        "annotations": writer.annotation_count,
+    }
+
+
+def stats(args: argparse.Namespace) -> Tuple[ResultT, int]:
+    dataset = _load(args.annotation_file)
+    columns = dataset._get_columns()
+
+    category_names = {category.id: category.name for category in dataset.categories}
+    category_ids, category_counts = np.unique(columns.category_ids, return_counts=True)
+    annotated_images = len(np.unique(columns.image_ids))
+    box_areas = columns.bboxes[:, 2] * columns.bboxes[:, 3]
+
+    return {
+        "images": len(dataset.images),
+        "annotations": len(columns),
+        "categories": len(dataset.categories),
+        "licenses": len(dataset.licences),
+        "images_without_annotations": len(dataset.images) - annotated_images,
+        "crowd_annotations": int(np.count_nonzero(columns.iscrowd)),
+        "annotations_per_category": {
+            category_names.get(category_id, str(category_id)): count
+            for category_id, count in zip(
+                category_ids.tolist(), category_counts.tolist()
+            )
+        },
+        "box_area_percentiles": (
+            dict(
+                zip(
+                    ("p5", "p25", "p50", "p75", "p95"),
+                    np.percentile(box_areas, [5, 25, 50, 75, 95]).round(2).tolist(),
+                )
+            )
+            if len(box_areas)
+            else {}
+        ),
+    }, 0
+
+
+def validate(args: argparse.Namespace) -> Tuple[ResultT, int]:
+    try:
+        with warnings.catch_warnings(record=True) as parsing_warnings:
+            warnings.simplefilter("always")
+            dataset = _load(args.annotation_file)
+    except (DatasetCorrupted, DatasetFormatNotValid) as e:
+        return {"valid": False, "error": str(e)}, 1
+
+    columns = dataset._get_columns()
+    image_ids = np.fromiter((i.id for i in dataset.images), np.int64)
+    category_ids = np.fromiter((c.id for c in dataset.categories), np.int64)
+
+    boxes = columns.bboxes
+    widths, heights = columns.image_sizes[:, 0], columns.image_sizes[:, 1]
+    # boxes may stick out of images by a pixel because of rounding
+    outside = (
+        (boxes[:, 0] < -1)
+        | (boxes[:, 1] < -1)
+        | (boxes[:, 0] + boxes[:, 2] > widths + 1)
+        | (boxes[:, 1] + boxes[:, 3] > heights + 1)
+    )
+
+    problems = {
+        "unparsed_annotations": len(parsing_warnings),
+        "duplicate_image_ids": len(image_ids) - len(np.unique(image_ids)),
+        "duplicate_category_ids": len(category_ids) - len(np.unique(category_ids)),
+        "duplicate_annotation_ids": len(columns) - len(np.unique(columns.ids)),
+        "unknown_image_ids": int(
+            np.count_nonzero(~np.isin(columns.image_ids, image_ids))
+        ),
+        "unknown_category_ids": int(
+            np.count_nonzero(~np.isin(columns.category_ids, category_ids))
+        ),
+        "empty_boxes": int(np.count_nonzero((boxes[:, 2] <= 0) | (boxes[:, 3] <= 0))),
+        "boxes_outside_images": int(np.count_nonzero(outside)),
+        "negative_areas": int(np.count_nonzero(columns.areas < 0)),
+    }
+    problems = {name: count for name, count in problems.items() if count}
+
+    return {"valid": not problems, "problems": problems}, 1 if problems else 0
+
+
+def convert(args: argparse.Namespace) -> Tuple[ResultT, int]:
+    if args.source_format == "coco":
+        dataset = _load(args.source, image_dir=args.image_dir)
+    elif args.source_format == "yolo":
+        if args.image_dir is None:
+            raise argparse.ArgumentTypeError("YOLO labels require --image-dir")
+
+        dataset = COCO.from_yolo(args.source, args.image_dir, workers=args.workers)
+    else:
+        if args.image_dir is None:
+            raise argparse.ArgumentTypeError("VOC annotations require --image-dir")
+
+        dataset = COCO.from_voc(
+            args.source, args.image_dir, probe_sizes=True, workers=args.workers
+        )
+
+    if args.to == "coco":
+        image_ids = [image.id for image in dataset.images]
+
+        return _write_subset(dataset, args.output, image_ids, args.chunk_size), 0
+
+    files = dataset.export(args.to, args.output, workers=args.workers)
+
+    return {"directory": str(args.output), "files": files}, 0
+
+
+def _parse_fractions(values: Sequence[str]) -> Dict[str, float]:
+    fractions: Dict[str, float] = {}
+
+    for value in values:
+        name, _, fraction = value.partition("=")
+
+        if name in fractions:
+            raise argparse.ArgumentTypeError(f"Subset '{name}' is given more than once")
+
+        try:
+            fractions[name] = float(fraction)
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                f"Subsets have to be given as name=fraction, got '{value}'"
+            )
+
+    if not fractions or any(fraction < 0 for fraction in fractions.values()):
+        raise argparse.ArgumentTypeError("Subset fractions have to be non-negative")
+
+    if sum(fractions.values()) <= 0:
+        raise argparse.ArgumentTypeError(
+            "At least one subset fraction has to be positive"
+        )
+
+    return fractions
+
+
+def split(args: argparse.Namespace) -> Tuple[ResultT, int]:
+    fractions = _parse_fractions(args.subsets)
+    dataset = _load(args.annotation_file)
+
+    image_ids = np.fromiter((image.id for image in dataset.images), np.int64)
+    np.random.default_rng(args.seed).shuffle(image_ids)
+
+    # subsets take consecutive parts of shuffled images proportionally to their (normalized) fractions
+    shares = np.fromiter(fractions.values(), np.float64)
+    bounds = np.round(np.cumsum(shares) / shares.sum() * len(image_ids)).astype(int)
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    subsets: Dict[str, ResultT] = {}
+
+    for name, start, end in zip(fractions, np.r_[0, bounds[:-1]], bounds):
+        # keep the original image order within subsets
+        subset_ids = np.sort(image_ids[start:end]).tolist()
+        output_file = args.output_dir / f"{name}.json"
+
+        subsets[name] = _write_subset(dataset, output_file, subset_ids, args.chunk_size)
+
+    return {"subsets": subsets}, 0
+
+
+def merge(args: argparse.Namespace) -> Tuple[ResultT, int]:
+    """
+    Merge annotation files: categories are unified by name, licenses by name and URL, images by file name.
+    Image and annotation IDs are renumbered
+    """
+    # all datasets have to be loaded, since categories go before images in the output file
+    datasets = [_load(annotation_file) for annotation_file in args.annotation_files]
+
+    categories: Dict[str, Dict[str, Any]] = {}
+    licenses: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    for dataset in datasets:
+        for category in dataset.categories:
+            if category.name not in categories:
+                categories[category.name] = {
+                    **category.to_dict(),
+                    "id": len(categories) + 1,
+                }
+
+        for licence in dataset.licences:
+            if (licence.name, licence.url) not in licenses:
+                licenses[(licence.name, licence.url)] = {
+                    **licence.to_dict(),
+                    "id": len(licenses) + 1,
+                }
+
+    merged_images: Dict[str, int] = {}
+
+    with DatasetWriter(
+        args.output,
+        info=datasets[0].info.to_dict(),
+        categories=list(categories.values()),
+        licenses=list(licenses.values()),
+    ) as writer:
+        for dataset in datasets:
+            category_ids = {
+                category.id: categories[category.name]["id"]
+                for category in dataset.categories
+            }
+            licence_ids = {
+                licence.id: licenses[(licence.name, licence.url)]["id"]
+                for licence in dataset.licences
+            }
+            image_ids = [image.id for image in dataset.images]
+
+            for images, annotations in _image_chunks(
+                dataset, image_ids, args.chunk_size
+            ):
+                new_images: List[Dict[str, Any]] = []
+                image_id_map: Dict[int, int] = {}
+
+                for image in images:
+                    merged_id = merged_images.get(image["file_name"])
+
+                    if merged_id is None:
+                        merged_id = writer.image_count + len(new_images) + 1
+                        merged_images[image["file_name"]] = merged_id
+
+                        if "license" in image:
+                            image["license"] = licence_ids.get(image["license"])
+
+                        new_images.append({**image, "id": merged_id})
+
+                    image_id_map[image["id"]] = merged_id
+
+                new_annotations = [
+                    {
+                        **annotation,
+                        "id": writer.annotation_count + position + 1,
+                        "image_id": image_id_map[annotation["image_id"]],
+                        "category_id": category_ids.get(
+                            annotation["category_id"], annotation["category_id"]
+                        ),
+                    }
+                    for position, annotation in enumerate(annotations)
+                ]
+
+                writer.write_images(new_images)
+                writer.write_annotations(new_annotations)
+
+    return {
+        "file": str(args.output),
+        "images": writer.image_count,
+        "annotations": writer.annotation_count,
+        "categories": len(categories),
+    }, 0
+
+
+def evaluate(args: argparse.Namespace) -> Tuple[ResultT, int]:
+    dataset = _load(args.annotation_file)
+
+    if args.type == "keypoints":
+        with open(args.detection_file) as file:
+            detections = json.load(file)
+
+        result = dataset.evaluate_keypoints(
+            detections,
+            max_detections=args.max_detections or 20,
+            workers=args.workers,
+        )
+    else:
+        result = dataset.evaluate_boxes(
+            dataset.load_results(args.detection_file),
+            max_detections=args.max_detections or 100,
+            workers=args.workers,
+        )
+
+    category_names = {category.id: category.name for category in dataset.categories}
+
+    return {
+        "summary": result.summary(),
+        "category_ap": {
+            category_names[category_id]: ap
+            for category_id, ap in result.category_ap().items()
+        },
+    }, 0
+
+
+def _positive_int(value: str) -> int:
+    number = int(value)
+
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"Expected a positive number, got {value}")
+
+    return number
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="coconutools",
+        description="Bulk operations on COCO datasets",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    # only commands writing annotation files use chunks
+    chunked = argparse.ArgumentParser(add_help=False)
+    chunked.add_argument(
+        "--chunk-size",
+        type=_positive_int,
+        default=CHUNK_SIZE,
+        help="Number of images written at once",
+    )
+
+    # only conversion and evaluation run in parallel
+    parallel = argparse.ArgumentParser(add_help=False)
+    parallel.add_argument(
+        "--workers",
+        type=_positive_int,
+        default=None,
+        help="Number of workers",
+    )
+
+    command = subparsers.add_parser("stats", help="Print dataset statistics")
+    command.add_argument("annotation_file", type=Path)
+    command.set_defaults(handler=stats)
+
+    command = subparsers.add_parser(
+        "validate",
+        help="Check dataset consistency (exits with 1 when problems are found)",
+    )
+    command.add_argument("annotation_file", type=Path)
+    command.set_defaults(handler=validate)
+
+    command = subparsers.add_parser(
+        "convert",
+        parents=[chunked, parallel],
+        help="Convert between COCO, YOLO and Pascal VOC",
+    )
+    command.add_argument(
+        "source",
+        type=Path,
+        help="COCO annotation file, YOLO label or VOC annotation directory",
+    )
+    command.add_argument(
+        "--from",
+        dest="source_format",
+        choices=("coco", "yolo", "voc"),
+        default="coco",
+    )
+    command.add_argument("--to", choices=("coco", "yolo", "voc"), required=True)
+    command.add_argument(
+        "--output",
+        type=Path,
+        required=True,
+        help="Annotation file (COCO) or label directory (YOLO, VOC)",
+    )
+    command.add_argument("--image-dir", type=Path, default=None)
+    command.set_defaults(handler=convert)
+
+    command = subparsers.add_parser(
+        "split", parents=[chunked], help="Split images into random subsets"
+    )
+    command.add_argument("annotation_file", type=Path)
+    command.add_argument(
+        "subsets", nargs="+", help="Subsets as name=fraction (e.g. train=0.8 val=0.2)"
+    )
+    command.add_argument("--output-dir", type=Path, required=True)
+    command.add_argument("--seed", type=int, default=0)
+    command.set_defaults(handler=split)
+
+    command = subparsers.add_parser(
+        "merge", parents=[chunked], help="Merge several annotation files"
+    )
+    command.add_argument("annotation_files", type=Path, nargs="+")
+    command.add_argument("--output", type=Path, required=True)
+    command.set_defaults(handler=merge)
+
+    command = subparsers.add_parser(
+        "evaluate", parents=[parallel], help="Evaluate detections with COCO AP"
+    )
+    command.add_argument("annotation_file", type=Path)
+    command.add_argument("detection_file", type=Path, help="COCO results JSON file")
+    command.add_argument("--type", choices=("bbox", "keypoints"), default="bbox")
+    command.add_argument(
+        "--max-detections",
+        type=_positive_int,
+        default=None,
+        help="Maximum detections per image (100 for bbox, 20 for keypoints by default)",
+    )
+    command.set_defaults(handler=evaluate)
+
+    return parser
+
+
+def _peak_memory() -> Optional[float]:
+    """
+    :return: Peak resident memory of the process and its finished workers in MB (None on Windows)
+    """
+    with suppress(ModuleNotFoundError):
+        import resource
+
+        peak = max(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        )
+
+        # kilobytes on Linux, bytes on macOS
+        return float(peak / 1024**2 if sys.platform == "darwin" else peak / 1024)
+
+    return None
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    handler: CommandT = args.handler
+
+    started_at = time.perf_counter()
+
+    try:
+        result, exit_code = handler(args)
+    except argparse.ArgumentTypeError as e:
+        print(f"coconutools {args.command}: error: {e}", file=sys.stderr)
+        return 2
+
+    elapsed = time.perf_counter() - started_at
+
+    print(json.dumps(result, indent=2, default=_default))
+
+    peak_memory = _peak_memory()
+    memory = "" if peak_memory is None else f", peak memory {peak_memory:.1f} MB"
+    print(f"coconutools {args.command}: {elapsed:.3f}s{memory}", file=sys.stderr)
+
+    return exit_code
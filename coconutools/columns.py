@@ -0,0 +1,181 @@
+from dataclasses import dataclass
+from typing import Dict, List
+
+import numpy as np
+
+from coconutools.annotations import Annotation
+from coconutools.images import Image
+
+
+def id_positions(known_ids: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """
+    Find positions of IDs in an (unsorted) array of known IDs
+
+    :param known_ids: (M,) array of unique IDs
+    :param ids: (N,) array of IDs to look up
+    :return: (N,) int64 array of positions in known_ids, -1 for unknown IDs
+    """
+    positions = np.full(len(ids), -1, dtype=np.int64)
+
+    if not len(known_ids):
+        return positions
+
+    order = np.argsort(known_ids, kind="stable")
+    found_positions = order[
+        np.minimum(np.searchsorted(known_ids, ids, sorter=order), len(known_ids) - 1)
+    ]
+    found = known_ids[found_positions] == ids
+    positions[found] = found_positions[found]
+
+    return positions
+
+
+def image_slices(image_ids: np.ndarray, image_order: np.ndarray) -> Dict[int, slice]:
+    """
+    Group annotations by images
+
+    :param image_ids: (N,) array of annotation image IDs
+    :param image_order: (N,) array of annotation positions stably sorted by image IDs
+    :return: Image ID -> slice of image_order with positions of the image annotations
+    """
+    group_ids, group_starts, group_counts = np.unique(
+        image_ids[image_order], return_index=True, return_counts=True
+    )
+
+    return {
+        int(image_id): slice(int(start), int(start + size))
+        for image_id, start, size in zip(group_ids, group_starts, group_counts)
+    }
+
+
+@dataclass
+class AnnotationColumns:
+    """
+    Columnar (NumPy) representation of dataset annotations.
+    Rows are aligned with the order of COCO.annotations
+    """
+
+    ids: np.ndarray  # (N,) int64
+    image_ids: np.ndarray  # (N,) int64
+    category_ids: np.ndarray  # (N,) int64
+    iscrowd: np.ndarray  # (N,) bool
+    areas: np.ndarray  # (N,) float32
+    bboxes: np.ndarray  # (N, 4) float32 in the xywh format
+    image_sizes: np.ndarray  # (N, 2) float32 width and height of the annotation image
+    polygon_indexes: np.ndarray  # (N,) int64 index in the dataset PolygonStore or -1
+    keypoint_indexes: np.ndarray  # (N,) int64 index in the dataset KeypointStore or -1
+
+    # annotation positions grouped by image and the image_id -> group slice index
+    image_order: np.ndarray
+    image_slices: Dict[int, slice]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_annotations(
+        cls, annotations: List[Annotation], images: List[Image]
+    ) -> "AnnotationColumns":
+        count = len(annotations)
+
+        ids = np.fromiter((a.id for a in annotations), np.int64, count)
+        image_ids = np.fromiter((a.image_id for a in annotations), np.int64, count)
+        category_ids = np.fromiter(
+            (a.category_id for a in annotations), np.int64, count
+        )
+        iscrowd = np.fromiter((bool(a.iscrowd) for a in annotations), bool, count)
+        areas = np.fromiter((a.area for a in annotations), np.float32, count)
+
+        bboxes = np.fromiter(
+            (
+                coordinate
+                for a in annotations
+                for coordinate in (a.bbox.x, a.bbox.y, a.bbox.width, a.bbox.height)
+            ),
+            np.float32,
+            count * 4,
+        ).reshape(count, 4)
+
+        polygon_indexes = np.fromiter(
+            (-1 if a._polygon_index is None else a._polygon_index for a in annotations),
+            np.int64,
+            count,
+        )
+        keypoint_indexes = np.fromiter(
+            (
+                -1 if a._keypoint_index is None else a._keypoint_index
+                for a in annotations
+            ),
+            np.int64,
+            count,
+        )
+
+        # join image sizes via sorted image IDs instead of a per-annotation dict lookup
+        known_image_ids = np.fromiter((i.id for i in images), np.int64, len(images))
+        known_sizes = np.array(
+            [(i.width, i.height) for i in images], dtype=np.float32
+        ).reshape(-1, 2)
+
+        image_sizes = np.full((count, 2), np.nan, dtype=np.float32)
+
+        if len(images):
+            sort_index = np.argsort(known_image_ids, kind="stable")
+            positions = np.searchsorted(known_image_ids, image_ids, sorter=sort_index)
+            positions = sort_index[np.minimum(positions, len(images) - 1)]
+
+            found = known_image_ids[positions] == image_ids
+            image_sizes[found] = known_sizes[positions[found]]
+
+        image_order = np.argsort(image_ids, kind="stable")
+
+        return cls(
+            ids=ids,
+            image_ids=image_ids,
+            category_ids=category_ids,
+            iscrowd=iscrowd,
+            areas=areas,
+            bboxes=bboxes,
+            image_sizes=image_sizes,
+            polygon_indexes=polygon_indexes,
+            keypoint_indexes=keypoint_indexes,
+            image_order=image_order,
+            image_slices=image_slices(image_ids, image_order),
+        )
+
+    def take(self, positions: np.ndarray) -> "AnnotationColumns":
+        """
+        Select rows by positions (polygon and keypoint indexes keep pointing to the same stores)
+
+        :param positions: (K,) array of annotation positions
+        :return: Columns of the selected annotations
+        """
+        image_ids = self.image_ids[positions]
+        image_order = np.argsort(image_ids, kind="stable")
+
+        return AnnotationColumns(
+            ids=self.ids[positions],
+            image_ids=image_ids,
+            category_ids=self.category_ids[positions],
+            iscrowd=self.iscrowd[positions],
+            areas=self.areas[positions],
+            bboxes=self.bboxes[positions],
+            image_sizes=self.image_sizes[positions],
+            polygon_indexes=self.polygon_indexes[positions],
+            keypoint_indexes=self.keypoint_indexes[positions],
+            image_order=image_order,
+            image_slices=image_slices(image_ids, image_order),
+        )
+
+    def image_positions(self, image_id: int) -> np.ndarray:
+        """
+        Get positions of annotations that belong to the given image
+
+        :param image_id: Image ID
+        :return: (K,) int64 array of annotation positions
+        """
+        image_slice = self.image_slices.get(image_id)
+
+        if image_slice is None:
+            return np.empty(0, dtype=np.int64)
+
+        return self.image_order[image_slice]
@@ -1,18 +1,78 @@
 import json
+import os
 import warnings
-from contextlib import suppress
+from concurrent.futures import Executor
 from dataclasses import asdict, dataclass
 from datetime import datetime
 from json import JSONDecodeError
 from os import PathLike
-from typing import Any, Dict, List, Optional
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    cast,
+)
 
-from coconutools.annotations import Annotation
+import numpy as np
+
+from coconutools.aio import ImageItem, ProgressCallbackT, iter_images, load_dataset
+from coconutools.analysis import ErrorAnalysis, analyze_errors
+from coconutools.annotations import Annotation, BBox, SegmentationT
+from coconutools.batches import BatchT, iter_batches
+from coconutools.boxes import (
+    BoxFormat,
+    BoxFormatT,
+    clip_boxes,
+    convert_boxes,
+    degenerate_boxes,
+    normalize_boxes,
+)
+from coconutools.categories import CategoryMappingT, remap_categories
+from coconutools.columns import AnnotationColumns
+from coconutools.detections import Detections, ResultsT, load_results
+from coconutools.duplicates import Duplicates, deduplicate, find_duplicates
+from coconutools.evaluation import (
+    EvaluationResult,
+    evaluate_boxes,
+    evaluate_keypoints,
+)
 from coconutools.exceptions import DatasetCorrupted, DatasetFormatNotValid
+from coconutools.fingerprints import FileFingerprint, RefreshResult
+from coconutools.formats import ExportFormatT, export_dataset
+from coconutools.formats.arrow import export_parquet, load_arrow, load_parquet, to_arrow
+from coconutools.formats.headers import SizeT
+from coconutools.formats.sqlite import export_sqlite, load_sqlite
+from coconutools.formats.voc import load_voc
+from coconutools.formats.yolo import load_yolo
 from coconutools.images import Category, Image, License
+from coconutools.indexes import AnnotationIndex
+from coconutools.keypoints import KeypointsT, KeypointStore
+from coconutools.pyramids import (
+    DEFAULT_CACHE_BYTES,
+    DEFAULT_SCALES,
+    MaskPyramid,
+    MaskT,
+    PyramidCache,
+    mask_iou,
+)
+from coconutools.segmentations import PolygonStore, PolygonT
+from coconutools.tiling import TileSizeT, tile_dataset
 
-with suppress(ModuleNotFoundError):
+if TYPE_CHECKING:
     import pandas
+    import pyarrow
+
+    from coconutools.sharing import SharedCOCO
 
 
 @dataclass
@@ -26,6 +86,12 @@ class Info:
     url: Optional[str]
     date_created: Optional[datetime]
 
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+EMPTY_INFO: Dict[str, Any] = {field: None for field in Info.__slots__}
+
 
 class COCO:
     """
@@ -34,15 +100,24 @@ class COCO:
     Description of COCO format: https://cocodataset.org/#format-data
     """
 
-    __image_index: Dict[int, Image] = {}
-    __category_index: Dict[int, Category] = {}
-    __annotation_index: Dict[int, Annotation] = {}
-    __license_index: Dict[int, License] = {}
+    __image_index: Dict[int, Image]
+    __category_index: Dict[int, Category]
+    __annotation_index: Dict[int, Annotation]
+    __license_index: Dict[int, License]
+
+    # removed annotations are left as None tombstones until the list is compacted
+    _annotations: List[Optional[Annotation]]
+    _columns: Optional[AnnotationColumns]
+    _index: Optional[AnnotationIndex]
+    _pyramids: Optional[PyramidCache]
+    _polygons: PolygonStore
+    _keypoints: KeypointStore
+    _fingerprint: Optional[FileFingerprint]
 
     def __init__(
         self, annotation_file: PathLike, image_dir: Optional[PathLike] = None
     ) -> None:
-        self.annotation_file = annotation_file
+        self.annotation_file: Optional[PathLike] = annotation_file
         self.image_dir = image_dir
 
         self._load_dataset()
@@ -53,7 +128,10 @@ class COCO:
 
     @property
     def annotations(self) -> List["Annotation"]:
-        return self._annotations
+        if self._index is not None and self._index.tombstones:
+            self._compact_annotations()
+
+        return cast(List[Annotation], self._annotations)
 
     @property
     def images(self) -> List["Image"]:
@@ -91,49 +169,1144 @@ class COCO:
     def _get_annotation(self, annotation_id: int) -> Annotation:
         return self.__annotation_index[annotation_id]
 
+    def _get_polygons(self, polygon_index: int) -> List[PolygonT]:
+        return self._polygons.get(polygon_index)
+
+    def _get_keypoints(self, keypoint_index: int) -> np.ndarray:
+        return self._keypoints.get(keypoint_index)
+
+    def _get_index(self) -> AnnotationIndex:
+        """
+        Get incrementally maintained annotation indexes (built lazily on the first mutation or lookup)
+        """
+        if self._index is None:
+            self._index = AnnotationIndex.from_annotations(self.annotations)
+
+        return self._index
+
+    def _compact_annotations(self) -> None:
+        self._annotations = cast(
+            List[Optional[Annotation]], self._get_index().compact(self._annotations)
+        )
+
+    def _get_columns(self) -> AnnotationColumns:
+        """
+        Get columnar representation of annotations (built lazily and cached)
+        """
+        if self._columns is None:
+            self._columns = AnnotationColumns.from_annotations(
+                self.annotations, self._images
+            )
+
+        return self._columns
+
+    def _aligned_polygons(self) -> PolygonStore:
+        """
+        Get polygons of all annotations as a compact store aligned with the annotation list
+        """
+        indexes = self._get_columns().polygon_indexes
+        annotations = self.annotations
+
+        if not any(
+            isinstance(annotations[position]._segmentation, list)
+            and annotations[position]._segmentation
+            for position in np.flatnonzero(indexes < 0).tolist()
+        ):
+            return self._polygons.take(indexes)
+
+        # polygons assigned to annotations after loading aren't in the dataset store
+        return PolygonStore.from_polygons(
+            [
+                segmentation if isinstance(segmentation, list) else []
+                for segmentation in (
+                    annotation.segmentation for annotation in annotations
+                )
+            ]
+        )
+
+    def _aligned_keypoints(self) -> KeypointStore:
+        """
+        Get keypoints of all annotations as a compact store aligned with the annotation list
+        """
+        indexes = self._get_columns().keypoint_indexes
+        annotations = self.annotations
+
+        if not any(
+            annotations[position]._keypoints is not None
+            for position in np.flatnonzero(indexes < 0).tolist()
+        ):
+            return self._keypoints.take(indexes)
+
+        # keypoints assigned to annotations after loading aren't in the dataset store
+        store = KeypointStore()
+        store.extend(
+            [
+                annotation._keypoint_dict().get("keypoints", [])
+                for annotation in annotations
+            ]
+        )
+
+        return store
+
     def _load_dataset(self) -> None:
         """
         Loads a COCO annotation JSON file
         """
+        self._load_content(*self._read_annotation_file())
+
+    def _read_annotation_file(self) -> Tuple[bytes, os.stat_result]:
+        """
+        Reads raw content of the annotation file together with its status at the time of reading
+        """
+        if self.annotation_file is None:
+            raise ValueError("In-memory dataset is not backed by any annotation file")
+
+        with open(self.annotation_file, "rb") as file:
+            return file.read(), os.fstat(file.fileno())
+
+    def _load_content(self, content: bytes, stat: os.stat_result) -> None:
+        """
+        Builds the dataset from raw content of the annotation file and fingerprints it
+        """
+        assert self.annotation_file is not None
+
+        annotation_file: Dict[str, Any] = self._parse_annotation_file(
+            content, self.annotation_file
+        )
+
+        self._build(annotation_file)
+        self._fingerprint = FileFingerprint.from_dataset(content, stat, annotation_file)
+
+    def refresh(self) -> RefreshResult:
+        """
+        Reload the dataset if its annotation file has been changed.
+        Changes are detected by the file size and modification time. When only new annotations have been appended
+        to the annotation array (the last node of the file), only they are parsed and added to the dataset in place.
+        Any other change leads to a full reload
+
+        :return: Whether the dataset was unchanged, got appended annotations or was fully reloaded
+        """
+        fingerprint = self._fingerprint
 
-        annotation_file: Dict[str, Any] = self._load_annotation_file(
-            self.annotation_file
+        if fingerprint is not None and self.annotation_file is not None:
+            if fingerprint.matches(os.stat(self.annotation_file)):
+                return RefreshResult.unchanged
+
+        content, stat = self._read_annotation_file()
+        appended = (
+            None
+            if fingerprint is None
+            else fingerprint.appended_annotations(content, stat)
         )
 
+        if appended is None:
+            self._load_content(content, stat)
+
+            return RefreshResult.reloaded
+
+        annotations, self._fingerprint = appended
+        self._build_annotations(annotations)
+
+        return RefreshResult.appended if annotations else RefreshResult.unchanged
+
+    def _reset(self) -> None:
         self._images: List[Image] = []
         self._categories: List[Category] = []
         self._licenses: List[License] = []
-        self._annotations: List[Annotation] = []
+        self._annotations = []
+
+        self.__image_index = {}
+        self.__category_index = {}
+        self.__annotation_index = {}
+        self.__license_index = {}
+
+        self._columns = None
+        self._index = None
+        self._pyramids = None
+        self._polygons = PolygonStore()
+        self._keypoints = KeypointStore()
+        self._fingerprint = None
 
-        self._info: Info = Info(**annotation_file.get("info", {}))
+        self._info: Info = Info(**EMPTY_INFO)
 
-        for category_info in annotation_file.get("categories", []):
-            category: Category = Category(**category_info)
+    def _build(self, dataset: Dict[str, Any]) -> None:
+        """
+        Builds the dataset from the content of a COCO annotation file
+        """
+        self._build_header(dataset)
+        self._build_annotations(dataset.get("annotations", []))
+
+    def _build_header(self, dataset: Dict[str, Any]) -> None:
+        """
+        Resets the dataset and builds everything but annotations from the content of a COCO annotation file
+        """
+        self._reset()
 
-            self._categories.append(category)
-            self._set_category(category)
+        self._info = Info(**{**EMPTY_INFO, **dataset.get("info", {})})
 
-        for license_info in annotation_file.get("licenses", []):
-            licence: License = License(**license_info)
+        for category_info in dataset.get("categories", []):
+            self._add_category(Category(**category_info))
 
-            self._licenses.append(licence)
-            self._set_licence(licence)
+        for license_info in dataset.get("licenses", []):
+            self._add_licence(License(**license_info))
 
-        for image_info in annotation_file.get("images", []):
-            image: Image = Image(**image_info, dataset=self)
+        for image_info in dataset.get("images", []):
+            self._add_image(Image(**image_info, dataset=self))
 
-            self._images.append(image)
-            self._set_image(image)
+    def _build_annotations(self, annotation_infos: List[Dict[str, Any]]) -> None:
+        """
+        Adds annotations from the content of a COCO annotation file (can be called several times with chunks of them)
+        """
+        polygon_annotations: List[Annotation] = []
+        polygons: List[List[PolygonT]] = []
+        keypoint_annotations: List[Annotation] = []
+        keypoints: List[KeypointsT] = []
 
-        for annotation_info in annotation_file.get("annotations", []):
+        for annotation_info in annotation_infos:
             try:
                 annotation: Annotation = Annotation(**annotation_info, dataset=self)
 
-                self._annotations.append(annotation)
-                self._set_annotation(annotation)
+                self._add_annotation(annotation)
+
+                if isinstance(annotation_info["segmentation"], list) and len(
+                    annotation_info["segmentation"]
+                ):
+                    polygon_annotations.append(annotation)
+                    polygons.append(annotation_info["segmentation"])
+
+                if annotation_info.get("keypoints") is not None:
+                    keypoint_annotations.append(annotation)
+                    keypoints.append(annotation_info["keypoints"])
             except TypeError as e:
                 warnings.warn(f"Error during annotations parsing: {str(e)}")
 
+        # move all polygons into one flat float32 buffer at once
+        for annotation, polygon_index in zip(
+            polygon_annotations, self._polygons.extend(polygons)
+        ):
+            annotation._attach_polygons(polygon_index)
+
+        for annotation, keypoint_index in zip(
+            keypoint_annotations, self._keypoints.extend(keypoints)
+        ):
+            annotation._attach_keypoints(keypoint_index)
+
+        self._columns = None
+
+    @classmethod
+    def _create(cls, image_dir: Optional[PathLike] = None) -> "COCO":
+        """
+        Create an empty in-memory dataset (not backed by any annotation file)
+        """
+        dataset = cls.__new__(cls)
+
+        dataset.annotation_file = None
+        dataset.image_dir = image_dir
+
+        dataset._reset()
+
+        return dataset
+
+    @classmethod
+    def from_dict(
+        cls, dataset: Dict[str, Any], image_dir: Optional[PathLike] = None
+    ) -> "COCO":
+        """
+        Build an in-memory dataset from a dict with the content of a COCO annotation file
+        (use COCOBuilder to construct large datasets from arrays)
+
+        :param dataset: Dict with info, licenses, categories, images and annotations
+        :param image_dir: Directory with images
+        :return: COCO dataset
+        """
+        coco = cls._create(image_dir)
+        coco._build(dataset)
+
+        return coco
+
+    @classmethod
+    async def aload(
+        cls,
+        annotation_file: PathLike,
+        image_dir: Optional[PathLike] = None,
+        progress: Optional[ProgressCallbackT] = None,
+        executor: Optional[Executor] = None,
+    ) -> "COCO":
+        """
+        Load a dataset without blocking the event loop (I/O and parsing are done in an executor).
+        The loading can be cancelled by cancelling the awaiting task
+
+        :param annotation_file: Path to the annotation file
+        :param image_dir: Path to the image directory
+        :param progress: Callback called with (stage, done, total) as reading ("read"), parsing ("parse")
+            and building ("build") of the dataset progresses
+        :param executor: Thread pool to run blocking work in (the loop default one if not given)
+        :return: COCO dataset
+        """
+        return await load_dataset(
+            cls, annotation_file, image_dir, progress=progress, executor=executor
+        )
+
+    @classmethod
+    def from_yolo(
+        cls,
+        label_dir: PathLike,
+        image_dir: PathLike,
+        classes: Optional[List[str]] = None,
+        image_size: Optional[SizeT] = None,
+        workers: Optional[int] = None,
+    ) -> "COCO":
+        """
+        Build an in-memory dataset from YOLO labels.
+        Label files are parsed in parallel and the dataset is built directly (without an intermediate annotation file)
+
+        :param label_dir: Directory with label files mirroring image paths (and optionally classes.txt)
+        :param image_dir: Directory with images
+        :param classes: Class names (read from classes.txt by default)
+        :param image_size: (width, height) of all images. Image sizes are read from image headers when not given
+        :param workers: Number of worker processes to parse files in parallel
+        :return: COCO dataset
+        """
+        dataset = cls._create(image_dir)
+
+        load_yolo(
+            dataset,
+            label_dir,
+            image_dir,
+            classes=classes,
+            image_size=image_size,
+            workers=workers,
+        )
+
+        return dataset
+
+    @classmethod
+    def from_voc(
+        cls,
+        annotation_dir: PathLike,
+        image_dir: Optional[PathLike] = None,
+        categories: Optional[List[str]] = None,
+        probe_sizes: bool = False,
+        workers: Optional[int] = None,
+    ) -> "COCO":
+        """
+        Build an in-memory dataset from Pascal VOC annotations.
+        XML files are parsed in parallel and the dataset is built directly (without an intermediate annotation file)
+
+        :param annotation_dir: Directory with XML annotations
+        :param image_dir: Directory with images
+        :param categories: Category names in the order of category IDs (the order of appearance by default)
+        :param probe_sizes: Read image sizes from image headers when they are missing in annotations
+            (requires the image directory)
+        :param workers: Number of worker processes to parse files in parallel
+        :return: COCO dataset
+        """
+        dataset = cls._create(image_dir)
+
+        load_voc(
+            dataset,
+            annotation_dir,
+            image_dir,
+            categories=categories,
+            probe_sizes=probe_sizes,
+            workers=workers,
+        )
+
+        return dataset
+
+    @classmethod
+    def from_sqlite(
+        cls,
+        database_file: PathLike,
+        where: Optional[str] = None,
+        parameters: Sequence[Any] = (),
+        image_dir: Optional[PathLike] = None,
+    ) -> "COCO":
+        """
+        Build an in-memory dataset from a SQLite database written by to_sqlite().
+        The condition is evaluated by SQLite, so filtered subsets are loaded without parsing the whole dataset
+
+        :param database_file: Path to the database file
+        :param where: SQL condition on the annotations table (e.g. "category_id = ? AND area > ?").
+            Only matching annotations and images they belong to are loaded
+        :param parameters: Values of the condition placeholders
+        :param image_dir: Directory with images
+        :return: COCO dataset
+        """
+        dataset = cls._create(image_dir)
+
+        load_sqlite(dataset, database_file, where=where, parameters=parameters)
+
+        return dataset
+
+    @classmethod
+    def from_arrow(
+        cls, table: "pyarrow.Table", image_dir: Optional[PathLike] = None
+    ) -> "COCO":
+        """
+        Build an in-memory dataset from an Arrow table created by to_arrow()
+
+        :param table: Arrow table
+        :param image_dir: Directory with images
+        :return: COCO dataset
+        """
+        dataset = cls._create(image_dir)
+
+        load_arrow(dataset, table)
+
+        return dataset
+
+    @classmethod
+    def from_parquet(
+        cls,
+        parquet_file: PathLike,
+        columns: Optional[Sequence[str]] = None,
+        image_dir: Optional[PathLike] = None,
+    ) -> "COCO":
+        """
+        Build an in-memory dataset from a Parquet file written by to_parquet().
+        Row groups are streamed and only requested columns are read, so projected loading is mostly I/O-bound
+
+        :param parquet_file: Path to the Parquet file
+        :param columns: Optional columns to read besides IDs, boxes and areas (e.g. ["segmentation", "keypoints"]).
+            All columns are read by default
+        :param image_dir: Directory with images
+        :return: COCO dataset
+        """
+        dataset = cls._create(image_dir)
+
+        load_parquet(dataset, parquet_file, columns=columns)
+
+        return dataset
+
+    def _add_category(self, category: Category) -> None:
+        self._categories.append(category)
+        self._set_category(category)
+
+    def _add_licence(self, licence: License) -> None:
+        self._licenses.append(licence)
+        self._set_licence(licence)
+
+    def _add_image(self, image: Image) -> None:
+        self._images.append(image)
+        self._set_image(image)
+
+    def _add_annotation(self, annotation: Annotation) -> None:
+        if self._index is not None:
+            self._index.add(annotation, len(self._annotations))
+
+        self._annotations.append(annotation)
+        self._set_annotation(annotation)
+
+    def _remove_annotation(self, annotation: Annotation) -> None:
+        position = self._get_index().remove(annotation)
+
+        self._annotations[position] = None
+        del self.__annotation_index[annotation.id]
+
+        if self._pyramids is not None:
+            self._pyramids.discard(annotation.id)
+
+    def _move_annotation(
+        self, annotation: Annotation, image_id: int, category_id: int
+    ) -> None:
+        self._get_index().move(annotation, image_id, category_id)
+
+        annotation.image_id = image_id
+        annotation.category_id = category_id
+
+    def _check_references(self, image_id: int, category_id: int) -> None:
+        try:
+            self._get_image(image_id)
+        except KeyError:
+            raise ValueError(f"Annotation references unknown image {image_id}")
+
+        try:
+            self._get_category(category_id)
+        except KeyError:
+            raise ValueError(f"Annotation references unknown category {category_id}")
+
+    def _store_segmentation(
+        self, annotation: Annotation, segmentation: SegmentationT
+    ) -> None:
+        """
+        Assign a segmentation to an annotation of the dataset (polygons are appended to the PolygonStore)
+        """
+        if isinstance(segmentation, list) and segmentation:
+            annotation._attach_polygons(self._polygons.append(segmentation))
+        else:
+            annotation._set_segmentation(segmentation)
+
+        self._columns = None
+
+        if self._pyramids is not None:
+            self._pyramids.discard(annotation.id)
+
+    def _store_keypoints(
+        self, annotation: Annotation, keypoints: Optional[KeypointsT]
+    ) -> None:
+        if keypoints is None:
+            annotation.keypoints = None
+            return
+
+        points = np.asarray(keypoints, dtype=np.float32).reshape(-1, 3)
+        (keypoint_index,) = self._keypoints.extend_arrays(
+            points, np.array([len(points)])
+        )
+
+        annotation._attach_keypoints(keypoint_index)
+
+    def add_annotation(
+        self, annotation: Union[Annotation, Mapping[str, Any]]
+    ) -> Annotation:
+        """
+        Add an annotation to the dataset. Per-image and per-category indexes are updated in place
+
+        :param annotation: Annotation or COCO annotation record. The ID is assigned automatically when it's missing,
+            iscrowd defaults to False, segmentation to [] and area to the bounding box area
+        :return: Added annotation (a new object bound to the dataset)
+        """
+        record = dict(
+            annotation.to_dict() if isinstance(annotation, Annotation) else annotation
+        )
+        index = self._get_index()
+
+        record.setdefault("id", index.next_id)
+        record.setdefault("iscrowd", False)
+        record.setdefault("area", float(record["bbox"][2]) * float(record["bbox"][3]))
+
+        segmentation = record.pop("segmentation", [])
+        keypoints = record.pop("keypoints", None)
+
+        if record["id"] in index.positions:
+            raise ValueError(f"Annotation {record['id']} already exists")
+
+        self._check_references(record["image_id"], record["category_id"])
+
+        added = Annotation(**record, segmentation=[], dataset=self)
+        self._add_annotation(added)
+
+        self._store_segmentation(added, segmentation)
+        self._store_keypoints(added, keypoints)
+        self._columns = None
+
+        return added
+
+    def remove_annotations(self, annotation_ids: Iterable[int]) -> None:
+        """
+        Remove annotations from the dataset in O(K) for K annotations.
+        Removed annotations are left as tombstones in the annotation list until it's compacted
+        (on the next access of COCO.annotations or once tombstones take a quarter of the list)
+
+        :param annotation_ids: IDs of annotations to remove (nothing is removed if any of them is unknown)
+        """
+        annotation_ids = list(dict.fromkeys(annotation_ids))
+        index = self._get_index()
+        unknown = [
+            annotation_id
+            for annotation_id in annotation_ids
+            if annotation_id not in index.positions
+        ]
+
+        if unknown:
+            raise KeyError(f"Unknown annotations {unknown}")
+
+        for annotation_id in annotation_ids:
+            self._remove_annotation(self._get_annotation(annotation_id))
+
+        if index.needs_compaction(len(self._annotations)):
+            self._compact_annotations()
+
+        self._columns = None
+
+    def update_annotation(self, annotation_id: int, **changes: Any) -> Annotation:
+        """
+        Update fields of an annotation in place. Moving it to another image or category updates indexes in O(1)
+
+        :param annotation_id: Annotation ID
+        :param changes: New values of annotation fields (image_id, category_id, bbox, area, iscrowd, segmentation,
+            keypoints, num_keypoints or custom ones)
+        :return: Updated annotation
+        """
+        if "id" in changes:
+            raise ValueError("Annotation IDs can't be updated")
+
+        if annotation_id not in self._get_index().positions:
+            raise KeyError(f"Unknown annotation {annotation_id}")
+
+        annotation = self._get_annotation(annotation_id)
+        image_id = changes.pop("image_id", annotation.image_id)
+        category_id = changes.pop("category_id", annotation.category_id)
+
+        self._check_references(image_id, category_id)
+
+        # new values are built before anything is changed, so invalid ones leave the annotation as it was
+        bbox = BBox(*changes.pop("bbox")) if "bbox" in changes else annotation.bbox
+        update_keypoints = "keypoints" in changes
+        keypoints = changes.pop("keypoints", None)
+
+        if keypoints is not None:
+            keypoints = np.asarray(keypoints, dtype=np.float32).reshape(-1, 3)
+
+        # polygons are converted before the annotation is attached to them, so this fails without changes too
+        if "segmentation" in changes:
+            self._store_segmentation(annotation, changes.pop("segmentation"))
+
+        self._move_annotation(annotation, image_id, category_id)
+        annotation.bbox = bbox
+
+        if update_keypoints:
+            self._store_keypoints(annotation, keypoints)
+
+        for field in ("area", "iscrowd", "num_keypoints"):
+            if field in changes:
+                setattr(annotation, field, changes.pop(field))
+
+        annotation.extra.update(changes)
+        self._columns = None
+
+        if self._pyramids is not None:
+            self._pyramids.discard(annotation_id)
+
+        return annotation
+
+    def image_annotations(self, image_id: int) -> List[Annotation]:
+        """
+        Get annotations of the given image in O(K) (in the order of COCO.annotations)
+
+        :param image_id: Image ID
+        :return: Image annotations
+        """
+        index = self._get_index()
+
+        return [
+            self._get_annotation(annotation_id)
+            for annotation_id in index.ordered(index.images.get(image_id, {}))
+        ]
+
+    def category_annotations(self, category_id: int) -> List[Annotation]:
+        """
+        Get annotations of the given category in O(K) (in the order of COCO.annotations)
+
+        :param category_id: Category ID
+        :return: Category annotations
+        """
+        index = self._get_index()
+
+        return [
+            self._get_annotation(annotation_id)
+            for annotation_id in index.ordered(index.categories.get(category_id, {}))
+        ]
+
+    def boxes(
+        self,
+        format: BoxFormatT = BoxFormat.xywh,
+        normalized: bool = False,
+        clip: bool = False,
+        min_size: Optional[float] = None,
+    ) -> np.ndarray:
+        """
+        Get bounding boxes of all annotations as one array.
+        Rows follow the order of COCO.annotations unless degenerate boxes are filtered out
+
+        :param format: Box format to convert to (xywh, xyxy or cxcywh)
+        :param normalized: Normalize coordinates by the annotation image width and height
+        :param clip: Clip boxes to the annotation image boundaries
+        :param min_size: Drop boxes with width or height not greater than this value (in pixels)
+        :return: (N, 4) contiguous float32 array of boxes
+        """
+        columns = self._get_columns()
+
+        return self._prepare_boxes(
+            columns.bboxes, columns.image_sizes, format, normalized, clip, min_size
+        )
+
+    def image_boxes(
+        self,
+        image_id: int,
+        format: BoxFormatT = BoxFormat.xywh,
+        normalized: bool = False,
+        clip: bool = False,
+        min_size: Optional[float] = None,
+    ) -> np.ndarray:
+        """
+        Get bounding boxes of the given image annotations as one array.
+        Rows follow the order of COCO.annotations unless degenerate boxes are filtered out
+
+        :param image_id: Image ID
+        :param format: Box format to convert to (xywh, xyxy or cxcywh)
+        :param normalized: Normalize coordinates by the image width and height
+        :param clip: Clip boxes to the image boundaries
+        :param min_size: Drop boxes with width or height not greater than this value (in pixels)
+        :return: (K, 4) contiguous float32 array of boxes
+        """
+        columns = self._get_columns()
+        positions = columns.image_positions(image_id)
+
+        return self._prepare_boxes(
+            columns.bboxes[positions],
+            columns.image_sizes[positions],
+            format,
+            normalized,
+            clip,
+            min_size,
+        )
+
+    def polygons(self, image_id: Optional[int] = None) -> PolygonStore:
+        """
+        Get polygon segmentations in the flat form (one float32 point buffer with polygon and annotation offsets).
+        Entries are aligned with COCO.annotations (or with COCO.image_boxes() when image_id is given),
+        annotations without polygons (e.g. RLE ones) get empty entries
+
+        :param image_id: Get polygons of the given image only
+        :return: Compact PolygonStore of the requested annotations
+        """
+        columns = self._get_columns()
+
+        if image_id is None:
+            return self._polygons.take(columns.polygon_indexes)
+
+        return self._polygons.take(
+            columns.polygon_indexes[columns.image_positions(image_id)]
+        )
+
+    def keypoints(
+        self, image_id: Optional[int] = None, num_keypoints: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Get keypoints of all annotations as one array.
+        Rows are aligned with COCO.annotations (or with COCO.image_boxes() when image_id is given),
+        annotations without keypoints get not labelled (zero) keypoints
+
+        :param image_id: Get keypoints of the given image only
+        :param num_keypoints: Number of keypoints per annotation (the largest number of category keypoints
+            or of annotation keypoints by default)
+        :return: (N, K, 3) float32 array of keypoint (x, y, visibility) rows
+        """
+        columns = self._get_columns()
+        indexes = columns.keypoint_indexes
+
+        if image_id is not None:
+            indexes = indexes[columns.image_positions(image_id)]
+
+        if num_keypoints is None:
+            num_keypoints = max(
+                (category.num_keypoints for category in self.categories), default=0
+            )
+            num_keypoints = max(
+                num_keypoints, int(self._keypoints.counts.max(initial=0))
+            )
+
+        return self._keypoints.take(indexes).dense(num_keypoints)
+
+    def cache_mask_pyramids(
+        self,
+        max_bytes: int = DEFAULT_CACHE_BYTES,
+        scales: Sequence[int] = DEFAULT_SCALES,
+    ) -> PyramidCache:
+        """
+        Cache mask pyramids of annotations (built lazily on the first use) to speed up repeated mask IoU computation.
+        Pyramids of edited annotations are discarded, the cache is dropped when the dataset is reloaded
+
+        :param max_bytes: Memory budget of the cache (least recently used pyramids are evicted)
+        :param scales: Cell sizes of pyramid levels (in pixels, from coarse to fine)
+        :return: Pyramid cache
+        """
+        self._pyramids = PyramidCache(max_bytes, scales)
+
+        return self._pyramids
+
+    def mask_pyramid(self, annotation_id: int) -> MaskPyramid:
+        """
+        Get the mask pyramid of an annotation (cached if cache_mask_pyramids() is enabled)
+
+        :param annotation_id: Annotation ID
+        :return: Mask pyramid
+        """
+        annotation = self._get_annotation(annotation_id)
+
+        if self._pyramids is None:
+            return MaskPyramid.from_rle(annotation.rle())
+
+        return self._pyramids.get(annotation_id, annotation.rle)
+
+    def mask_iou(
+        self,
+        annotation_ids: Sequence[int],
+        masks: Optional[Sequence[MaskT]] = None,
+        thresholds: Optional[Sequence[float]] = None,
+    ) -> np.ndarray:
+        """
+        Compute the mask IoU matrix of masks (e.g. detections) and annotations of the same image.
+        Crowd annotations are matched as in the COCO evaluation (the union is the area of the first mask)
+
+        :param annotation_ids: IDs of M annotations
+        :param masks: N RLE masks or their pyramids (the annotations themselves by default)
+        :param thresholds: IoU thresholds the result is compared with. Pairs far from them get coarse IoU estimates
+            (see pyramids.mask_iou())
+        :return: (N, M) float64 IoU matrix
+        """
+        pyramids = [
+            self.mask_pyramid(annotation_id) for annotation_id in annotation_ids
+        ]
+        crowd = np.fromiter(
+            (
+                bool(self._get_annotation(annotation_id).iscrowd)
+                for annotation_id in annotation_ids
+            ),
+            bool,
+            len(annotation_ids),
+        )
+
+        return mask_iou(
+            pyramids if masks is None else masks,
+            pyramids,
+            crowd=crowd,
+            thresholds=thresholds,
+        )
+
+    def load_results(
+        self,
+        results: ResultsT,
+        min_score: Optional[float] = None,
+        top_k: Optional[int] = None,
+        per_category: bool = False,
+    ) -> Detections:
+        """
+        Load detection results (pycocotools loadRes() equivalent) into arrays and validate them against the dataset.
+        JSON files are streamed, so results are never fully materialized as Python objects
+
+        :param results: Path to a JSON file with {image_id, category_id, bbox, score} records, a sequence of records
+            or a mapping of image_id, category_id, bbox and score arrays
+        :param min_score: Drop detections scored below the threshold
+        :param top_k: Keep only top scoring detections per image
+        :param per_category: Apply top_k per image and category
+        :return: Detections (can be passed to evaluate_boxes())
+        """
+        return load_results(
+            self, results, min_score=min_score, top_k=top_k, per_category=per_category
+        )
+
+    def evaluate_boxes(
+        self,
+        detections: Union[Sequence[Mapping[str, Any]], Detections],
+        max_detections: int = 100,
+        workers: Optional[int] = None,
+    ) -> EvaluationResult:
+        """
+        Evaluate box detections against the dataset with IoU-based AP (as the COCO bbox evaluation does)
+
+        :param detections: Detection records with image_id, category_id, bbox (xywh) and score fields
+            or loaded detections (see load_results())
+        :param max_detections: Maximum number of top scoring detections per image and category
+        :param workers: Number of worker processes evaluating categories in parallel
+        :return: Precision and recall per IoU threshold, category and area range (see EvaluationResult.summary())
+        """
+        return evaluate_boxes(
+            self, detections, max_detections=max_detections, workers=workers
+        )
+
+    def analyze_errors(
+        self,
+        detections: Union[Sequence[Mapping[str, Any]], Detections],
+        foreground_iou: float = 0.5,
+        background_iou: float = 0.1,
+        max_detections: int = 100,
+        confusion_score: float = 0.5,
+    ) -> ErrorAnalysis:
+        """
+        Break box detection errors down into TIDE error types (classification, localization, both, duplicate,
+        background and missed) with their dAP contributions per category and build the category confusion matrix
+
+        :param detections: Detection records with image_id, category_id, bbox (xywh) and score fields
+            or loaded detections (see load_results())
+        :param foreground_iou: IoU threshold of true positives
+        :param background_iou: IoU threshold below which detections are background errors
+        :param max_detections: Maximum number of top scoring detections per image and category
+        :param confusion_score: Minimum score of detections counted in the confusion matrix
+        :return: Error analysis (see ErrorAnalysis.summary() and ErrorAnalysis.category_dap())
+        """
+        return analyze_errors(
+            self,
+            detections,
+            foreground_iou=foreground_iou,
+            background_iou=background_iou,
+            max_detections=max_detections,
+            confusion_score=confusion_score,
+        )
+
+    def evaluate_keypoints(
+        self,
+        detections: Sequence[Mapping[str, Any]],
+        sigmas: Optional[Mapping[int, Sequence[float]]] = None,
+        max_detections: int = 20,
+        workers: Optional[int] = None,
+    ) -> EvaluationResult:
+        """
+        Evaluate keypoint detections against the dataset with OKS-based AP (as the COCO keypoint evaluation does)
+
+        :param detections: Detection records with image_id, category_id, keypoints and score fields
+        :param sigmas: Category ID -> per-keypoint standard deviations (COCO person sigmas are used for categories
+            with 17 keypoints by default)
+        :param max_detections: Maximum number of top scoring detections per image and category
+        :param workers: Number of worker processes evaluating categories in parallel
+        :return: Precision and recall per OKS threshold, category and area range (see EvaluationResult.summary())
+        """
+        return evaluate_keypoints(
+            self,
+            detections,
+            sigmas=sigmas,
+            max_detections=max_detections,
+            workers=workers,
+        )
+
+    def tile(
+        self,
+        size: TileSizeT,
+        overlap: int = 0,
+        min_visible_fraction: float = 0.0,
+        *,
+        output_file: PathLike,
+        workers: Optional[int] = None,
+    ) -> "COCO":
+        """
+        Split images into (possibly overlapping) tiles and clip bounding boxes, polygons and RLEs to them.
+        Every tile becomes a new image named as <file name>_<x>_<y>.<extension> after its source image
+        and offset in it. The tiled dataset is written to the output file incrementally
+
+        :param size: Tile size (one value for square tiles or a (width, height) tuple)
+        :param overlap: Overlap of neighbour tiles in pixels
+        :param min_visible_fraction: Drop annotations that have smaller part of their area inside the tile
+        :param output_file: Path to the tiled annotation file
+        :param workers: Number of worker processes to tile images in parallel
+        :return: Tiled COCO dataset
+        """
+        tile_dataset(
+            self,
+            output_file,
+            size=size,
+            overlap=overlap,
+            min_visible_fraction=min_visible_fraction,
+            workers=workers,
+        )
+
+        return COCO(annotation_file=output_file, image_dir=self.image_dir)
+
+    def batches(
+        self,
+        batch_size: int,
+        shuffle: bool = False,
+        seed: Optional[int] = None,
+        workers: Optional[int] = None,
+        prefetch: int = 2,
+        masks: bool = False,
+        drop_last: bool = False,
+        format: BoxFormatT = BoxFormat.xywh,
+        normalized: bool = False,
+    ) -> Generator[BatchT, None, None]:
+        """
+        Iterate over batches of images with their annotations padded into NumPy arrays.
+        Annotation groupings are computed once and batches are assembled ahead in background threads.
+
+        Every batch is a dictionary of:
+            - image_ids: (B,) int64
+            - image_paths: list of B image paths (joined with the image directory when it's set)
+            - image_sizes: (B, 2) int64 image widths and heights
+            - annotation_ids, labels (category IDs): (B, K) int64 padded with -1
+            - boxes: (B, K, 4) float32 padded with zeros
+            - iscrowd: (B, K) bool, areas: (B, K) float32
+            - valid: (B, K) bool mask of real (not padded) annotations
+            - masks: (B, K, H, W) uint8 annotation masks padded to the largest image (only when requested)
+
+        :param batch_size: Number of images per batch
+        :param shuffle: Shuffle images
+        :param seed: Random seed for shuffling
+        :param workers: Number of worker threads assembling batches
+        :param prefetch: Number of batches prepared ahead in background (0 to assemble batches on demand)
+        :param masks: Add rasterized annotation masks
+        :param drop_last: Drop the last incomplete batch
+        :param format: Box format (xywh, xyxy or cxcywh)
+        :param normalized: Normalize box coordinates by image sizes
+        :return: Iterator over batches
+        """
+        return iter_batches(
+            self,
+            batch_size,
+            shuffle=shuffle,
+            seed=seed,
+            workers=workers,
+            prefetch=prefetch,
+            masks=masks,
+            drop_last=drop_last,
+            format=format,
+            normalized=normalized,
+        )
+
+    def aiter_images(
+        self,
+        read_bytes: bool = True,
+        concurrency: int = 8,
+        executor: Optional[Executor] = None,
+    ) -> AsyncIterator[ImageItem]:
+        """
+        Asynchronously iterate over images with their annotations (and image file content).
+        Image files are read from the image directory in an executor with bounded concurrency
+
+        :param read_bytes: Read image files
+        :param concurrency: Maximum number of image files read at once
+        :param executor: Executor to read files in (the loop default one if not given)
+        :return: Async iterator over (image, annotations, data) items
+        """
+        return iter_images(
+            self, read_bytes=read_bytes, concurrency=concurrency, executor=executor
+        )
+
+    def find_duplicates(
+        self,
+        iou: float = 0.9,
+        same_category: bool = True,
+        workers: Optional[int] = None,
+    ) -> Duplicates:
+        """
+        Find images with the same file name and near-duplicate annotations (boxes of the same image with a high IoU).
+        Boxes are swept image by image in sorted order, so only boxes that can reach the IoU threshold are compared
+
+        :param iou: Minimal box IoU of near-duplicate annotations
+        :param same_category: Compare only annotations of the same category
+        :param workers: Number of worker processes
+        :return: Clusters of duplicate image and annotation IDs
+        """
+        return find_duplicates(
+            self, iou=iou, same_category=same_category, workers=workers
+        )
+
+    def deduplicate(
+        self,
+        duplicates: Optional[Duplicates] = None,
+        iou: float = 0.9,
+        same_category: bool = True,
+        workers: Optional[int] = None,
+    ) -> "COCO":
+        """
+        Get a copy of the dataset without duplicates. The first record of every duplicate cluster is kept
+
+        :param duplicates: Duplicates found by COCO.find_duplicates() (found with the given options if not passed)
+        :param iou: Minimal box IoU of near-duplicate annotations
+        :param same_category: Compare only annotations of the same category
+        :param workers: Number of worker processes
+        :return: Deduplicated in-memory COCO dataset
+        """
+        if duplicates is None:
+            duplicates = self.find_duplicates(
+                iou=iou, same_category=same_category, workers=workers
+            )
+
+        return deduplicate(self, duplicates)
+
+    def remap_categories(
+        self,
+        mapping: CategoryMappingT,
+        renumber: bool = True,
+        output_file: Optional[PathLike] = None,
+    ) -> "COCO":
+        """
+        Merge, drop and renumber categories or collapse them to their supercategories.
+        Category IDs of annotations are rewritten at once, segmentations and keypoints are shared with this dataset
+
+        :param mapping: Category ID -> ID of a kept category to merge it into (None to drop the category
+            with its annotations) or "supercategory" to collapse categories to their supercategories.
+            Categories missing in the mapping are kept
+        :param renumber: Assign contiguous IDs starting from 1 to remapped categories in the dataset order
+        :param output_file: Path to write the remapped dataset to
+        :return: Remapped in-memory COCO dataset (backed by the output file if it's given)
+        """
+        return remap_categories(
+            self, mapping, renumber=renumber, output_file=output_file
+        )
+
+    def export(
+        self, format: ExportFormatT, out_dir: PathLike, workers: Optional[int] = None
+    ) -> int:
+        """
+        Export annotations to the YOLO or Pascal VOC format (one label file per image).
+        Images are processed in chunks and label files are written concurrently,
+        so memory usage doesn't grow with the dataset size
+
+        :param format: Format to export to (yolo or voc)
+        :param out_dir: Output directory. Label files mirror image file names relative to the image directory
+        :param workers: Number of writer threads
+        :return: Number of written label files
+        """
+        return export_dataset(self, format, out_dir, workers=workers)
+
+    def to_sqlite(self, database_file: PathLike) -> None:
+        """
+        Write the dataset to a new SQLite database with images, categories, licenses and annotations tables.
+        Annotations are indexed by image ID, category ID and area. Segmentations, keypoints and custom annotation
+        fields are stored as JSON
+
+        :param database_file: Path to the database file (an existing file is replaced)
+        """
+        export_sqlite(self, database_file)
+
+    def to_arrow(self) -> "pyarrow.Table":
+        """
+        Convert the dataset to an Arrow table with a row per annotation and image fields on every row
+        (images without annotations get rows with empty annotation fields).
+        Columns are built from the columnar dataset stores in bulk: polygons are nested float lists,
+        RLEs are binary counts and custom annotation fields form a struct column
+
+        :return: pyarrow.Table
+        """
+        return to_arrow(self)
+
+    def to_parquet(self, parquet_file: PathLike, row_group_size: int = 100_000) -> None:
+        """
+        Write the dataset table (see to_arrow()) to a Parquet file
+
+        :param parquet_file: Path to the Parquet file
+        :param row_group_size: Number of rows per row group
+        """
+        export_parquet(self, parquet_file, row_group_size=row_group_size)
+
+    def share(self, path: Optional[PathLike] = None) -> "SharedCOCO":
+        """
+        Pack the dataset into a memory-mapped file to pass it to worker processes without copying.
+        The returned read-only dataset pickles into the file path only and workers map the file on unpickling.
+        The file is removed when the returned dataset is garbage collected, so keep it alive while workers run
+
+        :param path: Path to the file (a temporary file in /dev/shm or the temp directory by default)
+        :return: Shared read-only dataset
+        """
+        from coconutools.sharing import SharedCOCO
+
+        return SharedCOCO.from_dataset(self, path)
+
+    @staticmethod
+    def _prepare_boxes(
+        bboxes: np.ndarray,
+        image_sizes: np.ndarray,
+        format: BoxFormatT,
+        normalized: bool,
+        clip: bool,
+        min_size: Optional[float],
+    ) -> np.ndarray:
+        widths, heights = image_sizes[:, 0], image_sizes[:, 1]
+
+        if clip:
+            bboxes = clip_boxes(bboxes, widths, heights)
+
+        if min_size is not None:
+            keep = ~degenerate_boxes(bboxes, min_size=min_size)
+            bboxes, widths, heights = bboxes[keep], widths[keep], heights[keep]
+
+        bboxes = convert_boxes(bboxes, BoxFormat.xywh, format)
+
+        if normalized:
+            bboxes = normalize_boxes(bboxes, widths, heights)
+
+        return bboxes
+
     def df(self) -> "pandas.DataFrame":
         """
         Convert COCO dataset to pandas.DataFrame
@@ -146,21 +1319,23 @@ class COCO:
             data: List[Dict[str, Any]] = []
 
             for annotation in self.annotations:
-                annotation_dict: Dict[str, Any] = asdict(annotation)
-                extra_properties = annotation_dict.pop("extra", {})
-
-                del annotation_dict[
-                    "_dataset"
-                ]  # TODO: make this logic on the item class level
+                image: Image = annotation.image
 
                 data.append(
                     {
-                        **annotation_dict,
-                        **extra_properties,
+                        "id": annotation.id,
+                        "image_id": annotation.image_id,
+                        "category_id": annotation.category_id,
+                        "iscrowd": annotation.iscrowd,
+                        "segmentation": annotation.segmentation,
+                        "bbox": asdict(annotation.bbox),
+                        "area": annotation.area,
+                        **annotation._keypoint_dict(),
+                        **annotation.extra,
                         "category_name": annotation.category.name,
-                        "image_path": annotation.image.file_name,
-                        "image_width": annotation.image.width,
-                        "image_height": annotation.image.height,
+                        "image_path": image.file_name,
+                        "image_width": image.width,
+                        "image_height": image.height,
                     }
                 )
 
@@ -185,9 +1360,26 @@ class COCO:
         :param annotation_file: Path to the annotation file
         :return: Content of annotation file
         """
+        with open(annotation_path, "rb") as file:
+            return self._parse_annotation_file(file.read(), annotation_path)
+
+    @staticmethod
+    def _parse_annotation_file(
+        content: Union[str, bytes],
+        annotation_path: PathLike,
+        loads: Callable[[Union[str, bytes]], Any] = json.loads,
+    ) -> Dict[str, Any]:
+        """
+        Parses and validations content of a COCO annotation JSON file
+
+        :param content: Raw content of the annotation file
+        :param annotation_path: Path to the annotation file (used in error messages)
+        :param loads: JSON parser
+        :return: Content of annotation file
+        """
         try:
-            annotation_file: dict = json.load(open(annotation_path, "r"))
-        except JSONDecodeError as e:
+            annotation_file: dict = loads(content)
+        except (JSONDecodeError, UnicodeDecodeError) as e:
             raise DatasetCorrupted(
                 f"COCO dataset {annotation_path} seems to be corrupted or not a valid JSON file"
             ) from e
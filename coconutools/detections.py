@@ -0,0 +1,353 @@
+"""
+Detection results in the COCO results format ({image_id, category_id, bbox, score} records).
+
+Results are streamed from JSON files record by record and converted to NumPy arrays in chunks,
+so millions of records never exist as Python objects at the same time
+"""
+
+import codecs
+import json
+import re
+from dataclasses import dataclass
+from os import PathLike
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Union,
+)
+
+import numpy as np
+
+from coconutools.columns import id_positions
+from coconutools.exceptions import DatasetFormatNotValid
+
+if TYPE_CHECKING:
+    from coconutools.dataset import COCO
+
+# a path to a JSON file, detection records or field name -> array mapping
+ResultsT = Union[
+    str, PathLike, Sequence[Mapping[str, Any]], Mapping[str, Union[np.ndarray, Any]]
+]
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+SEPARATOR = re.compile(r"[ \t\n\r]*(,?)[ \t\n\r]*")
+
+
+@dataclass
+class Detections:
+    """
+    Columnar detection results
+    """
+
+    image_ids: np.ndarray  # (N,) int64
+    category_ids: np.ndarray  # (N,) int64
+    bboxes: np.ndarray  # (N, 4) float32 in the xywh format
+    scores: np.ndarray  # (N,) float32
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    @classmethod
+    def from_arrays(
+        cls,
+        image_ids: Any,
+        category_ids: Any,
+        bboxes: Any,
+        scores: Any,
+    ) -> "Detections":
+        detections = cls(
+            image_ids=np.asarray(image_ids, dtype=np.int64).reshape(-1),
+            category_ids=np.asarray(category_ids, dtype=np.int64).reshape(-1),
+            bboxes=np.asarray(bboxes, dtype=np.float32).reshape(-1, 4),
+            scores=np.asarray(scores, dtype=np.float32).reshape(-1),
+        )
+
+        count = len(detections)
+
+        if not (
+            len(detections.image_ids)
+            == len(detections.category_ids)
+            == len(detections.bboxes)
+            == count
+        ):
+            raise ValueError("Detection arrays have different lengths")
+
+        return detections
+
+    @classmethod
+    def from_records(cls, records: Sequence[Mapping[str, Any]]) -> "Detections":
+        count = len(records)
+
+        try:
+            return cls(
+                image_ids=np.fromiter(
+                    (r["image_id"] for r in records), np.int64, count
+                ),
+                category_ids=np.fromiter(
+                    (r["category_id"] for r in records), np.int64, count
+                ),
+                bboxes=np.array([r["bbox"] for r in records], dtype=np.float32).reshape(
+                    count, 4
+                ),
+                scores=np.fromiter((r["score"] for r in records), np.float32, count),
+            )
+        except KeyError as e:
+            raise DatasetFormatNotValid(
+                f"Detection records have to contain image_id, category_id, bbox and score fields, {e} is missing"
+            ) from e
+
+    @classmethod
+    def concatenate(cls, parts: Sequence["Detections"]) -> "Detections":
+        if not parts:
+            return cls.from_arrays([], [], [], [])
+
+        return cls(
+            image_ids=np.concatenate([part.image_ids for part in parts]),
+            category_ids=np.concatenate([part.category_ids for part in parts]),
+            bboxes=np.concatenate([part.bboxes for part in parts]),
+            scores=np.concatenate([part.scores for part in parts]),
+        )
+
+    @property
+    def areas(self) -> np.ndarray:
+        """
+        (N,) float64 array of box areas (used as detection areas in evaluation)
+        """
+        boxes = self.bboxes.astype(np.float64)
+        areas: np.ndarray = boxes[:, 2] * boxes[:, 3]
+
+        return areas
+
+    def take(self, positions: np.ndarray) -> "Detections":
+        """
+        Select detections by positions or a boolean mask
+        """
+        return Detections(
+            image_ids=self.image_ids[positions],
+            category_ids=self.category_ids[positions],
+            bboxes=self.bboxes[positions],
+            scores=self.scores[positions],
+        )
+
+    def threshold(self, min_score: float) -> "Detections":
+        """
+        Keep detections scored at least min_score
+        """
+        return self.take(self.scores >= min_score)
+
+    def top_k(self, k: int, per_category: bool = False) -> "Detections":
+        """
+        Keep k top scoring detections per image (or per image and category, as the evaluation does).
+        Detections with equal scores keep their order and the order of kept detections doesn't change
+
+        :param k: Maximum number of detections per group
+        :param per_category: Group detections by image and category instead of only by image
+        :return: Truncated detections
+        """
+        keys: List[np.ndarray] = [-self.scores]
+
+        if per_category:
+            keys.append(self.category_ids)
+
+        keys.append(self.image_ids)
+
+        # groups are contiguous in the lexsort order and scores decrease inside each of them
+        order = np.lexsort(keys)
+        count = len(order)
+
+        group_starts = np.ones(count, dtype=bool)
+        group_starts[1:] = self.image_ids[order][1:] != self.image_ids[order][:-1]
+
+        if per_category:
+            group_starts[1:] |= (
+                self.category_ids[order][1:] != self.category_ids[order][:-1]
+            )
+
+        positions = np.arange(count)
+        ranks = positions - np.maximum.accumulate(np.where(group_starts, positions, 0))
+
+        return self.take(np.sort(order[ranks < k]))
+
+
+def iter_json_records(
+    path: Union[str, PathLike], buffer_size: int = 1 << 20
+) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily parse a JSON file with an array of objects (only buffer_size bytes and the current record are kept in memory)
+
+    :param path: Path to the JSON file
+    :param buffer_size: Number of bytes read at once
+    :return: Iterator over records
+    """
+    decode = json.JSONDecoder().raw_decode
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+
+    buffer = ""
+    position = 0
+    started = eof = False
+
+    with open(path, "rb") as file:
+        while True:
+            position = WHITESPACE.match(buffer, position).end()  # type: ignore
+
+            if position == len(buffer) and eof:
+                raise DatasetFormatNotValid(
+                    f"Results file {path} is not a valid JSON array"
+                )
+
+            if position < len(buffer):
+                char = buffer[position]
+
+                if not started:
+                    if char != "[":
+                        raise DatasetFormatNotValid(
+                            f"Results file {path} has to contain a JSON array of detection records"
+                        )
+
+                    started = True
+                    position += 1
+                    continue
+
+                if char == "]":
+                    return
+
+                if char == ",":
+                    position += 1
+                    continue
+
+                try:
+                    # decode records one after another until the end of the buffer or the array
+                    while True:
+                        record, end = decode(buffer, position)
+                        yield record
+
+                        separator = SEPARATOR.match(buffer, end)
+                        position = separator.end()  # type: ignore
+
+                        if not separator.group(1):  # type: ignore
+                            break
+
+                    continue
+                except json.JSONDecodeError as e:
+                    if eof:
+                        raise DatasetFormatNotValid(
+                            f"Results file {path} is not a valid JSON array"
+                        ) from e
+
+            # the buffer is exhausted or ends in the middle of a record
+            chunk = file.read(buffer_size)
+            eof = not chunk
+            buffer = buffer[position:] + text_decoder.decode(chunk, final=eof)
+            position = 0
+
+
+def _chunks(
+    records: Iterable[Mapping[str, Any]], chunk_size: int
+) -> Iterator[List[Mapping[str, Any]]]:
+    chunk: List[Mapping[str, Any]] = []
+
+    for record in records:
+        chunk.append(record)
+
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def validate_detections(dataset: "COCO", detections: Detections) -> None:
+    """
+    Check that detections reference images and categories of the ground truth dataset
+
+    :param dataset: Ground truth dataset
+    :param detections: Detections to check
+    """
+    images = dataset.images
+    categories = dataset.categories
+
+    for name, known_ids, ids in (
+        (
+            "image",
+            np.fromiter((image.id for image in images), np.int64, len(images)),
+            detections.image_ids,
+        ),
+        (
+            "category",
+            np.fromiter(
+                (category.id for category in categories), np.int64, len(categories)
+            ),
+            detections.category_ids,
+        ),
+    ):
+        unknown = np.unique(ids[id_positions(known_ids, ids) < 0])
+
+        if len(unknown):
+            examples = ", ".join(str(id) for id in unknown[:5].tolist())
+
+            raise ValueError(
+                f"Detections reference {len(unknown)} {name} IDs missing in the ground truth (e.g. {examples})"
+            )
+
+
+def load_results(
+    dataset: "COCO",
+    results: ResultsT,
+    min_score: Optional[float] = None,
+    top_k: Optional[int] = None,
+    per_category: bool = False,
+    chunk_size: int = 100_000,
+) -> Detections:
+    """
+    Load detection results and validate them against the ground truth dataset.
+    The score threshold is applied chunk by chunk while loading, so filtered out records are never accumulated
+
+    :param dataset: Ground truth dataset
+    :param results: Path to a JSON file with detection records, a sequence of records
+        or a mapping of image_id, category_id, bbox and score arrays
+    :param min_score: Drop detections scored below the threshold
+    :param top_k: Keep only top scoring detections per image (see Detections.top_k())
+    :param per_category: Apply top_k per image and category
+    :param chunk_size: Number of records converted to arrays at once
+    :return: Detections
+    """
+    parts: List[Detections] = []
+
+    if isinstance(results, Mapping):
+        parts.append(
+            Detections.from_arrays(
+                results["image_id"],
+                results["category_id"],
+                results["bbox"],
+                results["score"],
+            )
+        )
+    else:
+        records: Iterable[Mapping[str, Any]] = (
+            iter_json_records(results)
+            if isinstance(results, (str, PathLike))
+            else results
+        )
+
+        parts.extend(
+            Detections.from_records(chunk) for chunk in _chunks(records, chunk_size)
+        )
+
+    if min_score is not None:
+        parts = [part.threshold(min_score) for part in parts]
+
+    detections = Detections.concatenate(parts)
+    validate_detections(dataset, detections)
+
+    if top_k is not None:
+        detections = detections.top_k(top_k, per_category=per_category)
+
+    return detections
@@ -0,0 +1,440 @@
+"""
+Comparison of two versions of a dataset.
+Records are normalized and hashed in bulk (annotations column by column with NumPy),
+so only hashes are compared once records are matched by IDs (or by geometry)
+"""
+
+import json
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from coconutools.boxes import paired_iou
+from coconutools.columns import id_positions
+from coconutools.segmentations import _concat_ranges
+
+if TYPE_CHECKING:
+    from coconutools.dataset import COCO
+
+MASK64 = (1 << 64) - 1
+
+
+def _splitmix(values: np.ndarray) -> np.ndarray:
+    """
+    SplitMix64 finalizer (vectorized, uint64 arithmetic wraps around)
+    """
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+
+    mixed: np.ndarray = values ^ (values >> np.uint64(31))
+
+    return mixed
+
+
+def _combine(*columns: np.ndarray) -> np.ndarray:
+    """
+    Hash rows of several uint64 columns
+    """
+    hashes = np.zeros(len(columns[0]), dtype=np.uint64)
+
+    for column in columns:
+        hashes = _splitmix(hashes ^ column)
+
+    return hashes
+
+
+def _float_bits(values: np.ndarray) -> np.ndarray:
+    # adding 0.0 normalizes -0.0 to 0.0
+    bits: np.ndarray = (np.asarray(values, dtype=np.float64) + 0.0).view(np.uint64)
+
+    return bits
+
+
+def _object_hashes(values: Iterable[Any]) -> np.ndarray:
+    """
+    Hash arbitrary JSON-serializable values (normalized by sorting dictionary keys)
+    """
+    return np.fromiter(
+        (
+            hash(json.dumps(value, sort_keys=True, default=str)) & MASK64
+            for value in values
+        ),
+        np.uint64,
+    )
+
+
+def _tuple_hashes(values: Iterable[Tuple[Any, ...]]) -> np.ndarray:
+    """
+    Hash tuples of hashable values
+    """
+    return np.fromiter((hash(value) & MASK64 for value in values), np.uint64)
+
+
+def _polygon_hashes(dataset: "COCO") -> np.ndarray:
+    """
+    Hash polygons of every annotation (annotations without polygons get the same empty hash)
+    """
+    store = dataset._aligned_polygons()
+
+    point_bits = store.points.astype(np.float32).view(np.uint32).astype(np.uint64)
+    point_counts = np.diff(store.polygon_offsets)
+    polygon_counts = np.diff(store.annotation_offsets)
+
+    # positions of points inside their annotations make hashes sensitive to the point order
+    annotation_point_offsets = store.polygon_offsets[store.annotation_offsets]
+    point_annotations = np.repeat(
+        np.arange(len(store)), np.diff(annotation_point_offsets)
+    )
+    local_positions = np.arange(len(point_bits), dtype=np.uint64) - np.repeat(
+        annotation_point_offsets[:-1], np.diff(annotation_point_offsets)
+    ).astype(np.uint64)
+
+    point_hashes = _combine(
+        local_positions, point_bits[:, 0] << np.uint64(32) | point_bits[:, 1]
+    )
+
+    hashes = np.zeros(len(store), dtype=np.uint64)
+    np.add.at(hashes, point_annotations, point_hashes)
+
+    # polygon boundaries have to affect the hash as well
+    polygon_annotations = np.repeat(np.arange(len(store)), polygon_counts)
+    boundary_hashes = _combine(
+        point_counts.astype(np.uint64),
+        np.arange(len(point_counts), dtype=np.uint64)
+        - np.repeat(store.annotation_offsets[:-1], polygon_counts).astype(np.uint64),
+    )
+    np.add.at(hashes, polygon_annotations, boundary_hashes)
+
+    return _combine(hashes, polygon_counts.astype(np.uint64))
+
+
+@dataclass
+class RecordDiff:
+    """
+    Difference between two versions of records of one kind (images, categories or annotations)
+    """
+
+    added: np.ndarray  # IDs of new records
+    removed: np.ndarray  # IDs of old records
+    modified: np.ndarray  # (K, 2) old and new IDs of changed records
+    # (R, 2) old and new IDs of records matched despite different IDs
+    reassigned: np.ndarray
+    unchanged: int
+
+    def __bool__(self) -> bool:
+        return bool(len(self.added) or len(self.removed) or len(self.modified))
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            "added": len(self.added),
+            "removed": len(self.removed),
+            "modified": len(self.modified),
+            "reassigned": len(self.reassigned),
+            "unchanged": self.unchanged,
+        }
+
+
+@dataclass
+class DatasetDiff:
+    """
+    Difference between two versions of a dataset
+    """
+
+    images: RecordDiff
+    categories: RecordDiff
+    annotations: RecordDiff
+    info_changed: bool = False
+    licenses_changed: bool = False
+
+    def __bool__(self) -> bool:
+        return bool(
+            self.images
+            or self.categories
+            or self.annotations
+            or self.info_changed
+            or self.licenses_changed
+        )
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "images": self.images.summary(),
+            "categories": self.categories.summary(),
+            "annotations": self.annotations.summary(),
+            "info_changed": self.info_changed,
+            "licenses_changed": self.licenses_changed,
+        }
+
+
+@dataclass
+class _Records:
+    ids: np.ndarray  # (N,) int64
+    hashes: np.ndarray  # (N,) uint64 content hashes (without IDs)
+    # (N,) uint64 secondary match keys (e.g. file names) used when IDs were reassigned
+    keys: np.ndarray
+    boxes: Optional[np.ndarray] = field(
+        default=None
+    )  # (N, 4) xywh boxes of annotations
+
+
+def _pairs(old: np.ndarray, new: np.ndarray) -> np.ndarray:
+    order = np.argsort(old, kind="stable")
+    pairs: np.ndarray = np.stack((old[order], new[order]), axis=1).astype(np.int64)
+
+    return pairs
+
+
+def _match_by_ids(old: _Records, new: _Records) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :return: Positions of matched old and new records
+    """
+    new_positions = id_positions(new.ids, old.ids)
+    matched = new_positions >= 0
+
+    return np.flatnonzero(matched), new_positions[matched]
+
+
+def _match_by_keys(
+    old: _Records, new: _Records, old_left: np.ndarray, new_left: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Match not yet matched records with equal keys (the first record with the key wins)
+    """
+    keys, first_new = np.unique(new.keys[new_left], return_index=True)
+
+    if not len(keys):
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+
+    positions = np.searchsorted(keys, old.keys[old_left]).clip(max=len(keys) - 1)
+
+    found = keys[positions] == old.keys[old_left]
+    old_matched, new_matched = old_left[found], new_left[first_new[positions[found]]]
+
+    # the same new record can't be matched twice
+    new_matched, unique_positions = np.unique(new_matched, return_index=True)
+
+    return old_matched[unique_positions], new_matched
+
+
+def _match_by_geometry(
+    old: _Records,
+    new: _Records,
+    old_left: np.ndarray,
+    new_left: np.ndarray,
+    iou_threshold: float,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Greedily match not yet matched annotations of the same image and category by box IoU.
+    Candidate pairs of all groups are generated and scored at once, only the greedy assignment is sequential
+    """
+    assert old.boxes is not None and new.boxes is not None
+
+    old_left = old_left[np.argsort(old.keys[old_left], kind="stable")]
+    new_left = new_left[np.argsort(new.keys[new_left], kind="stable")]
+    old_groups, new_groups = old.keys[old_left], new.keys[new_left]
+
+    common = np.intersect1d(old_groups, new_groups)
+    old_starts = np.searchsorted(old_groups, common, side="left")
+    old_counts = np.searchsorted(old_groups, common, side="right") - old_starts
+    new_starts = np.searchsorted(new_groups, common, side="left")
+    new_counts = np.searchsorted(new_groups, common, side="right") - new_starts
+
+    # all (old, new) pairs inside every group
+    pair_counts = old_counts * new_counts
+    pair_groups = np.repeat(np.arange(len(common)), pair_counts)
+    steps = _concat_ranges(np.zeros(len(common), np.int64), pair_counts)
+    old_candidates = old_left[
+        old_starts[pair_groups] + steps // new_counts[pair_groups]
+    ]
+    new_candidates = new_left[new_starts[pair_groups] + steps % new_counts[pair_groups]]
+
+    iou = paired_iou(old.boxes[old_candidates], new.boxes[new_candidates])
+    accepted = np.flatnonzero(iou >= iou_threshold)
+    accepted = accepted[np.argsort(-iou[accepted], kind="stable")]
+
+    old_matched: List[int] = []
+    new_matched: List[int] = []
+    used_old: Set[int] = set()
+    used_new: Set[int] = set()
+
+    for old_position, new_position in zip(
+        old_candidates[accepted].tolist(), new_candidates[accepted].tolist()
+    ):
+        if old_position in used_old or new_position in used_new:
+            continue
+
+        used_old.add(old_position)
+        used_new.add(new_position)
+        old_matched.append(old_position)
+        new_matched.append(new_position)
+
+    return np.array(old_matched, np.int64), np.array(new_matched, np.int64)
+
+
+def _diff_records(
+    old: _Records,
+    new: _Records,
+    match_keys: bool,
+    iou_threshold: Optional[float] = None,
+) -> RecordDiff:
+    old_matched, new_matched = _match_by_ids(old, new)
+
+    reassigned_old = np.empty(0, np.int64)
+    reassigned_new = np.empty(0, np.int64)
+
+    if match_keys:
+        old_left = np.setdiff1d(np.arange(len(old.ids)), old_matched)
+        new_left = np.setdiff1d(np.arange(len(new.ids)), new_matched)
+
+        if iou_threshold is None:
+            reassigned_old, reassigned_new = _match_by_keys(
+                old, new, old_left, new_left
+            )
+        else:
+            reassigned_old, reassigned_new = _match_by_geometry(
+                old, new, old_left, new_left, iou_threshold
+            )
+
+        old_matched = np.concatenate((old_matched, reassigned_old))
+        new_matched = np.concatenate((new_matched, reassigned_new))
+
+    changed = old.hashes[old_matched] != new.hashes[new_matched]
+
+    return RecordDiff(
+        added=np.sort(np.delete(new.ids, new_matched)),
+        removed=np.sort(np.delete(old.ids, old_matched)),
+        modified=_pairs(old.ids[old_matched[changed]], new.ids[new_matched[changed]]),
+        reassigned=_pairs(old.ids[reassigned_old], new.ids[reassigned_new]),
+        unchanged=int((~changed).sum()),
+    )
+
+
+def _image_records(dataset: "COCO") -> _Records:
+    images = dataset.images
+
+    return _Records(
+        ids=np.fromiter((image.id for image in images), np.int64, len(images)),
+        hashes=_tuple_hashes(
+            (
+                image.file_name,
+                image.width,
+                image.height,
+                image.coco_url,
+                image.flickr_url,
+                str(image.date_captured),
+                image.license_id,
+            )
+            for image in images
+        ),
+        keys=_tuple_hashes((image.file_name,) for image in images),
+    )
+
+
+def _category_records(dataset: "COCO") -> _Records:
+    categories = dataset.categories
+
+    return _Records(
+        ids=np.fromiter((c.id for c in categories), np.int64, len(categories)),
+        hashes=_tuple_hashes((c.name, c.supercategory) for c in categories),
+        keys=_tuple_hashes((c.name,) for c in categories),
+    )
+
+
+def _reference_keys(known: _Records, ids: np.ndarray) -> np.ndarray:
+    """
+    Replace referenced IDs by keys of referenced records (so annotations stay equal when only IDs were reassigned).
+    Unknown references are kept as they are
+    """
+    positions = id_positions(known.ids, ids)
+    keys = ids.astype(np.uint64)
+    keys[positions >= 0] = known.keys[positions[positions >= 0]]
+
+    return keys
+
+
+def _annotation_records(
+    dataset: "COCO", images: _Records, categories: _Records
+) -> _Records:
+    columns = dataset._get_columns()
+    annotations = dataset.annotations
+
+    image_keys = _reference_keys(images, columns.image_ids)
+    category_keys = _reference_keys(categories, columns.category_ids)
+
+    # RLEs, keypoints and custom fields are rare, so they are hashed one by one
+    other_hashes = np.zeros(len(annotations), dtype=np.uint64)
+    other_positions = [
+        position
+        for position, annotation in enumerate(annotations)
+        if annotation.extra
+        or isinstance(annotation._segmentation, dict)
+        or annotation.has_keypoints
+    ]
+    other_hashes[other_positions] = _object_hashes(
+        [
+            annotations[p].extra,
+            annotations[p]._segmentation,
+            annotations[p]._keypoint_dict(),
+        ]
+        for p in other_positions
+    )
+
+    return _Records(
+        ids=columns.ids,
+        hashes=_combine(
+            image_keys,
+            category_keys,
+            columns.iscrowd.astype(np.uint64),
+            _float_bits(columns.areas),
+            *(_float_bits(columns.bboxes[:, i]) for i in range(4)),
+            _polygon_hashes(dataset),
+            other_hashes,
+        ),
+        keys=_combine(image_keys, category_keys),
+        boxes=columns.bboxes,
+    )
+
+
+def diff(
+    old: "COCO",
+    new: "COCO",
+    match_reassigned: bool = True,
+    iou_threshold: Optional[float] = 0.5,
+) -> DatasetDiff:
+    """
+    Compare two versions of a dataset.
+
+    Records are matched by IDs first. When IDs were reassigned, images are matched by file names,
+    categories by names and annotations by box IoU within the same image and category.
+    References are compared by referenced records (e.g. annotations of re-numbered images stay unchanged)
+
+    :param old: Old dataset version
+    :param new: New dataset version
+    :param match_reassigned: Match records that are not matched by IDs
+    :param iou_threshold: Minimal box IoU to match annotations with different IDs
+        (None matches only annotations with identical geometry and labels)
+    :return: Dataset difference
+    """
+    old_images, new_images = _image_records(old), _image_records(new)
+    old_categories, new_categories = _category_records(old), _category_records(new)
+
+    old_annotations = _annotation_records(old, old_images, old_categories)
+    new_annotations = _annotation_records(new, new_images, new_categories)
+
+    if iou_threshold is None:
+        # identical annotations (up to IDs) are matched via their content hashes
+        old_annotations.keys = old_annotations.hashes
+        new_annotations.keys = new_annotations.hashes
+
+    return DatasetDiff(
+        images=_diff_records(old_images, new_images, match_reassigned),
+        categories=_diff_records(old_categories, new_categories, match_reassigned),
+        annotations=_diff_records(
+            old_annotations, new_annotations, match_reassigned, iou_threshold
+        ),
+        info_changed=old.info.to_dict() != new.info.to_dict(),
+        licenses_changed=[licence.to_dict() for licence in old.licences]
+        != [licence.to_dict() for licence in new.licences],
+    )
@@ -0,0 +1,331 @@
+"""
+Detection of duplicate images (records of the same file) and near-duplicate annotations
+(boxes of the same image and category with a high IoU).
+
+Annotations of the whole dataset are sorted by (image, category, left box border) at once
+and swept in chunks of images, so only boxes that could still reach the IoU threshold are compared
+"""
+
+from dataclasses import dataclass
+from functools import partial
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from coconutools.annotations import Annotation
+from coconutools.boxes import paired_iou
+from coconutools.columns import id_positions
+from coconutools.images import Category, Image, License
+from coconutools.parallel import ordered_map
+
+if TYPE_CHECKING:
+    from coconutools.dataset import COCO
+
+# (N, 4) xywh float64 boxes sorted by the left border inside groups and (N,) group indexes
+SweepChunkT = Tuple[np.ndarray, np.ndarray]
+
+
+@dataclass
+class Duplicates:
+    """
+    Clusters of duplicate records.
+    Members of every cluster follow the dataset order, so the first member is the one kept on deduplication
+    """
+
+    images: List[np.ndarray]  # clusters of IDs of images with the same file name
+    annotations: List[np.ndarray]  # clusters of IDs of near-duplicate annotations
+
+    def __bool__(self) -> bool:
+        return bool(self.images or self.annotations)
+
+    @staticmethod
+    def _dropped(clusters: List[np.ndarray]) -> np.ndarray:
+        if not clusters:
+            return np.empty(0, dtype=np.int64)
+
+        return np.concatenate([cluster[1:] for cluster in clusters])
+
+    @property
+    def duplicate_image_ids(self) -> np.ndarray:
+        """
+        IDs of images dropped on deduplication (all cluster members but the first one)
+        """
+        return self._dropped(self.images)
+
+    @property
+    def duplicate_annotation_ids(self) -> np.ndarray:
+        """
+        IDs of annotations dropped on deduplication (all cluster members but the first one)
+        """
+        return self._dropped(self.annotations)
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            "image_clusters": len(self.images),
+            "duplicate_images": len(self.duplicate_image_ids),
+            "annotation_clusters": len(self.annotations),
+            "duplicate_annotations": len(self.duplicate_annotation_ids),
+        }
+
+
+def _sweep(chunk: SweepChunkT, iou_threshold: float) -> np.ndarray:
+    """
+    Find pairs of boxes of the same group with IoU not lower than the threshold.
+
+    Box j placed after box i (x_j >= x_i) can reach the threshold only when their intersection is at least
+    threshold * area_i, so x_j <= x_i + (1 - threshold) * w_i. Boxes are compared with their k-th neighbour
+    for k = 1, 2, ... and a box stops being compared once its neighbour is out of that window
+
+    :return: (K, 2) int64 array of box positions in the chunk
+    """
+    boxes, groups = chunk
+    count = len(boxes)
+    lefts = boxes[:, 0]
+    limits = lefts + (1 - iou_threshold) * boxes[:, 2]
+
+    pairs: List[np.ndarray] = [np.empty((0, 2), dtype=np.int64)]
+    active = np.arange(count)
+    offset = 1
+
+    while len(active):
+        active = active[active + offset < count]
+        neighbours = active + offset
+
+        in_window = (groups[neighbours] == groups[active]) & (
+            lefts[neighbours] <= limits[active]
+        )
+        active, neighbours = active[in_window], neighbours[in_window]
+
+        matched = paired_iou(boxes[active], boxes[neighbours]) >= iou_threshold
+        pairs.append(np.stack((active[matched], neighbours[matched]), axis=1))
+
+        offset += 1
+
+    return np.concatenate(pairs)
+
+
+def _components(count: int, pairs: np.ndarray) -> np.ndarray:
+    """
+    Label connected components of a graph (union-find by hooking to the lowest root and pointer jumping)
+
+    :param count: Number of nodes
+    :param pairs: (K, 2) array of edges
+    :return: (count,) int64 array of component labels (the lowest node of every component)
+    """
+    labels = np.arange(count, dtype=np.int64)
+    first, second = pairs[:, 0], pairs[:, 1]
+
+    while True:
+        roots = np.minimum(labels[first], labels[second])
+        hooked = labels.copy()
+
+        np.minimum.at(hooked, labels[first], roots)
+        np.minimum.at(hooked, labels[second], roots)
+
+        # compress paths until every node points to its root
+        while True:
+            jumped = hooked[hooked]
+
+            if np.array_equal(jumped, hooked):
+                break
+
+            hooked = jumped
+
+        if np.array_equal(hooked, labels):
+            return labels
+
+        labels = hooked
+
+
+def _clusters(ids: np.ndarray, labels: np.ndarray) -> List[np.ndarray]:
+    """
+    Group IDs by labels (only groups of several IDs are returned).
+    Labels are positions of the first group members, so groups are ordered by their first member
+
+    :param ids: (N,) array of IDs
+    :param labels: (N,) array of group labels in [0, N) range
+    :return: Clusters of IDs
+    """
+    sizes = np.bincount(labels, minlength=len(labels))
+    members = np.flatnonzero(sizes[labels] > 1)
+    members = members[np.argsort(labels[members], kind="stable")]
+
+    _, starts = np.unique(labels[members], return_index=True)
+
+    return np.split(ids[members], starts[1:]) if len(members) else []
+
+
+def _image_labels(dataset: "COCO") -> np.ndarray:
+    """
+    :return: (N,) positions of the first image with the same file name for every image
+    """
+    first_positions: Dict[str, int] = {}
+
+    return np.fromiter(
+        (
+            first_positions.setdefault(image.file_name, position)
+            for position, image in enumerate(dataset.images)
+        ),
+        np.int64,
+        len(dataset.images),
+    )
+
+
+def _sweep_chunks(groups: np.ndarray, chunk_size: int) -> List[Tuple[int, int]]:
+    """
+    Split sorted boxes into chunks of about chunk_size boxes without splitting groups
+    """
+    count = len(groups)
+    group_starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    targets = np.arange(chunk_size, count, chunk_size)
+    bounds = np.unique(
+        np.r_[0, group_starts[np.searchsorted(group_starts, targets, "right") - 1]]
+    ).tolist()
+
+    return list(zip(bounds, bounds[1:] + [count]))
+
+
+def find_duplicates(
+    dataset: "COCO",
+    iou: float = 0.9,
+    same_category: bool = True,
+    workers: Optional[int] = None,
+    chunk_size: int = 100_000,
+) -> Duplicates:
+    """
+    Find duplicate images (with the same file name) and near-duplicate annotations.
+    Annotations of duplicate images are compared as if they belonged to the first of them
+
+    :param dataset: COCO dataset
+    :param iou: Minimal box IoU of near-duplicate annotations
+    :param same_category: Compare only annotations of the same category
+    :param workers: Number of worker processes sweeping chunks of images in parallel
+    :param chunk_size: Number of annotations swept at once
+    :return: Clusters of duplicate images and annotations
+    """
+    if not 0 < iou <= 1:
+        raise ValueError(f"IoU threshold has to be in (0, 1] range, got {iou}")
+
+    columns = dataset._get_columns()
+
+    image_ids = np.fromiter(
+        (image.id for image in dataset.images), np.int64, len(dataset.images)
+    )
+    image_labels = _image_labels(dataset)
+
+    annotation_images = columns.image_ids
+
+    if np.any(image_labels != np.arange(len(image_labels))):
+        # move annotations to the first image of the same file (annotations of unknown images stay as they are)
+        image_positions = id_positions(image_ids, annotation_images)
+        annotation_images = np.where(
+            image_positions >= 0,
+            image_ids[image_labels[image_positions]],
+            annotation_images,
+        )
+    categories = (
+        columns.category_ids if same_category else np.zeros(len(columns), np.int64)
+    )
+
+    boxes = columns.bboxes.astype(np.float64)
+    order = np.lexsort((boxes[:, 0], categories, annotation_images))
+    sorted_images, sorted_categories = annotation_images[order], categories[order]
+    groups = np.cumsum(
+        np.r_[
+            False,
+            (sorted_images[1:] != sorted_images[:-1])
+            | (sorted_categories[1:] != sorted_categories[:-1]),
+        ]
+    )
+    sorted_boxes = boxes[order]
+
+    chunks = _sweep_chunks(groups, chunk_size) if len(columns) else []
+    chunk_pairs = ordered_map(
+        partial(_sweep, iou_threshold=iou),
+        ((sorted_boxes[start:end], groups[start:end]) for start, end in chunks),
+        workers=workers,
+    )
+
+    pairs = [np.empty((0, 2), dtype=np.int64)]
+
+    for (start, _), found in zip(chunks, chunk_pairs):
+        pairs.append(order[found + start])
+
+    annotation_pairs = np.concatenate(pairs)
+
+    return Duplicates(
+        images=_clusters(image_ids, image_labels),
+        annotations=_clusters(columns.ids, _components(len(columns), annotation_pairs)),
+    )
+
+
+def deduplicate(dataset: "COCO", duplicates: Duplicates) -> "COCO":
+    """
+    Build a deduplicated copy of the dataset. The first member of every cluster is kept,
+    annotations of dropped images are moved to the kept image with the same file name
+
+    :param dataset: COCO dataset
+    :param duplicates: Duplicates found in the dataset
+    :return: In-memory COCO dataset without duplicates
+    """
+    kept_images: Dict[int, int] = {}
+
+    for cluster in duplicates.images:
+        kept_image, *dropped_images = cluster.tolist()
+        kept_images.update(dict.fromkeys(dropped_images, kept_image))
+
+    deduplicated = type(dataset)._create(image_dir=dataset.image_dir)
+    deduplicated._info = dataset.info
+
+    for category in dataset.categories:
+        deduplicated._add_category(Category(**category.to_dict()))
+
+    for licence in dataset.licences:
+        deduplicated._add_licence(License(**licence.to_dict()))
+
+    for image in dataset.images:
+        if image.id not in kept_images:
+            deduplicated._add_image(Image(**image.to_dict(), dataset=deduplicated))
+
+    columns = dataset._get_columns()
+    positions = np.flatnonzero(
+        ~np.isin(columns.ids, duplicates.duplicate_annotation_ids)
+    )
+    polygon_indexes = columns.polygon_indexes[positions]
+    keypoint_indexes = columns.keypoint_indexes[positions]
+    deduplicated._polygons = dataset._polygons.take(polygon_indexes)
+    deduplicated._keypoints = dataset._keypoints.take(keypoint_indexes)
+
+    for index, (position, polygon_index, keypoint_index) in enumerate(
+        zip(positions.tolist(), polygon_indexes.tolist(), keypoint_indexes.tolist())
+    ):
+        annotation = dataset.annotations[position]
+        kept_annotation = Annotation(
+            id=annotation.id,
+            image_id=kept_images.get(annotation.image_id, annotation.image_id),
+            category_id=annotation.category_id,
+            iscrowd=annotation.iscrowd,
+            segmentation=[] if polygon_index >= 0 else annotation._segmentation,
+            bbox=(
+                annotation.bbox.x,
+                annotation.bbox.y,
+                annotation.bbox.width,
+                annotation.bbox.height,
+            ),
+            area=annotation.area,
+            dataset=deduplicated,
+            # keypoints assigned after loading aren't moved to the store yet
+            keypoints=None if keypoint_index >= 0 else annotation._keypoints,
+            num_keypoints=annotation.num_keypoints,
+            **annotation.extra,
+        )
+
+        if polygon_index >= 0:
+            kept_annotation._attach_polygons(index)
+
+        if keypoint_index >= 0:
+            kept_annotation._attach_keypoints(index)
+
+        deduplicated._add_annotation(kept_annotation)
+
+    return deduplicated
@@ -0,0 +1,527 @@
+"""
+COCO-style evaluation (box and keypoint AP).
+
+Results match the reference COCO evaluation: similarity matrices are computed per image and category,
+detections are matched greedily in the order of their scores (vectorized over similarity thresholds)
+and precision/recall curves are accumulated per category and area range.
+Categories are independent, so they can be evaluated in parallel
+"""
+
+from dataclasses import dataclass, field
+from functools import partial
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+
+from coconutools.boxes import box_iou
+from coconutools.detections import Detections
+from coconutools.keypoints import COCO_PERSON_SIGMAS, KeypointStore, oks
+from coconutools.parallel import ordered_map
+
+if TYPE_CHECKING:
+    from coconutools.dataset import COCO
+
+# name -> (min area, max area)
+AreaRangesT = Mapping[str, Tuple[float, float]]
+
+SIMILARITY_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+RECALL_THRESHOLDS = np.linspace(0.0, 1.0, 101)
+BOX_AREA_RANGES: AreaRangesT = {
+    "all": (0, 1e10),
+    "small": (0, 32**2),
+    "medium": (32**2, 96**2),
+    "large": (96**2, 1e10),
+}
+KEYPOINT_AREA_RANGES: AreaRangesT = {
+    "all": (0, 1e10),
+    "medium": (32**2, 96**2),
+    "large": (96**2, 1e10),
+}
+
+
+def match_detections(
+    similarity: np.ndarray,
+    gt_ignore: np.ndarray,
+    gt_crowd: np.ndarray,
+    thresholds: np.ndarray = SIMILARITY_THRESHOLDS,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Greedily match detections (sorted by descending scores) with ground truth of one image and category.
+    Every detection takes the most similar unmatched ground truth above the threshold, preferring not ignored
+    ground truth. Crowd ground truth can be matched several times
+
+    :param similarity: (D, G) similarity matrix (IoU or OKS)
+    :param gt_ignore: (G,) boolean mask of ignored ground truth
+    :param gt_crowd: (G,) boolean mask of crowd ground truth
+    :param thresholds: (T,) similarity thresholds
+    :return: (T, D) masks of matched detections and of detections matched with ignored ground truth
+    """
+    detection_count, gt_count = similarity.shape
+    dt_matched = np.zeros((len(thresholds), detection_count), dtype=bool)
+    dt_ignored = np.zeros((len(thresholds), detection_count), dtype=bool)
+
+    if not gt_count:
+        return dt_matched, dt_ignored
+
+    gt_matched = np.zeros((len(thresholds), gt_count), dtype=bool)
+    limits = np.minimum(thresholds, 1 - 1e-10)[:, None]
+    steps = np.arange(len(thresholds))
+
+    for detection in range(detection_count):
+        passing = (~gt_matched | gt_crowd) & (similarity[detection] >= limits)
+        has_regular = (passing & ~gt_ignore).any(axis=1, keepdims=True)
+        candidates = passing & (~gt_ignore | ~has_regular)
+
+        # the last of equally similar ground truth wins as in the reference implementation
+        scores = np.where(candidates, similarity[detection], -np.inf)[:, ::-1]
+        best = gt_count - 1 - np.argmax(scores, axis=1)
+        found = candidates.any(axis=1)
+
+        gt_matched[steps[found], best[found]] = True
+        dt_matched[found, detection] = True
+        dt_ignored[found, detection] = gt_ignore[best[found]]
+
+    return dt_matched, dt_ignored
+
+
+def _precision_recall(
+    scores: np.ndarray,
+    dt_matched: np.ndarray,
+    dt_ignored: np.ndarray,
+    gt_count: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param scores: (D,) detection scores
+    :param dt_matched: (T, D) masks of matched detections
+    :param dt_ignored: (T, D) masks of ignored detections
+    :param gt_count: Number of not ignored ground truth
+    :return: (T, R) interpolated precision and (T,) recall
+    """
+    order = np.argsort(-scores, kind="mergesort")
+    dt_matched, dt_ignored = dt_matched[:, order], dt_ignored[:, order]
+
+    true_positives = np.cumsum(dt_matched & ~dt_ignored, axis=1, dtype=np.float64)
+    false_positives = np.cumsum(~dt_matched & ~dt_ignored, axis=1, dtype=np.float64)
+
+    precision = np.zeros((len(dt_matched), len(RECALL_THRESHOLDS)))
+    recall = np.zeros(len(dt_matched))
+
+    if not dt_matched.shape[1]:
+        return precision, recall
+
+    recalls = true_positives / gt_count
+    precisions = true_positives / (true_positives + false_positives + np.spacing(1))
+    # make precision monotonically decreasing
+    precisions = np.maximum.accumulate(precisions[:, ::-1], axis=1)[:, ::-1]
+
+    recall[:] = recalls[:, -1]
+
+    for step, (step_recalls, step_precisions) in enumerate(zip(recalls, precisions)):
+        positions = np.searchsorted(step_recalls, RECALL_THRESHOLDS, side="left")
+        reached = positions < len(step_recalls)
+        precision[step, reached] = step_precisions[positions[reached]]
+
+    return precision, recall
+
+
+@dataclass
+class EvaluationResult:
+    """
+    Precision and recall per similarity threshold, category and area range (-1 where there is no ground truth)
+    """
+
+    precision: np.ndarray  # (T, R, C, A) precision at recall thresholds
+    recall: np.ndarray  # (T, C, A)
+    category_ids: np.ndarray  # (C,)
+    area_ranges: List[str]  # (A,)
+    max_detections: int
+    thresholds: np.ndarray = field(default_factory=SIMILARITY_THRESHOLDS.copy)
+
+    @staticmethod
+    def _mean(values: np.ndarray) -> float:
+        defined = values[values > -1]
+
+        return float(defined.mean()) if len(defined) else -1.0
+
+    def _threshold_position(self, threshold: float) -> int:
+        return int(np.argmin(np.abs(self.thresholds - threshold)))
+
+    def summary(self) -> Dict[str, float]:
+        """
+        :return: AP and AR (with up to max_detections detections per image) averaged over thresholds and categories,
+            also at 0.5 and 0.75 thresholds and per area range
+        """
+        summary: Dict[str, float] = {}
+        all_areas = self.area_ranges.index("all")
+        at_50, at_75 = self._threshold_position(0.5), self._threshold_position(0.75)
+
+        for name, values in (("AP", self.precision), ("AR", self.recall)):
+            area_values = values[..., all_areas]
+
+            summary[name] = self._mean(area_values)
+            summary[f"{name}50"] = self._mean(area_values[at_50])
+            summary[f"{name}75"] = self._mean(area_values[at_75])
+
+            for position, area_range in enumerate(self.area_ranges):
+                if area_range != "all":
+                    summary[f"{name}_{area_range}"] = self._mean(values[..., position])
+
+        return summary
+
+    def category_ap(self) -> Dict[int, float]:
+        """
+        :return: Category ID -> AP averaged over thresholds (for all areas)
+        """
+        all_areas = self.area_ranges.index("all")
+
+        return {
+            int(category_id): self._mean(self.precision[:, :, position, all_areas])
+            for position, category_id in enumerate(self.category_ids)
+        }
+
+
+@dataclass
+class _CategoryData:
+    """
+    Ground truth and detections of one category
+    """
+
+    gt_image_ids: np.ndarray  # (G,)
+    gt_boxes: np.ndarray  # (G, 4) xywh
+    gt_areas: np.ndarray  # (G,)
+    gt_ignore: np.ndarray  # (G,) ignored regardless of the area range
+    gt_crowd: np.ndarray  # (G,)
+    dt_image_ids: np.ndarray  # (D,)
+    dt_scores: np.ndarray  # (D,)
+    dt_boxes: np.ndarray  # (D, 4) xywh
+    dt_areas: np.ndarray  # (D,)
+
+    # keypoint evaluation only
+    gt_keypoints: Optional[np.ndarray] = None  # (G, K, 3)
+    dt_keypoints: Optional[np.ndarray] = None  # (D, K, 3)
+    sigmas: Optional[np.ndarray] = None  # (K,)
+
+    def similarity(self, gt: np.ndarray, dt: np.ndarray) -> np.ndarray:
+        """
+        :return: (D, G) similarity matrix of the given detections and ground truth
+        """
+        if self.sigmas is None:
+            return box_iou(self.dt_boxes[dt], self.gt_boxes[gt], self.gt_crowd[gt])
+
+        assert self.gt_keypoints is not None and self.dt_keypoints is not None
+
+        return oks(
+            self.gt_keypoints[gt],
+            self.gt_boxes[gt],
+            self.gt_areas[gt],
+            self.dt_keypoints[dt],
+            self.sigmas,
+        )
+
+
+def _image_groups(image_ids: np.ndarray) -> Dict[int, np.ndarray]:
+    """
+    :return: Image ID -> positions of records (in their original order)
+    """
+    order = np.argsort(image_ids, kind="stable")
+    unique_ids, starts = np.unique(image_ids[order], return_index=True)
+    bounds = np.r_[starts, len(order)].tolist()
+
+    return {
+        image_id: order[start:end]
+        for image_id, start, end in zip(unique_ids.tolist(), bounds[:-1], bounds[1:])
+    }
+
+
+def _evaluate_category(
+    data: _CategoryData, area_ranges: List[Tuple[float, float]], max_detections: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :return: (T, R, A) precision and (T, A) recall of the category (-1 for area ranges without ground truth)
+    """
+    gt_groups = _image_groups(data.gt_image_ids)
+    dt_groups = _image_groups(data.dt_image_ids)
+    empty = np.empty(0, dtype=np.int64)
+
+    scores: List[np.ndarray] = []
+    matches: List[List[Tuple[np.ndarray, np.ndarray]]] = [[] for _ in area_ranges]
+    gt_counts = np.zeros(len(area_ranges), dtype=np.int64)
+
+    for image_id in sorted(gt_groups.keys() | dt_groups.keys()):
+        gt = gt_groups.get(image_id, empty)
+        dt = dt_groups.get(image_id, empty)
+        dt = dt[np.argsort(-data.dt_scores[dt], kind="mergesort")][:max_detections]
+
+        similarity = data.similarity(gt, dt)
+        gt_areas, dt_areas = data.gt_areas[gt], data.dt_areas[dt]
+        scores.append(data.dt_scores[dt])
+
+        for area_position, (min_area, max_area) in enumerate(area_ranges):
+            ignore = data.gt_ignore[gt] | (gt_areas < min_area) | (gt_areas > max_area)
+
+            # not ignored ground truth goes first
+            gt_order = np.argsort(ignore, kind="mergesort")
+            dt_matched, dt_ignored = match_detections(
+                similarity[:, gt_order], ignore[gt_order], data.gt_crowd[gt][gt_order]
+            )
+            dt_ignored |= ~dt_matched & ((dt_areas < min_area) | (dt_areas > max_area))
+
+            matches[area_position].append((dt_matched, dt_ignored))
+            gt_counts[area_position] += np.count_nonzero(~ignore)
+
+    thresholds = len(SIMILARITY_THRESHOLDS)
+    precision = -np.ones((thresholds, len(RECALL_THRESHOLDS), len(area_ranges)))
+    recall = -np.ones((thresholds, len(area_ranges)))
+
+    if not scores:
+        return precision, recall
+
+    category_scores = np.concatenate(scores)
+
+    for area_position, area_matches in enumerate(matches):
+        if not gt_counts[area_position]:
+            continue
+
+        precision[:, :, area_position], recall[:, area_position] = _precision_recall(
+            category_scores,
+            np.concatenate([matched for matched, _ in area_matches], axis=1),
+            np.concatenate([ignored for _, ignored in area_matches], axis=1),
+            int(gt_counts[area_position]),
+        )
+
+    return precision, recall
+
+
+def _evaluate(
+    categories: List[_CategoryData],
+    category_ids: np.ndarray,
+    area_ranges: AreaRangesT,
+    max_detections: int,
+    workers: Optional[int],
+) -> EvaluationResult:
+    if "all" not in area_ranges:
+        raise ValueError("Area ranges have to include the 'all' range")
+
+    evaluate_category = partial(
+        _evaluate_category,
+        area_ranges=list(area_ranges.values()),
+        max_detections=max_detections,
+    )
+    results = list(ordered_map(evaluate_category, categories, workers=workers))
+
+    thresholds = len(SIMILARITY_THRESHOLDS)
+    precision = -np.ones(
+        (thresholds, len(RECALL_THRESHOLDS), len(category_ids), len(area_ranges))
+    )
+    recall = -np.ones((thresholds, len(category_ids), len(area_ranges)))
+
+    for position, (category_precision, category_recall) in enumerate(results):
+        precision[:, :, position] = category_precision
+        recall[:, position] = category_recall
+
+    return EvaluationResult(
+        precision=precision,
+        recall=recall,
+        category_ids=category_ids,
+        area_ranges=list(area_ranges),
+        max_detections=max_detections,
+    )
+
+
+def _detection_arrays(
+    detections: Sequence[Mapping[str, Any]],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    :return: Image IDs, category IDs and scores of detection records
+    """
+    count = len(detections)
+
+    return (
+        np.fromiter((d["image_id"] for d in detections), np.int64, count),
+        np.fromiter((d["category_id"] for d in detections), np.int64, count),
+        np.fromiter((d["score"] for d in detections), np.float64, count),
+    )
+
+
+def evaluate_boxes(
+    dataset: "COCO",
+    detections: Union[Sequence[Mapping[str, Any]], Detections],
+    max_detections: int = 100,
+    area_ranges: AreaRangesT = BOX_AREA_RANGES,
+    workers: Optional[int] = None,
+) -> EvaluationResult:
+    """
+    Evaluate box detections with IoU-based AP (as the COCO bbox evaluation does).
+    Crowd ground truth is ignored, detections inside crowd regions don't count as false positives
+
+    :param dataset: Ground truth COCO dataset
+    :param detections: Detection records with image_id, category_id, bbox (xywh) and score fields
+        or loaded detections (see COCO.load_results())
+    :param max_detections: Maximum number of top scoring detections per image and category
+    :param area_ranges: Area range name -> (min area, max area). It has to include the "all" range
+    :param workers: Number of worker processes evaluating categories in parallel
+    :return: Precision and recall per IoU threshold, category and area range
+    """
+    columns = dataset._get_columns()
+    category_ids = np.array(
+        sorted(category.id for category in dataset.categories), dtype=np.int64
+    )
+
+    if isinstance(detections, Detections):
+        dt_image_ids, dt_category_ids = detections.image_ids, detections.category_ids
+        dt_scores, dt_boxes = detections.scores, detections.bboxes
+        dt_areas = detections.areas
+    else:
+        dt_image_ids, dt_category_ids, dt_scores = _detection_arrays(detections)
+        dt_boxes = np.array([d["bbox"] for d in detections], dtype=np.float64).reshape(
+            -1, 4
+        )
+        dt_areas = dt_boxes[:, 2] * dt_boxes[:, 3]
+
+    categories: List[_CategoryData] = []
+
+    for category_id in category_ids.tolist():
+        gt = np.flatnonzero(columns.category_ids == category_id)
+        dt = np.flatnonzero(dt_category_ids == category_id)
+
+        categories.append(
+            _CategoryData(
+                gt_image_ids=columns.image_ids[gt],
+                gt_boxes=columns.bboxes[gt],
+                gt_areas=columns.areas[gt],
+                gt_ignore=columns.iscrowd[gt],
+                gt_crowd=columns.iscrowd[gt],
+                dt_image_ids=dt_image_ids[dt],
+                dt_scores=dt_scores[dt],
+                dt_boxes=dt_boxes[dt],
+                dt_areas=dt_areas[dt],
+            )
+        )
+
+    return _evaluate(categories, category_ids, area_ranges, max_detections, workers)
+
+
+def _keypoint_sigmas(
+    dataset: "COCO", sigmas: Optional[Mapping[int, Sequence[float]]]
+) -> Dict[int, np.ndarray]:
+    category_sigmas: Dict[int, np.ndarray] = {}
+
+    for category in dataset.categories:
+        if not category.num_keypoints:
+            continue
+
+        if sigmas is not None and category.id in sigmas:
+            values = np.asarray(sigmas[category.id], dtype=np.float64)
+        elif category.num_keypoints == len(COCO_PERSON_SIGMAS):
+            values = COCO_PERSON_SIGMAS
+        else:
+            raise ValueError(
+                f"Keypoint sigmas of the category '{category.name}' (ID={category.id}) are required"
+            )
+
+        if len(values) != category.num_keypoints:
+            raise ValueError(
+                f"The category '{category.name}' (ID={category.id}) has {category.num_keypoints} keypoints, "
+                f"but {len(values)} sigmas are given"
+            )
+
+        category_sigmas[category.id] = values
+
+    if not category_sigmas:
+        raise ValueError("The dataset has no keypoint categories")
+
+    return category_sigmas
+
+
+def evaluate_keypoints(
+    dataset: "COCO",
+    detections: Sequence[Mapping[str, Any]],
+    sigmas: Optional[Mapping[int, Sequence[float]]] = None,
+    max_detections: int = 20,
+    area_ranges: AreaRangesT = KEYPOINT_AREA_RANGES,
+    workers: Optional[int] = None,
+) -> EvaluationResult:
+    """
+    Evaluate keypoint detections with OKS-based AP (as the COCO keypoint evaluation does).
+    Crowd ground truth and ground truth without labelled keypoints is ignored
+
+    :param dataset: Ground truth COCO dataset with keypoint categories
+    :param detections: Detection records with image_id, category_id, keypoints and score fields
+    :param sigmas: Category ID -> per-keypoint standard deviations (COCO person sigmas are used for categories
+        with 17 keypoints by default)
+    :param max_detections: Maximum number of top scoring detections per image and category
+    :param area_ranges: Area range name -> (min area, max area). It has to include the "all" range
+    :param workers: Number of worker processes evaluating categories in parallel
+    :return: Precision and recall per OKS threshold, category and area range
+    """
+    category_sigmas = _keypoint_sigmas(dataset, sigmas)
+    category_ids = np.array(sorted(category_sigmas), dtype=np.int64)
+    num_keypoints = max(len(values) for values in category_sigmas.values())
+
+    columns = dataset._get_columns()
+    gt_keypoints = dataset.keypoints(num_keypoints=num_keypoints)
+    labelled_counts = np.count_nonzero(gt_keypoints[:, :, 2] > 0, axis=1)
+    gt_num_keypoints = np.fromiter(
+        (
+            -1 if annotation.num_keypoints is None else annotation.num_keypoints
+            for annotation in dataset.annotations
+        ),
+        np.int64,
+        len(columns),
+    )
+    gt_ignore = columns.iscrowd | (
+        np.where(gt_num_keypoints >= 0, gt_num_keypoints, labelled_counts) == 0
+    )
+
+    dt_image_ids, dt_category_ids, dt_scores = _detection_arrays(detections)
+    dt_store = KeypointStore()
+    dt_store.extend([d["keypoints"] for d in detections])
+    dt_keypoints = dt_store.dense(num_keypoints)
+
+    # detection boxes are extents of their keypoints
+    dt_boxes = np.zeros((len(detections), 4))
+    non_empty = np.flatnonzero(dt_store.counts > 0)
+
+    if len(non_empty):
+        starts = dt_store.offsets[non_empty]
+        points = dt_store.keypoints[:, :2].astype(np.float64)
+        top_left = np.minimum.reduceat(points, starts)
+        dt_boxes[non_empty] = np.hstack(
+            (top_left, np.maximum.reduceat(points, starts) - top_left)
+        )
+
+    categories: List[_CategoryData] = []
+
+    for category_id in category_ids.tolist():
+        size = len(category_sigmas[category_id])
+        gt = np.flatnonzero(columns.category_ids == category_id)
+        dt = np.flatnonzero(dt_category_ids == category_id)
+
+        categories.append(
+            _CategoryData(
+                gt_image_ids=columns.image_ids[gt],
+                gt_boxes=columns.bboxes[gt],
+                gt_areas=columns.areas[gt],
+                gt_ignore=gt_ignore[gt],
+                gt_crowd=columns.iscrowd[gt],
+                dt_image_ids=dt_image_ids[dt],
+                dt_scores=dt_scores[dt],
+                dt_boxes=dt_boxes[dt],
+                dt_areas=dt_boxes[dt, 2] * dt_boxes[dt, 3],
+                gt_keypoints=gt_keypoints[gt, :size],
+                dt_keypoints=dt_keypoints[dt, :size],
+                sigmas=category_sigmas[category_id],
+            )
+        )
+
+    return _evaluate(categories, category_ids, area_ranges, max_detections, workers)
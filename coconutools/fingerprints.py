@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from enum import Enum, unique
+from typing import Any, Dict, List, Optional, Tuple
+
+WHITESPACE = b" \t\r\n"
+
+
+@unique
+class RefreshResult(str, Enum):
+    """
+    Outcome of COCO.refresh()
+
+    - unchanged: the annotation file has not been changed
+    - appended: only new annotations have been appended and parsed
+    - reloaded: the dataset has been fully reloaded
+    """
+
+    unchanged = "unchanged"
+    appended = "appended"
+    reloaded = "reloaded"
+
+
+def _skip_whitespace(content: bytes, end: int) -> int:
+    while end > 0 and content[end - 1] in WHITESPACE:
+        end -= 1
+
+    return end
+
+
+def _closing_bracket(content: bytes) -> Optional[int]:
+    """
+    Find the closing bracket of an array that is the last node of a JSON object (without copying the content)
+    """
+    end = _skip_whitespace(content, len(content))
+
+    if not end or content[end - 1] != ord("}"):
+        return None
+
+    end = _skip_whitespace(content, end - 1)
+
+    if not end or content[end - 1] != ord("]"):
+        return None
+
+    return end - 1
+
+
+def _hasher() -> Any:
+    # fingerprints are not used for security, so a fast hash is enough
+    return hashlib.sha1(usedforsecurity=False)
+
+
+@dataclass
+class FileFingerprint:
+    """
+    Fingerprint of a loaded annotation file.
+
+    When annotations are the last node of the file, the tail offset points right after their last array element
+    and the hash covers everything before it, so appended annotations can be detected and parsed alone
+    """
+
+    __slots__ = ("size", "mtime_ns", "tail_offset", "hasher", "annotation_count")
+
+    size: int
+    mtime_ns: int
+    tail_offset: Optional[int]
+    # hash state of the content up to the tail offset (or of the whole content)
+    hasher: Any
+    annotation_count: int
+
+    @classmethod
+    def from_content(
+        cls,
+        content: bytes,
+        stat: os.stat_result,
+        annotations_last: bool,
+        annotation_count: int,
+    ) -> "FileFingerprint":
+        """
+        :param content: Raw content of the annotation file
+        :param stat: Status of the annotation file at the time it was read
+        :param annotations_last: Whether annotations are the last node of the file
+        :param annotation_count: Number of annotations in the file
+        """
+        bracket = _closing_bracket(content) if annotations_last else None
+        # the offset follows the last array element (or the opening bracket of an empty array)
+        tail_offset = None if bracket is None else _skip_whitespace(content, bracket)
+
+        hasher = _hasher()
+
+        with memoryview(content) as view:
+            hasher.update(view[:tail_offset])
+
+        return cls(
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            tail_offset=tail_offset,
+            hasher=hasher,
+            annotation_count=annotation_count,
+        )
+
+    @classmethod
+    def from_dataset(
+        cls, content: bytes, stat: os.stat_result, dataset: Dict[str, Any]
+    ) -> "FileFingerprint":
+        """
+        :param content: Raw content of the annotation file
+        :param stat: Status of the annotation file at the time it was read
+        :param dataset: Parsed content of the annotation file
+        """
+        return cls.from_content(
+            content,
+            stat,
+            # JSON objects keep the order of their keys, so this tells whether annotations are written last
+            annotations_last=list(dataset)[-1:] == ["annotations"],
+            annotation_count=len(dataset.get("annotations", [])),
+        )
+
+    def matches(self, stat: os.stat_result) -> bool:
+        return self.size == stat.st_size and self.mtime_ns == stat.st_mtime_ns
+
+    def appended_annotations(
+        self, content: bytes, stat: os.stat_result
+    ) -> Optional[Tuple[List[Dict[str, Any]], "FileFingerprint"]]:
+        """
+        Parse annotations appended to the previously loaded content.
+        The content is hashed once: the hash of the unchanged prefix is extended with the appended part
+
+        :param content: Raw content of the changed annotation file
+        :param stat: Status of the changed annotation file at the time it was read
+        :return: Appended annotation records and the fingerprint of the changed file
+            or None if the file was changed in any other way
+        """
+        tail_offset = self.tail_offset
+        bracket = _closing_bracket(content)
+
+        if tail_offset is None or bracket is None or bracket < tail_offset:
+            return None
+
+        hasher = _hasher()
+
+        with memoryview(content) as view:
+            hasher.update(view[:tail_offset])
+
+            if hasher.digest() != self.hasher.digest():
+                return None
+
+            appended = bytes(view[tail_offset:bracket]).strip()
+            new_tail_offset = _skip_whitespace(content, bracket)
+            hasher.update(view[tail_offset:new_tail_offset])
+
+        if self.annotation_count and appended:
+            if not appended.startswith(b","):
+                return None
+
+            appended = appended[1:]
+
+        try:
+            annotations = json.loads(b"[" + appended + b"]")
+        except ValueError:
+            return None
+
+        if not isinstance(annotations, list):
+            return None
+
+        fingerprint = FileFingerprint(
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            tail_offset=new_tail_offset,
+            hasher=hasher,
+            annotation_count=self.annotation_count + len(annotations),
+        )
+
+        return annotations, fingerprint
@@ -0,0 +1,42 @@
+from enum import Enum, unique
+from os import PathLike
+from typing import TYPE_CHECKING, Optional, Union
+
+from coconutools.formats.voc import export_voc
+from coconutools.formats.yolo import export_yolo
+
+if TYPE_CHECKING:
+    from coconutools.dataset import COCO
+
+
+@unique
+class ExportFormat(str, Enum):
+    """
+    Annotation formats datasets can be exported to
+
+    - yolo: one txt label file per image with normalized cxcywh boxes and classes.txt
+    - voc: one Pascal VOC XML file per image
+    """
+
+    yolo = "yolo"
+    voc = "voc"
+
+
+ExportFormatT = Union[ExportFormat, str]
+
+
+def export_dataset(
+    dataset: "COCO",
+    format: ExportFormatT,
+    out_dir: PathLike,
+    workers: Optional[int] = None,
+) -> int:
+    """
+    Export dataset annotations to the given format
+
+    :return: Number of written annotation files
+    """
+    if ExportFormat(format) == ExportFormat.yolo:
+        return export_yolo(dataset, out_dir, workers=workers)
+
+    return export_voc(dataset, out_dir, workers=workers)
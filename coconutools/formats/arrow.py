@@ -0,0 +1,470 @@
+"""
+Apache Arrow / Parquet representation of datasets (requires pyarrow).
+
+Datasets are kept as one flat table with a row per annotation and image fields denormalized onto every row
+(images without annotations get rows with empty annotation fields). Numeric columns and polygon/keypoint
+columns are built directly from the dataset columnar stores. Custom annotation fields go to a struct column
+(or to a column of JSON strings when a field has different types in different annotations).
+Info, licenses and categories are kept in the schema metadata
+"""
+
+import json
+from os import PathLike
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Set
+
+import numpy as np
+
+from coconutools.annotations import Annotation
+from coconutools.columns import id_positions
+from coconutools.images import Image
+from coconutools.writers import _default
+
+if TYPE_CHECKING:
+    import pyarrow
+
+    from coconutools.dataset import COCO
+
+METADATA_KEY = b"coconutools"
+
+REQUIRED_COLUMNS = (
+    "image_id",
+    "file_name",
+    "width",
+    "height",
+    "id",
+    "category_id",
+    "iscrowd",
+    "area",
+    "bbox",
+)
+OPTIONAL_COLUMNS = (
+    "coco_url",
+    "flickr_url",
+    "date_captured",
+    "license",
+    "segmentation",
+    "rle",
+    "keypoints",
+    "num_keypoints",
+    "extra",
+)
+IMAGE_FIELDS = ("coco_url", "flickr_url", "date_captured", "license")
+
+
+def _pyarrow() -> Any:
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ModuleNotFoundError:
+        raise ModuleNotFoundError(
+            "In order to be able to convert your COCO dataset to Arrow or Parquet you need to "
+            "have pyarrow installed in your project: "
+            "- pip install pyarrow"
+            "- poetry add pyarrow"
+        )
+
+    return pyarrow
+
+
+def _rle_column(annotations: List[Annotation]) -> List[Optional[Dict[str, Any]]]:
+    rles: List[Optional[Dict[str, Any]]] = []
+
+    for annotation in annotations:
+        segmentation = annotation._segmentation
+
+        if not isinstance(segmentation, dict):
+            rles.append(None)
+        elif isinstance(segmentation["counts"], list):
+            rles.append({"size": segmentation["size"], "runs": segmentation["counts"]})
+        else:
+            counts = segmentation["counts"]
+            rles.append(
+                {
+                    "size": segmentation["size"],
+                    "counts": counts.encode() if isinstance(counts, str) else counts,
+                }
+            )
+
+    return rles
+
+
+def to_arrow(dataset: "COCO") -> "pyarrow.Table":
+    """
+    Build an Arrow table of the dataset
+
+    :param dataset: COCO dataset
+    :return: Table with a row per annotation (and per image without annotations)
+    """
+    pa = _pyarrow()
+
+    columns = dataset._get_columns()
+    annotations = dataset.annotations
+    images = dataset.images
+    count = len(columns)
+
+    image_ids = np.fromiter((image.id for image in images), np.int64, len(images))
+    # annotation rows go first and images without annotations are appended
+    image_positions = np.concatenate(
+        (
+            id_positions(image_ids, columns.image_ids),
+            np.flatnonzero(~np.isin(image_ids, columns.image_ids)),
+        )
+    )
+    row_count = len(image_positions)
+
+    def image_column(values: List[Any], type: Any) -> Any:
+        # rows of annotations of unknown images get empty image fields
+        array = pa.array(values, type=type)
+        indexes = pa.array(image_positions, mask=image_positions < 0)
+
+        return array.take(indexes)
+
+    def annotation_column(values: Any, type: Any = None) -> Any:
+        # rows of images without annotations get empty annotation fields
+        array = values if isinstance(values, pa.Array) else pa.array(values, type=type)
+
+        if row_count == count:
+            return array
+
+        return pa.concat_arrays([array, pa.nulls(row_count - count, type=array.type)])
+
+    # keep full precision of box and area values (dataset columns are float32)
+    bboxes = np.fromiter(
+        (
+            coordinate
+            for annotation in annotations
+            for coordinate in (
+                annotation.bbox.x,
+                annotation.bbox.y,
+                annotation.bbox.width,
+                annotation.bbox.height,
+            )
+        ),
+        np.float64,
+        count * 4,
+    ).reshape(-1, 4)
+    areas = np.fromiter(
+        (annotation.area for annotation in annotations), np.float64, count
+    )
+
+    polygons = dataset._aligned_polygons()
+    polygon_column = pa.LargeListArray.from_arrays(
+        polygons.annotation_offsets,
+        pa.LargeListArray.from_arrays(
+            2 * polygons.polygon_offsets, polygons.points.ravel()
+        ),
+    )
+
+    keypoints = dataset._aligned_keypoints()
+    has_keypoints = np.fromiter(
+        (annotation.has_keypoints for annotation in annotations), bool, count
+    )
+    keypoint_column = pa.LargeListArray.from_arrays(
+        3 * keypoints.offsets,
+        keypoints.keypoints.ravel(),
+        mask=pa.array(~has_keypoints),
+    )
+
+    table_columns: Dict[str, Any] = {
+        "image_id": pa.concat_arrays(
+            [pa.array(columns.image_ids), pa.array(image_ids[image_positions[count:]])]
+        ),
+        "file_name": image_column([image.file_name for image in images], pa.string()),
+        "width": image_column([image.width for image in images], pa.int64()),
+        "height": image_column([image.height for image in images], pa.int64()),
+        "coco_url": image_column([image.coco_url for image in images], pa.string()),
+        "flickr_url": image_column([image.flickr_url for image in images], pa.string()),
+        "date_captured": image_column(
+            [
+                None if image.date_captured is None else str(image.date_captured)
+                for image in images
+            ],
+            pa.string(),
+        ),
+        "license": image_column([image.license_id for image in images], pa.int64()),
+        "id": annotation_column(columns.ids),
+        "category_id": annotation_column(columns.category_ids),
+        "iscrowd": annotation_column(columns.iscrowd),
+        "area": annotation_column(areas),
+        "bbox": annotation_column(
+            pa.StructArray.from_arrays(
+                [pa.array(bboxes[:, index]) for index in range(4)],
+                names=["x", "y", "width", "height"],
+            )
+        ),
+        "segmentation": annotation_column(polygon_column),
+        "rle": annotation_column(
+            _rle_column(annotations),
+            pa.struct(
+                [
+                    ("size", pa.list_(pa.int64())),
+                    ("counts", pa.binary()),
+                    ("runs", pa.list_(pa.int64())),
+                ]
+            ),
+        ),
+        "keypoints": annotation_column(keypoint_column),
+        "num_keypoints": annotation_column(
+            [annotation.num_keypoints for annotation in annotations], pa.int64()
+        ),
+    }
+
+    if any(annotation.extra for annotation in annotations):
+        extras = [annotation.extra or None for annotation in annotations]
+
+        try:
+            extra_column = pa.array(extras)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # struct fields need one type, mixed ones (e.g. 1 and "x") are valid in COCO JSON though
+            extra_column = pa.array(
+                [
+                    None if extra is None else json.dumps(extra, default=_default)
+                    for extra in extras
+                ],
+                pa.string(),
+            )
+
+        table_columns["extra"] = annotation_column(extra_column)
+
+    header = {
+        "info": dataset.info.to_dict(),
+        "licenses": [licence.to_dict() for licence in dataset.licences],
+        "categories": [category.to_dict() for category in dataset.categories],
+    }
+
+    return pa.table(table_columns).replace_schema_metadata(
+        {METADATA_KEY: json.dumps(header, default=_default)}
+    )
+
+
+def export_parquet(
+    dataset: "COCO", parquet_file: PathLike, row_group_size: int = 100_000
+) -> None:
+    """
+    Write the dataset to a Parquet file
+
+    :param dataset: COCO dataset
+    :param parquet_file: Path to the Parquet file
+    :param row_group_size: Number of rows per row group (the unit of streaming on loading)
+    """
+    pa = _pyarrow()
+
+    pa.parquet.write_table(
+        to_arrow(dataset), parquet_file, row_group_size=row_group_size
+    )
+
+
+def _list_offsets(array: Any) -> np.ndarray:
+    """
+    :return: (N + 1,) int64 offsets of a (possibly sliced) list array rebased to its flattened values
+    """
+    offsets: np.ndarray = array.offsets.to_numpy()
+    rebased: np.ndarray = offsets - offsets[0]
+
+    return rebased
+
+
+def _add_images(
+    dataset: "COCO", batch: Any, image_ids: np.ndarray, known_ids: Set[int]
+) -> None:
+    first_rows = np.sort(np.unique(image_ids, return_index=True)[1])
+    names = [
+        name
+        for name in ("file_name", "width", "height", *IMAGE_FIELDS)
+        if name in batch.schema.names
+    ]
+
+    for image_id, file_name, *values in zip(
+        image_ids[first_rows].tolist(),
+        *(batch.column(name).take(first_rows).to_pylist() for name in names),
+    ):
+        # rows of annotations of unknown images have no image fields
+        if image_id in known_ids or file_name is None:
+            continue
+
+        known_ids.add(image_id)
+        dataset._add_image(
+            Image(
+                id=image_id,
+                file_name=file_name,
+                **dict(zip(names[1:], values)),
+                dataset=dataset,
+            )
+        )
+
+
+def _add_annotations(dataset: "COCO", batch: Any) -> None:
+    count = batch.num_rows
+    names = batch.schema.names
+
+    ids = batch.column("id").to_numpy()
+    image_ids = batch.column("image_id").to_numpy()
+    category_ids = batch.column("category_id").to_numpy()
+    iscrowd = batch.column("iscrowd").to_numpy(zero_copy_only=False)
+    areas = batch.column("area").to_numpy()
+    bboxes = np.stack(
+        [field.to_numpy() for field in batch.column("bbox").flatten()], axis=1
+    )
+
+    segmentations: List[Any] = [[]] * count
+    has_polygons = np.zeros(count, dtype=bool)
+
+    if "rle" in names:
+        for position, rle in enumerate(batch.column("rle").to_pylist()):
+            if rle is not None:
+                counts = (
+                    rle["runs"] if rle["counts"] is None else rle["counts"].decode()
+                )
+                segmentations[position] = {"size": rle["size"], "counts": counts}
+
+    if "segmentation" in names:
+        polygons = batch.column("segmentation")
+        polygon_counts = np.diff(_list_offsets(polygons))
+        has_polygons = polygon_counts > 0
+
+        flat_polygons = polygons.flatten()
+        point_counts = np.diff(_list_offsets(flat_polygons)) // 2
+        points = flat_polygons.flatten().to_numpy().reshape(-1, 2)
+
+        polygon_indexes = dataset._polygons.extend_arrays(
+            points, point_counts, polygon_counts
+        )
+
+    has_keypoints = np.zeros(count, dtype=bool)
+
+    if "keypoints" in names:
+        keypoint_column = batch.column("keypoints")
+        has_keypoints = keypoint_column.is_valid().to_numpy(zero_copy_only=False)
+
+        keypoint_indexes = dataset._keypoints.extend_arrays(
+            keypoint_column.flatten().to_numpy().reshape(-1, 3),
+            np.diff(_list_offsets(keypoint_column)) // 3,
+        )
+
+    num_keypoints = (
+        batch.column("num_keypoints").to_pylist()
+        if "num_keypoints" in names
+        else [None] * count
+    )
+    extras = batch.column("extra").to_pylist() if "extra" in names else [None] * count
+
+    for position, values in enumerate(
+        zip(
+            ids.tolist(),
+            image_ids.tolist(),
+            category_ids.tolist(),
+            iscrowd.tolist(),
+            bboxes.tolist(),
+            areas.tolist(),
+        )
+    ):
+        id, image_id, category_id, crowd, bbox, area = values
+        row_extra = extras[position]
+        if row_extra is None:
+            extra = {}
+        elif isinstance(row_extra, str):
+            extra = json.loads(row_extra)
+        else:
+            # struct columns have fields of all extras, so missing ones are read as nulls
+            extra = {
+                key: value for key, value in row_extra.items() if value is not None
+            }
+
+        annotation = Annotation(
+            id=id,
+            image_id=image_id,
+            category_id=category_id,
+            iscrowd=crowd,
+            segmentation=segmentations[position],
+            bbox=bbox,
+            area=area,
+            dataset=dataset,
+            num_keypoints=num_keypoints[position],
+            **extra,
+        )
+
+        if has_polygons[position]:
+            annotation._attach_polygons(polygon_indexes[position])
+
+        if has_keypoints[position]:
+            annotation._attach_keypoints(keypoint_indexes[position])
+
+        dataset._add_annotation(annotation)
+
+
+def load_arrow(
+    dataset: "COCO", table: "pyarrow.Table", batch_size: int = 65_536
+) -> None:
+    """
+    Fill an empty dataset from an Arrow table built by to_arrow()
+
+    :param dataset: Empty in-memory COCO dataset
+    :param table: Arrow table (it may miss optional columns)
+    :param batch_size: Number of rows converted at once
+    """
+    _load_batches(dataset, table.schema, table.to_batches(max_chunksize=batch_size))
+
+
+def load_parquet(
+    dataset: "COCO",
+    parquet_file: PathLike,
+    columns: Optional[Sequence[str]] = None,
+    batch_size: int = 65_536,
+) -> None:
+    """
+    Fill an empty dataset from a Parquet file written by export_parquet().
+    Row groups are streamed, so only one batch of rows is kept in memory besides the dataset
+
+    :param dataset: Empty in-memory COCO dataset
+    :param parquet_file: Path to the Parquet file
+    :param columns: Optional columns to read (e.g. segmentation, keypoints or extra). All columns by default
+    :param batch_size: Number of rows read at once
+    """
+    pa = _pyarrow()
+
+    file = pa.parquet.ParquetFile(parquet_file)
+    schema = file.schema_arrow
+
+    if columns is not None:
+        unknown = set(columns) - set(OPTIONAL_COLUMNS) - set(REQUIRED_COLUMNS)
+
+        if unknown:
+            raise ValueError(
+                f"Unknown columns: {', '.join(sorted(unknown))}. Optional columns are {', '.join(OPTIONAL_COLUMNS)}"
+            )
+
+    read_columns = [
+        *REQUIRED_COLUMNS,
+        *(
+            name
+            for name in OPTIONAL_COLUMNS
+            if name in schema.names and (columns is None or name in columns)
+        ),
+    ]
+
+    _load_batches(
+        dataset,
+        schema,
+        file.iter_batches(batch_size=batch_size, columns=read_columns),
+    )
+
+
+def _load_batches(dataset: "COCO", schema: Any, batches: Any) -> None:
+    metadata = schema.metadata or {}
+
+    if METADATA_KEY not in metadata:
+        raise ValueError("The table hasn't been written by coconutools")
+
+    header = json.loads(metadata[METADATA_KEY])
+    dataset._build_header({**header, "images": []})
+
+    known_ids: Set[int] = set()
+
+    for batch in batches:
+        image_ids = batch.column("image_id").to_numpy()
+        _add_images(dataset, batch, image_ids, known_ids)
+
+        annotation_rows = batch.column("id").is_valid()
+        _add_annotations(dataset, batch.filter(annotation_rows))
+
+    dataset._columns = None
@@ -0,0 +1,172 @@
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import PurePath
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+import numpy as np
+
+from coconutools.images import Image
+
+if TYPE_CHECKING:
+    from coconutools.dataset import COCO
+
+FileT = Tuple[str, str]
+ItemT = TypeVar("ItemT")
+
+
+def image_chunks(
+    dataset: "COCO", chunk_size: int = 1024
+) -> Iterator[Tuple[List[Image], np.ndarray, np.ndarray]]:
+    """
+    Iterate over dataset images in chunks together with their annotation positions.
+    Annotations are grouped by images once (via the columnar index) instead of scanning them per image
+
+    :return: Chunk images, positions of their annotations (grouped by image) and annotation counts per image
+    """
+    columns = dataset._get_columns()
+    images = dataset.images
+
+    for chunk_start in range(0, len(images), chunk_size):
+        chunk_end = chunk_start + chunk_size
+        chunk_images = images[chunk_start:chunk_end]
+        image_positions = [columns.image_positions(image.id) for image in chunk_images]
+
+        yield (
+            chunk_images,
+            np.concatenate(image_positions or [np.empty(0, np.int64)]),
+            np.fromiter(
+                (len(positions) for positions in image_positions),
+                np.int64,
+                len(image_positions),
+            ),
+        )
+
+
+def mirrored_path(out_dir: str, file_name: str, extension: str) -> str:
+    """
+    Path of a file mirroring an image path (relative to the image directory) with another extension.
+    Absolute image paths are made relative, so the file always stays in the output directory
+
+    :param out_dir: Output directory
+    :param file_name: Image file name
+    :param extension: Extension of the mirrored file (with the leading dot)
+    :return: Path of the mirrored file
+    """
+    path = PurePath(file_name)
+    parts = path.parts[1:] if path.anchor else path.parts
+
+    if ".." in parts or not parts:
+        raise ValueError(
+            f"Image file name {file_name} points outside of the image directory"
+        )
+
+    return os.path.join(out_dir, os.path.splitext(os.path.join(*parts))[0] + extension)
+
+
+def claim_path(claimed: Dict[str, str], path: str, file_name: str) -> str:
+    """
+    Register the mirrored file of an image and fail when another image maps to it (a.jpg and a.png)
+
+    :param claimed: Mirrored paths and their image file names (updated in place)
+    :return: Mirrored path
+    """
+    other = claimed.setdefault(path, file_name)
+
+    if other != file_name:
+        raise ValueError(f"Images {other} and {file_name} map to the same file {path}")
+
+    return path
+
+
+def _write_batch(files: List[FileT]) -> None:
+    for path, content in files:
+        with open(path, "w") as output:
+            output.write(content)
+
+
+def write_files(
+    files: List[FileT],
+    executor: Optional[Executor] = None,
+    created_dirs: Optional[Set[str]] = None,
+    batch_size: int = 64,
+) -> int:
+    """
+    Write small text files (concurrently when an executor is given).
+    Parent directories are created once per call and files are handed to workers in batches,
+    so the per-file overhead is a single open/write/close
+
+    :param files: (path, content) pairs
+    :param executor: Thread pool to write files in
+    :param created_dirs: Directories known to exist (updated in place)
+    :param batch_size: Number of files written by a worker at once
+    :return: Number of written files
+    """
+    created_dirs = set() if created_dirs is None else created_dirs
+
+    for directory in {os.path.dirname(path) for path, _ in files} - created_dirs:
+        os.makedirs(directory, exist_ok=True)
+        created_dirs.add(directory)
+
+    if executor is None:
+        _write_batch(files)
+    else:
+        # consume results to propagate write errors
+        list(executor.map(_write_batch, batched(files, batch_size)))
+
+    return len(files)
+
+
+@contextmanager
+def file_writer(workers: Optional[int] = None) -> Iterator[Optional[Executor]]:
+    """
+    Create a thread pool for write_files() (or nothing when the work should be done in the current thread)
+    """
+    if not workers or workers <= 1:
+        yield None
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        yield executor
+
+
+def scan_files(root: str, extensions: Tuple[str, ...]) -> List[str]:
+    """
+    Recursively find files with the given extensions
+
+    :param root: Directory to scan
+    :param extensions: Lowercase file extensions (with the leading dot)
+    :return: Sorted file paths relative to the root (with forward slashes)
+    """
+    found: List[str] = []
+    directories = [""]
+
+    while directories:
+        directory = directories.pop()
+
+        with os.scandir(os.path.join(root, directory)) as entries:
+            for entry in entries:
+                path = f"{directory}/{entry.name}" if directory else entry.name
+
+                if entry.is_dir():
+                    directories.append(path)
+                elif os.path.splitext(entry.name)[1].lower() in extensions:
+                    found.append(path)
+
+    return sorted(found)
+
+
+def batched(items: List[ItemT], batch_size: int) -> Iterator[List[ItemT]]:
+    for start in range(0, len(items), batch_size):
+        end = start + batch_size
+
+        yield items[start:end]
@@ -0,0 +1,74 @@
+import struct
+from typing import BinaryIO, Optional, Tuple
+
+SizeT = Tuple[int, int]
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+GIF_SIGNATURES = (b"GIF87a", b"GIF89a")
+
+# JPEG start-of-frame markers (all SOFn except DHT, JPG and DAC ones)
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _jpeg_size(file: BinaryIO) -> Optional[SizeT]:
+    file.seek(2)
+
+    while True:
+        marker = file.read(2)
+
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+
+        # markers may be padded with any number of 0xFF bytes
+        while marker[1] == 0xFF:
+            marker = marker[1:] + file.read(1)
+
+        if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+            continue  # standalone markers don't have a segment length
+
+        header = file.read(2)
+
+        if len(header) < 2:
+            return None
+
+        (length,) = struct.unpack(">H", header)
+
+        if marker[1] in JPEG_SOF_MARKERS:
+            frame = file.read(5)
+
+            if len(frame) < 5:
+                return None
+
+            height, width = struct.unpack(">xHH", frame)
+
+            return width, height
+
+        file.seek(length - 2, 1)
+
+
+def probe_image_size(path: str) -> Optional[SizeT]:
+    """
+    Read image width and height from the file header without decoding the image.
+    PNG, JPEG, GIF and BMP images are supported
+
+    :param path: Image path
+    :return: (width, height) or None if the format is not recognized
+    """
+    with open(path, "rb") as file:
+        head = file.read(26)
+
+        if head.startswith(PNG_SIGNATURE) and len(head) >= 24:
+            return struct.unpack(">II", head[16:24])
+
+        if head[:6] in GIF_SIGNATURES and len(head) >= 10:
+            return struct.unpack("<HH", head[6:10])
+
+        if head.startswith(b"BM") and len(head) >= 26:
+            width, height = struct.unpack("<ii", head[18:26])
+
+            return width, abs(height)  # top-down bitmaps have negative heights
+
+        if head.startswith(b"\xff\xd8"):
+            return _jpeg_size(file)
+
+    return None
@@ -0,0 +1,367 @@
+"""
+SQLite storage of datasets for ad-hoc SQL querying.
+
+Every COCO node gets its own table. Nested values (segmentations, keypoints, category keypoint names
+and skeletons, custom annotation fields) are kept as JSON text, so they can be queried with SQLite JSON functions
+"""
+
+import json
+import os
+import sqlite3
+from itertools import islice
+from os import PathLike
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from coconutools.writers import _default
+
+if TYPE_CHECKING:
+    from coconutools.dataset import COCO
+
+RowT = Tuple[Any, ...]
+
+SCHEMA = """
+CREATE TABLE info (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE licenses (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    url TEXT
+);
+CREATE TABLE categories (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    supercategory TEXT,
+    keypoints TEXT,
+    skeleton TEXT
+);
+CREATE TABLE images (
+    id INTEGER PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    coco_url TEXT,
+    flickr_url TEXT,
+    date_captured TEXT,
+    license INTEGER
+);
+CREATE TABLE annotations (
+    id INTEGER PRIMARY KEY,
+    image_id INTEGER NOT NULL,
+    category_id INTEGER NOT NULL,
+    iscrowd INTEGER NOT NULL,
+    area REAL NOT NULL,
+    bbox_x REAL NOT NULL,
+    bbox_y REAL NOT NULL,
+    bbox_width REAL NOT NULL,
+    bbox_height REAL NOT NULL,
+    segmentation TEXT,
+    keypoints TEXT,
+    num_keypoints INTEGER,
+    extra TEXT
+);
+"""
+
+# created after the bulk insert, which is faster than maintaining them row by row
+INDEXES = """
+CREATE INDEX annotations_image_id ON annotations (image_id);
+CREATE INDEX annotations_category_id ON annotations (category_id);
+CREATE INDEX annotations_area ON annotations (area);
+CREATE INDEX images_file_name ON images (file_name);
+"""
+
+IMAGE_COLUMNS = (
+    "id",
+    "file_name",
+    "width",
+    "height",
+    "coco_url",
+    "flickr_url",
+    "date_captured",
+    "license",
+)
+
+
+def _dumps(value: Any) -> Optional[str]:
+    return None if value is None else json.dumps(value, default=_default)
+
+
+def _loads(value: Optional[str]) -> Any:
+    return None if value is None else json.loads(value)
+
+
+def _chunks(rows: Iterable[RowT], chunk_size: int) -> Iterator[List[RowT]]:
+    iterator = iter(rows)
+
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+
+        if not chunk:
+            return
+
+        yield chunk
+
+
+def _annotation_rows(dataset: "COCO", chunk_size: int) -> Iterator[RowT]:
+    columns = dataset._get_columns()
+    annotations = dataset.annotations
+
+    for start in range(0, len(columns), chunk_size):
+        end = start + chunk_size
+
+        # nested lists of stored polygons and keypoints are built for the whole chunk at once
+        polygon_indexes = columns.polygon_indexes[start:end]
+        polygons = dataset._polygons.take(polygon_indexes).tolist()
+        has_polygons = (polygon_indexes >= 0).tolist()
+
+        keypoint_indexes = columns.keypoint_indexes[start:end]
+        keypoints = dataset._keypoints.take(keypoint_indexes).tolist()
+        has_keypoints = (keypoint_indexes >= 0).tolist()
+
+        for position, annotation in enumerate(annotations[start:end]):
+            bbox = annotation.bbox
+
+            yield (
+                annotation.id,
+                annotation.image_id,
+                annotation.category_id,
+                int(annotation.iscrowd),
+                annotation.area,
+                bbox.x,
+                bbox.y,
+                bbox.width,
+                bbox.height,
+                _dumps(
+                    polygons[position]
+                    if has_polygons[position]
+                    else annotation.segmentation
+                ),
+                (
+                    _dumps(keypoints[position])
+                    if has_keypoints[position]
+                    else _dumps(annotation._keypoint_dict().get("keypoints"))
+                ),
+                annotation.num_keypoints,
+                _dumps(annotation.extra) if annotation.extra else None,
+            )
+
+
+def export_sqlite(
+    dataset: "COCO", database_file: PathLike, chunk_size: int = 100_000
+) -> None:
+    """
+    Write the dataset to a new SQLite database (an existing file is replaced).
+    Rows are inserted in bulk in one transaction and indexes on annotation image IDs, category IDs and areas
+    are built at the end
+
+    :param dataset: COCO dataset
+    :param database_file: Path to the database file
+    :param chunk_size: Number of rows inserted at once
+    """
+    if os.path.exists(database_file):
+        os.remove(database_file)
+
+    connection = sqlite3.connect(database_file)
+
+    try:
+        # the database is written from scratch, so there is nothing to recover on failures
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.executescript(SCHEMA)
+
+        tables: Sequence[Tuple[str, int, Iterable[RowT]]] = (
+            (
+                "info",
+                2,
+                ((key, _dumps(value)) for key, value in dataset.info.to_dict().items()),
+            ),
+            (
+                "licenses",
+                3,
+                (
+                    (licence.id, licence.name, licence.url)
+                    for licence in dataset.licences
+                ),
+            ),
+            (
+                "categories",
+                5,
+                (
+                    (
+                        category.id,
+                        category.name,
+                        category.supercategory,
+                        _dumps(category.keypoints),
+                        _dumps(category.skeleton),
+                    )
+                    for category in dataset.categories
+                ),
+            ),
+            (
+                "images",
+                len(IMAGE_COLUMNS),
+                (
+                    (
+                        image.id,
+                        image.file_name,
+                        image.width,
+                        image.height,
+                        image.coco_url,
+                        image.flickr_url,
+                        (
+                            None
+                            if image.date_captured is None
+                            else str(image.date_captured)
+                        ),
+                        image.license_id,
+                    )
+                    for image in dataset.images
+                ),
+            ),
+            ("annotations", 13, _annotation_rows(dataset, chunk_size)),
+        )
+
+        with connection:
+            for table, column_count, rows in tables:
+                placeholders = ", ".join("?" * column_count)
+                statement = f"INSERT INTO {table} VALUES ({placeholders})"
+
+                for chunk in _chunks(rows, chunk_size):
+                    connection.executemany(statement, chunk)
+
+            connection.executescript(INDEXES)
+    finally:
+        connection.close()
+
+
+def _annotation_dict(row: RowT) -> Dict[str, Any]:
+    (
+        id,
+        image_id,
+        category_id,
+        iscrowd,
+        area,
+        x,
+        y,
+        width,
+        height,
+        segmentation,
+        keypoints,
+        num_keypoints,
+        extra,
+    ) = row
+
+    annotation: Dict[str, Any] = {
+        **(_loads(extra) or {}),
+        "id": id,
+        "image_id": image_id,
+        "category_id": category_id,
+        "iscrowd": iscrowd,
+        "area": area,
+        "bbox": (x, y, width, height),
+        "segmentation": _loads(segmentation),
+    }
+
+    if keypoints is not None:
+        annotation["keypoints"] = _loads(keypoints)
+        annotation["num_keypoints"] = num_keypoints
+
+    return annotation
+
+
+def load_sqlite(
+    dataset: "COCO",
+    database_file: PathLike,
+    where: Optional[str] = None,
+    parameters: Sequence[Any] = (),
+    chunk_size: int = 100_000,
+) -> None:
+    """
+    Fill an empty dataset from a SQLite database written by export_sqlite() (records are loaded in the order of IDs).
+    Only annotations matching the condition and their images are loaded (categories and licenses are loaded fully)
+
+    :param dataset: Empty in-memory COCO dataset
+    :param database_file: Path to the database file
+    :param where: SQL condition on the annotations table (e.g. "category_id = ? AND area > ?")
+    :param parameters: Values of the condition placeholders
+    :param chunk_size: Number of annotations built at once
+    """
+    if not os.path.exists(database_file):
+        raise FileNotFoundError(f"SQLite database {database_file} doesn't exist")
+
+    annotation_filter = "" if where is None else f" WHERE {where}"
+    image_filter = (
+        ""
+        if where is None
+        else f" WHERE id IN (SELECT image_id FROM annotations{annotation_filter})"
+    )
+
+    connection = sqlite3.connect(f"file:{os.fspath(database_file)}?mode=ro", uri=True)
+
+    try:
+        info = {
+            key: _loads(value)
+            for key, value in connection.execute("SELECT * FROM info")
+        }
+        licenses = [
+            {"id": id, "name": name, "url": url}
+            for id, name, url in connection.execute(
+                "SELECT * FROM licenses ORDER BY id"
+            )
+        ]
+        categories = [
+            {
+                "id": id,
+                "name": name,
+                "supercategory": supercategory,
+                "keypoints": _loads(keypoints),
+                "skeleton": _loads(skeleton),
+            }
+            for id, name, supercategory, keypoints, skeleton in connection.execute(
+                "SELECT * FROM categories ORDER BY id"
+            )
+        ]
+        images = [
+            {
+                column: value
+                for column, value in zip(IMAGE_COLUMNS, row)
+                if value is not None or column in ("id", "file_name")
+            }
+            for row in connection.execute(
+                f"SELECT * FROM images{image_filter} ORDER BY id", parameters
+            )
+        ]
+
+        dataset._build_header(
+            {
+                "info": info,
+                "licenses": licenses,
+                "categories": categories,
+                "images": images,
+            }
+        )
+
+        cursor = connection.execute(
+            f"SELECT * FROM annotations{annotation_filter} ORDER BY id", parameters
+        )
+
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+
+            if not rows:
+                break
+
+            dataset._build_annotations([_annotation_dict(row) for row in rows])
+    finally:
+        connection.close()
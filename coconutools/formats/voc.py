@@ -0,0 +1,290 @@
+import os
+from functools import partial
+from os import PathLike
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from coconutools.annotations import Annotation
+from coconutools.formats.files import (
+    FileT,
+    batched,
+    claim_path,
+    file_writer,
+    image_chunks,
+    mirrored_path,
+    scan_files,
+    write_files,
+)
+from coconutools.formats.headers import probe_image_size
+from coconutools.images import Category, Image
+from coconutools.parallel import ordered_map
+
+if TYPE_CHECKING:
+    from coconutools.dataset import COCO
+
+# file name, image size and objects (name, difficult, xmin, ymin, xmax, ymax) of one image
+VOCObjectT = Tuple[str, bool, float, float, float, float]
+VOCAnnotationT = Tuple[str, int, int, List[VOCObjectT]]
+
+OBJECT_TEMPLATE = (
+    "  <object>\n"
+    "    <name>{name}</name>\n"
+    "    <pose>Unspecified</pose>\n"
+    "    <truncated>0</truncated>\n"
+    "    <difficult>{difficult}</difficult>\n"
+    "    <bndbox>\n"
+    "      <xmin>{xmin}</xmin>\n"
+    "      <ymin>{ymin}</ymin>\n"
+    "      <xmax>{xmax}</xmax>\n"
+    "      <ymax>{ymax}</ymax>\n"
+    "    </bndbox>\n"
+    "  </object>\n"
+)
+
+ANNOTATION_TEMPLATE = (
+    "<annotation>\n"
+    "  <folder>{folder}</folder>\n"
+    "  <filename>{filename}</filename>\n"
+    "  <size>\n"
+    "    <width>{width}</width>\n"
+    "    <height>{height}</height>\n"
+    "    <depth>3</depth>\n"
+    "  </size>\n"
+    "  <segmented>0</segmented>\n"
+    "{objects}"
+    "</annotation>\n"
+)
+
+
+def annotation_path(out_dir: str, file_name: str) -> str:
+    """
+    Annotation files mirror image paths (relative to the image directory) with the .xml extension
+    """
+    return mirrored_path(out_dir, file_name, ".xml")
+
+
+def export_voc(
+    dataset: "COCO",
+    out_dir: PathLike,
+    workers: Optional[int] = None,
+    chunk_size: int = 1024,
+) -> int:
+    """
+    Export dataset to the Pascal VOC format: one XML file per image.
+    Boxes are written in 1-based pixel coordinates, crowd annotations are marked as difficult
+
+    :param dataset: COCO dataset
+    :param out_dir: Output directory
+    :param workers: Number of writer threads
+    :param chunk_size: Number of images processed at once
+    :return: Number of written annotation files
+    """
+    output_dir = str(out_dir)
+
+    category_names = {
+        category.id: escape(category.name) for category in dataset.categories
+    }
+
+    columns = dataset._get_columns()
+    created_dirs: Set[str] = set()
+    annotation_paths: Dict[str, str] = {}
+    written = 0
+
+    with file_writer(workers) as executor:
+        for images, positions, counts in image_chunks(dataset, chunk_size):
+            bboxes = columns.bboxes[positions].astype(np.float64)
+            corners = np.rint(
+                np.hstack((bboxes[:, :2], bboxes[:, :2] + bboxes[:, 2:]))
+            ).astype(np.int64)
+            corners[:, :2] += 1
+
+            objects = [
+                OBJECT_TEMPLATE.format(
+                    name=category_names.get(category_id, str(category_id)),
+                    difficult=int(iscrowd),
+                    xmin=xmin,
+                    ymin=ymin,
+                    xmax=xmax,
+                    ymax=ymax,
+                )
+                for category_id, iscrowd, (xmin, ymin, xmax, ymax) in zip(
+                    columns.category_ids[positions].tolist(),
+                    columns.iscrowd[positions].tolist(),
+                    corners.tolist(),
+                )
+            ]
+
+            files: List[FileT] = []
+            ends = np.cumsum(counts)
+
+            for image, start, end in zip(
+                images, (ends - counts).tolist(), ends.tolist()
+            ):
+                folder, filename = os.path.split(image.file_name)
+
+                content = ANNOTATION_TEMPLATE.format(
+                    folder=escape(os.path.basename(folder)),
+                    filename=escape(filename),
+                    width=image.width,
+                    height=image.height,
+                    objects="".join(objects[start:end]),
+                )
+                path = annotation_path(output_dir, image.file_name)
+                files.append(
+                    (claim_path(annotation_paths, path, image.file_name), content)
+                )
+
+            written += write_files(files, executor, created_dirs=created_dirs)
+
+    return written
+
+
+def _size(value: Optional[str]) -> int:
+    return int(float(value)) if value else 0
+
+
+def parse_annotation(path: str) -> VOCAnnotationT:
+    """
+    Parse a Pascal VOC XML annotation
+
+    :return: Image file name (as written in the annotation), width, height (0 if missing) and objects
+    """
+    root = ElementTree.parse(path).getroot()
+
+    objects: List[VOCObjectT] = []
+
+    for node in root.iter("object"):
+        box = node.find("bndbox")
+
+        if box is None:
+            continue
+
+        objects.append(
+            (
+                (node.findtext("name") or "").strip(),
+                node.findtext("difficult", "0").strip() == "1",
+                float(box.findtext("xmin") or 0),
+                float(box.findtext("ymin") or 0),
+                float(box.findtext("xmax") or 0),
+                float(box.findtext("ymax") or 0),
+            )
+        )
+
+    return (
+        (root.findtext("filename") or "").strip(),
+        _size(root.findtext("size/width")),
+        _size(root.findtext("size/height")),
+        objects,
+    )
+
+
+def _read_annotations(
+    batch: List[str], annotation_root: str, image_root: Optional[str]
+) -> List[VOCAnnotationT]:
+    results: List[VOCAnnotationT] = []
+
+    for annotation_file in batch:
+        filename, width, height, objects = parse_annotation(
+            os.path.join(annotation_root, annotation_file)
+        )
+
+        # annotations mirror image paths, while the filename node keeps the base name only
+        file_name = os.path.join(
+            os.path.dirname(annotation_file),
+            filename or os.path.splitext(os.path.basename(annotation_file))[0],
+        ).replace(os.sep, "/")
+
+        if image_root is not None and not (width and height):
+            width, height = probe_image_size(os.path.join(image_root, file_name)) or (
+                width,
+                height,
+            )
+
+        results.append((file_name, width, height, objects))
+
+    return results
+
+
+def load_voc(
+    dataset: "COCO",
+    annotation_dir: PathLike,
+    image_dir: Optional[PathLike] = None,
+    categories: Optional[List[str]] = None,
+    probe_sizes: bool = False,
+    workers: Optional[int] = None,
+    batch_size: int = 256,
+) -> None:
+    """
+    Fill an empty dataset with Pascal VOC annotations.
+    Boxes are converted from 1-based pixel coordinates, difficult objects are marked as crowd ones
+
+    :param dataset: Empty in-memory COCO dataset
+    :param annotation_dir: Directory with XML annotations
+    :param image_dir: Directory with images (used to probe image sizes)
+    :param categories: Category names in the order of category IDs.
+        Other object names get IDs in the order they are met in annotations
+    :param probe_sizes: Read image sizes from image headers when they are missing in annotations
+        (requires the image directory)
+    :param workers: Number of worker processes to parse files in parallel
+    :param batch_size: Number of annotation files handed to a worker at once
+    """
+    if probe_sizes and image_dir is None:
+        raise ValueError(
+            "Image sizes can be probed only when the image directory is given"
+        )
+
+    annotation_root = str(annotation_dir)
+    read_annotations = partial(
+        _read_annotations,
+        annotation_root=annotation_root,
+        image_root=str(image_dir) if probe_sizes else None,
+    )
+
+    category_ids: Dict[str, int] = {}
+
+    for name in categories or []:
+        category_ids.setdefault(name, len(category_ids) + 1)
+
+    annotation_files = scan_files(annotation_root, (".xml",))
+    image_count = annotation_count = 0
+
+    for batch in ordered_map(
+        read_annotations, batched(annotation_files, batch_size), workers=workers
+    ):
+        for file_name, width, height, objects in batch:
+            image_count += 1
+
+            dataset._add_image(
+                Image(
+                    id=image_count,
+                    file_name=file_name,
+                    width=width,
+                    height=height,
+                    dataset=dataset,
+                )
+            )
+
+            for name, difficult, xmin, ymin, xmax, ymax in objects:
+                category_id = category_ids.setdefault(name, len(category_ids) + 1)
+                x, y = xmin - 1, ymin - 1
+                box_width, box_height = xmax - x, ymax - y
+                annotation_count += 1
+
+                dataset._add_annotation(
+                    Annotation(
+                        id=annotation_count,
+                        image_id=image_count,
+                        category_id=category_id,
+                        iscrowd=difficult,
+                        segmentation=[],
+                        bbox=(x, y, box_width, box_height),
+                        area=box_width * box_height,
+                        dataset=dataset,
+                    )
+                )
+
+    for name, category_id in category_ids.items():
+        dataset._add_category(Category(id=category_id, name=name))
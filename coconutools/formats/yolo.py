@@ -0,0 +1,243 @@
+import os
+from functools import partial
+from os import PathLike
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from coconutools.annotations import Annotation
+from coconutools.boxes import BoxFormat, clip_boxes, convert_boxes, normalize_boxes
+from coconutools.columns import id_positions
+from coconutools.exceptions import DatasetFormatNotValid
+from coconutools.formats.files import (
+    FileT,
+    batched,
+    claim_path,
+    file_writer,
+    image_chunks,
+    mirrored_path,
+    scan_files,
+    write_files,
+)
+from coconutools.formats.headers import SizeT, probe_image_size
+from coconutools.images import Category, Image
+from coconutools.parallel import ordered_map
+
+if TYPE_CHECKING:
+    from coconutools.dataset import COCO
+
+CLASSES_FILE = "classes.txt"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tif", ".tiff", ".webp")
+
+# image size and (K, 5) array of labels (class, cx, cy, w, h) of one image
+ImageLabelsT = Tuple[Optional[SizeT], np.ndarray]
+
+
+def label_path(out_dir: str, file_name: str) -> str:
+    """
+    Label files mirror image paths (relative to the image directory) with the .txt extension
+    """
+    return mirrored_path(out_dir, file_name, ".txt")
+
+
+def export_yolo(
+    dataset: "COCO",
+    out_dir: PathLike,
+    workers: Optional[int] = None,
+    chunk_size: int = 1024,
+) -> int:
+    """
+    Export dataset to the YOLO format: one label file per image with "<class> <cx> <cy> <w> <h>" lines
+    (box coordinates are normalized by image sizes) and classes.txt with category names
+    (class indexes follow the order of COCO.categories)
+
+    :param dataset: COCO dataset
+    :param out_dir: Output directory
+    :param workers: Number of writer threads
+    :param chunk_size: Number of images processed at once
+    :return: Number of written label files
+    """
+    output_dir = str(out_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    with open(os.path.join(output_dir, CLASSES_FILE), "w") as classes_file:
+        classes_file.writelines(f"{category.name}\n" for category in dataset.categories)
+
+    category_ids = np.array([category.id for category in dataset.categories], np.int64)
+
+    columns = dataset._get_columns()
+    created_dirs: Set[str] = {output_dir}
+    label_paths: Dict[str, str] = {}
+    written = 0
+
+    with file_writer(workers) as executor:
+        for images, positions, counts in image_chunks(dataset, chunk_size):
+            widths = columns.image_sizes[positions, 0]
+            heights = columns.image_sizes[positions, 1]
+
+            # boxes crossing image borders are clipped, YOLO loaders reject coordinates outside of [0, 1]
+            boxes = normalize_boxes(
+                convert_boxes(
+                    clip_boxes(columns.bboxes[positions], widths, heights),
+                    BoxFormat.xywh,
+                    BoxFormat.cxcywh,
+                ),
+                widths,
+                heights,
+            )
+            classes = id_positions(category_ids, columns.category_ids[positions])
+
+            # annotations of unknown categories can't be represented in YOLO and are skipped
+            lines = [
+                "%d %.6f %.6f %.6f %.6f\n" % (label, *box) if label >= 0 else ""
+                for label, box in zip(classes.tolist(), boxes.tolist())
+            ]
+
+            files: List[FileT] = []
+            ends = np.cumsum(counts)
+
+            for image, start, end in zip(
+                images, (ends - counts).tolist(), ends.tolist()
+            ):
+                files.append(
+                    (
+                        claim_path(
+                            label_paths,
+                            label_path(output_dir, image.file_name),
+                            image.file_name,
+                        ),
+                        "".join(lines[start:end]),
+                    )
+                )
+
+            written += write_files(files, executor, created_dirs=created_dirs)
+
+    return written
+
+
+def parse_labels(content: str) -> np.ndarray:
+    """
+    Parse a YOLO label file. Only the first 5 values of every line are used,
+    so polygon labels are read as their class and the first point
+
+    :return: (K, 5) float64 array of class indexes and normalized cxcywh boxes
+    """
+    lines = [line.split()[:5] for line in content.splitlines()]
+
+    return np.array([line for line in lines if len(line) == 5], np.float64).reshape(
+        -1, 5
+    )
+
+
+def _read_labels(batch: List[Tuple[str, str]], probe_sizes: bool) -> List[ImageLabelsT]:
+    results: List[ImageLabelsT] = []
+
+    for image_path, label_path in batch:
+        size = probe_image_size(image_path) if probe_sizes else None
+
+        try:
+            with open(label_path) as label_file:
+                labels = parse_labels(label_file.read())
+        except FileNotFoundError:
+            labels = np.empty((0, 5), np.float64)  # images without objects
+
+        results.append((size, labels))
+
+    return results
+
+
+def load_yolo(
+    dataset: "COCO",
+    label_dir: PathLike,
+    image_dir: PathLike,
+    classes: Optional[List[str]] = None,
+    image_size: Optional[SizeT] = None,
+    workers: Optional[int] = None,
+    batch_size: int = 256,
+) -> None:
+    """
+    Fill an empty dataset with YOLO labels. Images are found in the image directory,
+    their label files are expected to mirror image paths in the label directory with the .txt extension
+
+    :param dataset: Empty in-memory COCO dataset
+    :param label_dir: Directory with label files (and optionally classes.txt)
+    :param image_dir: Directory with images
+    :param classes: Class names (read from classes.txt by default)
+    :param image_size: (width, height) of all images. Image sizes are read from image headers when not given
+    :param workers: Number of worker processes to parse files in parallel
+    :param batch_size: Number of images handed to a worker at once
+    """
+    label_root, image_root = str(label_dir), str(image_dir)
+    file_names = scan_files(image_root, IMAGE_EXTENSIONS)
+
+    if classes is None and os.path.exists(os.path.join(label_root, CLASSES_FILE)):
+        with open(os.path.join(label_root, CLASSES_FILE)) as classes_file:
+            classes = [name.strip() for name in classes_file if name.strip()]
+
+    paths = [
+        (os.path.join(image_root, file_name), label_path(label_root, file_name))
+        for file_name in file_names
+    ]
+    read_labels = partial(_read_labels, probe_sizes=image_size is None)
+
+    sizes: List[SizeT] = []
+    image_labels: List[np.ndarray] = []
+
+    for batch in ordered_map(read_labels, batched(paths, batch_size), workers=workers):
+        for size, labels in batch:
+            if size is None:
+                if image_size is None:
+                    raise DatasetFormatNotValid(
+                        f"Size of the image {file_names[len(sizes)]} can't be read from its header"
+                    )
+
+                size = image_size
+
+            sizes.append(size)
+            image_labels.append(labels)
+
+    counts = np.fromiter((len(labels) for labels in image_labels), np.int64)
+    labels = np.concatenate([np.empty((0, 5), np.float64), *image_labels])
+    class_indexes = labels[:, 0].astype(np.int64)
+
+    # denormalize all boxes at once
+    image_sizes = np.repeat(np.array(sizes, np.float64).reshape(-1, 2), counts, axis=0)
+    boxes = convert_boxes(labels[:, 1:], BoxFormat.cxcywh, BoxFormat.xywh).astype(
+        np.float64
+    ) * np.tile(image_sizes, 2)
+
+    class_count = int(class_indexes.max(initial=-1)) + 1
+    names = list(classes or [])
+    names += [str(index) for index in range(len(names), class_count)]
+
+    for index, name in enumerate(names):
+        dataset._add_category(Category(id=index + 1, name=name))
+
+    for image_id, (file_name, (width, height)) in enumerate(zip(file_names, sizes), 1):
+        dataset._add_image(
+            Image(
+                id=image_id,
+                file_name=file_name,
+                width=int(width),
+                height=int(height),
+                dataset=dataset,
+            )
+        )
+
+    image_ids = np.repeat(np.arange(1, len(file_names) + 1), counts)
+
+    for annotation_id, (image_id, class_index, bbox) in enumerate(
+        zip(image_ids.tolist(), class_indexes.tolist(), boxes.tolist()), 1
+    ):
+        dataset._add_annotation(
+            Annotation(
+                id=annotation_id,
+                image_id=image_id,
+                category_id=class_index + 1,
+                iscrowd=False,
+                segmentation=[],
+                bbox=bbox,
+                area=bbox[2] * bbox[3],
+                dataset=dataset,
+            )
+        )
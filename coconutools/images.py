@@ -1,6 +1,6 @@
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 from datetime import datetime
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
 from coconutools.exceptions import DatasetNotReferenced
 
@@ -18,6 +18,9 @@ class License:
     name: str
     url: str
 
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
 
 @dataclass(init=False)
 class Category:
@@ -25,16 +28,48 @@ class Category:
     Image Category
     """
 
-    __slots__ = ("id", "name", "supercategory")
+    __slots__ = ("id", "name", "supercategory", "keypoints", "skeleton")
 
     id: int
     name: str
     supercategory: Optional[str]
 
-    def __init__(self, id: int, name: str, supercategory: Optional[str] = None) -> None:
+    # names of keypoints and 1-based keypoint index pairs connected by limbs (keypoint categories only)
+    keypoints: Optional[List[str]]
+    skeleton: Optional[List[List[int]]]
+
+    def __init__(
+        self,
+        id: int,
+        name: str,
+        supercategory: Optional[str] = None,
+        keypoints: Optional[List[str]] = None,
+        skeleton: Optional[List[List[int]]] = None,
+    ) -> None:
         self.id = id
         self.name = name
         self.supercategory = supercategory
+        self.keypoints = keypoints
+        self.skeleton = skeleton
+
+    @property
+    def num_keypoints(self) -> int:
+        return len(self.keypoints) if self.keypoints else 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        category_dict: Dict[str, Any] = {
+            "id": self.id,
+            "name": self.name,
+            "supercategory": self.supercategory,
+        }
+
+        if self.keypoints is not None:
+            category_dict["keypoints"] = self.keypoints
+
+        if self.skeleton is not None:
+            category_dict["skeleton"] = self.skeleton
+
+        return category_dict
 
 
 @dataclass(init=False)
@@ -83,6 +118,25 @@ class Image:
         self.date_captured = date_captured
         self.license_id = license
 
+    def to_dict(self) -> Dict[str, Any]:
+        image_dict: Dict[str, Any] = {
+            "id": self.id,
+            "file_name": self.file_name,
+            "width": self.width,
+            "height": self.height,
+        }
+
+        for field, value in (
+            ("coco_url", self.coco_url),
+            ("flickr_url", self.flickr_url),
+            ("date_captured", self.date_captured),
+            ("license", self.license_id),
+        ):
+            if value is not None:
+                image_dict[field] = value
+
+        return image_dict
+
     @property
     def license(self) -> Optional[License]:
         if not self.license_id:
@@ -0,0 +1,91 @@
+"""
+Incrementally maintained annotation indexes of mutable datasets.
+
+Annotation IDs are grouped by images and categories in insertion-ordered dicts (used as ordered sets),
+so adding, moving and removing an annotation costs O(1). Removed annotations leave tombstones (None)
+in the annotation list instead of shifting it, and the list is compacted once tombstones take a noticeable part of it
+"""
+
+from typing import Dict, List, Optional
+
+from coconutools.annotations import Annotation
+
+# share of tombstones in the annotation list that triggers its compaction
+COMPACTION_RATIO = 0.25
+
+
+class AnnotationIndex:
+    """
+    Positions of annotations in the dataset annotation list and annotation IDs per image and category
+    """
+
+    def __init__(self) -> None:
+        self.positions: Dict[int, int] = {}
+        self.images: Dict[int, Dict[int, None]] = {}
+        self.categories: Dict[int, Dict[int, None]] = {}
+
+        self.tombstones = 0
+        self.next_id = 1
+
+    @classmethod
+    def from_annotations(cls, annotations: List[Annotation]) -> "AnnotationIndex":
+        index = cls()
+
+        for position, annotation in enumerate(annotations):
+            index.add(annotation, position)
+
+        return index
+
+    def add(self, annotation: Annotation, position: int) -> None:
+        self.positions[annotation.id] = position
+        self.images.setdefault(annotation.image_id, {})[annotation.id] = None
+        self.categories.setdefault(annotation.category_id, {})[annotation.id] = None
+
+        self.next_id = max(self.next_id, annotation.id + 1)
+
+    def remove(self, annotation: Annotation) -> int:
+        """
+        :return: Position of the removed annotation (it's left as a tombstone)
+        """
+        del self.images[annotation.image_id][annotation.id]
+        del self.categories[annotation.category_id][annotation.id]
+
+        self.tombstones += 1
+
+        return self.positions.pop(annotation.id)
+
+    def move(self, annotation: Annotation, image_id: int, category_id: int) -> None:
+        """
+        Regroup an annotation under a new image and category
+        """
+        if image_id != annotation.image_id:
+            del self.images[annotation.image_id][annotation.id]
+            self.images.setdefault(image_id, {})[annotation.id] = None
+
+        if category_id != annotation.category_id:
+            del self.categories[annotation.category_id][annotation.id]
+            self.categories.setdefault(category_id, {})[annotation.id] = None
+
+    def ordered(self, annotation_ids: Dict[int, None]) -> List[int]:
+        """
+        :return: Annotation IDs in the order of the annotation list
+        """
+        return sorted(annotation_ids, key=self.positions.__getitem__)
+
+    def needs_compaction(self, size: int) -> bool:
+        return self.tombstones > 0 and self.tombstones > size * COMPACTION_RATIO
+
+    def compact(self, annotations: List[Optional[Annotation]]) -> List[Annotation]:
+        """
+        Drop tombstones from the annotation list and update annotation positions
+
+        :return: Compacted annotation list
+        """
+        compacted = [annotation for annotation in annotations if annotation is not None]
+
+        self.positions = {
+            annotation.id: position for position, annotation in enumerate(compacted)
+        }
+        self.tombstones = 0
+
+        return compacted
@@ -0,0 +1,245 @@
+"""
+Keypoint storage and Object Keypoint Similarity (OKS)
+"""
+
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from coconutools.segmentations import _append, _concat_ranges, _offsets
+
+# flat [x1, y1, v1, x2, y2, v2, ...] list (v: 0 - not labelled, 1 - labelled but not visible, 2 - visible)
+KeypointsT = Sequence[float]
+
+# per-keypoint standard deviations of the COCO person keypoints (nose, eyes, ears, shoulders, elbows, wrists,
+# hips, knees and ankles)
+COCO_PERSON_SIGMAS = (
+    np.array(
+        [0.26, 0.25, 0.25, 0.35, 0.35, 0.79, 0.79, 0.72, 0.72]
+        + [0.62, 0.62, 1.07, 1.07, 0.87, 0.87, 0.89, 0.89]
+    )
+    / 10.0
+)
+
+
+class KeypointStore:
+    """
+    Compact storage of keypoints.
+
+    Keypoints of all entries are kept in one flat float32 (P, 3) array of (x, y, visibility) rows
+    and entry i consists of keypoints offsets[i]:offsets[i + 1]
+    """
+
+    __slots__ = ("_keypoints", "_offsets", "_keypoint_count", "_count")
+
+    def __init__(
+        self,
+        keypoints: Optional[np.ndarray] = None,
+        offsets: Optional[np.ndarray] = None,
+    ) -> None:
+        self._keypoints = (
+            np.empty((0, 3), dtype=np.float32)
+            if keypoints is None
+            else np.asarray(keypoints, dtype=np.float32).reshape(-1, 3)
+        )
+        self._offsets = (
+            np.zeros(1, dtype=np.int64)
+            if offsets is None
+            else np.asarray(offsets, dtype=np.int64)
+        )
+
+        self._keypoint_count = len(self._keypoints)
+        self._count = len(self._offsets) - 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def keypoints(self) -> np.ndarray:
+        """
+        (P, 3) float32 array of all keypoints
+        """
+        return self._keypoints[: self._keypoint_count]
+
+    @property
+    def offsets(self) -> np.ndarray:
+        """
+        (N + 1,) int64 array of entry offsets into keypoints
+        """
+        return self._offsets[: self._count + 1]
+
+    @property
+    def counts(self) -> np.ndarray:
+        """
+        (N,) int64 array of keypoint numbers per entry
+        """
+        return np.diff(self.offsets)
+
+    def extend(self, keypoint_lists: Sequence[KeypointsT]) -> range:
+        """
+        Append keypoints in bulk (the buffers grow geometrically, so appends are amortized O(1))
+
+        :param keypoint_lists: List of flat [x1, y1, v1, x2, y2, v2, ...] keypoint lists
+        :return: Indexes of the added entries
+        """
+        counts = np.fromiter(
+            (len(keypoints) // 3 for keypoints in keypoint_lists),
+            np.int64,
+            len(keypoint_lists),
+        )
+        keypoints = np.fromiter(
+            (
+                value
+                for keypoints in keypoint_lists
+                for value in keypoints[: len(keypoints) // 3 * 3]
+            ),
+            np.float32,
+            int(counts.sum()) * 3,
+        ).reshape(-1, 3)
+
+        return self.extend_arrays(keypoints, counts)
+
+    def extend_arrays(self, keypoints: np.ndarray, counts: np.ndarray) -> range:
+        """
+        Append keypoints given as flat arrays (e.g. columns of an Arrow table)
+
+        :param keypoints: (P, 3) array of keypoints of all entries
+        :param counts: (N,) array of keypoint numbers per entry
+        :return: Indexes of the added entries
+        """
+        keypoints = np.asarray(keypoints, dtype=np.float32).reshape(-1, 3)
+        counts = np.asarray(counts, dtype=np.int64)
+
+        start = self._count
+
+        self._keypoints = _append(self._keypoints, self._keypoint_count, keypoints)
+        self._offsets = _append(
+            self._offsets, self._count + 1, np.cumsum(counts) + self._keypoint_count
+        )
+
+        self._keypoint_count += len(keypoints)
+        self._count += len(counts)
+
+        return range(start, self._count)
+
+    def get(self, index: int) -> np.ndarray:
+        """
+        :param index: Entry index
+        :return: (K, 3) float32 array of the entry keypoints
+        """
+        start, end = self._offsets[[index, index + 1]].tolist()
+
+        keypoints: np.ndarray = self._keypoints[start:end].copy()
+
+        return keypoints
+
+    def tolist(self) -> List[List[float]]:
+        """
+        Build flat [x1, y1, v1, ...] lists of all entries at once (much faster than get() of every entry)
+
+        :return: List of keypoint lists
+        """
+        keypoints = self.keypoints.ravel().tolist()
+        bounds = (3 * self.offsets).tolist()
+
+        return [keypoints[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def take(self, indexes: np.ndarray) -> "KeypointStore":
+        """
+        Gather a compact store of the given entries (negative indexes produce empty entries)
+
+        :param indexes: Entry indexes
+        :return: A new store with entries aligned to the given indexes
+        """
+        indexes = np.asarray(indexes, dtype=np.int64)
+        valid = indexes >= 0
+        offsets = self.offsets
+
+        # invalid entries are read as the empty range [0, 0)
+        starts = offsets[np.where(valid, indexes, 0)]
+        counts = offsets[np.where(valid, indexes + 1, 0)] - starts
+
+        return KeypointStore(
+            keypoints=self._keypoints[_concat_ranges(starts, counts)],
+            offsets=_offsets(counts),
+        )
+
+    def dense(self, num_keypoints: Optional[int] = None) -> np.ndarray:
+        """
+        Pack entries into one array (shorter entries are padded with not labelled keypoints)
+
+        :param num_keypoints: Number of keypoints per entry (the largest entry size by default)
+        :return: (N, K, 3) float32 array
+        """
+        counts = self.counts
+        size = int(counts.max(initial=0)) if num_keypoints is None else num_keypoints
+
+        dense = np.zeros((self._count, size, 3), dtype=np.float32)
+        kept = np.minimum(counts, size)
+        entries = np.repeat(np.arange(self._count), kept)
+        steps = _concat_ranges(np.zeros(self._count, np.int64), kept)
+
+        dense[entries, steps] = self.keypoints[_concat_ranges(self.offsets[:-1], kept)]
+
+        return dense
+
+
+def oks(
+    gt_keypoints: np.ndarray,
+    gt_boxes: np.ndarray,
+    gt_areas: np.ndarray,
+    dt_keypoints: np.ndarray,
+    sigmas: np.ndarray,
+) -> np.ndarray:
+    """
+    Compute the Object Keypoint Similarity matrix (as defined by the COCO keypoint evaluation).
+    Only labelled ground truth keypoints are compared. Ground truth without labelled keypoints is compared
+    by distances of detected keypoints to its box enlarged twice in every direction
+
+    :param gt_keypoints: (G, K, 3) array of ground truth keypoints
+    :param gt_boxes: (G, 4) array of ground truth xywh boxes
+    :param gt_areas: (G,) array of ground truth areas
+    :param dt_keypoints: (D, K, 3) array of detected keypoints
+    :param sigmas: (K,) array of per-keypoint standard deviations
+    :return: (D, G) float64 OKS matrix
+    """
+    gt_keypoints = np.asarray(gt_keypoints, dtype=np.float64)
+    dt_keypoints = np.asarray(dt_keypoints, dtype=np.float64)
+    gt_boxes = np.asarray(gt_boxes, dtype=np.float64).reshape(-1, 4)
+    variances = (2 * np.asarray(sigmas, dtype=np.float64)) ** 2
+
+    labelled = gt_keypoints[:, :, 2] > 0  # (G, K)
+    has_labelled = labelled.any(axis=1)  # (G,)
+
+    x_detected = dt_keypoints[:, None, :, 0]  # (D, 1, K)
+    y_detected = dt_keypoints[:, None, :, 1]
+
+    x_min = (gt_boxes[:, 0] - gt_boxes[:, 2])[None, :, None]  # (1, G, 1)
+    x_max = (gt_boxes[:, 0] + 2 * gt_boxes[:, 2])[None, :, None]
+    y_min = (gt_boxes[:, 1] - gt_boxes[:, 3])[None, :, None]
+    y_max = (gt_boxes[:, 1] + 2 * gt_boxes[:, 3])[None, :, None]
+
+    dx = np.where(
+        has_labelled[None, :, None],
+        x_detected - gt_keypoints[None, :, :, 0],
+        np.maximum(x_min - x_detected, 0) + np.maximum(x_detected - x_max, 0),
+    )
+    dy = np.where(
+        has_labelled[None, :, None],
+        y_detected - gt_keypoints[None, :, :, 1],
+        np.maximum(y_min - y_detected, 0) + np.maximum(y_detected - y_max, 0),
+    )
+
+    errors = (
+        (dx**2 + dy**2)
+        / variances
+        / (np.asarray(gt_areas, dtype=np.float64)[None, :, None] + np.spacing(1))
+        / 2
+    )
+    weights = np.where(has_labelled[:, None], labelled, True)  # (G, K)
+
+    similarity: np.ndarray = (np.exp(-errors) * weights).sum(axis=-1) / np.maximum(
+        weights.sum(axis=-1), 1
+    )
+
+    return similarity
@@ -0,0 +1,530 @@
+"""
+Post-processing of detection results: NMS, Soft-NMS and weighted box fusion.
+
+Detections are grouped by image and category at once (one sort of the whole results set).
+The algorithms are sequential inside groups, so groups of similar sizes are padded to the same size and processed
+together: every step of an algorithm is vectorized over all groups of a batch.
+Groups too large to be padded are processed one by one computing IoU of one box at a time.
+Batches of groups can be processed in a pool of worker processes
+"""
+
+from functools import partial
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from coconutools.boxes import BoxFormat, convert_boxes
+from coconutools.detections import Detections
+from coconutools.parallel import ordered_map
+
+# xywh boxes, scores and group bounds of several groups (sorted by descending scores inside groups)
+BatchT = Tuple[np.ndarray, np.ndarray, List[int]]
+
+# batch -> new xywh boxes, scores and their numbers per group
+KernelT = Callable[[BatchT], Tuple[np.ndarray, np.ndarray, np.ndarray]]
+
+# (group in the batch, sort key in the group, xywh box, score) of output detections
+PartT = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+SOFT_NMS_METHODS = ("linear", "gaussian")
+
+# maximum number of elements in (G, M, M) IoU tensors of padded groups (larger groups aren't padded)
+PADDED_LIMIT = 1 << 22
+
+
+def _group_order(detections: Detections) -> Tuple[np.ndarray, List[int]]:
+    """
+    :return: Detection positions grouped by image and category (by descending scores inside groups)
+        and group bounds in it
+    """
+    if not len(detections):
+        return np.empty(0, dtype=np.int64), [0]
+
+    order = np.lexsort(
+        (-detections.scores, detections.category_ids, detections.image_ids)
+    )
+    image_ids = detections.image_ids[order]
+    category_ids = detections.category_ids[order]
+
+    starts = np.flatnonzero(
+        (image_ids[1:] != image_ids[:-1]) | (category_ids[1:] != category_ids[:-1])
+    )
+
+    return order, [0, *(starts + 1).tolist(), len(order)]
+
+
+def _batches(
+    boxes: np.ndarray, scores: np.ndarray, bounds: List[int], batch_size: int
+) -> Iterator[BatchT]:
+    for first in range(0, len(bounds) - 1, batch_size):
+        last = min(first + batch_size, len(bounds) - 1)
+        start, end = bounds[first], bounds[last]
+        batch_bounds = bounds[first:last]
+
+        yield (
+            boxes[start:end],
+            scores[start:end],
+            [bound - start for bound in batch_bounds] + [end - start],
+        )
+
+
+def _large_groups(bounds: List[int]) -> Iterator[Tuple[int, int, int]]:
+    """
+    :return: Iterator over the index, start and end of groups whose IoU matrices exceed PADDED_LIMIT
+    """
+    for group, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+        if (end - start) * (end - start) > PADDED_LIMIT:
+            yield group, start, end
+
+
+def _padded_groups(
+    bounds: List[int], skip_large: bool = True
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Split groups into chunks of similar sizes (up to the same power of two) padded to the same size
+
+    :param bounds: Group bounds
+    :param skip_large: Skip groups whose IoU matrices exceed PADDED_LIMIT (see _large_groups())
+    :return: Iterator over (G,) group indexes and (G, M) positions of their members (-1 for padding)
+    """
+    starts = np.asarray(bounds[:-1], dtype=np.int64)
+    sizes = np.diff(np.asarray(bounds, dtype=np.int64))
+    buckets = np.ceil(np.log2(sizes)).astype(np.int64)
+
+    if skip_large:
+        buckets[sizes * sizes > PADDED_LIMIT] = -1
+
+    for bucket in np.unique(buckets[buckets >= 0]).tolist():
+        groups = np.flatnonzero(buckets == bucket)
+        width = int(sizes[groups].max())
+        ranks = np.arange(width)
+        step = max(1, PADDED_LIMIT // (width * width))
+
+        for first in range(0, len(groups), step):
+            last = first + step
+            chunk = groups[first:last]
+
+            yield chunk, np.where(
+                ranks < sizes[chunk, None], starts[chunk, None] + ranks, -1
+            )
+
+
+def _xyxy(boxes: np.ndarray) -> np.ndarray:
+    """
+    Convert (..., 4) xywh boxes to float64 xyxy boxes
+    """
+    converted: np.ndarray = convert_boxes(
+        boxes.reshape(-1, 4), BoxFormat.xywh, BoxFormat.xyxy
+    ).astype(np.float64)
+
+    return converted.reshape(boxes.shape)
+
+
+def _iou(boxes: np.ndarray, other: np.ndarray) -> np.ndarray:
+    """
+    Broadcasted IoU of (..., 4) xyxy boxes
+    """
+    top_left = np.maximum(boxes[..., :2], other[..., :2])
+    bottom_right = np.minimum(boxes[..., 2:], other[..., 2:])
+    intersections = np.prod(np.clip(bottom_right - top_left, 0, None), axis=-1)
+    unions = (
+        np.prod(boxes[..., 2:] - boxes[..., :2], axis=-1)
+        + np.prod(other[..., 2:] - other[..., :2], axis=-1)
+        - intersections
+    )
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        iou: np.ndarray = np.where(unions > 0, intersections / unions, 0.0)
+
+    return iou
+
+
+def _padded_iou(boxes: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    """
+    :return: (G, M, M) IoU matrices of padded groups
+    """
+    x1, y1, x2, y2 = np.moveaxis(_xyxy(boxes[np.maximum(positions, 0)]), -1, 0)
+    areas = (x2 - x1) * (y2 - y1)
+
+    # coordinate planes keep temporaries (G, M, M) instead of (G, M, M, 2)
+    widths = np.minimum(x2[:, :, None], x2[:, None, :])
+    widths -= np.maximum(x1[:, :, None], x1[:, None, :])
+    np.clip(widths, 0, None, out=widths)
+
+    heights = np.minimum(y2[:, :, None], y2[:, None, :])
+    heights -= np.maximum(y1[:, :, None], y1[:, None, :])
+    np.clip(heights, 0, None, out=heights)
+
+    intersections = widths
+    intersections *= heights
+    unions = areas[:, :, None] + areas[:, None, :]
+    unions -= intersections
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        iou: np.ndarray = np.where(unions > 0, intersections / unions, 0.0)
+
+    return iou
+
+
+def _collect(
+    parts: List[PartT], group_count: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Merge outputs of padded chunks ordering them by groups and sort keys
+    """
+    if not parts:
+        return (
+            np.empty((0, 4), dtype=np.float32),
+            np.empty(0, dtype=np.float32),
+            np.zeros(group_count, dtype=np.int64),
+        )
+
+    groups, keys, boxes, scores = (np.concatenate(arrays) for arrays in zip(*parts))
+    order = np.lexsort((keys, groups))
+
+    return boxes[order], scores[order], np.bincount(groups, minlength=group_count)
+
+
+def _nms_kernel(
+    batch: BatchT, iou_threshold: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    boxes, scores, bounds = batch
+    keep = np.zeros(len(scores), dtype=bool)
+
+    for _, positions in _padded_groups(bounds):
+        overlapping = _padded_iou(boxes, positions) > iou_threshold
+        kept = positions >= 0
+
+        # each kept box suppresses lower scored boxes of its group
+        for rank in range(positions.shape[1] - 1):
+            following = rank + 1
+            kept[:, following:] &= ~(
+                kept[:, rank, None] & overlapping[:, rank, following:]
+            )
+
+        keep[positions[kept]] = True
+
+    for _, start, end in _large_groups(bounds):
+        group_boxes = _xyxy(boxes[start:end])
+        remaining = np.arange(end - start)
+
+        # the best remaining box is kept and suppresses the others overlapping it
+        while len(remaining):
+            best, others = remaining[0], remaining[1:]
+            keep[start + best] = True
+            remaining = others[
+                _iou(group_boxes[best], group_boxes[others]) <= iou_threshold
+            ]
+
+    counts = np.add.reduceat(keep.astype(np.int64), bounds[:-1])
+
+    return boxes[keep], scores[keep], counts
+
+
+def _soft_nms_kernel(
+    batch: BatchT,
+    method: str,
+    iou_threshold: float,
+    sigma: float,
+    score_threshold: float,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    boxes, scores, bounds = batch
+    parts: List[PartT] = []
+
+    for groups, positions in _padded_groups(bounds):
+        iou = _padded_iou(boxes, positions)
+        rows = np.arange(len(groups))
+
+        current = np.where(
+            positions >= 0, scores[positions].astype(np.float64), -np.inf
+        )
+        alive = (positions >= 0) & (current >= score_threshold)
+
+        for rank in range(positions.shape[1]):
+            picked = alive.any(axis=1)
+
+            if not picked.any():
+                break
+
+            # the highest scored alive box of every group is kept and decays scores of the others
+            best = np.argmax(np.where(alive, current, -np.inf), axis=1)
+            alive[rows, best] = False
+
+            parts.append(
+                (
+                    groups[picked],
+                    np.full(np.count_nonzero(picked), rank),
+                    boxes[positions[rows, best][picked]],
+                    current[rows, best][picked],
+                )
+            )
+
+            overlaps = iou[rows, best]
+
+            if method == "linear":
+                decay = np.where(overlaps > iou_threshold, 1 - overlaps, 1.0)
+            else:
+                decay = np.exp(-(overlaps**2) / sigma)
+
+            np.multiply(current, decay, out=current, where=alive)
+            alive &= current >= score_threshold
+
+    for group, start, end in _large_groups(bounds):
+        group_boxes = _xyxy(boxes[start:end])
+        group_scores = scores[start:end].astype(np.float64)
+        alive = group_scores >= score_threshold
+        picks: List[int] = []
+        picked_scores: List[float] = []
+
+        while alive.any():
+            best = int(np.argmax(np.where(alive, group_scores, -np.inf)))
+            alive[best] = False
+            picks.append(best)
+            picked_scores.append(group_scores[best])
+
+            overlaps = _iou(group_boxes[best], group_boxes)
+
+            if method == "linear":
+                decay = np.where(overlaps > iou_threshold, 1 - overlaps, 1.0)
+            else:
+                decay = np.exp(-(overlaps**2) / sigma)
+
+            np.multiply(group_scores, decay, out=group_scores, where=alive)
+            alive &= group_scores >= score_threshold
+
+        parts.append(
+            (
+                np.full(len(picks), group),
+                np.arange(len(picks)),
+                boxes[start + np.asarray(picks, dtype=np.int64)],
+                np.asarray(picked_scores),
+            )
+        )
+
+    return _collect(parts, len(bounds) - 1)
+
+
+def _fusion_kernel(
+    batch: BatchT,
+    iou_threshold: float,
+    model_count: int,
+    weight_sum: float,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    boxes, scores, bounds = batch
+    parts: List[PartT] = []
+
+    # fusion keeps (G, M, 4) arrays only, so large groups are padded too
+    for groups, positions in _padded_groups(bounds, skip_large=False):
+        count, width = positions.shape
+        clusters = np.arange(width)
+        padded_boxes = _xyxy(boxes[np.maximum(positions, 0)])
+        padded_scores = scores[positions].astype(np.float64)
+
+        # running score-weighted sums of clustered boxes
+        fused = np.zeros((count, width, 4))
+        coordinate_sums = np.zeros((count, width, 4))
+        score_sums = np.zeros((count, width))
+        cluster_sizes = np.zeros((count, width), dtype=np.int64)
+        fused_counts = np.zeros(count, dtype=np.int64)
+
+        # boxes join the best overlapping fused box of their group in the order of scores
+        for rank in range(width):
+            active = np.flatnonzero(positions[:, rank] >= 0)
+            box = padded_boxes[active, rank]
+            score = padded_scores[active, rank]
+
+            iou = np.where(
+                clusters < fused_counts[active, None],
+                _iou(fused[active], box[:, None]),
+                -1.0,
+            )
+            best = np.argmax(iou, axis=1)
+            matched = iou[np.arange(len(active)), best] > iou_threshold
+            cluster = np.where(matched, best, fused_counts[active])
+
+            fused_counts[active] += ~matched
+            coordinate_sums[active, cluster] += score[:, None] * box
+            score_sums[active, cluster] += score
+            cluster_sizes[active, cluster] += 1
+            fused[active, cluster] = (
+                coordinate_sums[active, cluster] / score_sums[active, cluster, None]
+            )
+
+        group_rows, cluster_columns = np.nonzero(clusters < fused_counts[:, None])
+        sizes = cluster_sizes[group_rows, cluster_columns]
+        fused_scores = (
+            score_sums[group_rows, cluster_columns]
+            / sizes
+            * np.minimum(sizes, model_count)
+            / weight_sum
+        )
+
+        parts.append(
+            (
+                groups[group_rows],
+                -fused_scores,
+                convert_boxes(
+                    fused[group_rows, cluster_columns], BoxFormat.xyxy, BoxFormat.xywh
+                ),
+                fused_scores,
+            )
+        )
+
+    return _collect(parts, len(bounds) - 1)
+
+
+def _apply(
+    kernel: KernelT,
+    detections: Detections,
+    workers: Optional[int],
+    batch_size: int,
+) -> Detections:
+    """
+    Apply the kernel to every image and category group of detections
+    """
+    order, bounds = _group_order(detections)
+
+    results = list(
+        ordered_map(
+            kernel,
+            _batches(
+                detections.bboxes[order], detections.scores[order], bounds, batch_size
+            ),
+            workers=workers,
+        )
+    )
+
+    counts = np.concatenate(
+        [np.empty(0, dtype=np.int64)] + [group_counts for _, _, group_counts in results]
+    )
+    group_starts = order[np.asarray(bounds[:-1], dtype=np.int64)]
+
+    return Detections.from_arrays(
+        image_ids=np.repeat(detections.image_ids[group_starts], counts),
+        category_ids=np.repeat(detections.category_ids[group_starts], counts),
+        bboxes=np.concatenate(
+            [np.empty((0, 4), dtype=np.float32)]
+            + [group_boxes for group_boxes, _, _ in results]
+        ),
+        scores=np.concatenate(
+            [np.empty(0, dtype=np.float32)]
+            + [group_scores for _, group_scores, _ in results]
+        ),
+    )
+
+
+def nms(
+    detections: Detections,
+    iou_threshold: float = 0.5,
+    workers: Optional[int] = None,
+    batch_size: int = 1000,
+) -> Detections:
+    """
+    Apply non-maximum suppression to detections of every image and category
+
+    :param detections: Detections
+    :param iou_threshold: Boxes overlapping a higher scored kept box by more than this IoU are suppressed
+    :param workers: Number of worker processes
+    :param batch_size: Number of image and category groups processed by one task
+    :return: Kept detections grouped by image and category (by descending scores inside groups)
+    """
+    kernel = partial(_nms_kernel, iou_threshold=iou_threshold)
+
+    return _apply(kernel, detections, workers, batch_size)
+
+
+def soft_nms(
+    detections: Detections,
+    method: str = "gaussian",
+    iou_threshold: float = 0.3,
+    sigma: float = 0.5,
+    score_threshold: float = 0.001,
+    workers: Optional[int] = None,
+    batch_size: int = 1000,
+) -> Detections:
+    """
+    Apply Soft-NMS to detections of every image and category: instead of being suppressed, overlapping boxes
+    get their scores decayed and are dropped only when their scores fall below the threshold
+
+    :param detections: Detections
+    :param method: Score decay method: "linear" (by 1 - IoU above iou_threshold) or "gaussian" (by exp(-IoU^2 / sigma))
+    :param iou_threshold: IoU above which scores are decayed by the linear method
+    :param sigma: Spread of the gaussian method
+    :param score_threshold: Detections with lower (decayed) scores are dropped
+    :param workers: Number of worker processes
+    :param batch_size: Number of image and category groups processed by one task
+    :return: Kept detections with decayed scores grouped by image and category
+    """
+    if method not in SOFT_NMS_METHODS:
+        raise ValueError(
+            f"Unknown Soft-NMS method '{method}', supported: {', '.join(SOFT_NMS_METHODS)}"
+        )
+
+    kernel = partial(
+        _soft_nms_kernel,
+        method=method,
+        iou_threshold=iou_threshold,
+        sigma=sigma,
+        score_threshold=score_threshold,
+    )
+
+    return _apply(kernel, detections, workers, batch_size)
+
+
+def weighted_box_fusion(
+    detection_sets: Sequence[Detections],
+    weights: Optional[Sequence[float]] = None,
+    iou_threshold: float = 0.55,
+    skip_threshold: float = 0.0,
+    workers: Optional[int] = None,
+    batch_size: int = 1000,
+) -> Detections:
+    """
+    Fuse detections of several models with weighted box fusion (WBF).
+    Boxes of every image and category are clustered in the order of their (weighted) scores, fused boxes are
+    score-weighted averages of clusters, and fused scores are average cluster scores scaled down for clusters
+    that didn't get boxes from all models
+
+    :param detection_sets: Detections of every model
+    :param weights: Model weights (all models are weighted equally by default)
+    :param iou_threshold: Boxes overlapping a fused box by more than this IoU join its cluster
+    :param skip_threshold: Detections scored below this value are skipped
+    :param workers: Number of worker processes
+    :param batch_size: Number of image and category groups processed by one task
+    :return: Fused detections grouped by image and category
+    """
+    model_weights = (
+        np.ones(len(detection_sets))
+        if weights is None
+        else np.asarray(weights, dtype=np.float64)
+    )
+
+    if len(model_weights) != len(detection_sets):
+        raise ValueError(
+            f"{len(model_weights)} weights are given for {len(detection_sets)} detection sets"
+        )
+
+    weighted_sets: List[Detections] = []
+
+    for detections, weight in zip(detection_sets, model_weights.tolist()):
+        # boxes with zero scores have no weight in fused boxes
+        detections = detections.take(
+            (detections.scores >= skip_threshold) & (detections.scores > 0)
+        )
+        weighted_sets.append(
+            Detections(
+                image_ids=detections.image_ids,
+                category_ids=detections.category_ids,
+                bboxes=detections.bboxes,
+                scores=detections.scores * np.float32(weight),
+            )
+        )
+
+    kernel = partial(
+        _fusion_kernel,
+        iou_threshold=iou_threshold,
+        model_count=len(detection_sets),
+        weight_sum=float(model_weights.sum()),
+    )
+
+    return _apply(kernel, Detections.concatenate(weighted_sets), workers, batch_size)
@@ -0,0 +1,121 @@
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import suppress
+from queue import Full, Queue
+from threading import Event, Thread
+from typing import Any, Callable, Deque, Iterable, Iterator, Optional, TypeVar
+
+ItemT = TypeVar("ItemT")
+ResultT = TypeVar("ResultT")
+
+
+def ordered_map(
+    func: Callable[[ItemT], ResultT],
+    items: Iterable[ItemT],
+    workers: Optional[int] = None,
+    processes: bool = True,
+    max_pending: Optional[int] = None,
+) -> Iterator[ResultT]:
+    """
+    Lazily map items in a pool of workers preserving their order.
+    Unlike Executor.map(), items are consumed on demand (at most max_pending of them are in flight),
+    so memory stays flat on large inputs
+
+    :param func: Function to apply (has to be picklable when processes are used)
+    :param items: Items to process
+    :param workers: Number of workers (the work is done in the current thread when it's None or 1)
+    :param processes: Use a process pool instead of a thread pool
+    :param max_pending: Maximum number of submitted but not consumed items (4 per worker by default)
+    :return: Iterator over results
+    """
+    if not workers or workers <= 1:
+        yield from map(func, items)
+        return
+
+    pool_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    max_pending = max_pending or 4 * workers
+
+    executor: Executor
+
+    with pool_class(max_workers=workers) as executor:
+        pending: Deque[Future] = deque()
+
+        try:
+            for item in items:
+                pending.append(executor.submit(func, item))
+
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+class _Failure:
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+_DONE = object()
+
+
+def prefetched(items: Iterable[ItemT], size: int = 2) -> Iterator[ItemT]:
+    """
+    Consume items in a background thread, keeping up to `size` of them ready in a bounded queue.
+    Errors raised while producing items are re-raised in the consumer
+
+    :param items: Items to prefetch
+    :param size: Maximum number of prefetched items
+    :return: Iterator over items
+    """
+    buffer: "Queue[Any]" = Queue(maxsize=max(size, 1))
+    stopped = Event()
+
+    def put(item: Any) -> bool:
+        # wake up periodically, so the thread exits when the consumer has stopped early
+        while not stopped.is_set():
+            with suppress(Full):
+                buffer.put(item, timeout=0.1)
+                return True
+
+        return False
+
+    def produce() -> None:
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_Failure(e))
+            return
+        finally:
+            # release resources of generators (e.g. worker pools) in the thread that runs them
+            close = getattr(items, "close", None)
+
+            if close is not None:
+                close()
+
+        put(_DONE)
+
+    producer = Thread(target=produce, name="coconutools-prefetch", daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            item = buffer.get()
+
+            if item is _DONE:
+                return
+
+            if isinstance(item, _Failure):
+                raise item.error
+
+            yield item
+    finally:
+        stopped.set()
+        producer.join()
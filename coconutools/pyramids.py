@@ -0,0 +1,388 @@
+"""
+Multi-resolution mask pyramids for fast mask IoU.
+
+A pyramid keeps the foreground intervals of an RLE mask together with coverage counts of its pixels
+in coarse grid cells (e.g. 32x32 and 8x8 pixel cells) cropped to the mask bounding box.
+Per-cell counts bound the intersection of two masks: it's at least sum(max(a + b - cell, 0))
+and at most sum(min(a, b)). So mask pairs can be compared from coarse to fine levels:
+pairs with disjoint boxes are rejected right away, pairs whose IoU bounds don't straddle any decision threshold
+get a coarse IoU estimate and only the rest is computed at full resolution
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Hashable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from coconutools.segmentations import (
+    RLE_T,
+    _rle_runs,
+    _runs_to_intervals,
+    crop,
+    decode,
+    to_bbox,
+)
+
+DEFAULT_SCALES = (32, 8)
+DEFAULT_CACHE_BYTES = 256 << 20
+
+
+def _count_dtype(scale: int) -> type:
+    return np.uint16 if scale * scale < 1 << 16 else np.int32
+
+
+@dataclass
+class MaskPyramid:
+    """
+    Foreground intervals of an RLE mask and its coverage counts at coarse resolutions
+    """
+
+    size: Tuple[int, int]  # (height, width) of the mask
+    area: int
+    # (4,) int64 tight box in the xyxy format (exclusive, zeros for empty masks)
+    box: np.ndarray
+
+    # [start, end) intervals of foreground pixels in the column-major order
+    starts: np.ndarray
+    ends: np.ndarray
+
+    # cell sizes from coarse to fine and (rows, columns) counts of foreground pixels per cell.
+    # Cell grids are aligned to the image origin and cropped to the cells covering the box
+    scales: Tuple[int, ...]
+    levels: List[np.ndarray]
+
+    @classmethod
+    def from_rle(
+        cls, rle: RLE_T, scales: Sequence[int] = DEFAULT_SCALES
+    ) -> "MaskPyramid":
+        """
+        Build a pyramid of an RLE mask (only the bounding box region of the mask is decoded)
+
+        :param rle: RLE mask (compressed or uncompressed)
+        :param scales: Cell sizes of pyramid levels (in pixels, from coarse to fine)
+        :return: Mask pyramid
+        """
+        height, width = rle["size"]
+        starts, ends = _runs_to_intervals(_rle_runs(rle))
+        non_empty = ends > starts
+        starts, ends = starts[non_empty], ends[non_empty]
+
+        x, y, box_width, box_height = to_bbox([rle])[0].astype(np.int64).tolist()
+        box = np.array([x, y, x + box_width, y + box_height], dtype=np.int64)
+        levels: List[np.ndarray] = []
+
+        if not len(starts):
+            return cls(
+                (height, width),
+                0,
+                box,
+                starts,
+                ends,
+                tuple(scales),
+                [np.zeros((0, 0), dtype=_count_dtype(scale)) for scale in scales],
+            )
+
+        mask = decode(crop(rle, x, y, box_width, box_height))
+
+        for scale in scales:
+            # pad the box region to whole cells of the image-aligned grid
+            top, left = y % scale, x % scale
+            rows = -(-(top + box_height) // scale)
+            columns = -(-(left + box_width) // scale)
+
+            bottom, right = top + box_height, left + box_width
+
+            padded = np.zeros((rows * scale, columns * scale), dtype=np.int32)
+            padded[top:bottom, left:right] = mask
+            counts = padded.reshape(rows, scale, columns, scale).sum(axis=(1, 3))
+
+            levels.append(counts.astype(_count_dtype(scale)))
+
+        return cls(
+            (height, width),
+            int((ends - starts).sum()),
+            box,
+            starts,
+            ends,
+            tuple(scales),
+            levels,
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.box.nbytes
+            + self.starts.nbytes
+            + self.ends.nbytes
+            + sum(level.nbytes for level in self.levels)
+        )
+
+    def _origin(self, level: int) -> Tuple[int, int]:
+        scale = self.scales[level]
+
+        return int(self.box[1]) // scale, int(self.box[0]) // scale
+
+    def _overlap(
+        self, other: "MaskPyramid", level: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: Cell counts of both masks in the cells covered by both boxes
+        """
+        cells, other_cells = self.levels[level], other.levels[level]
+        row, column = self._origin(level)
+        other_row, other_column = other._origin(level)
+
+        # the overlap region in the cell grid
+        top, left = max(row, other_row), max(column, other_column)
+        bottom = max(top, min(row + len(cells), other_row + len(other_cells)))
+        right = max(
+            left,
+            min(column + cells.shape[1], other_column + other_cells.shape[1]),
+        )
+
+        row_slice = slice(top - row, bottom - row)
+        column_slice = slice(left - column, right - column)
+        other_row_slice = slice(top - other_row, bottom - other_row)
+        other_column_slice = slice(left - other_column, right - other_column)
+
+        return (
+            cells[row_slice, column_slice].astype(np.int64),
+            other_cells[other_row_slice, other_column_slice].astype(np.int64),
+        )
+
+    def intersection_bounds(
+        self, other: "MaskPyramid", level: int
+    ) -> Tuple[int, int, float]:
+        """
+        Bound the intersection area with another mask at the given pyramid level
+
+        :return: Lower bound, upper bound and estimate of the intersection area
+        """
+        counts, other_counts = self._overlap(other, level)
+
+        if not counts.size:
+            return 0, 0, 0.0
+
+        cell_area = self.scales[level] ** 2
+
+        lower = int(np.maximum(counts + other_counts - cell_area, 0).sum())
+        upper = int(np.minimum(counts, other_counts).sum())
+        # pixels of both masks are assumed to be spread independently within cells
+        estimate = float((counts * other_counts).sum()) / cell_area
+
+        return lower, upper, estimate
+
+    def intersection(self, other: "MaskPyramid") -> int:
+        """
+        Compute the exact intersection area with another mask from foreground intervals
+        """
+        if not len(self.starts) or not len(other.starts):
+            return 0
+
+        # foreground length of the other mask before each position
+        lengths = np.zeros(len(other.starts) + 1, dtype=np.int64)
+        np.cumsum(other.ends - other.starts, out=lengths[1:])
+
+        def covered(positions: np.ndarray) -> np.ndarray:
+            indexes = np.searchsorted(other.ends, positions, side="right")
+            partial = np.zeros(len(positions), dtype=np.int64)
+            inside = indexes < len(other.starts)
+            partial[inside] = np.maximum(
+                positions[inside] - other.starts[indexes[inside]], 0
+            )
+
+            return lengths[indexes] + partial
+
+        return int((covered(self.ends) - covered(self.starts)).sum())
+
+
+class PyramidCache:
+    """
+    LRU cache of mask pyramids bounded by their total size in bytes
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_CACHE_BYTES,
+        scales: Sequence[int] = DEFAULT_SCALES,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.scales = tuple(scales)
+        self.nbytes = 0
+
+        self._pyramids: "OrderedDict[Hashable, MaskPyramid]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._pyramids)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._pyramids
+
+    def get(self, key: Hashable, rle: Callable[[], RLE_T]) -> MaskPyramid:
+        """
+        Get the cached pyramid or build it and cache it (evicting least recently used pyramids)
+
+        :param key: Cache key (e.g. annotation ID)
+        :param rle: Function returning the RLE mask to build the pyramid from
+        :return: Mask pyramid
+        """
+        pyramid = self._pyramids.get(key)
+
+        if pyramid is not None:
+            self._pyramids.move_to_end(key)
+
+            return pyramid
+
+        pyramid = MaskPyramid.from_rle(rle(), self.scales)
+
+        if pyramid.nbytes > self.max_bytes:
+            return pyramid
+
+        self._pyramids[key] = pyramid
+        self.nbytes += pyramid.nbytes
+
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._pyramids.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+        return pyramid
+
+    def discard(self, key: Hashable) -> None:
+        pyramid = self._pyramids.pop(key, None)
+
+        if pyramid is not None:
+            self.nbytes -= pyramid.nbytes
+
+    def clear(self) -> None:
+        self._pyramids.clear()
+        self.nbytes = 0
+
+
+MaskT = Union[RLE_T, MaskPyramid]
+
+
+def _pyramids(masks: Sequence[MaskT], scales: Sequence[int]) -> List[MaskPyramid]:
+    return [
+        mask if isinstance(mask, MaskPyramid) else MaskPyramid.from_rle(mask, scales)
+        for mask in masks
+    ]
+
+
+def _undecided(
+    lower: np.ndarray, upper: np.ndarray, thresholds: np.ndarray
+) -> np.ndarray:
+    """
+    :return: Mask of IoU ranges that straddle a threshold (IoU >= threshold can't be decided)
+    """
+    undecided: np.ndarray = np.any(
+        (lower[:, None] < thresholds[None, :])
+        & (upper[:, None] >= thresholds[None, :]),
+        axis=1,
+    )
+
+    return undecided
+
+
+def mask_iou(
+    masks: Sequence[MaskT],
+    other: Sequence[MaskT],
+    crowd: Optional[np.ndarray] = None,
+    thresholds: Optional[Sequence[float]] = None,
+) -> np.ndarray:
+    """
+    Compute the IoU matrix of two sets of masks of the same image.
+    Pairs with disjoint boxes get zero IoU without touching the masks. When decision thresholds are given,
+    pairs are compared from coarse to fine pyramid levels and only the pairs with IoU bounds straddling a threshold
+    are computed at full resolution (the others get a coarse estimate on the same side of every threshold)
+
+    :param masks: N RLE masks or their pyramids (e.g. detections)
+    :param other: M RLE masks or their pyramids (e.g. ground truth)
+    :param crowd: (M,) boolean mask of crowd masks. The union with a crowd mask is the area of the first mask
+        (as in the COCO evaluation)
+    :param thresholds: IoU thresholds the result is compared with (exact IoU of all overlapping pairs by default)
+    :return: (N, M) float64 IoU matrix
+    """
+    scales = next(
+        (mask.scales for mask in (*masks, *other) if isinstance(mask, MaskPyramid)),
+        DEFAULT_SCALES,
+    )
+    pyramids, other_pyramids = _pyramids(masks, scales), _pyramids(other, scales)
+
+    if len({pyramid.size for pyramid in (*pyramids, *other_pyramids)}) > 1:
+        raise ValueError("Masks have to be of the same size")
+
+    if len({pyramid.scales for pyramid in (*pyramids, *other_pyramids)}) > 1:
+        raise ValueError("Mask pyramids have to be of the same scales")
+
+    iou = np.zeros((len(pyramids), len(other_pyramids)), dtype=np.float64)
+
+    if not len(pyramids) or not len(other_pyramids):
+        return iou
+
+    boxes = np.stack([pyramid.box for pyramid in pyramids])
+    other_boxes = np.stack([pyramid.box for pyramid in other_pyramids])
+    areas = np.array([pyramid.area for pyramid in pyramids], dtype=np.float64)
+    other_areas = np.array(
+        [pyramid.area for pyramid in other_pyramids], dtype=np.float64
+    )
+
+    top_left = np.maximum(boxes[:, None, :2], other_boxes[None, :, :2])
+    bottom_right = np.minimum(boxes[:, None, 2:], other_boxes[None, :, 2:])
+    overlapping = np.all(bottom_right > top_left, axis=2)
+
+    rows, columns = np.nonzero(overlapping)
+    pair_areas = areas[rows]
+    area_sums = pair_areas + other_areas[columns]
+    crowd_pairs = (
+        np.zeros(len(rows), dtype=bool)
+        if crowd is None
+        else np.asarray(crowd, dtype=bool)[columns]
+    )
+
+    def to_iou(intersections: np.ndarray, pairs: np.ndarray) -> np.ndarray:
+        pair_unions = np.where(
+            crowd_pairs[pairs], pair_areas[pairs], area_sums[pairs] - intersections
+        )
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(pair_unions > 0, intersections / pair_unions, 0.0)
+
+    pending = np.arange(len(rows))
+
+    if thresholds is not None:
+        threshold_array = np.asarray(thresholds, dtype=np.float64)
+
+        for level in range(len(scales)):
+            if not len(pending):
+                break
+
+            bounds = np.array(
+                [
+                    pyramids[rows[pair]].intersection_bounds(
+                        other_pyramids[columns[pair]], level
+                    )
+                    for pair in pending.tolist()
+                ],
+                dtype=np.float64,
+            ).reshape(-1, 3)
+
+            lower, upper = to_iou(bounds[:, 0], pending), to_iou(bounds[:, 1], pending)
+            undecided = _undecided(lower, upper, threshold_array)
+
+            decided = pending[~undecided]
+            iou[rows[decided], columns[decided]] = to_iou(
+                bounds[~undecided, 2], decided
+            )
+            pending = pending[undecided]
+
+    intersections = np.array(
+        [
+            pyramids[rows[pair]].intersection(other_pyramids[columns[pair]])
+            for pair in pending.tolist()
+        ],
+        dtype=np.float64,
+    )
+    iou[rows[pending], columns[pending]] = to_iou(intersections, pending)
+
+    return iou
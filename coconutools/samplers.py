@@ -0,0 +1,366 @@
+"""
+Image samplers for long-tail datasets.
+Image weights are computed once from the image x category count matrix,
+every epoch produces an array of image positions (in COCO.images) that can be sharded across distributed ranks
+"""
+
+import math
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterator, Optional, Tuple
+
+import numpy as np
+
+from coconutools.columns import id_positions
+
+if TYPE_CHECKING:
+    from coconutools.dataset import COCO
+
+
+@dataclass
+class ImageCategoryCounts:
+    """
+    Sparse (COO) matrix of annotation counts per image and category.
+    Rows and columns are positions in COCO.images and COCO.categories
+    """
+
+    image_ids: np.ndarray  # (I,) int64
+    category_ids: np.ndarray  # (C,) int64
+    rows: np.ndarray  # (NNZ,) int64
+    columns: np.ndarray  # (NNZ,) int64
+    counts: np.ndarray  # (NNZ,) int64
+
+    @classmethod
+    def from_dataset(cls, dataset: "COCO") -> "ImageCategoryCounts":
+        columns = dataset._get_columns()
+
+        image_ids = np.fromiter(
+            (image.id for image in dataset.images), np.int64, len(dataset.images)
+        )
+        category_ids = np.fromiter(
+            (category.id for category in dataset.categories),
+            np.int64,
+            len(dataset.categories),
+        )
+
+        rows = id_positions(image_ids, columns.image_ids)
+        cols = id_positions(category_ids, columns.category_ids)
+        known = (rows >= 0) & (cols >= 0)
+
+        cells, counts = np.unique(
+            rows[known] * len(category_ids) + cols[known], return_counts=True
+        )
+
+        return cls(
+            image_ids=image_ids,
+            category_ids=category_ids,
+            rows=cells // max(len(category_ids), 1),
+            columns=cells % max(len(category_ids), 1),
+            counts=counts.astype(np.int64),
+        )
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self.image_ids), len(self.category_ids)
+
+    def to_dense(self) -> np.ndarray:
+        """
+        :return: (I, C) int64 count matrix
+        """
+        dense = np.zeros(self.shape, dtype=np.int64)
+        dense[self.rows, self.columns] = self.counts
+
+        return dense
+
+    def image_frequencies(self) -> np.ndarray:
+        """
+        :return: (C,) float64 fraction of images that contain every category
+        """
+        images_with_category = np.bincount(self.columns, minlength=self.shape[1])
+
+        frequencies: np.ndarray = images_with_category / max(self.shape[0], 1)
+
+        return frequencies
+
+    def _reduce_by_image(self, values: np.ndarray, empty: float) -> np.ndarray:
+        """
+        Take the maximum of per-category values over categories present in every image
+        """
+        reduced = np.full(self.shape[0], -np.inf)
+        np.maximum.at(reduced, self.rows, values[self.columns])
+        reduced[np.isneginf(reduced)] = empty
+
+        return reduced
+
+
+def repeat_factors(counts: ImageCategoryCounts, threshold: float) -> np.ndarray:
+    """
+    LVIS repeat factors: r(c) = max(1, sqrt(t / f(c))) for every category with the image frequency f(c),
+    an image is repeated max(r(c)) times over its categories
+
+    :param counts: Image x category counts
+    :param threshold: Frequency threshold t (categories that are more frequent are not oversampled)
+    :return: (I,) float64 image repeat factors
+    """
+    frequencies = counts.image_frequencies()
+
+    with np.errstate(divide="ignore"):
+        category_factors = np.maximum(1.0, np.sqrt(threshold / frequencies))
+
+    return counts._reduce_by_image(category_factors, empty=1.0)
+
+
+def category_balanced_weights(
+    counts: ImageCategoryCounts, power: float = 1.0
+) -> np.ndarray:
+    """
+    Image weights that balance categories: every image gets the maximum of 1 / f(c) ** power over its categories.
+    Images without annotations get the weight of the most frequent category
+
+    :param counts: Image x category counts
+    :param power: Smoothing power (0 disables balancing, 1 fully balances categories)
+    :return: (I,) float64 image weights
+    """
+    frequencies = counts.image_frequencies()
+    present = frequencies > 0
+
+    category_weights = np.zeros(len(frequencies))
+    category_weights[present] = frequencies[present] ** -power
+
+    empty = float(category_weights[present].min()) if present.any() else 1.0
+
+    return counts._reduce_by_image(category_weights, empty=empty)
+
+
+class AliasTable:
+    """
+    Walker alias table for O(1) draws from a discrete distribution (built with Vose's algorithm)
+    """
+
+    __slots__ = ("probabilities", "aliases")
+
+    def __init__(self, weights: np.ndarray) -> None:
+        weights = np.asarray(weights, dtype=np.float64)
+        total = weights.sum()
+
+        if len(weights) == 0 or not np.isfinite(total) or total <= 0:
+            raise ValueError("Weights have to be non-negative with a positive sum")
+
+        if (weights < 0).any():
+            raise ValueError("Weights have to be non-negative with a positive sum")
+
+        scaled = weights * (len(weights) / total)
+
+        self.probabilities = np.ones(len(weights), dtype=np.float64)
+        self.aliases = np.arange(len(weights), dtype=np.int64)
+
+        small = np.flatnonzero(scaled < 1.0).tolist()
+        large = np.flatnonzero(scaled >= 1.0).tolist()
+        remaining = scaled.tolist()
+
+        while small and large:
+            less, more = small.pop(), large.pop()
+
+            self.probabilities[less] = remaining[less]
+            self.aliases[less] = more
+
+            remaining[more] += remaining[less] - 1.0
+            (small if remaining[more] < 1.0 else large).append(more)
+
+        # leftovers have probabilities of 1 up to rounding errors
+
+    def __len__(self) -> int:
+        return len(self.probabilities)
+
+    def draw(self, size: int, rng: np.random.Generator) -> np.ndarray:
+        """
+        :param size: Number of draws
+        :param rng: Random generator
+        :return: (size,) int64 array of drawn indexes
+        """
+        columns = rng.integers(0, len(self.probabilities), size=size)
+        accept = rng.random(size) < self.probabilities[columns]
+
+        return np.where(accept, columns, self.aliases[columns])
+
+
+class ImageSampler(ABC):
+    """
+    Base class of epoch-based image samplers.
+
+    Every epoch all ranks draw the same global index array (seeded by the seed and epoch),
+    padded to be divisible by the world size, and every rank takes its own interleaved shard of it
+    """
+
+    def __init__(
+        self, image_ids: np.ndarray, seed: int = 0, rank: int = 0, world_size: int = 1
+    ) -> None:
+        if not 0 <= rank < world_size:
+            raise ValueError(
+                f"Rank has to be in [0, world_size), got {rank} (world size: {world_size})"
+            )
+
+        self.image_ids = image_ids
+        self.seed = seed
+        self.rank = rank
+        self.world_size = world_size
+        self.epoch = 0
+
+    @abstractmethod
+    def _draw(self, rng: np.random.Generator) -> np.ndarray:
+        """
+        Draw the global index array of an epoch (the same on all ranks)
+        """
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch = epoch
+
+    def epoch_indices(self, epoch: Optional[int] = None) -> np.ndarray:
+        """
+        Get image positions (in COCO.images) sampled by the current rank in the given epoch
+
+        :param epoch: Epoch number (the current one if not given)
+        :return: int64 array of image positions
+        """
+        epoch = self.epoch if epoch is None else epoch
+        indices = self._draw(np.random.default_rng([self.seed, epoch]))
+
+        padding = -len(indices) % self.world_size
+
+        if padding and len(indices):
+            # indices are repeated cyclically, so shards stay equal when there are fewer indices than ranks
+            indices = np.resize(indices, len(indices) + padding)
+
+        shard: np.ndarray = indices[np.arange(self.rank, len(indices), self.world_size)]
+
+        return shard
+
+    def epoch_image_ids(self, epoch: Optional[int] = None) -> np.ndarray:
+        """
+        Get image IDs sampled by the current rank in the given epoch
+        """
+        image_ids: np.ndarray = self.image_ids[self.epoch_indices(epoch)]
+
+        return image_ids
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.epoch_indices().tolist())
+
+    def __len__(self) -> int:
+        return len(self.epoch_indices())
+
+
+class CategoryBalancedSampler(ImageSampler):
+    """
+    Draws images with replacement proportionally to category balancing weights (O(1) per draw)
+    """
+
+    def __init__(
+        self,
+        weights: np.ndarray,
+        image_ids: np.ndarray,
+        num_samples: Optional[int] = None,
+        seed: int = 0,
+        rank: int = 0,
+        world_size: int = 1,
+    ) -> None:
+        super().__init__(image_ids, seed=seed, rank=rank, world_size=world_size)
+
+        self.weights = weights
+        self.num_samples = len(weights) if num_samples is None else num_samples
+        self.table = AliasTable(weights)
+
+    @classmethod
+    def from_dataset(
+        cls,
+        dataset: "COCO",
+        power: float = 1.0,
+        num_samples: Optional[int] = None,
+        seed: int = 0,
+        rank: int = 0,
+        world_size: int = 1,
+    ) -> "CategoryBalancedSampler":
+        """
+        :param dataset: COCO dataset
+        :param power: Smoothing power of inverse category frequencies
+        :param num_samples: Number of images drawn per epoch (across all ranks), the dataset size by default
+        :param seed: Random seed (has to be the same on all ranks)
+        :param rank: Current rank
+        :param world_size: Number of ranks
+        """
+        counts = ImageCategoryCounts.from_dataset(dataset)
+
+        return cls(
+            category_balanced_weights(counts, power=power),
+            counts.image_ids,
+            num_samples=num_samples,
+            seed=seed,
+            rank=rank,
+            world_size=world_size,
+        )
+
+    def _draw(self, rng: np.random.Generator) -> np.ndarray:
+        return self.table.draw(self.num_samples, rng)
+
+
+class RepeatFactorSampler(ImageSampler):
+    """
+    LVIS-style repeat factor sampling: every image is repeated floor(r) times plus once more with probability frac(r),
+    and the repeated indices are shuffled
+    """
+
+    def __init__(
+        self,
+        factors: np.ndarray,
+        image_ids: np.ndarray,
+        shuffle: bool = True,
+        seed: int = 0,
+        rank: int = 0,
+        world_size: int = 1,
+    ) -> None:
+        super().__init__(image_ids, seed=seed, rank=rank, world_size=world_size)
+
+        self.factors = factors
+        self.shuffle = shuffle
+
+        self._whole = np.floor(factors).astype(np.int64)
+        self._fraction = factors - self._whole
+
+    @classmethod
+    def from_dataset(
+        cls,
+        dataset: "COCO",
+        threshold: float = 0.001,
+        shuffle: bool = True,
+        seed: int = 0,
+        rank: int = 0,
+        world_size: int = 1,
+    ) -> "RepeatFactorSampler":
+        """
+        :param dataset: COCO dataset
+        :param threshold: Frequency threshold (categories in less than this fraction of images get oversampled)
+        :param shuffle: Shuffle images every epoch
+        :param seed: Random seed (has to be the same on all ranks)
+        :param rank: Current rank
+        :param world_size: Number of ranks
+        """
+        counts = ImageCategoryCounts.from_dataset(dataset)
+
+        return cls(
+            repeat_factors(counts, threshold),
+            counts.image_ids,
+            shuffle=shuffle,
+            seed=seed,
+            rank=rank,
+            world_size=world_size,
+        )
+
+    @property
+    def expected_epoch_size(self) -> int:
+        return int(math.ceil(self.factors.sum()))
+
+    def _draw(self, rng: np.random.Generator) -> np.ndarray:
+        repeats = self._whole + (rng.random(len(self.factors)) < self._fraction)
+        indices = np.repeat(np.arange(len(self.factors)), repeats)
+
+        return rng.permutation(indices) if self.shuffle else indices
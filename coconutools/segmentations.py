@@ -0,0 +1,920 @@
+from typing import List, Optional, Sequence, Tuple, TypedDict, Union
+
+import numpy as np
+
+PolygonT = List[float]
+
+
+class UncompressedRLE_T(TypedDict):
+    """
+    Uncompressed RLE (the counts are stored as a list of run lengths)
+    """
+
+    counts: List[int]
+    size: List[int]
+
+
+class CompressedRLE_T(TypedDict):
+    """
+    Compressed RLE (the counts are stored as a LEB128-like encoded string)
+    """
+
+    counts: str
+    size: List[int]
+
+
+def _concat_ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    Vectorized concatenation of np.arange(start, start + count) ranges
+    """
+    total = int(counts.sum())
+
+    if not total:
+        return np.empty(0, dtype=np.int64)
+
+    shifts = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    ranges: np.ndarray = np.arange(total, dtype=np.int64) + shifts
+
+    return ranges
+
+
+def _offsets(counts: np.ndarray) -> np.ndarray:
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    return offsets
+
+
+def _append(buffer: np.ndarray, size: int, values: np.ndarray) -> np.ndarray:
+    """
+    Write values after the first `size` rows of a buffer (growing it geometrically when needed)
+
+    :return: The buffer or its grown copy
+    """
+    required = size + len(values)
+
+    if required > len(buffer):
+        capacity = max(required, 2 * len(buffer), 16)
+        grown = np.empty((capacity,) + buffer.shape[1:], dtype=buffer.dtype)
+        grown[:size] = buffer[:size]
+        buffer = grown
+
+    buffer[size:required] = values
+
+    return buffer
+
+
+class PolygonStore:
+    """
+    Compact storage of polygon segmentations.
+
+    All polygon points are kept in one flat float32 (P, 2) array. Polygon offsets point to the first point
+    of each polygon and annotation offsets point to the first polygon of each stored entry (annotation),
+    so entry i consists of polygons annotation_offsets[i]:annotation_offsets[i + 1]
+    """
+
+    __slots__ = (
+        "_points",
+        "_polygon_offsets",
+        "_annotation_offsets",
+        "_point_count",
+        "_polygon_count",
+        "_count",
+    )
+
+    def __init__(
+        self,
+        points: Optional[np.ndarray] = None,
+        polygon_offsets: Optional[np.ndarray] = None,
+        annotation_offsets: Optional[np.ndarray] = None,
+    ) -> None:
+        self._points = (
+            np.empty((0, 2), dtype=np.float32)
+            if points is None
+            else np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        )
+        self._polygon_offsets = (
+            np.zeros(1, dtype=np.int64)
+            if polygon_offsets is None
+            else np.asarray(polygon_offsets, dtype=np.int64)
+        )
+        self._annotation_offsets = (
+            np.zeros(1, dtype=np.int64)
+            if annotation_offsets is None
+            else np.asarray(annotation_offsets, dtype=np.int64)
+        )
+
+        self._point_count = len(self._points)
+        self._polygon_count = len(self._polygon_offsets) - 1
+        self._count = len(self._annotation_offsets) - 1
+
+    @classmethod
+    def from_polygons(cls, segmentations: Sequence[List[PolygonT]]) -> "PolygonStore":
+        store = cls()
+        store.extend(segmentations)
+
+        return store
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def points(self) -> np.ndarray:
+        """
+        (P, 2) float32 array of all polygon points
+        """
+        return self._points[: self._point_count]
+
+    @property
+    def polygon_offsets(self) -> np.ndarray:
+        """
+        (M + 1,) int64 array of polygon offsets into points
+        """
+        return self._polygon_offsets[: self._polygon_count + 1]
+
+    @property
+    def annotation_offsets(self) -> np.ndarray:
+        """
+        (N + 1,) int64 array of entry offsets into polygons
+        """
+        return self._annotation_offsets[: self._count + 1]
+
+    def extend(self, segmentations: Sequence[List[PolygonT]]) -> range:
+        """
+        Append polygon segmentations in bulk (the buffers grow geometrically, so appends are amortized O(1))
+
+        :param segmentations: List of polygon segmentations (each one is a list of flat [x1, y1, x2, y2, ...] lists)
+        :return: Indexes of the added entries
+        """
+        polygon_counts = np.fromiter(
+            (len(polygons) for polygons in segmentations), np.int64, len(segmentations)
+        )
+        point_counts = np.fromiter(
+            (len(polygon) // 2 for polygons in segmentations for polygon in polygons),
+            np.int64,
+            int(polygon_counts.sum()),
+        )
+        points = np.fromiter(
+            (
+                coordinate
+                for polygons in segmentations
+                for polygon in polygons
+                for coordinate in polygon[: len(polygon) // 2 * 2]
+            ),
+            np.float32,
+            int(point_counts.sum()) * 2,
+        ).reshape(-1, 2)
+
+        return self.extend_arrays(points, point_counts, polygon_counts)
+
+    def extend_arrays(
+        self, points: np.ndarray, point_counts: np.ndarray, polygon_counts: np.ndarray
+    ) -> range:
+        """
+        Append polygon segmentations given as flat arrays (e.g. columns of an Arrow table)
+
+        :param points: (P, 2) array of points of all polygons
+        :param point_counts: (M,) array of point numbers per polygon
+        :param polygon_counts: (N,) array of polygon numbers per entry
+        :return: Indexes of the added entries
+        """
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        point_counts = np.asarray(point_counts, dtype=np.int64)
+        polygon_counts = np.asarray(polygon_counts, dtype=np.int64)
+
+        start = self._count
+
+        self._points = _append(self._points, self._point_count, points)
+        self._polygon_offsets = _append(
+            self._polygon_offsets,
+            self._polygon_count + 1,
+            np.cumsum(point_counts) + self._point_count,
+        )
+        self._annotation_offsets = _append(
+            self._annotation_offsets,
+            self._count + 1,
+            np.cumsum(polygon_counts) + self._polygon_count,
+        )
+
+        self._point_count += len(points)
+        self._polygon_count += len(point_counts)
+        self._count += len(polygon_counts)
+
+        return range(start, self._count)
+
+    def append(self, polygons: List[PolygonT]) -> int:
+        """
+        Append one polygon segmentation
+
+        :return: Index of the added entry
+        """
+        return self.extend([polygons])[0]
+
+    def get(self, index: int) -> List[PolygonT]:
+        """
+        Build a nested list representation of the stored polygons
+
+        :param index: Entry index
+        :return: List of flat [x1, y1, x2, y2, ...] polygons
+        """
+        first_polygon = int(self._annotation_offsets[index])
+        end_offset = int(self._annotation_offsets[index + 1]) + 1
+
+        offsets = self._polygon_offsets[first_polygon:end_offset]
+        first_point, last_point = int(offsets[0]), int(offsets[-1])
+
+        points = self._points[first_point:last_point].ravel().tolist()
+        bounds = (2 * (offsets - first_point)).tolist()
+
+        return [points[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def tolist(self) -> List[List[PolygonT]]:
+        """
+        Build nested list representations of all entries at once (much faster than get() of every entry)
+
+        :return: List of polygon segmentations
+        """
+        points = self.points.ravel().tolist()
+        bounds = (2 * self.polygon_offsets).tolist()
+        offsets = self.annotation_offsets.tolist()
+
+        polygons = [points[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+        return [polygons[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def take(self, indexes: np.ndarray) -> "PolygonStore":
+        """
+        Gather a compact store of the given entries (negative indexes produce empty entries)
+
+        :param indexes: Entry indexes
+        :return: A new store with entries aligned to the given indexes
+        """
+        indexes = np.asarray(indexes, dtype=np.int64)
+        valid = indexes >= 0
+
+        annotation_offsets = self.annotation_offsets
+        polygon_offsets = self.polygon_offsets
+
+        # invalid entries are read as the empty range [0, 0)
+        polygon_starts = annotation_offsets[np.where(valid, indexes, 0)]
+        polygon_counts = (
+            annotation_offsets[np.where(valid, indexes + 1, 0)] - polygon_starts
+        )
+        polygon_indexes = _concat_ranges(polygon_starts, polygon_counts)
+
+        point_starts = polygon_offsets[polygon_indexes]
+        point_counts = polygon_offsets[polygon_indexes + 1] - point_starts
+        point_indexes = _concat_ranges(point_starts, point_counts)
+
+        return PolygonStore(
+            points=self.points[point_indexes],
+            polygon_offsets=_offsets(point_counts),
+            annotation_offsets=_offsets(polygon_counts),
+        )
+
+    def polygon_areas(self) -> np.ndarray:
+        """
+        Compute areas of all stored polygons (the shoelace formula)
+
+        :return: (M,) float64 array of polygon areas
+        """
+        points = self.points.astype(np.float64)
+        polygon_offsets = self.polygon_offsets
+
+        point_counts = np.diff(polygon_offsets)
+        polygon_ids = np.repeat(np.arange(len(point_counts)), point_counts)
+
+        # index of the next point within the same polygon (the last point wraps to the first one)
+        next_points = np.arange(1, len(points) + 1)
+        non_empty = point_counts > 0
+        next_points[polygon_offsets[1:][non_empty] - 1] = polygon_offsets[:-1][
+            non_empty
+        ]
+
+        x, y = points[:, 0], points[:, 1]
+        cross = x * y[next_points] - x[next_points] * y
+
+        return (
+            np.abs(np.bincount(polygon_ids, weights=cross, minlength=len(point_counts)))
+            / 2
+        )
+
+    def areas(self) -> np.ndarray:
+        """
+        Compute areas of the stored entries as sums of their polygon areas
+
+        :return: (N,) float64 array of entry areas
+        """
+        polygon_counts = np.diff(self.annotation_offsets)
+        entry_ids = np.repeat(np.arange(self._count), polygon_counts)
+
+        return np.bincount(
+            entry_ids, weights=self.polygon_areas(), minlength=self._count
+        )
+
+
+RLE_T = Union[UncompressedRLE_T, CompressedRLE_T]
+
+
+def decode_counts(counts: Union[str, bytes]) -> np.ndarray:
+    """
+    Decode a compressed RLE counts string (the same encoding as used by pycocotools)
+
+    :param counts: Compressed counts
+    :return: int64 array of run lengths
+    """
+    if isinstance(counts, str):
+        counts = counts.encode("ascii")
+
+    runs: List[int] = []
+    position, length = 0, len(counts)
+
+    while position < length:
+        value, shift, more = 0, 0, True
+
+        while more:
+            chunk = counts[position] - 48
+            value |= (chunk & 0x1F) << shift
+            more = bool(chunk & 0x20)
+            position += 1
+            shift += 5
+
+            if not more and chunk & 0x10:
+                value |= -1 << shift
+
+        if len(runs) > 2:
+            value += runs[-2]
+
+        runs.append(value)
+
+    return np.array(runs, dtype=np.int64)
+
+
+def encode_counts(runs: Union[Sequence[int], np.ndarray]) -> str:
+    """
+    Encode run lengths into a compressed RLE counts string (the same encoding as used by pycocotools)
+
+    :param runs: Run lengths (starting with a background run)
+    :return: Compressed counts
+    """
+    values = [int(run) for run in runs]
+    chars: List[str] = []
+
+    for index, value in enumerate(values):
+        if index > 2:
+            value -= values[index - 2]
+
+        more = True
+
+        while more:
+            chunk = value & 0x1F
+            value >>= 5
+            more = value != -1 if chunk & 0x10 else value != 0
+
+            if more:
+                chunk |= 0x20
+
+            chars.append(chr(chunk + 48))
+
+    return "".join(chars)
+
+
+def _rle_runs(rle: RLE_T) -> np.ndarray:
+    counts = rle["counts"]
+
+    if isinstance(counts, (str, bytes)):
+        return decode_counts(counts)
+
+    return np.asarray(counts, dtype=np.int64)
+
+
+def _rle_size(rles: Sequence[RLE_T]) -> List[int]:
+    sizes = {tuple(rle["size"]) for rle in rles}
+
+    if len(sizes) != 1:
+        raise ValueError(
+            f"RLEs have to be of the same (non-empty) size, got: {sorted(sizes)}"
+        )
+
+    return list(sizes.pop())
+
+
+def _runs_to_intervals(runs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Convert run lengths into [start, end) intervals of foreground pixels (in the column-major order)
+    """
+    positions = np.cumsum(runs)
+    ends = positions[1::2]
+    starts = positions[0::2][: len(ends)]
+
+    return starts, ends
+
+
+def _intervals_to_runs(starts: np.ndarray, ends: np.ndarray, total: int) -> np.ndarray:
+    """
+    Convert sorted non-overlapping foreground intervals into run lengths (touching intervals get merged)
+    """
+    non_empty = ends > starts
+    starts, ends = starts[non_empty], ends[non_empty]
+
+    if len(starts):
+        gaps = starts[1:] != ends[:-1]
+        starts = starts[np.r_[True, gaps]]
+        ends = ends[np.r_[gaps, True]]
+
+    edges = np.empty(2 * len(starts) + 2, dtype=np.int64)
+    edges[0], edges[-1] = 0, total
+    edges[1:-1:2] = starts
+    edges[2:-1:2] = ends
+
+    runs = np.diff(edges)
+
+    if len(runs) > 1 and runs[-1] == 0:
+        runs = runs[:-1]
+
+    return runs
+
+
+def _sweep(
+    rles: Sequence[RLE_T], weights: Sequence[int], accept: int
+) -> CompressedRLE_T:
+    """
+    Combine RLEs run by run: every RLE covers its foreground with its weight
+    and the result keeps segments where the total coverage equals to the accept value
+    (or exceeds zero when accept is 0)
+    """
+    size = _rle_size(rles)
+    total = int(np.prod(size))
+
+    starts_list, ends_list, weight_list = [], [], []
+
+    for rle, weight in zip(rles, weights):
+        starts, ends = _runs_to_intervals(_rle_runs(rle))
+
+        starts_list.append(starts)
+        ends_list.append(ends)
+        weight_list.append(np.full(len(starts), weight, dtype=np.int64))
+
+    # mask boundaries are added as no-op events, so empty masks are handled the same way
+    interval_weights = np.concatenate(weight_list)
+    positions = np.concatenate([np.array([0, total])] + starts_list + ends_list)
+    deltas = np.concatenate(([0, 0], interval_weights, -interval_weights))
+
+    order = np.argsort(positions, kind="stable")
+    positions, coverage = positions[order], np.cumsum(deltas[order])
+
+    # the coverage after the last event at each position holds until the next position
+    last_events = np.r_[positions[1:] != positions[:-1], True]
+    positions, coverage = positions[last_events], coverage[last_events]
+
+    selected = coverage > 0 if accept == 0 else coverage == accept
+    selected = selected[:-1]
+
+    return {
+        "counts": encode_counts(
+            _intervals_to_runs(positions[:-1][selected], positions[1:][selected], total)
+        ),
+        "size": size,
+    }
+
+
+def merge(rles: Sequence[RLE_T], intersect: bool = False) -> CompressedRLE_T:
+    """
+    Compute union (or intersection) of RLE masks without decoding them
+
+    :param rles: RLE masks of the same size (compressed or uncompressed)
+    :param intersect: Compute intersection instead of union
+    :return: Compressed RLE
+    """
+    return _sweep(rles, [1] * len(rles), accept=len(rles) if intersect else 0)
+
+
+def intersect(rles: Sequence[RLE_T]) -> CompressedRLE_T:
+    """
+    Compute intersection of RLE masks without decoding them
+
+    :param rles: RLE masks of the same size (compressed or uncompressed)
+    :return: Compressed RLE
+    """
+    return merge(rles, intersect=True)
+
+
+def subtract(rle: RLE_T, rles: Sequence[RLE_T]) -> CompressedRLE_T:
+    """
+    Subtract the union of RLE masks from the given RLE mask without decoding them
+
+    :param rle: RLE mask to subtract from
+    :param rles: RLE masks to subtract
+    :return: Compressed RLE
+    """
+    # any subtracted mask coverage pushes the total weight over 1
+    return _sweep([rle, *rles], [1] + [2] * len(rles), accept=1)
+
+
+def area(rles: Sequence[RLE_T]) -> np.ndarray:
+    """
+    Compute areas of RLE masks
+
+    :param rles: RLE masks (compressed or uncompressed)
+    :return: (N,) int64 array of areas
+    """
+    return np.fromiter(
+        (int(_rle_runs(rle)[1::2].sum()) for rle in rles), np.int64, len(rles)
+    )
+
+
+def to_bbox(rles: Sequence[RLE_T]) -> np.ndarray:
+    """
+    Compute tight bounding boxes of RLE masks
+
+    :param rles: RLE masks (compressed or uncompressed)
+    :return: (N, 4) float32 array of boxes in the xywh format (empty masks get zero boxes)
+    """
+    boxes = np.zeros((len(rles), 4), dtype=np.float32)
+
+    for index, rle in enumerate(rles):
+        starts, ends = _runs_to_intervals(_rle_runs(rle))
+        non_empty = ends > starts
+        starts, ends = starts[non_empty], ends[non_empty] - 1
+
+        if not len(starts):
+            continue
+
+        height = rle["size"][0]
+
+        start_columns, end_columns = starts // height, ends // height
+        start_rows, end_rows = starts % height, ends % height
+
+        # intervals spanning several columns cover the whole column height
+        spanning = start_columns != end_columns
+        start_rows[spanning], end_rows[spanning] = 0, height - 1
+
+        x_min, x_max = start_columns.min(), end_columns.max()
+        y_min, y_max = start_rows.min(), end_rows.max()
+
+        boxes[index] = (x_min, y_min, x_max - x_min + 1, y_max - y_min + 1)
+
+    return boxes
+
+
+def decode(rle: RLE_T) -> np.ndarray:
+    """
+    Decode an RLE into a dense binary mask
+
+    :param rle: RLE mask (compressed or uncompressed)
+    :return: (H, W) uint8 mask
+    """
+    height, width = rle["size"]
+    runs = _rle_runs(rle)
+    values = np.arange(len(runs), dtype=np.uint8) % 2
+
+    return np.repeat(values, runs).reshape(width, height).T
+
+
+def encode(mask: np.ndarray) -> CompressedRLE_T:
+    """
+    Encode a dense binary mask into a compressed RLE
+
+    :param mask: (H, W) binary mask
+    :return: Compressed RLE
+    """
+    height, width = mask.shape
+    pixels = np.asarray(mask, dtype=bool).ravel(order="F")
+
+    changes = np.flatnonzero(pixels[1:] != pixels[:-1]) + 1
+    edges = np.r_[0, changes, len(pixels)]
+    runs = np.diff(edges)
+
+    if len(pixels) and pixels[0]:
+        runs = np.r_[0, runs]
+
+    return {"counts": encode_counts(runs), "size": [height, width]}
+
+
+def _column_pieces(rle: RLE_T) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Split foreground intervals of an RLE into per-column pieces
+
+    :return: Column indexes, start rows and end rows (exclusive) of the pieces
+    """
+    height = rle["size"][0]
+    starts, ends = _runs_to_intervals(_rle_runs(rle))
+
+    non_empty = ends > starts
+    starts, ends = starts[non_empty], ends[non_empty]
+
+    first_columns, last_columns = starts // height, (ends - 1) // height
+    column_counts = last_columns - first_columns + 1
+
+    piece_intervals = np.repeat(np.arange(len(starts)), column_counts)
+    columns = _concat_ranges(first_columns, column_counts)
+    column_starts = columns * height
+
+    start_rows = np.maximum(starts[piece_intervals], column_starts) - column_starts
+    end_rows = np.minimum(ends[piece_intervals], column_starts + height) - column_starts
+
+    return columns, start_rows, end_rows
+
+
+def _pieces_to_rle(
+    columns: np.ndarray,
+    start_rows: np.ndarray,
+    end_rows: np.ndarray,
+    height: int,
+    width: int,
+) -> CompressedRLE_T:
+    """
+    Assemble an RLE from per-column foreground pieces (pieces are allowed to be unsorted and overlapping)
+    """
+    valid = (end_rows > start_rows) & (columns >= 0) & (columns < width)
+    columns, start_rows, end_rows = columns[valid], start_rows[valid], end_rows[valid]
+
+    starts = columns * height + start_rows
+    ends = columns * height + end_rows
+
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+
+    # merge overlapping pieces, so the intervals become disjoint
+    if len(starts):
+        running_ends = np.maximum.accumulate(ends)
+        new_groups = np.r_[True, starts[1:] > running_ends[:-1]]
+
+        starts = starts[new_groups]
+        ends = running_ends[np.r_[new_groups[1:], True]]
+
+    return {
+        "counts": encode_counts(_intervals_to_runs(starts, ends, height * width)),
+        "size": [height, width],
+    }
+
+
+def crop(rle: RLE_T, x: int, y: int, width: int, height: int) -> CompressedRLE_T:
+    """
+    Crop an RLE mask by remapping its runs (the mask is never decoded)
+
+    :param rle: RLE mask (compressed or uncompressed)
+    :param x: Left coordinate of the crop region
+    :param y: Top coordinate of the crop region
+    :param width: Width of the crop region
+    :param height: Height of the crop region
+    :return: Compressed RLE of the (height, width) size
+    """
+    columns, start_rows, end_rows = _column_pieces(rle)
+
+    start_rows = np.clip(start_rows, y, y + height) - y
+    end_rows = np.clip(end_rows, y, y + height) - y
+
+    return _pieces_to_rle(columns - x, start_rows, end_rows, height, width)
+
+
+def clip_polygon(points: np.ndarray, box: Sequence[float]) -> np.ndarray:
+    """
+    Clip a polygon with an axis-aligned rectangle (the Sutherland-Hodgman algorithm)
+
+    :param points: (P, 2) array of polygon points
+    :param box: Clipping rectangle in the xyxy format
+    :return: (M, 2) array of the clipped polygon points (empty if the polygon is outside of the rectangle)
+    """
+    x_min, y_min, x_max, y_max = box
+
+    for axis, bound, keep_greater in (
+        (0, x_min, True),
+        (0, x_max, False),
+        (1, y_min, True),
+        (1, y_max, False),
+    ):
+        if not len(points):
+            break
+
+        next_points = np.roll(points, -1, axis=0)
+
+        inside = points[:, axis] >= bound if keep_greater else points[:, axis] <= bound
+        next_inside = np.roll(inside, -1)
+        crossing = inside != next_inside
+
+        delta = next_points[:, axis] - points[:, axis]
+        ratio = np.divide(
+            bound - points[:, axis],
+            delta,
+            out=np.zeros_like(delta),
+            where=delta != 0,
+        )
+        intersections = points + ratio[:, None] * (next_points - points)
+        intersections[:, axis] = bound
+
+        # every edge emits its start point (when inside) followed by the boundary intersection (when crossing)
+        candidates = np.stack((points, intersections), axis=1)
+        emitted = np.stack((inside, crossing), axis=1)
+
+        points = candidates[emitted]
+
+    return points
+
+
+def _scaled_pixel_ranges(
+    starts: np.ndarray, ends: np.ndarray, scale: float, offset: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Map [start, end) pixel ranges with x' = scale * x + offset
+    and select target pixels whose centers fall into the mapped ranges
+    """
+    mapped_starts, mapped_ends = scale * starts + offset, scale * ends + offset
+    low, high = np.minimum(mapped_starts, mapped_ends), np.maximum(
+        mapped_starts, mapped_ends
+    )
+
+    return (
+        np.ceil(low - 0.5).astype(np.int64),
+        np.ceil(high - 0.5).astype(np.int64),
+    )
+
+
+def remap(
+    rle: RLE_T,
+    scale_x: float,
+    scale_y: float,
+    offset_x: float,
+    offset_y: float,
+    height: int,
+    width: int,
+) -> CompressedRLE_T:
+    """
+    Apply an axis-aligned transform (x' = scale_x * x + offset_x, y' = scale_y * y + offset_y)
+    to an RLE mask by remapping its runs (nearest neighbour sampling, the mask is never decoded).
+    Covers resizing, flipping (negative scales), padding and cropping
+
+    :param rle: RLE mask (compressed or uncompressed)
+    :param scale_x: Horizontal scale
+    :param scale_y: Vertical scale
+    :param offset_x: Horizontal offset
+    :param offset_y: Vertical offset
+    :param height: Height of the resulting mask
+    :param width: Width of the resulting mask
+    :return: Compressed RLE of the (height, width) size
+    """
+    columns, start_rows, end_rows = _column_pieces(rle)
+
+    start_columns, end_columns = _scaled_pixel_ranges(
+        columns, columns + 1, scale_x, offset_x
+    )
+    start_columns = np.clip(start_columns, 0, width)
+    end_columns = np.clip(end_columns, 0, width)
+
+    start_rows, end_rows = _scaled_pixel_ranges(start_rows, end_rows, scale_y, offset_y)
+    start_rows, end_rows = np.clip(start_rows, 0, height), np.clip(end_rows, 0, height)
+
+    # upscaled columns turn into several target columns
+    column_counts = np.maximum(end_columns - start_columns, 0)
+    pieces = np.repeat(np.arange(len(columns)), column_counts)
+
+    return _pieces_to_rle(
+        _concat_ranges(start_columns, column_counts),
+        start_rows[pieces],
+        end_rows[pieces],
+        height,
+        width,
+    )
+
+
+def flip(rle: RLE_T, horizontal: bool = True) -> CompressedRLE_T:
+    """
+    Flip an RLE mask by remapping its runs
+
+    :param rle: RLE mask (compressed or uncompressed)
+    :param horizontal: Flip horizontally (left to right) or vertically (top to bottom)
+    :return: Compressed RLE
+    """
+    height, width = rle["size"]
+
+    if horizontal:
+        return remap(rle, -1, 1, width, 0, height, width)
+
+    return remap(rle, 1, -1, 0, height, height, width)
+
+
+def _trunc(values: np.ndarray) -> np.ndarray:
+    # C-style (int) cast of pycocotools (rounds towards zero)
+    truncated: np.ndarray = np.trunc(values).astype(np.int64)
+
+    return truncated
+
+
+def from_polygon(
+    polygon: Union[PolygonT, np.ndarray], height: int, width: int
+) -> CompressedRLE_T:
+    """
+    Rasterize a polygon into a compressed RLE (the same way as pycocotools does)
+
+    :param polygon: Flat [x1, y1, x2, y2, ...] list or (K, 2) array of polygon points
+    :param height: Mask height
+    :param width: Mask width
+    :return: Compressed RLE
+    """
+    scale = 5.0
+    points = np.asarray(polygon, dtype=np.float64).reshape(-1, 2)
+    total = height * width
+
+    # upsample and get discrete points densely along the entire boundary
+    x = _trunc(scale * points[:, 0] + 0.5)
+    y = _trunc(scale * points[:, 1] + 0.5)
+    x_starts, x_ends = x, np.roll(x, -1)
+    y_starts, y_ends = y, np.roll(y, -1)
+
+    dx, dy = np.abs(x_ends - x_starts), np.abs(y_ends - y_starts)
+    along_x = dx >= dy
+    flip = (along_x & (x_starts > x_ends)) | (~along_x & (y_starts > y_ends))
+
+    x_starts, x_ends = np.where(flip, x_ends, x_starts), np.where(
+        flip, x_starts, x_ends
+    )
+    y_starts, y_ends = np.where(flip, y_ends, y_starts), np.where(
+        flip, y_starts, y_ends
+    )
+
+    steps = np.maximum(dx, dy)
+    slopes = np.where(
+        along_x,
+        (y_ends - y_starts) / np.maximum(dx, 1),
+        (x_ends - x_starts) / np.maximum(dy, 1),
+    )
+
+    edges = np.repeat(np.arange(len(points)), steps + 1)
+    d = _concat_ranges(np.zeros(len(points), np.int64), steps + 1)
+    t = np.where(flip[edges], steps[edges] - d, d)
+
+    u = np.where(
+        along_x[edges],
+        t + x_starts[edges],
+        _trunc(x_starts[edges] + slopes[edges] * t + 0.5),
+    )
+    v = np.where(
+        along_x[edges],
+        _trunc(y_starts[edges] + slopes[edges] * t + 0.5),
+        t + y_starts[edges],
+    )
+
+    # get points along the y-boundary and downsample
+    changed = np.flatnonzero(u[1:] != u[:-1]) + 1
+    u_current, u_previous = u[changed], u[changed - 1]
+    v_current, v_previous = v[changed], v[changed - 1]
+
+    xd = np.where(u_current < u_previous, u_current, u_current - 1).astype(np.float64)
+    xd = (xd + 0.5) / scale - 0.5
+    yd = np.minimum(v_current, v_previous).astype(np.float64)
+    yd = np.ceil(np.clip((yd + 0.5) / scale - 0.5, 0, height))
+
+    valid = (np.floor(xd) == xd) & (xd >= 0) & (xd <= width - 1)
+    boundary = xd[valid].astype(np.int64) * height + yd[valid].astype(np.int64)
+
+    # every boundary point toggles the mask, so points at the same position cancel each other
+    positions, multiplicity = np.unique(boundary[boundary < total], return_counts=True)
+    toggles = positions[multiplicity % 2 == 1]
+
+    runs = np.diff(np.r_[0, toggles, total])
+
+    return {"counts": encode_counts(runs), "size": [height, width]}
+
+
+def from_polygons(
+    polygons: Sequence[Union[PolygonT, np.ndarray]], height: int, width: int
+) -> CompressedRLE_T:
+    """
+    Rasterize polygons of one annotation into a compressed RLE (the union of all polygons)
+
+    :param polygons: Polygons as flat [x1, y1, x2, y2, ...] lists or (K, 2) arrays
+    :param height: Mask height
+    :param width: Mask width
+    :return: Compressed RLE
+    """
+    rles = [from_polygon(polygon, height, width) for polygon in polygons]
+
+    if not rles:
+        return {"counts": encode_counts([height * width]), "size": [height, width]}
+
+    return rles[0] if len(rles) == 1 else merge(rles)
+
+
+def to_rle(
+    segmentation: Union[List[PolygonT], RLE_T], height: int, width: int
+) -> CompressedRLE_T:
+    """
+    Convert any segmentation (polygons, uncompressed or compressed RLE) into a compressed RLE
+
+    :param segmentation: Annotation segmentation
+    :param height: Image height (used to rasterize polygons)
+    :param width: Image width (used to rasterize polygons)
+    :return: Compressed RLE
+    """
+    if isinstance(segmentation, list):
+        return from_polygons(segmentation, height, width)
+
+    counts = segmentation["counts"]
+
+    if isinstance(counts, (str, bytes)):
+        return {
+            "counts": counts if isinstance(counts, str) else counts.decode("ascii"),
+            "size": list(segmentation["size"]),
+        }
+
+    return {"counts": encode_counts(counts), "size": list(segmentation["size"])}
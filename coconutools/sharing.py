@@ -0,0 +1,487 @@
+"""
+Sharing of loaded datasets between processes.
+
+The dataset is packed into flat arrays (columns, polygon and keypoint stores, string tables) in one memory-mapped file.
+Unpickling a shared dataset maps the file read-only, so worker processes attach to the same pages
+instead of getting a copy of the whole dataset. Annotation and image objects are rebuilt from the arrays on access
+and reject assignments (they would change only the copy of one process)
+"""
+
+import mmap
+import os
+import pickle
+import tempfile
+import weakref
+from contextlib import suppress
+from os import PathLike
+from typing import Any, Dict, List, Optional, Tuple, cast
+
+import numpy as np
+
+from coconutools.annotations import Annotation
+from coconutools.columns import AnnotationColumns, image_slices
+from coconutools.dataset import COCO, EMPTY_INFO, Info
+from coconutools.images import Category, Image, License
+from coconutools.keypoints import KeypointStore
+from coconutools.segmentations import PolygonStore
+
+# array name -> (offset in the file, dtype, shape)
+LayoutT = Dict[str, Tuple[int, str, Tuple[int, ...]]]
+
+ALIGNMENT = 64
+
+SHARED_DIR = "/dev/shm"
+
+
+def _default_path() -> str:
+    directory = SHARED_DIR if os.path.isdir(SHARED_DIR) else tempfile.gettempdir()
+    descriptor, path = tempfile.mkstemp(prefix="coconutools-", dir=directory)
+    os.close(descriptor)
+
+    return path
+
+
+def _bytes_table(items: List[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+    offsets = np.zeros(len(items) + 1, dtype=np.int64)
+    np.cumsum([len(item) for item in items], out=offsets[1:])
+
+    return np.frombuffer(b"".join(items), dtype=np.uint8), offsets
+
+
+def _string_table(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    return _bytes_table([string.encode() for string in strings])
+
+
+def _blob_table(values: List[Optional[Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pickle values one by one, so a value is unpickled without the others (None is stored as an empty blob)
+    """
+    return _bytes_table(
+        [
+            b"" if value is None else pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            for value in values
+        ]
+    )
+
+
+def _table_item(table: np.ndarray, offsets: np.ndarray, position: int) -> bytes:
+    start, end = offsets[position].item(), offsets[position + 1].item()
+
+    return table[start:end].tobytes()
+
+
+def _pack(dataset: COCO) -> Dict[str, np.ndarray]:
+    """
+    Pack everything but the header (info, categories and licenses) into flat arrays
+    """
+    columns = dataset._get_columns()
+    annotations = dataset.annotations
+    images = dataset.images
+    count = len(annotations)
+
+    polygons = dataset._aligned_polygons()
+    keypoints = dataset._aligned_keypoints()
+    positions = np.arange(count, dtype=np.int64)
+
+    # RLEs and custom fields are rare, so they are pickled for the annotations that have them
+    details: List[Optional[Tuple[Any, Dict[str, Any]]]] = [None] * count
+
+    for position, annotation in enumerate(annotations):
+        segmentation = annotation._segmentation
+
+        # polygons go to the polygon store
+        if not isinstance(segmentation, list) or annotation.extra:
+            details[position] = (
+                [] if isinstance(segmentation, list) else segmentation,
+                annotation.extra,
+            )
+
+    annotation_details, annotation_detail_offsets = _blob_table(details)
+    file_names, file_name_offsets = _string_table([image.file_name for image in images])
+    image_details, image_detail_offsets = _blob_table(
+        [
+            {
+                field: value
+                for field, value in image.to_dict().items()
+                if field not in ("id", "file_name", "width", "height")
+            }
+            or None
+            for image in images
+        ]
+    )
+
+    return {
+        "ids": columns.ids,
+        "image_ids": columns.image_ids,
+        "category_ids": columns.category_ids,
+        "iscrowd": columns.iscrowd,
+        "areas": columns.areas,
+        "bboxes": columns.bboxes,
+        "image_sizes": columns.image_sizes,
+        "image_order": columns.image_order,
+        # exact values, columns keep float32 copies
+        "exact_iscrowd": np.fromiter(
+            (int(a.iscrowd) for a in annotations), np.int64, count
+        ),
+        "exact_areas": np.fromiter((a.area for a in annotations), np.float64, count),
+        "exact_bboxes": np.array(
+            [(a.bbox.x, a.bbox.y, a.bbox.width, a.bbox.height) for a in annotations],
+            dtype=np.float64,
+        ).reshape(count, 4),
+        "num_keypoints": np.fromiter(
+            (-1 if a.num_keypoints is None else a.num_keypoints for a in annotations),
+            np.int64,
+            count,
+        ),
+        "id_order": np.argsort(columns.ids, kind="stable"),
+        "polygon_indexes": np.where(
+            np.diff(polygons.annotation_offsets) > 0, positions, -1
+        ),
+        "keypoint_indexes": np.fromiter(
+            (
+                position if annotation.has_keypoints else -1
+                for position, annotation in enumerate(annotations)
+            ),
+            np.int64,
+            count,
+        ),
+        "points": polygons.points,
+        "polygon_offsets": polygons.polygon_offsets,
+        "annotation_offsets": polygons.annotation_offsets,
+        "keypoints": keypoints.keypoints,
+        "keypoint_offsets": keypoints.offsets,
+        "annotation_details": annotation_details,
+        "annotation_detail_offsets": annotation_detail_offsets,
+        "image_ids_table": np.fromiter(
+            (image.id for image in images), np.int64, len(images)
+        ),
+        "image_id_order": np.argsort(
+            np.fromiter((image.id for image in images), np.int64, len(images)),
+            kind="stable",
+        ),
+        "image_widths": np.fromiter(
+            (image.width for image in images), np.int64, len(images)
+        ),
+        "image_heights": np.fromiter(
+            (image.height for image in images), np.int64, len(images)
+        ),
+        "file_names": file_names,
+        "file_name_offsets": file_name_offsets,
+        "image_details": image_details,
+        "image_detail_offsets": image_detail_offsets,
+    }
+
+
+def _write(path: str, arrays: Dict[str, np.ndarray]) -> LayoutT:
+    """
+    Write arrays one after another (aligned for vectorized access) and return their layout
+    """
+    layout: LayoutT = {}
+    offset = 0
+
+    with open(path, "wb") as file:
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            padding = -offset % ALIGNMENT
+
+            file.write(b"\0" * padding)
+            offset += padding
+
+            layout[name] = (offset, array.dtype.str, array.shape)
+            file.write(array.tobytes())
+            offset += array.nbytes
+
+        # empty files can't be memory-mapped
+        file.write(b"\0")
+
+    return layout
+
+
+def _attach(path: str, layout: LayoutT) -> Dict[str, np.ndarray]:
+    """
+    Map the file read-only and create array views over it
+    """
+    with open(path, "rb") as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    arrays: Dict[str, np.ndarray] = {}
+
+    for name, (offset, dtype, shape) in layout.items():
+        size = int(np.prod(shape, dtype=np.int64))
+
+        # views keep the mapping alive, it's unmapped once all of them are garbage collected
+        arrays[name] = np.frombuffer(
+            buffer, dtype=np.dtype(dtype), count=size, offset=offset
+        ).reshape(shape)
+
+    return arrays
+
+
+def _remove(path: str, owner_pid: int) -> None:
+    # forked workers inherit the owner object, but only the owner process removes the file
+    if os.getpid() == owner_pid:
+        with suppress(FileNotFoundError):
+            os.remove(path)
+
+
+class _SharedAnnotation(Annotation):
+    """
+    Annotation rebuilt from the arrays of a shared dataset
+    """
+
+    __slots__ = ()
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise TypeError("Shared datasets are read-only")
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # the annotation is rebuilt from the arrays of the dataset attached in the receiving process
+        return cast(SharedCOCO, self._dataset)._get_annotation, (self.id,)
+
+
+class _SharedImage(Image):
+    """
+    Image rebuilt from the arrays of a shared dataset
+    """
+
+    __slots__ = ()
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise TypeError("Shared datasets are read-only")
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return cast(SharedCOCO, self._dataset)._get_image, (self.id,)
+
+
+class SharedCOCO(COCO):
+    """
+    Read-only COCO dataset backed by a memory-mapped file (see COCO.share()).
+    Pickling sends only the file path and the array layout, so the dataset can be passed to worker processes cheaply.
+    Annotations and images are rebuilt per process on first access (custom fields and RLEs are unpickled
+    for the accessed annotation only) and their fields can't be assigned.
+    The file is removed when the dataset created by share() is garbage collected
+    """
+
+    def __init__(
+        self,
+        path: str,
+        layout: LayoutT,
+        header: Dict[str, Any],
+        image_dir: Optional[PathLike] = None,
+        owner: bool = False,
+    ) -> None:
+        self.annotation_file = None
+        self.image_dir = image_dir
+
+        self._path = path
+        self._layout = layout
+        self._header = header
+
+        self._reset()
+
+        self._info = Info(**{**EMPTY_INFO, **header["info"]})
+
+        for category_info in header["categories"]:
+            self._add_category(Category(**category_info))
+
+        for license_info in header["licenses"]:
+            self._add_licence(License(**license_info))
+
+        self._arrays = arrays = _attach(path, layout)
+
+        self._polygons = PolygonStore(
+            arrays["points"], arrays["polygon_offsets"], arrays["annotation_offsets"]
+        )
+        self._keypoints = KeypointStore(arrays["keypoints"], arrays["keypoint_offsets"])
+        self._columns = AnnotationColumns(
+            ids=arrays["ids"],
+            image_ids=arrays["image_ids"],
+            category_ids=arrays["category_ids"],
+            iscrowd=arrays["iscrowd"],
+            areas=arrays["areas"],
+            bboxes=arrays["bboxes"],
+            image_sizes=arrays["image_sizes"],
+            polygon_indexes=arrays["polygon_indexes"],
+            keypoint_indexes=arrays["keypoint_indexes"],
+            image_order=arrays["image_order"],
+            image_slices=image_slices(arrays["image_ids"], arrays["image_order"]),
+        )
+
+        # objects are built on first access
+        self._annotation_cache: Dict[int, Annotation] = {}
+        self._image_cache: Dict[int, Image] = {}
+        self._all_annotations: Optional[List[Annotation]] = None
+        self._all_images: Optional[List[Image]] = None
+
+        if owner:
+            weakref.finalize(self, _remove, path, os.getpid())
+
+    @classmethod
+    def from_dataset(
+        cls, dataset: COCO, path: Optional[PathLike] = None
+    ) -> "SharedCOCO":
+        """
+        Pack the dataset into a memory-mapped file
+
+        :param dataset: COCO dataset
+        :param path: Path to the file (a temporary file in /dev/shm or the temp directory by default)
+        :return: Shared dataset that owns the file
+        """
+        file_path = _default_path() if path is None else os.fspath(path)
+
+        try:
+            layout = _write(file_path, _pack(dataset))
+        except BaseException:
+            _remove(file_path, os.getpid())
+            raise
+
+        header = {
+            "info": dataset.info.to_dict(),
+            "categories": [category.to_dict() for category in dataset.categories],
+            "licenses": [licence.to_dict() for licence in dataset.licences],
+        }
+
+        return cls(file_path, layout, header, dataset.image_dir, owner=True)
+
+    @classmethod
+    def _create(cls, image_dir: Optional[PathLike] = None) -> COCO:
+        # datasets derived from a shared one (remapped, deduplicated, ...) are regular in-memory datasets
+        return COCO._create(image_dir)
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return SharedCOCO, (self._path, self._layout, self._header, self.image_dir)
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def annotations(self) -> List[Annotation]:
+        if self._all_annotations is None:
+            self._all_annotations = [
+                self._annotation_at(position)
+                for position in range(len(self._arrays["ids"]))
+            ]
+
+        return self._all_annotations
+
+    @property
+    def images(self) -> List[Image]:
+        if self._all_images is None:
+            self._all_images = [
+                self._image_at(position)
+                for position in range(len(self._arrays["image_ids_table"]))
+            ]
+
+        return self._all_images
+
+    def _get_columns(self) -> AnnotationColumns:
+        assert self._columns is not None
+
+        return self._columns
+
+    def _get_annotation(self, annotation_id: int) -> Annotation:
+        return self._annotation_at(
+            self._find(self._arrays["ids"], self._arrays["id_order"], annotation_id)
+        )
+
+    def _get_image(self, image_id: int) -> Image:
+        return self._image_at(
+            self._find(
+                self._arrays["image_ids_table"],
+                self._arrays["image_id_order"],
+                image_id,
+            )
+        )
+
+    @staticmethod
+    def _find(ids: np.ndarray, order: np.ndarray, id: int) -> int:
+        index = int(np.searchsorted(ids, id, sorter=order))
+
+        if index == len(ids) or ids[order[index]] != id:
+            raise KeyError(id)
+
+        position: int = order[index].item()
+
+        return position
+
+    def _annotation_at(self, position: int) -> Annotation:
+        annotation = self._annotation_cache.get(position)
+
+        if annotation is not None:
+            return annotation
+
+        arrays = self._arrays
+        details = _table_item(
+            arrays["annotation_details"], arrays["annotation_detail_offsets"], position
+        )
+        segmentation, extra = pickle.loads(details) if details else ([], {})
+        num_keypoints: int = arrays["num_keypoints"][position].item()
+
+        annotation = Annotation(
+            id=arrays["ids"][position].item(),
+            image_id=arrays["image_ids"][position].item(),
+            category_id=arrays["category_ids"][position].item(),
+            iscrowd=arrays["exact_iscrowd"][position].item(),
+            segmentation=segmentation,
+            bbox=tuple(arrays["exact_bboxes"][position].tolist()),
+            area=arrays["exact_areas"][position].item(),
+            dataset=self,
+            num_keypoints=None if num_keypoints < 0 else num_keypoints,
+            **extra,
+        )
+
+        if arrays["polygon_indexes"][position] >= 0:
+            annotation._attach_polygons(position)
+
+        if arrays["keypoint_indexes"][position] >= 0:
+            annotation._attach_keypoints(position)
+
+        annotation.__class__ = _SharedAnnotation
+        self._annotation_cache[position] = annotation
+
+        return annotation
+
+    def _image_at(self, position: int) -> Image:
+        image = self._image_cache.get(position)
+
+        if image is not None:
+            return image
+
+        arrays = self._arrays
+        details = _table_item(
+            arrays["image_details"], arrays["image_detail_offsets"], position
+        )
+
+        image = Image(
+            id=arrays["image_ids_table"][position].item(),
+            file_name=_table_item(
+                arrays["file_names"], arrays["file_name_offsets"], position
+            ).decode(),
+            width=arrays["image_widths"][position].item(),
+            height=arrays["image_heights"][position].item(),
+            dataset=self,
+            **(pickle.loads(details) if details else {}),
+        )
+        image.__class__ = _SharedImage
+
+        self._image_cache[position] = image
+
+        return image
+
+    def _build_annotations(self, annotation_infos: List[Dict[str, Any]]) -> None:
+        raise TypeError("Shared datasets are read-only")
+
+    def _add_image(self, image: Image) -> None:
+        raise TypeError("Shared datasets are read-only")
+
+    def _add_annotation(self, annotation: Annotation) -> None:
+        raise TypeError("Shared datasets are read-only")
+
+    def _remove_annotation(self, annotation: Annotation) -> None:
+        raise TypeError("Shared datasets are read-only")
+
+    def _move_annotation(
+        self, annotation: Annotation, image_id: int, category_id: int
+    ) -> None:
+        raise TypeError("Shared datasets are read-only")
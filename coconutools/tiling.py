@@ -0,0 +1,365 @@
+import os
+from functools import partial
+from os import PathLike
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
+
+import numpy as np
+
+from coconutools.parallel import ordered_map
+from coconutools.segmentations import (
+    RLE_T,
+    PolygonStore,
+    _concat_ranges,
+    area,
+    clip_polygon,
+    crop,
+    to_bbox,
+)
+from coconutools.writers import DatasetWriter
+
+if TYPE_CHECKING:
+    from coconutools.dataset import COCO
+
+TileSizeT = Union[int, Tuple[int, int]]
+
+# image record, annotation records (without geometry), xywh boxes, polygons and RLEs of one image
+ImagePayloadT = Tuple[
+    Dict[str, Any],
+    List[Dict[str, Any]],
+    np.ndarray,
+    PolygonStore,
+    List[Optional[RLE_T]],
+]
+TilesT = List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]
+
+
+def tile_offsets(length: int, size: int, overlap: int) -> np.ndarray:
+    """
+    Compute tile offsets along one image axis. The last tile is aligned to the image border,
+    so tiles cover the whole image and all of them have the same size (unless the image is smaller)
+
+    :param length: Image width or height
+    :param size: Tile size along the axis
+    :param overlap: Overlap of neighbour tiles
+    :return: int64 array of tile offsets
+    """
+    if length <= size:
+        return np.zeros(1, dtype=np.int64)
+
+    offsets = np.arange(0, length - size, size - overlap, dtype=np.int64)
+
+    return np.append(offsets, length - size)
+
+
+def _overlapping_tiles(
+    starts: np.ndarray, ends: np.ndarray, box_starts: np.ndarray, box_ends: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the range of (sorted) tiles overlapping every box along one axis
+
+    :return: The first overlapping tile index and the number of overlapping tiles per box
+    """
+    first = np.searchsorted(ends, box_starts, side="right")
+    last = np.searchsorted(starts, box_ends, side="left") - 1
+
+    return first, np.maximum(last - first + 1, 0)
+
+
+def _tile_image(
+    payload: ImagePayloadT,
+    size: Tuple[int, int],
+    overlap: int,
+    min_visible_fraction: float,
+) -> TilesT:
+    image, records, bboxes, polygons, rles = payload
+
+    tile_width = min(size[0], image["width"])
+    tile_height = min(size[1], image["height"])
+    x_offsets = tile_offsets(image["width"], tile_width, overlap)
+    y_offsets = tile_offsets(image["height"], tile_height, overlap)
+
+    # bucket annotations by tiles, so the work is proportional to the number of annotations per tile
+    first_x, count_x = _overlapping_tiles(
+        x_offsets, x_offsets + tile_width, bboxes[:, 0], bboxes[:, 0] + bboxes[:, 2]
+    )
+    first_y, count_y = _overlapping_tiles(
+        y_offsets, y_offsets + tile_height, bboxes[:, 1], bboxes[:, 1] + bboxes[:, 3]
+    )
+
+    pair_counts = count_x * count_y
+    pair_annotations = np.repeat(np.arange(len(records)), pair_counts)
+    pair_steps = _concat_ranges(np.zeros(len(records), np.int64), pair_counts)
+
+    safe_count_y = np.maximum(count_y[pair_annotations], 1)
+    pair_tiles = (first_y[pair_annotations] + pair_steps % safe_count_y) * len(
+        x_offsets
+    ) + (first_x[pair_annotations] + pair_steps // safe_count_y)
+
+    order = np.argsort(pair_tiles, kind="stable")
+    pair_tiles, pair_annotations = pair_tiles[order], pair_annotations[order]
+
+    # every tile is emitted (even without annotations), so no part of the image is lost
+    tile_ids = np.arange(len(x_offsets) * len(y_offsets))
+    tile_starts = np.searchsorted(pair_tiles, tile_ids, side="left")
+    tile_ends = np.searchsorted(pair_tiles, tile_ids, side="right")
+
+    polygon_areas = polygons.areas()
+    rle_areas = {
+        index: int(area([rle])[0]) for index, rle in enumerate(rles) if rle is not None
+    }
+    file_name, extension = os.path.splitext(image["file_name"])
+
+    tiles: TilesT = []
+
+    for tile_id, start, end in zip(tile_ids, tile_starts, tile_ends):
+        x = int(x_offsets[tile_id % len(x_offsets)])
+        y = int(y_offsets[tile_id // len(x_offsets)])
+        tile_box = (x, y, x + tile_width, y + tile_height)
+
+        tile_annotations: List[Dict[str, Any]] = []
+
+        for index in pair_annotations[start:end].tolist():
+            clipped = _clip_annotation(
+                index,
+                tile_box,
+                bboxes[index],
+                records[index],
+                polygons,
+                polygon_areas[index],
+                rles[index],
+                rle_areas.get(index),
+            )
+
+            if clipped is None or clipped[1] < min_visible_fraction:
+                continue
+
+            tile_annotations.append(clipped[0])
+
+        tile_image = {
+            **image,
+            "file_name": f"{file_name}_{x}_{y}{extension}",
+            "width": tile_width,
+            "height": tile_height,
+        }
+
+        tiles.append((tile_image, tile_annotations))
+
+    return tiles
+
+
+def _clip_annotation(
+    index: int,
+    tile_box: Tuple[int, int, int, int],
+    bbox: np.ndarray,
+    record: Dict[str, Any],
+    polygons: PolygonStore,
+    polygon_area: float,
+    rle: Optional[RLE_T],
+    rle_area: Optional[int],
+) -> Optional[Tuple[Dict[str, Any], float]]:
+    """
+    Clip an annotation with a tile
+
+    :return: The clipped annotation record (in the tile coordinates) and its visible fraction
+    """
+    x_min, y_min, x_max, y_max = tile_box
+    first_polygon, last_polygon = polygons.annotation_offsets[[index, index + 1]]
+
+    segmentation: Any = []
+
+    if rle is not None:
+        segmentation = crop(rle, x_min, y_min, x_max - x_min, y_max - y_min)
+        clipped_area = float(area([segmentation])[0])
+        clipped_bbox = to_bbox([segmentation])[0].tolist()
+        fraction = clipped_area / rle_area if rle_area else 0.0
+    elif last_polygon > first_polygon:
+        points = polygons.points
+        bounds = polygons.polygon_offsets[
+            np.arange(first_polygon, last_polygon + 1)
+        ].tolist()
+
+        clipped_polygons = [
+            clip_polygon(points[start:end], tile_box)
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+        clipped_polygons = [p for p in clipped_polygons if len(p) >= 3]
+
+        if not clipped_polygons:
+            return None
+
+        clipped_store = PolygonStore(
+            points=np.concatenate(clipped_polygons) - (x_min, y_min),
+            polygon_offsets=np.cumsum([0] + [len(p) for p in clipped_polygons]),
+            annotation_offsets=np.array([0, len(clipped_polygons)]),
+        )
+
+        segmentation = clipped_store.get(0)
+        clipped_area = float(clipped_store.areas()[0])
+        clipped_points = clipped_store.points
+        clipped_bbox = [
+            *clipped_points.min(axis=0).tolist(),
+            *(clipped_points.max(axis=0) - clipped_points.min(axis=0)).tolist(),
+        ]
+        fraction = clipped_area / polygon_area if polygon_area else 0.0
+    else:
+        x, y, width, height = bbox.tolist()
+        clipped_x, clipped_y = max(x, x_min), max(y, y_min)
+        clipped_width = min(x + width, x_max) - clipped_x
+        clipped_height = min(y + height, y_max) - clipped_y
+
+        if clipped_width <= 0 or clipped_height <= 0:
+            return None
+
+        fraction = clipped_width * clipped_height / (width * height)
+        clipped_area = record["area"] * fraction
+        clipped_bbox = [
+            clipped_x - x_min,
+            clipped_y - y_min,
+            clipped_width,
+            clipped_height,
+        ]
+
+    if clipped_area <= 0:
+        return None
+
+    annotation = {
+        **record,
+        "segmentation": segmentation,
+        "bbox": clipped_bbox,
+        "area": clipped_area,
+    }
+
+    if "keypoints" in record:
+        annotation.update(_clip_keypoints(record, tile_box))
+
+    return annotation, fraction
+
+
+def _clip_keypoints(
+    record: Dict[str, Any], tile_box: Tuple[int, int, int, int]
+) -> Dict[str, Any]:
+    """
+    Move keypoints to the tile coordinates (keypoints outside of the tile become not labelled)
+    """
+    x_min, y_min, x_max, y_max = tile_box
+    keypoints = np.asarray(record["keypoints"], dtype=np.float32).reshape(-1, 3)
+
+    kept = (
+        (keypoints[:, 2] > 0)
+        & (keypoints[:, 0] >= x_min)
+        & (keypoints[:, 0] <= x_max)
+        & (keypoints[:, 1] >= y_min)
+        & (keypoints[:, 1] <= y_max)
+    )
+    keypoints[:, :2] -= (x_min, y_min)
+    keypoints[~kept] = 0
+
+    clipped: Dict[str, Any] = {"keypoints": keypoints.ravel().tolist()}
+
+    if "num_keypoints" in record:
+        clipped["num_keypoints"] = int(kept.sum())
+
+    return clipped
+
+
+def _image_payloads(dataset: "COCO") -> Iterator[ImagePayloadT]:
+    columns = dataset._get_columns()
+
+    for image in dataset.images:
+        positions = columns.image_positions(image.id)
+        annotations = [dataset.annotations[position] for position in positions.tolist()]
+
+        records = []
+        rles: List[Optional[RLE_T]] = []
+
+        for annotation in annotations:
+            # polygons are passed in the flat form, so only RLEs are read from annotations
+            segmentation = annotation._segmentation
+
+            rles.append(
+                cast(RLE_T, segmentation) if isinstance(segmentation, dict) else None
+            )
+            records.append(
+                {
+                    "category_id": annotation.category_id,
+                    "iscrowd": annotation.iscrowd,
+                    "area": annotation.area,
+                    **annotation._keypoint_dict(),
+                    **annotation.extra,
+                }
+            )
+
+        yield (
+            image.to_dict(),
+            records,
+            columns.bboxes[positions],
+            dataset.polygons(image_id=image.id),
+            rles,
+        )
+
+
+def tile_dataset(
+    dataset: "COCO",
+    output_file: PathLike,
+    size: TileSizeT,
+    overlap: int = 0,
+    min_visible_fraction: float = 0.0,
+    workers: Optional[int] = None,
+) -> None:
+    """
+    Split dataset images into tiles and clip annotations accordingly.
+    Tiled images and annotations are written to the output file as soon as each source image is processed
+
+    :param dataset: COCO dataset to tile
+    :param output_file: Path to the tiled annotation file
+    :param size: Tile size (one value for square tiles or a (width, height) tuple)
+    :param overlap: Overlap of neighbour tiles in pixels
+    :param min_visible_fraction: Drop annotations that have smaller part of their area inside the tile
+    :param workers: Number of worker processes to tile images in parallel
+    """
+    tile_size = (size, size) if isinstance(size, int) else size
+
+    if not 0 <= overlap < min(tile_size):
+        raise ValueError(
+            f"Tile overlap has to be non-negative and smaller than the tile size, got {overlap}"
+        )
+
+    tile = partial(
+        _tile_image,
+        size=tile_size,
+        overlap=overlap,
+        min_visible_fraction=min_visible_fraction,
+    )
+
+    with DatasetWriter(
+        output_file,
+        info=dataset.info.to_dict(),
+        categories=[category.to_dict() for category in dataset.categories],
+        licenses=[licence.to_dict() for licence in dataset.licences],
+    ) as writer:
+        for tiles in ordered_map(tile, _image_payloads(dataset), workers=workers):
+            tile_images: List[Dict[str, Any]] = []
+            tile_annotations: List[Dict[str, Any]] = []
+
+            for tile_image, annotations in tiles:
+                image_id = writer.image_count + len(tile_images) + 1
+                tile_images.append({**tile_image, "id": image_id})
+
+                for annotation in annotations:
+                    annotation_id = writer.annotation_count + len(tile_annotations) + 1
+                    tile_annotations.append(
+                        {**annotation, "id": annotation_id, "image_id": image_id}
+                    )
+
+            writer.write_images(tile_images)
+            writer.write_annotations(tile_annotations)
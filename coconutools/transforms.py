@@ -0,0 +1,586 @@
+"""
+Batched geometric transforms of annotations.
+
+Every transform is expressed as a 3x3 affine matrix (and an output size) per image, so the whole dataset
+is transformed at once: bounding boxes and polygon points are multiplied by their image matrices in bulk,
+RLEs are transformed by remapping their runs (flips, crops, padding and scaling) and areas are recomputed
+"""
+
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple, Union, cast
+
+import numpy as np
+
+from coconutools.annotations import Annotation
+from coconutools.dataset import COCO
+from coconutools.images import Category, Image, License
+from coconutools.keypoints import KeypointStore
+from coconutools.segmentations import (
+    RLE_T,
+    PolygonStore,
+    _offsets,
+    area,
+    clip_polygon,
+    decode,
+    encode,
+    remap,
+    to_bbox,
+)
+
+ScaleT = Union[float, Tuple[float, float]]
+SizeT = Tuple[int, int]
+
+
+def _matrix(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float64)
+
+    if matrix.shape == (2, 3):
+        matrix = np.vstack((matrix, [0, 0, 1]))
+
+    if matrix.shape != (3, 3):
+        raise ValueError(f"Affine matrix has to be 2x3 or 3x3, got {matrix.shape}")
+
+    return matrix
+
+
+def transform_points(points: np.ndarray, matrices: np.ndarray) -> np.ndarray:
+    """
+    Apply affine matrices to points
+
+    :param points: (P, 2) array of points
+    :param matrices: (3, 3) matrix or (P, 3, 3) per-point matrices
+    :return: (P, 2) array of transformed points
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+    transformed: np.ndarray
+
+    if matrices.ndim == 2:
+        transformed = points @ matrices[:2, :2].T + matrices[:2, 2]
+    else:
+        transformed = (
+            np.einsum("pij,pj->pi", matrices[:, :2, :2], points) + matrices[:, :2, 2]
+        )
+
+    return transformed
+
+
+def transform_boxes(boxes: np.ndarray, matrices: np.ndarray) -> np.ndarray:
+    """
+    Apply affine matrices to xywh boxes (the result is the bounding box of the transformed corners)
+
+    :param boxes: (N, 4) array of boxes in the xywh format
+    :param matrices: (3, 3) matrix or (N, 3, 3) per-box matrices
+    :return: (N, 4) float32 array of boxes in the xywh format
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    x_min, y_min = boxes[:, 0], boxes[:, 1]
+    x_max, y_max = x_min + boxes[:, 2], y_min + boxes[:, 3]
+
+    corners = np.stack(
+        (
+            np.stack((x_min, y_min), axis=-1),
+            np.stack((x_max, y_min), axis=-1),
+            np.stack((x_max, y_max), axis=-1),
+            np.stack((x_min, y_max), axis=-1),
+        ),
+        axis=1,
+    ).reshape(-1, 2)
+
+    if matrices.ndim == 3:
+        matrices = np.repeat(matrices, 4, axis=0)
+
+    corners = transform_points(corners, matrices).reshape(-1, 4, 2)
+    top_left, bottom_right = corners.min(axis=1), corners.max(axis=1)
+
+    return np.hstack((top_left, bottom_right - top_left)).astype(np.float32)
+
+
+def transform_rle(rle: RLE_T, matrix: np.ndarray, width: int, height: int) -> RLE_T:
+    """
+    Apply an affine matrix to an RLE mask. Axis-aligned transforms (scaling, flips, crops, padding)
+    remap the runs directly, other transforms (e.g. rotations) fall back to nearest-neighbour warping
+    of the decoded mask
+
+    :param rle: RLE mask (compressed or uncompressed)
+    :param matrix: 3x3 affine matrix
+    :param width: Width of the resulting mask
+    :param height: Height of the resulting mask
+    :return: Compressed RLE of the (height, width) size
+    """
+    matrix = _matrix(matrix)
+
+    if matrix[0, 1] == 0 and matrix[1, 0] == 0:
+        return remap(
+            rle, matrix[0, 0], matrix[1, 1], matrix[0, 2], matrix[1, 2], height, width
+        )
+
+    mask = decode(rle)
+
+    target_y, target_x = np.mgrid[0:height, 0:width]
+    target_points = np.stack((target_x.ravel(), target_y.ravel()), axis=-1) + 0.5
+    source = np.floor(transform_points(target_points, np.linalg.inv(matrix)))
+    source_x, source_y = source[:, 0].astype(np.int64), source[:, 1].astype(np.int64)
+
+    inside = (
+        (source_x >= 0)
+        & (source_x < mask.shape[1])
+        & (source_y >= 0)
+        & (source_y < mask.shape[0])
+    )
+    warped = np.zeros(height * width, dtype=bool)
+    warped[inside] = mask[source_y[inside], source_x[inside]]
+
+    return encode(warped.reshape(height, width))
+
+
+def transform_polygons(
+    polygons: PolygonStore,
+    matrices: np.ndarray,
+    widths: np.ndarray,
+    heights: np.ndarray,
+) -> PolygonStore:
+    """
+    Apply affine matrices to polygons and clip them to the resulting image boundaries
+
+    :param polygons: Polygons store
+    :param matrices: (3, 3) matrix or (N, 3, 3) per-entry matrices
+    :param widths: (N,) array of resulting image widths (or a scalar)
+    :param heights: (N,) array of resulting image heights (or a scalar)
+    :return: Polygon store with the same entries (polygons that fall outside of images are dropped)
+    """
+    annotation_offsets = polygons.annotation_offsets
+    polygon_offsets = polygons.polygon_offsets
+
+    polygon_counts = np.diff(annotation_offsets)
+    point_counts = np.diff(polygon_offsets)
+
+    polygon_owners = np.repeat(np.arange(len(polygons)), polygon_counts)
+    point_owners = np.repeat(polygon_owners, point_counts)
+
+    widths = np.broadcast_to(np.asarray(widths, dtype=np.float64), (len(polygons),))
+    heights = np.broadcast_to(np.asarray(heights, dtype=np.float64), (len(polygons),))
+
+    points = transform_points(
+        polygons.points,
+        matrices if matrices.ndim == 2 else matrices[point_owners],
+    )
+
+    # only polygons sticking out of images need the (per polygon) clipping
+    outside = (
+        (points[:, 0] < 0)
+        | (points[:, 1] < 0)
+        | (points[:, 0] > widths[point_owners])
+        | (points[:, 1] > heights[point_owners])
+    )
+    polygon_ids = np.repeat(np.arange(len(point_counts)), point_counts)
+    clipped_polygons = np.flatnonzero(
+        np.bincount(polygon_ids[outside], minlength=len(point_counts))
+    )
+
+    if not len(clipped_polygons):
+        return PolygonStore(points, polygon_offsets, annotation_offsets)
+
+    chunks: List[np.ndarray] = []
+    kept_point_counts = point_counts.copy()
+    clipped_set = set(clipped_polygons.tolist())
+
+    for polygon_id, (start, end) in enumerate(
+        zip(polygon_offsets[:-1].tolist(), polygon_offsets[1:].tolist())
+    ):
+        polygon_points = points[start:end]
+
+        if polygon_id in clipped_set:
+            owner = polygon_owners[polygon_id]
+            polygon_points = clip_polygon(
+                polygon_points, (0, 0, widths[owner], heights[owner])
+            )
+
+            if len(polygon_points) < 3:
+                polygon_points = polygon_points[:0]
+
+            kept_point_counts[polygon_id] = len(polygon_points)
+
+        chunks.append(polygon_points)
+
+    kept_polygons = kept_point_counts > 0
+    kept_polygon_counts = np.bincount(
+        polygon_owners[kept_polygons], minlength=len(polygons)
+    )
+
+    return PolygonStore(
+        points=np.concatenate(chunks) if chunks else np.empty((0, 2)),
+        polygon_offsets=_offsets(kept_point_counts[kept_polygons]),
+        annotation_offsets=_offsets(kept_polygon_counts),
+    )
+
+
+def transform_keypoints(
+    keypoints: KeypointStore,
+    matrices: np.ndarray,
+    widths: np.ndarray,
+    heights: np.ndarray,
+) -> KeypointStore:
+    """
+    Apply affine matrices to labelled keypoints. Keypoints that end up outside of images become not labelled
+    (keypoint order is kept, so left and right keypoints are not swapped by flips)
+
+    :param keypoints: Keypoint store
+    :param matrices: (3, 3) matrix or (N, 3, 3) per-entry matrices
+    :param widths: (N,) array of resulting image widths (or a scalar)
+    :param heights: (N,) array of resulting image heights (or a scalar)
+    :return: Keypoint store with the same entries
+    """
+    owners = np.repeat(np.arange(len(keypoints)), keypoints.counts)
+    widths = np.broadcast_to(np.asarray(widths, dtype=np.float64), (len(keypoints),))
+    heights = np.broadcast_to(np.asarray(heights, dtype=np.float64), (len(keypoints),))
+
+    transformed = keypoints.keypoints.copy()
+    points = transform_points(
+        transformed[:, :2], matrices if matrices.ndim == 2 else matrices[owners]
+    )
+
+    inside = (
+        (points[:, 0] >= 0)
+        & (points[:, 1] >= 0)
+        & (points[:, 0] <= widths[owners])
+        & (points[:, 1] <= heights[owners])
+    )
+    labelled = transformed[:, 2] > 0
+
+    transformed[:, :2] = points
+    transformed[~(labelled & inside)] = 0
+
+    return KeypointStore(transformed, keypoints.offsets)
+
+
+def _polygon_bboxes(polygons: PolygonStore) -> np.ndarray:
+    """
+    Compute tight xywh bounding boxes of polygon store entries (empty entries get NaN boxes)
+    """
+    boxes = np.full((len(polygons), 4), np.nan, dtype=np.float32)
+
+    point_starts = polygons.polygon_offsets[polygons.annotation_offsets]
+    point_counts = np.diff(point_starts)
+    non_empty = np.flatnonzero(point_counts > 0)
+
+    if len(non_empty):
+        points = polygons.points
+        group_starts = point_starts[non_empty]
+        top_left = np.minimum.reduceat(points, group_starts, axis=0)
+        bottom_right = np.maximum.reduceat(points, group_starts, axis=0)
+
+        boxes[non_empty] = np.hstack((top_left, bottom_right - top_left))
+
+    return boxes
+
+
+def transform(
+    dataset: COCO,
+    matrices: Mapping[int, np.ndarray],
+    sizes: Optional[Mapping[int, SizeT]] = None,
+) -> COCO:
+    """
+    Apply per-image affine transforms to the whole dataset at once.
+    Annotations that end up outside of their images are dropped, areas are recomputed
+
+    :param dataset: COCO dataset
+    :param matrices: Image ID -> 2x3 or 3x3 affine matrix (images without matrices are left intact)
+    :param sizes: Image ID -> (width, height) of the transformed image (the original sizes are kept by default)
+    :return: A new in-memory COCO dataset
+    """
+    sizes = sizes or {}
+    images = dataset.images
+    image_ids = np.fromiter((image.id for image in images), np.int64, len(images))
+
+    image_matrices = np.tile(np.eye(3), (len(images), 1, 1))
+    image_sizes = np.array(
+        [sizes.get(image.id, (image.width, image.height)) for image in images],
+        dtype=np.int64,
+    ).reshape(-1, 2)
+
+    for position, image in enumerate(images):
+        if image.id in matrices:
+            image_matrices[position] = _matrix(matrices[image.id])
+
+    columns = dataset._get_columns()
+
+    image_order = np.argsort(image_ids, kind="stable")
+    image_positions = image_order[
+        np.minimum(
+            np.searchsorted(image_ids, columns.image_ids, sorter=image_order),
+            max(len(images) - 1, 0),
+        )
+    ]
+
+    annotation_matrices = image_matrices[image_positions]
+    widths = image_sizes[image_positions, 0]
+    heights = image_sizes[image_positions, 1]
+
+    # bounding boxes: tight boxes of transformed polygons, RLEs or transformed box corners
+    boxes = transform_boxes(columns.bboxes, annotation_matrices)
+
+    # polygons kept on annotations (outside of the dataset store) are transformed as well
+    source_polygons = dataset._aligned_polygons()
+    polygons = transform_polygons(source_polygons, annotation_matrices, widths, heights)
+    polygon_boxes = _polygon_bboxes(polygons)
+    has_polygons = np.diff(source_polygons.annotation_offsets) > 0
+    boxes[has_polygons] = polygon_boxes[has_polygons]
+
+    # areas scale with the matrix determinant (only box-only annotations need that)
+    determinants = np.abs(np.linalg.det(annotation_matrices[:, :2, :2]))
+    unclipped_box_areas = boxes[:, 2] * boxes[:, 3]
+
+    boxes = _clip_boxes(boxes, widths, heights)
+    box_areas = boxes[:, 2] * boxes[:, 3]
+
+    areas = np.where(
+        unclipped_box_areas > 0,
+        columns.areas
+        * determinants
+        * np.divide(
+            box_areas,
+            unclipped_box_areas,
+            out=np.zeros_like(box_areas),
+            where=unclipped_box_areas > 0,
+        ),
+        0,
+    )
+    areas = np.where(has_polygons, polygons.areas(), areas)
+
+    transformed = COCO._create(image_dir=dataset.image_dir)
+    transformed._info = dataset.info
+
+    for category in dataset.categories:
+        transformed._add_category(Category(**category.to_dict()))
+
+    for licence in dataset.licences:
+        transformed._add_licence(License(**licence.to_dict()))
+
+    for image, (width, height) in zip(images, image_sizes.tolist()):
+        transformed._add_image(
+            Image(
+                **{**image.to_dict(), "width": width, "height": height},
+                dataset=transformed,
+            )
+        )
+
+    transformed._polygons = polygons
+
+    keypoints = transform_keypoints(
+        dataset._keypoints.take(columns.keypoint_indexes),
+        annotation_matrices,
+        widths,
+        heights,
+    )
+    transformed._keypoints = keypoints
+    has_keypoints = columns.keypoint_indexes >= 0
+    labelled_counts = np.bincount(
+        np.repeat(np.arange(len(keypoints)), keypoints.counts),
+        weights=keypoints.keypoints[:, 2] > 0,
+        minlength=len(keypoints),
+    ).astype(np.int64)
+    box_list, area_list = boxes.tolist(), areas.tolist()
+
+    for position, annotation in enumerate(dataset.annotations):
+        # polygons are taken from the transformed store, so only RLEs are read from annotations
+        segmentation = annotation._segmentation
+        segmentation = [] if segmentation is None else segmentation
+        bbox, annotation_area = box_list[position], area_list[position]
+
+        if isinstance(segmentation, dict):
+            segmentation = transform_rle(
+                segmentation,
+                annotation_matrices[position],
+                int(widths[position]),
+                int(heights[position]),
+            )
+            annotation_area = float(area([segmentation])[0])
+            bbox = to_bbox([segmentation])[0].tolist()
+
+        if annotation_area <= 0 or not bbox[2] > 0 or not bbox[3] > 0:
+            continue
+
+        transformed_annotation = Annotation(
+            id=annotation.id,
+            image_id=annotation.image_id,
+            category_id=annotation.category_id,
+            iscrowd=annotation.iscrowd,
+            segmentation=segmentation,
+            bbox=bbox,
+            area=annotation_area,
+            dataset=transformed,
+            num_keypoints=(
+                None
+                if annotation.num_keypoints is None
+                else int(labelled_counts[position])
+            ),
+            **annotation.extra,
+        )
+
+        if has_polygons[position]:
+            transformed_annotation._attach_polygons(position)
+
+        if has_keypoints[position]:
+            transformed_annotation._attach_keypoints(position)
+
+        transformed._add_annotation(transformed_annotation)
+
+    return transformed
+
+
+def _clip_boxes(
+    boxes: np.ndarray, widths: np.ndarray, heights: np.ndarray
+) -> np.ndarray:
+    x_min = np.clip(boxes[:, 0], 0, widths)
+    y_min = np.clip(boxes[:, 1], 0, heights)
+    x_max = np.clip(boxes[:, 0] + boxes[:, 2], 0, widths)
+    y_max = np.clip(boxes[:, 1] + boxes[:, 3], 0, heights)
+
+    clipped: np.ndarray = np.stack(
+        (x_min, y_min, x_max - x_min, y_max - y_min), axis=-1
+    ).astype(np.float32)
+
+    return clipped
+
+
+def _per_image(dataset: COCO, image_ids: Optional[Sequence[int]]) -> List[Image]:
+    if image_ids is None:
+        return dataset.images
+
+    return [dataset._get_image(image_id) for image_id in image_ids]
+
+
+def resize(
+    dataset: COCO,
+    scale: Optional[ScaleT] = None,
+    size: Optional[SizeT] = None,
+    image_ids: Optional[Sequence[int]] = None,
+) -> COCO:
+    """
+    Resize images by the given scale or to the given size
+
+    :param dataset: COCO dataset
+    :param scale: Scale factor (one value or a (horizontal, vertical) tuple)
+    :param size: Target (width, height) of every image
+    :param image_ids: Resize only the given images (all images by default)
+    :return: A new in-memory COCO dataset
+    """
+    if (scale is None) == (size is None):
+        raise ValueError("Either scale or size has to be specified")
+
+    matrices: Dict[int, np.ndarray] = {}
+    sizes: Dict[int, SizeT] = {}
+
+    scale_x, scale_y = scale if isinstance(scale, tuple) else (scale, scale)
+
+    for image in _per_image(dataset, image_ids):
+        if size is not None:
+            width, height = size
+        else:
+            width = int(round(image.width * cast(float, scale_x)))
+            height = int(round(image.height * cast(float, scale_y)))
+
+        matrices[image.id] = np.diag([width / image.width, height / image.height, 1])
+        sizes[image.id] = (width, height)
+
+    return transform(dataset, matrices, sizes)
+
+
+def hflip(dataset: COCO, image_ids: Optional[Sequence[int]] = None) -> COCO:
+    """
+    Flip images horizontally (left to right)
+    """
+    return transform(
+        dataset,
+        {
+            image.id: np.array([[-1, 0, image.width], [0, 1, 0], [0, 0, 1]])
+            for image in _per_image(dataset, image_ids)
+        },
+    )
+
+
+def vflip(dataset: COCO, image_ids: Optional[Sequence[int]] = None) -> COCO:
+    """
+    Flip images vertically (top to bottom)
+    """
+    return transform(
+        dataset,
+        {
+            image.id: np.array([[1, 0, 0], [0, -1, image.height], [0, 0, 1]])
+            for image in _per_image(dataset, image_ids)
+        },
+    )
+
+
+def pad(
+    dataset: COCO,
+    left: int = 0,
+    top: int = 0,
+    right: int = 0,
+    bottom: int = 0,
+    image_ids: Optional[Sequence[int]] = None,
+) -> COCO:
+    """
+    Pad images with the given number of pixels on every side
+    """
+    selected_images = _per_image(dataset, image_ids)
+
+    return transform(
+        dataset,
+        {
+            image.id: np.array([[1, 0, left], [0, 1, top], [0, 0, 1]])
+            for image in selected_images
+        },
+        {
+            image.id: (image.width + left + right, image.height + top + bottom)
+            for image in selected_images
+        },
+    )
+
+
+def crop(
+    dataset: COCO,
+    x: int,
+    y: int,
+    width: int,
+    height: int,
+    image_ids: Optional[Sequence[int]] = None,
+) -> COCO:
+    """
+    Crop the given region out of images
+    """
+    selected_images = _per_image(dataset, image_ids)
+
+    return transform(
+        dataset,
+        {
+            image.id: np.array([[1, 0, -x], [0, 1, -y], [0, 0, 1]])
+            for image in selected_images
+        },
+        {image.id: (width, height) for image in selected_images},
+    )
+
+
+def affine(
+    dataset: COCO,
+    matrix: np.ndarray,
+    size: Optional[SizeT] = None,
+    image_ids: Optional[Sequence[int]] = None,
+) -> COCO:
+    """
+    Apply the same affine transform to images
+
+    :param dataset: COCO dataset
+    :param matrix: 2x3 or 3x3 affine matrix
+    :param size: (width, height) of transformed images (the original sizes are kept by default)
+    :param image_ids: Transform only the given images (all images by default)
+    :return: A new in-memory COCO dataset
+    """
+    matrix = _matrix(matrix)
+    selected_images = _per_image(dataset, image_ids)
+
+    return transform(
+        dataset,
+        {image.id: matrix for image in selected_images},
+        {image.id: size for image in selected_images} if size else None,
+    )
@@ -0,0 +1,102 @@
+import json
+import shutil
+import tempfile
+from os import PathLike
+from types import TracebackType
+from typing import IO, Any, Dict, Iterable, List, Optional, Type
+
+
+def _default(value: Any) -> Any:
+    # numpy scalars, datetimes and alike
+    if hasattr(value, "item"):
+        return value.item()
+
+    return str(value)
+
+
+class DatasetWriter:
+    """
+    Streaming writer of COCO annotation files.
+
+    Images and annotations can be written in any order and in small chunks, so the whole dataset
+    is never held in memory. Images are written straight to the output file while annotations are spooled
+    to a temporary file and appended at the end (so the annotations array is the last one in the file)
+    """
+
+    def __init__(
+        self,
+        annotation_file: PathLike,
+        info: Optional[Dict[str, Any]] = None,
+        categories: Iterable[Dict[str, Any]] = (),
+        licenses: Iterable[Dict[str, Any]] = (),
+    ) -> None:
+        self.annotation_file = annotation_file
+
+        self._file: IO[str] = open(annotation_file, "w")
+        self._annotation_spool: IO[str] = tempfile.TemporaryFile(mode="w+")
+
+        self._image_count = 0
+        self._annotation_count = 0
+
+        self._file.write('{"info": ')
+        self._file.write(self._dumps(info or {}))
+        self._file.write(', "licenses": ')
+        self._file.write(self._dumps(list(licenses)))
+        self._file.write(', "categories": ')
+        self._file.write(self._dumps(list(categories)))
+        self._file.write(', "images": [')
+
+    @property
+    def image_count(self) -> int:
+        return self._image_count
+
+    @property
+    def annotation_count(self) -> int:
+        return self._annotation_count
+
+    @staticmethod
+    def _dumps(value: Any) -> str:
+        return json.dumps(value, default=_default)
+
+    def write_images(self, images: List[Dict[str, Any]]) -> None:
+        self._image_count = self._write(self._file, images, self._image_count)
+
+    def write_annotations(self, annotations: List[Dict[str, Any]]) -> None:
+        self._annotation_count = self._write(
+            self._annotation_spool, annotations, self._annotation_count
+        )
+
+    def _write(self, file: IO[str], records: List[Dict[str, Any]], count: int) -> int:
+        if not records:
+            return count
+
+        if count:
+            file.write(", ")
+
+        file.write(", ".join(self._dumps(record) for record in records))
+
+        return count + len(records)
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+
+        self._file.write('], "annotations": [')
+
+        self._annotation_spool.seek(0)
+        shutil.copyfileobj(self._annotation_spool, self._file)
+        self._annotation_spool.close()
+
+        self._file.write("]}")
+        self._file.close()
+
+    def __enter__(self) -> "DatasetWriter":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        self.close()
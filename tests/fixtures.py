@@ -1,15 +1,25 @@
+import json
 from enum import Enum, unique
 from os.path import dirname
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from coconutools import COCO, Annotation
 
 FIXTURE_DIR: Path = Path(dirname(__file__) + "/fixtures").resolve()
 
+# random annotation fields (all but IDs) and a random detection record of an annotation
+AnnotationFactoryT = Callable[[np.random.Generator], Dict[str, Any]]
+DetectionFactoryT = Callable[[np.random.Generator, Annotation], Dict[str, Any]]
+
 
 @unique
 class Fixtures(str, Enum):
     corrupted_annotation = FIXTURE_DIR / "corrupted_annotation.json"
     food_nutritions = FIXTURE_DIR / "food_nutritions.json"
+    shapes = FIXTURE_DIR / "shapes.json"
 
 
 @unique
@@ -633,7 +643,23 @@ def generate_annotation_dict(
             ],
             "size": [359, 640],
         },
-        SegmentationFormats.rle: "",  # TODO: Add a valid RLE string
+        SegmentationFormats.rle: {
+            "counts": (
+                "WfP36P;2N1TO2]F0b9k0000O1O1N3N2N1001O0N2O00FnE@h0NZ8c0nG@Q8?nGCRO2`8<T"
+                "HLZOJa8:UHLZOJa8;PH0^OEb8<oG>Q8BbGZO4T1[8B^G]O6P1^8KbG4a8J_G6b8I^G8`8N"
+                "ZG4d8n0]GPNb8Q2]GPNc8P2\\GRNc8Y200000ZO_GfNa8P1iGPOX8o0gGROZ8KaG<4J]8_O"
+                "iGf0ILn7@QI:PO6o7BQI7PO5P8FRI1oN8o7IQIOPO8j7NVIJPO7g73ZIDPOMF6n7:QJ^OR"
+                "N8l7;VJHS5LSI=c10W5EUI;a14X5CVI8m0GRO?j6GSI2Q1m0l5RORIOT1o0j5FYJ:g5EZJ"
+                ";f5D\\JEfNFo6=oHVO^1e0fNFo6;oJDSN1o69dKGXMEo6c0iK_OXM8P78mI_Of01^N7n6<i"
+                "I@k0K`N8l6a0dI^O^O:R1Gl5b0aI9`0VOo5b0YI`0f0nNR6NPI77n0f0mNT6NoH76o0f0l"
+                "NV6NoH65P1f0gN\\61jH84S1OaN83l6OkH92V1LjN0IY7JlH<OX1KjNOIh73`Hg0I;i7kN`"
+                "H:GGOV1n7cNdHOK3FZ1d8eNPHY1Q8iNnGW1R8iNoGV1Q8jNoGV1Q8iNPHX1o7iNTHT1k7l"
+                "NUHU1j7kNRHe0[ODc8GkGk0GZO^8KkGi0J[O[8LkG6B0?IT81kG5C1?FV82iG7BGg90iFM"
+                "_O4^k3b0l^L4M2L4O10002N1O01O3M00000O1O2]OlEK]:0?Nle65WoH>l9`0N2N2O0000"
+                "00000001N2N2M2M3I7G:M3M4LXeY2"
+            ),
+            "size": [359, 640],
+        },
     }
 
     annotation_dict: Dict[str, Any] = {
@@ -647,3 +673,59 @@ def generate_annotation_dict(
     }
 
     return annotation_dict
+
+
+def generate_dataset(
+    annotation_file: Path,
+    categories: List[Dict[str, Any]],
+    annotation: AnnotationFactoryT,
+    annotation_counts: Tuple[int, int],
+    seed: int = 7,
+    image_count: int = 40,
+) -> COCO:
+    """
+    Write a random dataset of 640x480 images to the annotation file and load it
+
+    :param annotation_counts: Range of annotation counts per image (the upper bound is exclusive)
+    """
+    rng = np.random.default_rng(seed)
+    images: List[Dict[str, Any]] = []
+    annotations: List[Dict[str, Any]] = []
+
+    for image_id in range(1, image_count + 1):
+        images.append(
+            {
+                "id": image_id,
+                "file_name": f"{image_id}.jpg",
+                "width": 640,
+                "height": 480,
+            }
+        )
+
+        for _ in range(rng.integers(*annotation_counts)):
+            annotations.append(
+                {"id": len(annotations) + 1, "image_id": image_id, **annotation(rng)}
+            )
+
+    with open(annotation_file, "w") as file:
+        json.dump(
+            {"images": images, "categories": categories, "annotations": annotations},
+            file,
+        )
+
+    return COCO(annotation_file=annotation_file)
+
+
+def generate_detections(
+    dataset: COCO, detection: DetectionFactoryT, rng: np.random.Generator
+) -> List[Dict[str, Any]]:
+    """
+    Generate up to 2 detection records per annotation of the dataset
+    """
+    detections: List[Dict[str, Any]] = []
+
+    for annotation in dataset.annotations:
+        for _ in range(rng.integers(0, 3)):
+            detections.append(detection(rng, annotation))
+
+    return detections
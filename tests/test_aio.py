@@ -0,0 +1,166 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import pytest
+
+from coconutools import COCO
+from coconutools.aio import loads_incrementally
+from coconutools.exceptions import DatasetCorrupted
+from tests.fixtures import Fixtures
+
+
+class TestAsyncLoading:
+    def test_aload(self) -> None:
+        events: List[Tuple[str, int, int]] = []
+
+        dataset = asyncio.run(
+            COCO.aload(
+                Fixtures.shapes.value,
+                progress=lambda *event: events.append(event),
+            )
+        )
+        expected = COCO(annotation_file=Fixtures.shapes.value)
+
+        assert dataset.annotation_file == Fixtures.shapes.value
+        assert [a.to_dict() for a in dataset.annotations] == [
+            a.to_dict() for a in expected.annotations
+        ]
+        assert [i.to_dict() for i in dataset.images] == [
+            i.to_dict() for i in expected.images
+        ]
+        assert dataset.boxes().tolist() == expected.boxes().tolist()
+
+        assert [stage for stage, _, _ in events] == ["read", "parse", "parse", "build"]
+        assert events[0][1] == events[0][2]
+        assert events[-1][1:] == (4, 4)
+
+    def test_loads_incrementally(self) -> None:
+        content = Path(Fixtures.shapes.value).read_bytes()
+
+        assert loads_incrementally(content) == json.loads(content)
+        assert loads_incrementally(' { "a" : [ ] , "b" : [1, {"c": 2}] } ') == {
+            "a": [],
+            "b": [1, {"c": 2}],
+        }
+
+        for invalid in ('{"a": [1 2]}', '{"a": 1', '{"a": 1} 2', "{1: 2}"):
+            with pytest.raises(json.JSONDecodeError):
+                loads_incrementally(invalid)
+
+    def test_aload_responsiveness(self, tmp_path: Path) -> None:
+        count = 50_000
+        path = tmp_path / "large.json"
+        path.write_text(
+            json.dumps(
+                {
+                    "categories": [{"id": 1, "name": "square"}],
+                    "images": [
+                        {"id": 1, "file_name": "1.png", "width": 640, "height": 480}
+                    ],
+                    "annotations": [
+                        {
+                            "id": annotation_id,
+                            "image_id": 1,
+                            "category_id": 1,
+                            "bbox": [1.5, 2.5, 30.25, 40.75],
+                            "area": 1000.5,
+                            "iscrowd": 0,
+                            "segmentation": [[1, 2, 3, 4, 5, 6, 7, 8, 9, 10]],
+                        }
+                        for annotation_id in range(1, count + 1)
+                    ],
+                }
+            )
+        )
+
+        started_at = time.perf_counter()
+        json.loads(path.read_bytes())
+        parse_time = time.perf_counter() - started_at
+
+        async def load() -> float:
+            loaded = False
+            stall = 0.0
+
+            async def tick() -> None:
+                nonlocal stall
+                last = time.perf_counter()
+
+                while not loaded:
+                    await asyncio.sleep(0.001)
+                    now = time.perf_counter()
+                    stall, last = max(stall, now - last), now
+
+            ticker = asyncio.ensure_future(tick())
+            dataset = await COCO.aload(path)
+            loaded = True
+            await ticker
+
+            assert len(dataset.annotations) == count
+
+            return stall
+
+        # a single json.loads() call would stall the loop for the whole parsing
+        assert asyncio.run(load()) < parse_time / 4
+
+    def test_aload_process_pool(self) -> None:
+        with ProcessPoolExecutor(1) as executor:
+            with pytest.raises(TypeError, match="ThreadPoolExecutor"):
+                asyncio.run(COCO.aload(Fixtures.shapes.value, executor=executor))
+
+    def test_aload_corrupted(self) -> None:
+        with pytest.raises(DatasetCorrupted):
+            asyncio.run(COCO.aload(Fixtures.corrupted_annotation.value))
+
+    def test_aload_cancellation(self) -> None:
+        async def load() -> None:
+            def cancel(stage: str, *_: int) -> None:
+                if stage == "read":
+                    task.cancel()
+
+            task = asyncio.ensure_future(
+                COCO.aload(Fixtures.shapes.value, progress=cancel)
+            )
+
+            await task
+
+        with pytest.raises(asyncio.CancelledError):
+            asyncio.run(load())
+
+
+class TestAsyncImages:
+    def test_aiter_images(self, tmp_path: Path) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value, image_dir=tmp_path)
+
+        for image in dataset.images:
+            (tmp_path / image.file_name).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / image.file_name).write_bytes(image.file_name.encode())
+
+        async def collect(
+            read_bytes: bool,
+        ) -> List[Tuple[int, List[int], Optional[bytes]]]:
+            return [
+                (image.id, [a.id for a in annotations], data)
+                async for image, annotations, data in dataset.aiter_images(
+                    read_bytes=read_bytes, concurrency=1
+                )
+            ]
+
+        assert asyncio.run(collect(True)) == [
+            (7, [1, 2, 3], b"shapes/1.png"),
+            (8, [4], b"shapes/2.png"),
+        ]
+        assert asyncio.run(collect(False)) == [(7, [1, 2, 3], None), (8, [4], None)]
+
+    def test_aiter_images_without_image_dir(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+
+        async def first() -> None:
+            async for _ in dataset.aiter_images():
+                break
+
+        with pytest.raises(ValueError):
+            asyncio.run(first())
@@ -0,0 +1,164 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from coconutools import COCO
+from coconutools.analysis import ERROR_TYPES
+from tests.test_evaluation import box_dataset, noisy_detections
+
+
+def error_dataset(tmp_path: Path) -> COCO:
+    boxes = [
+        (1, [0, 0, 10, 10]),
+        (1, [100, 0, 10, 10]),
+        (2, [200, 0, 10, 10]),
+        (2, [300, 0, 10, 10]),
+        (1, [400, 0, 10, 10]),  # missed
+    ]
+    annotations = [
+        {
+            "id": position + 1,
+            "image_id": 1,
+            "category_id": category_id,
+            "bbox": bbox,
+            "area": 100,
+            "iscrowd": 0,
+            "segmentation": [],
+        }
+        for position, (category_id, bbox) in enumerate(boxes)
+    ]
+    annotations.append(
+        {
+            "id": 6,
+            "image_id": 1,
+            "category_id": 1,
+            "bbox": [0, 100, 100, 100],
+            "area": 10000,
+            "iscrowd": 1,
+            "segmentation": [],
+        }
+    )
+
+    with open(tmp_path / "errors.json", "w") as file:
+        json.dump(
+            {
+                "images": [
+                    {"id": 1, "file_name": "1.jpg", "width": 640, "height": 480}
+                ],
+                "categories": [{"id": 1, "name": "1"}, {"id": 2, "name": "2"}],
+                "annotations": annotations,
+            },
+            file,
+        )
+
+    return COCO(annotation_file=tmp_path / "errors.json")
+
+
+DETECTIONS = [
+    (1, [0, 0, 10, 10], 0.9),  # true positive
+    (1, [0, 0, 10, 10], 0.8),  # duplicate
+    (1, [105, 0, 10, 10], 0.7),  # localization (IoU 1/3)
+    (1, [200, 0, 10, 10], 0.6),  # classification
+    (1, [305, 0, 10, 10], 0.5),  # both
+    (1, [500, 300, 10, 10], 0.4),  # background
+    (1, [10, 110, 10, 10], 0.3),  # inside the crowd region
+    (2, [300, 0, 10, 10], 0.95),  # true positive
+]
+
+
+class TestAnalysis:
+    def test_errors(self, tmp_path: Path) -> None:
+        dataset = error_dataset(tmp_path)
+
+        analysis = dataset.analyze_errors(
+            [
+                {
+                    "image_id": 1,
+                    "category_id": category_id,
+                    "bbox": bbox,
+                    "score": score,
+                }
+                for category_id, bbox, score in DETECTIONS
+            ]
+        )
+
+        assert analysis.detections.scores.tolist() == pytest.approx(
+            [0.95, 0.9, 0.8, 0.7, 0.6, 0.5, 0.4, 0.3]
+        )
+        assert [
+            ERROR_TYPES[code] if code >= 0 else None
+            for code in analysis.errors.tolist()
+        ] == [
+            None,
+            None,
+            "duplicate",
+            "localization",
+            "classification",
+            "both",
+            "background",
+            None,
+        ]
+        assert analysis.missed.tolist() == [False, False, False, False, True, False]
+        assert analysis.error_counts() == dict.fromkeys(ERROR_TYPES, 1)
+
+        assert analysis.ap.tolist() == pytest.approx([34 / 101, 51 / 101])
+        assert analysis.fixed_ap["localization"].tolist() == pytest.approx(
+            [(34 + 33 * 2 / 3) / 101, 51 / 101]
+        )
+        assert analysis.fixed_ap["missed"][0] == pytest.approx(51 / 101)
+
+        category_dap = analysis.category_dap()
+
+        assert category_dap["classification"] == pytest.approx({1: 0, 2: 50 / 101})
+        assert category_dap["duplicate"] == pytest.approx({1: 0, 2: 0})
+        assert analysis.summary()["classification"] == pytest.approx(25 / 101)
+
+    def test_confusion_matrix(self, tmp_path: Path) -> None:
+        dataset = error_dataset(tmp_path)
+
+        analysis = dataset.analyze_errors(
+            [
+                {
+                    "image_id": 1,
+                    "category_id": category_id,
+                    "bbox": bbox,
+                    "score": score,
+                }
+                for category_id, bbox, score in DETECTIONS
+            ]
+        )
+
+        # ground truth x detected categories, background goes last
+        assert analysis.confusion.tolist() == [[1, 0, 2], [1, 1, 0], [3, 0, 0]]
+
+    def test_matches_evaluation(self, tmp_path: Path) -> None:
+        dataset = box_dataset(tmp_path, image_count=100)
+        records = noisy_detections(dataset)
+
+        analysis = dataset.analyze_errors(dataset.load_results(records))
+        result = dataset.evaluate_boxes(records)
+
+        assert analysis.ap == pytest.approx(result.precision[0, :, :, 0].mean(axis=0))
+        assert analysis.summary()["AP"] == pytest.approx(result.summary()["AP50"])
+
+        counts = analysis.error_counts()
+        false_positives = sum(counts.values()) - counts["missed"]
+
+        assert false_positives == np.count_nonzero(analysis.errors >= 0)
+        assert analysis.confusion.sum() > 0
+
+        for error in ERROR_TYPES:
+            assert all(dap >= -1e-9 for dap in analysis.category_dap()[error].values())
+
+    def test_no_detections(self, tmp_path: Path) -> None:
+        dataset = box_dataset(tmp_path)
+
+        analysis = dataset.analyze_errors([])
+
+        assert analysis.summary()["AP"] == 0
+        assert analysis.error_counts()["missed"] == np.count_nonzero(
+            ~dataset._get_columns().iscrowd
+        )
+        assert analysis.summary()["missed"] == 0
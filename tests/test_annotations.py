@@ -58,3 +58,13 @@ class TestAnnotations:
         assert image.file_name == "images/1/96021e5b-IMG_2055.jpeg"
         assert image.width == 3024
         assert image.height == 4032
+
+    def test_annotation_masks(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+        square, crowd, box = dataset.annotations[:3]
+
+        assert square.mask().shape == (100, 100)
+        assert int(square.mask().sum()) == 40 * 40
+        assert int(crowd.mask().sum()) == 40 * 60
+        assert crowd.rle()["size"] == [100, 100]
+        assert int(box.mask().sum()) == 0
@@ -0,0 +1,77 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from coconutools import COCO
+from tests.fixtures import Fixtures
+
+
+class TestBatches:
+    @pytest.mark.parametrize("workers, prefetch", [(None, 0), (None, 2), (2, 2)])
+    def test_batches(self, workers: int, prefetch: int) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value, image_dir=Path("images"))
+
+        (batch,) = dataset.batches(2, workers=workers, prefetch=prefetch)
+
+        assert batch["image_ids"].tolist() == [7, 8]
+        assert batch["image_paths"] == ["images/shapes/1.png", "images/shapes/2.png"]
+        assert batch["image_sizes"].tolist() == [[100, 100], [50, 40]]
+        assert batch["annotation_ids"].tolist() == [[1, 2, 3], [4, -1, -1]]
+        assert batch["labels"].tolist() == [[1, 2, 1], [3, -1, -1]]
+        assert batch["iscrowd"].tolist() == [[False, True, False], [False] * 3]
+        assert batch["valid"].tolist() == [[True] * 3, [True, False, False]]
+        assert batch["boxes"].shape == (2, 3, 4)
+        assert batch["boxes"][1].tolist() == [[20, 10, 20, 10], [0] * 4, [0] * 4]
+        assert "masks" not in batch
+
+    def test_batches_masks(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+
+        (batch,) = dataset.batches(2, masks=True, format="xyxy", normalized=True)
+        masks = batch["masks"]
+
+        assert masks.shape == (2, 3, 100, 100)
+        np.testing.assert_array_equal(masks[0, 0], dataset.annotations[0].mask())
+        np.testing.assert_array_equal(masks[0, 1], dataset.annotations[1].mask())
+        assert masks[0, 2].sum() == 0
+        assert masks[1].sum() == 0
+        np.testing.assert_allclose(batch["boxes"][1, 0], [0.4, 0.25, 0.8, 0.5])
+
+    def test_batches_assigned_masks(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+        dataset.annotations[2].segmentation = [[70, 70, 80, 70, 80, 80, 70, 80]]
+        # polygons that are not attached to the dataset PolygonStore
+        dataset.annotations[3]._set_segmentation([[0, 0, 10, 0, 10, 10, 0, 10]])
+
+        (batch,) = dataset.batches(2, masks=True)
+
+        assert batch["masks"][0, 2].sum() == 100
+        np.testing.assert_array_equal(
+            batch["masks"][0, 2], dataset.annotations[2].mask()
+        )
+        assert batch["masks"][1, 0, :40, :50].sum() == 100
+
+    def test_shuffled_batches(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+
+        def image_ids(seed: int, drop_last: bool = False) -> list:
+            return [
+                batch["image_ids"].tolist()
+                for batch in dataset.batches(
+                    1, shuffle=True, seed=seed, drop_last=drop_last
+                )
+            ]
+
+        assert image_ids(0) == image_ids(0)
+        assert sorted(image_ids(1)) == [[7], [8]]
+        assert [
+            batch["image_ids"].tolist() for batch in dataset.batches(3, drop_last=True)
+        ] == []
+
+    def test_batches_early_stop(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+
+        batches = dataset.batches(1, workers=2, prefetch=1)
+        assert next(batches)["image_ids"].tolist() == [7]
+        batches.close()
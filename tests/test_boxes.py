@@ -0,0 +1,105 @@
+from typing import List
+
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
+
+from coconutools import COCO
+from coconutools.boxes import (
+    BoxFormat,
+    box_iou,
+    clip_boxes,
+    convert_boxes,
+    degenerate_boxes,
+    normalize_boxes,
+)
+from tests.fixtures import Fixtures
+
+
+class TestBoxConversions:
+    @pytest.mark.parametrize(
+        "target, expected",
+        [
+            (BoxFormat.xywh, [10, 20, 30, 40]),
+            (BoxFormat.xyxy, [10, 20, 40, 60]),
+            (BoxFormat.cxcywh, [25, 40, 30, 40]),
+        ],
+    )
+    def test_convert_boxes(self, target: BoxFormat, expected: list) -> None:
+        boxes = np.array([[10, 20, 30, 40]])
+
+        converted = convert_boxes(boxes, BoxFormat.xywh, target)
+
+        assert converted.dtype == np.float32
+        assert converted.flags.c_contiguous
+        assert_allclose(converted, [expected])
+        assert_allclose(convert_boxes(converted, target, "xywh"), boxes)
+
+    def test_clip_and_normalize_boxes(self) -> None:
+        boxes = np.array([[-10, 10, 50, 50], [80, 80, 40, 40]])
+
+        clipped = clip_boxes(boxes, widths=100, heights=100)
+
+        assert_allclose(clipped, [[0, 10, 40, 50], [80, 80, 20, 20]])
+        assert_allclose(
+            normalize_boxes(clipped, np.array([100, 200]), np.array([100, 200])),
+            [[0, 0.1, 0.4, 0.5], [0.4, 0.4, 0.1, 0.1]],
+        )
+
+    def test_degenerate_boxes(self) -> None:
+        boxes = np.array([[0, 0, 10, 10], [0, 0, 0, 10], [0, 0, 10, 1]])
+
+        assert degenerate_boxes(boxes).tolist() == [False, True, False]
+        assert degenerate_boxes(boxes, min_size=1).tolist() == [False, True, True]
+
+    def test_box_iou(self) -> None:
+        boxes = np.array([[0, 0, 10, 10], [20, 20, 5, 5]])
+        other = np.array([[5, 0, 10, 10], [0, 0, 100, 100]])
+
+        assert_allclose(box_iou(boxes, other), [[50 / 150, 0.01], [0, 0.0025]])
+        # a box inside a crowd region fully overlaps it
+        expected: List[List[float]] = [[50 / 150, 1], [0, 1]]
+        assert_allclose(box_iou(boxes, other, crowd=np.array([False, True])), expected)
+
+
+class TestDatasetBoxes:
+    def test_dataset_boxes(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.food_nutritions.value)
+
+        boxes = dataset.boxes(format=BoxFormat.xyxy, normalized=True)
+
+        assert boxes.shape == (len(dataset.annotations), 4)
+        assert boxes.dtype == np.float32
+
+        annotation = dataset.annotations[0]
+        image = annotation.image
+
+        assert_allclose(
+            boxes[0],
+            [
+                annotation.bbox.x / image.width,
+                annotation.bbox.y / image.height,
+                (annotation.bbox.x + annotation.bbox.width) / image.width,
+                (annotation.bbox.y + annotation.bbox.height) / image.height,
+            ],
+            rtol=1e-6,
+        )
+
+    def test_image_boxes(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.food_nutritions.value)
+
+        annotation = dataset.annotations[3]
+
+        assert_allclose(
+            dataset.image_boxes(annotation.image_id),
+            [
+                [
+                    annotation.bbox.x,
+                    annotation.bbox.y,
+                    annotation.bbox.width,
+                    annotation.bbox.height,
+                ]
+            ],
+        )
+        assert dataset.image_boxes(image_id=100500).shape == (0, 4)
+        assert dataset.image_boxes(annotation.image_id, min_size=5000).shape == (0, 4)
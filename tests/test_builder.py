@@ -0,0 +1,164 @@
+import json
+
+import numpy as np
+import pytest
+
+from coconutools import COCO, COCOBuilder
+from coconutools.segmentations import encode
+from tests.fixtures import Fixtures
+
+
+class TestBuilder:
+    def test_from_dict(self) -> None:
+        with open(Fixtures.shapes.value) as file:
+            content = json.load(file)
+
+        dataset = COCO.from_dict(content)
+        loaded = COCO(annotation_file=Fixtures.shapes.value)
+
+        assert dataset.annotation_file is None
+        assert [a.to_dict() for a in dataset.annotations] == [
+            a.to_dict() for a in loaded.annotations
+        ]
+        assert np.array_equal(dataset.boxes(), loaded.boxes())
+
+    def test_build(self) -> None:
+        builder = COCOBuilder(categories=[{"name": "cat"}, {"name": "dog", "id": 5}])
+        image_ids = builder.add_images(
+            ["a.jpg", "b.jpg"], widths=640, heights=[480, 360]
+        )
+
+        first = builder.add_annotations(
+            image_ids=[image_ids[0], image_ids[1]],
+            category_ids=[1, 5],
+            bboxes=[[0, 0, 10, 20], [5, 5, 4, 4]],
+        )
+        second = builder.add_annotations(
+            image_ids=image_ids[1],
+            category_ids=1,
+            bboxes=np.array([[1, 1, 2, 2]]),
+            areas=[3.5],
+            iscrowd=[True],
+        )
+
+        dataset = builder.build()
+
+        assert first.tolist() == [1, 2]
+        assert second.tolist() == [3]
+        assert [c.id for c in dataset.categories] == [1, 5]
+        assert [(i.id, i.file_name, i.width, i.height) for i in dataset.images] == [
+            (1, "a.jpg", 640, 480),
+            (2, "b.jpg", 640, 360),
+        ]
+        assert [a.area for a in dataset.annotations] == [200, 16, 3.5]
+        assert dataset.annotations[2].iscrowd
+        assert dataset.annotations[1].category.name == "dog"
+        assert dataset.image_boxes(2).tolist() == [[5, 5, 4, 4], [1, 1, 2, 2]]
+
+        # columns are built from the buffers in the same way as from the annotations
+        columns = dataset._get_columns()
+        expected = type(columns).from_annotations(dataset.annotations, dataset.images)
+
+        for name in ("ids", "image_ids", "category_ids", "iscrowd", "areas"):
+            assert np.array_equal(getattr(columns, name), getattr(expected, name))
+
+        assert np.array_equal(columns.image_sizes, expected.image_sizes)
+        assert columns.image_slices == expected.image_slices
+
+    def test_segmentations_and_keypoints(self) -> None:
+        builder = COCOBuilder(
+            categories=[{"name": "person", "keypoints": ["nose", "eye"]}]
+        )
+        builder.add_images(["a.jpg"], widths=10, heights=10, ids=[7])
+
+        mask = np.zeros((10, 10), dtype=np.uint8)
+        mask[2:4, 2:5] = 1
+        rle = encode(mask)
+
+        builder.add_annotations(
+            image_ids=7,
+            category_ids=1,
+            bboxes=np.zeros((3, 4)),
+            segmentations=[[[0, 0, 4, 0, 4, 4, 0, 4]], rle, []],
+            keypoints=np.array(
+                [[[1, 1, 2], [2, 2, 0]], [[3, 3, 1], [4, 4, 1]], [[0, 0, 0], [0, 0, 0]]]
+            ),
+        )
+
+        dataset = builder.build()
+        polygon, rle_annotation, empty = dataset.annotations
+
+        assert polygon.segmentation == [[0, 0, 4, 0, 4, 4, 0, 4]]
+        assert polygon.area == 16
+        assert rle_annotation.segmentation == rle
+        assert rle_annotation.area == 6
+        assert empty.area == 0
+        assert [a.num_keypoints for a in dataset.annotations] == [1, 2, 0]
+        assert dataset.keypoints().shape == (3, 2, 3)
+
+    def test_optional_keypoints(self) -> None:
+        builder = COCOBuilder(
+            categories=[{"name": "person", "keypoints": ["nose", "eye"]}]
+        )
+        builder.add_images(["a.jpg"], widths=10, heights=10, ids=[7])
+        builder.add_annotations(
+            image_ids=7,
+            category_ids=1,
+            bboxes=np.zeros((3, 4)),
+            keypoints=[None, [1, 1, 2, 2, 2, 0], None],
+        )
+
+        dataset = builder.build()
+
+        assert [a.keypoints is None for a in dataset.annotations] == [
+            True,
+            False,
+            True,
+        ]
+        assert [a.num_keypoints for a in dataset.annotations] == [None, 1, None]
+        assert dataset.keypoints().tolist() == [
+            [[0, 0, 0], [0, 0, 0]],
+            [[1, 1, 2], [2, 2, 0]],
+            [[0, 0, 0], [0, 0, 0]],
+        ]
+
+    def test_invalid(self) -> None:
+        builder = COCOBuilder(categories=[{"name": "cat"}])
+        builder.add_images(["a.jpg"], 10, 10)
+
+        with pytest.raises(ValueError, match="values"):
+            builder.add_images(["b.jpg", "c.jpg"], [10], 10)
+
+        builder.add_annotations(image_ids=2, category_ids=1, bboxes=[[0, 0, 1, 1]])
+
+        with pytest.raises(ValueError, match="unknown image"):
+            builder.build()
+
+        builder = COCOBuilder(categories=[{"name": "cat"}])
+        builder.add_images(["a.jpg", "b.jpg"], 10, 10, ids=[1, 1])
+
+        with pytest.raises(ValueError, match="not unique"):
+            builder.build()
+
+        with pytest.raises(ValueError, match="already exists"):
+            builder.add_category("dog", id=1)
+
+    def test_growth(self) -> None:
+        builder = COCOBuilder(categories=[{"name": "cat"}])
+
+        for batch in range(50):
+            image_ids = builder.add_images(
+                [f"{batch}_{i}.jpg" for i in range(20)], 100, 100
+            )
+            builder.add_annotations(
+                image_ids=np.repeat(image_ids, 3),
+                category_ids=1,
+                bboxes=np.tile([0, 0, 5, 5], (60, 1)),
+            )
+
+        dataset = builder.build()
+
+        assert builder.image_count == len(dataset.images) == 1000
+        assert builder.annotation_count == len(dataset.annotations) == 3000
+        assert [a.id for a in dataset.annotations] == list(range(1, 3001))
+        assert len(dataset.image_boxes(1000)) == 3
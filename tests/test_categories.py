@@ -0,0 +1,96 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from coconutools import COCO
+from tests.fixtures import Fixtures
+
+
+class TestCategories:
+    def test_merge_and_drop(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+
+        remapped = dataset.remap_categories({2: 1, 3: None})
+
+        assert [category.to_dict() for category in remapped.categories] == [
+            {"id": 1, "name": "square", "supercategory": "shape"}
+        ]
+        assert [a.id for a in remapped.annotations] == [1, 2, 3]
+        assert [a.category_id for a in remapped.annotations] == [1, 1, 1]
+        assert remapped.annotations[1].category.name == "square"
+        assert len(remapped.images) == len(dataset.images)
+
+        # segmentations are shared with the source dataset
+        assert remapped._polygons is dataset._polygons
+        assert (
+            remapped.annotations[0].segmentation == dataset.annotations[0].segmentation
+        )
+        assert (
+            remapped.annotations[1].segmentation == dataset.annotations[1].segmentation
+        )
+
+        columns = remapped._get_columns()
+
+        assert columns.category_ids.tolist() == [1, 1, 1]
+        assert columns.image_positions(7).tolist() == [0, 1, 2]
+        assert np.array_equal(remapped.boxes(), dataset.boxes()[:3])
+
+        # the source dataset is left intact
+        assert [a.category_id for a in dataset.annotations] == [1, 2, 1, 3]
+
+    def test_renumber(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+
+        renumbered = dataset.remap_categories({1: None})
+        kept_ids = dataset.remap_categories({1: None}, renumber=False)
+
+        assert [c.id for c in renumbered.categories] == [1, 2]
+        assert [a.category_id for a in renumbered.annotations] == [1, 2]
+        assert [c.id for c in kept_ids.categories] == [2, 3]
+        assert [a.category_id for a in kept_ids.annotations] == [2, 3]
+
+    def test_supercategory(self, tmp_path: Path) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+
+        collapsed = dataset.remap_categories(
+            "supercategory", output_file=tmp_path / "collapsed.json"
+        )
+
+        assert [(c.id, c.name) for c in collapsed.categories] == [
+            (1, "shape"),
+            (2, "round"),
+        ]
+        assert [a.category_id for a in collapsed.annotations] == [1, 1, 1, 2]
+
+        saved = COCO(annotation_file=tmp_path / "collapsed.json")
+
+        assert collapsed.annotation_file == tmp_path / "collapsed.json"
+        assert [a.to_dict() for a in saved.annotations] == [
+            a.to_dict() for a in collapsed.annotations
+        ]
+        assert [c.to_dict() for c in saved.categories] == [
+            c.to_dict() for c in collapsed.categories
+        ]
+
+    def test_invalid_mapping(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+
+        with pytest.raises(ValueError, match="unknown"):
+            dataset.remap_categories({42: 1})
+
+        # the target category is merged itself
+        with pytest.raises(ValueError, match="not a kept category"):
+            dataset.remap_categories({1: 2, 2: 3, 3: None})
+
+        with pytest.raises(ValueError):
+            dataset.remap_categories("category")
+
+    def test_drop_everything(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+
+        remapped = dataset.remap_categories(dict.fromkeys([1, 2, 3]))
+
+        assert not remapped.categories
+        assert not remapped.annotations
+        assert len(remapped.boxes()) == 0
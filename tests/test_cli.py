@@ -0,0 +1,201 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from coconutools import COCO
+from coconutools.cli import main
+from tests.fixtures import Fixtures
+
+
+def run(capsys: pytest.CaptureFixture, args: List[str], exit_code: int = 0) -> Any:
+    assert main(args) == exit_code
+
+    output = capsys.readouterr()
+    assert "peak memory" in output.err
+
+    return json.loads(output.out)
+
+
+class TestCLI:
+    def test_stats(self, capsys: pytest.CaptureFixture) -> None:
+        stats = run(capsys, ["stats", str(Fixtures.shapes.value)])
+
+        assert stats["images"] == 2
+        assert stats["annotations"] == 4
+        assert stats["crowd_annotations"] == 1
+        assert stats["annotations_per_category"] == {
+            "square": 2,
+            "rectangle": 1,
+            "circle": 1,
+        }
+
+    def test_validate(self, tmp_path: Path, capsys: pytest.CaptureFixture) -> None:
+        assert run(capsys, ["validate", str(Fixtures.shapes.value)]) == {
+            "valid": True,
+            "problems": {},
+        }
+
+        with open(Fixtures.shapes.value) as file:
+            dataset: Dict[str, Any] = json.load(file)
+
+        dataset["annotations"][0]["image_id"] = 100
+        dataset["annotations"][1]["bbox"] = [90, 90, 20, 0]
+        (tmp_path / "invalid.json").write_text(json.dumps(dataset))
+
+        assert run(
+            capsys, ["validate", str(tmp_path / "invalid.json")], exit_code=1
+        ) == {
+            "valid": False,
+            "problems": {
+                "unknown_image_ids": 1,
+                "empty_boxes": 1,
+                "boxes_outside_images": 1,
+            },
+        }
+
+        result = run(
+            capsys,
+            ["validate", str(Fixtures.corrupted_annotation.value)],
+            exit_code=1,
+        )
+        assert not result["valid"] and "corrupted" in result["error"]
+
+    def test_split_and_merge(
+        self, tmp_path: Path, capsys: pytest.CaptureFixture
+    ) -> None:
+        split = run(
+            capsys,
+            [
+                "split",
+                str(Fixtures.shapes.value),
+                "train=0.5",
+                "val=0.5",
+                "--output-dir",
+                str(tmp_path),
+                "--chunk-size",
+                "1",
+            ],
+        )
+
+        subsets = split["subsets"]
+        assert subsets["train"]["images"] + subsets["val"]["images"] == 2
+        assert subsets["train"]["annotations"] + subsets["val"]["annotations"] == 4
+
+        merged = run(
+            capsys,
+            [
+                "merge",
+                str(tmp_path / "train.json"),
+                str(tmp_path / "val.json"),
+                "--output",
+                str(tmp_path / "merged.json"),
+            ],
+        )
+        assert merged["images"] == 2 and merged["annotations"] == 4
+
+        original = COCO(annotation_file=Fixtures.shapes.value)
+        dataset = COCO(annotation_file=tmp_path / "merged.json")
+
+        assert sorted(image.file_name for image in dataset.images) == sorted(
+            image.file_name for image in original.images
+        )
+        assert sorted(a.area for a in dataset.annotations) == sorted(
+            a.area for a in original.annotations
+        )
+
+    def test_merge_unifies_categories(
+        self, tmp_path: Path, capsys: pytest.CaptureFixture
+    ) -> None:
+        with open(Fixtures.shapes.value) as file:
+            dataset: Dict[str, Any] = json.load(file)
+
+        # the same categories under other IDs and a new image
+        for category in dataset["categories"]:
+            category["id"] += 10
+
+        for annotation in dataset["annotations"]:
+            annotation["category_id"] += 10
+
+        dataset["images"][1]["file_name"] = "shapes/3.png"
+        (tmp_path / "other.json").write_text(json.dumps(dataset))
+
+        merged = run(
+            capsys,
+            [
+                "merge",
+                str(Fixtures.shapes.value),
+                str(tmp_path / "other.json"),
+                "--output",
+                str(tmp_path / "merged.json"),
+            ],
+        )
+
+        assert merged["categories"] == 3
+        assert merged["images"] == 3
+        assert merged["annotations"] == 8
+
+        merged_dataset = COCO(annotation_file=tmp_path / "merged.json")
+        circles = [a for a in merged_dataset.annotations if a.category_id == 3]
+
+        assert sorted(a.image_id for a in circles) == [2, 3]
+
+    def test_convert(self, tmp_path: Path, capsys: pytest.CaptureFixture) -> None:
+        converted = run(
+            capsys,
+            [
+                "convert",
+                str(Fixtures.shapes.value),
+                "--to",
+                "yolo",
+                "--output",
+                str(tmp_path / "labels"),
+            ],
+        )
+
+        assert converted["files"] == 2
+        assert (tmp_path / "labels" / "classes.txt").exists()
+
+        # image sizes of VOC annotations are probed from images
+        arguments = ["convert", str(tmp_path / "labels"), "--from", "voc"]
+
+        assert main([*arguments, "--to", "coco", "--output", str(tmp_path)]) == 2
+        assert "--image-dir" in capsys.readouterr().err
+
+    def test_evaluate(self, tmp_path: Path, capsys: pytest.CaptureFixture) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+        detections = [
+            {
+                "image_id": annotation.image_id,
+                "category_id": annotation.category_id,
+                "bbox": annotation.to_dict()["bbox"],
+                "score": 0.9,
+            }
+            for annotation in dataset.annotations
+        ]
+        (tmp_path / "detections.json").write_text(json.dumps(detections))
+
+        result = run(
+            capsys,
+            ["evaluate", str(Fixtures.shapes.value), str(tmp_path / "detections.json")],
+        )
+
+        assert result["summary"]["AP"] == pytest.approx(1.0)
+        assert result["category_ap"]["square"] == pytest.approx(1.0)
+
+    def test_invalid_split(self, tmp_path: Path, capsys: pytest.CaptureFixture) -> None:
+        arguments = ["split", str(Fixtures.shapes.value), "--output-dir", str(tmp_path)]
+
+        assert main([*arguments, "train=0", "val=0"]) == 2
+        assert "positive" in capsys.readouterr().err
+
+        assert main([*arguments, "train=0.5", "train=0.5"]) == 2
+        assert "more than once" in capsys.readouterr().err
+        assert not list(tmp_path.iterdir())
+
+    @pytest.mark.parametrize("option", ["--workers", "--chunk-size"])
+    def test_unused_options(self, option: str) -> None:
+        # only commands that run in parallel accept workers, only ones writing annotation files accept chunk sizes
+        with pytest.raises(SystemExit):
+            main(["stats", str(Fixtures.shapes.value), option, "2"])
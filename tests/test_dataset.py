@@ -1,3 +1,5 @@
+import json
+import os
 from os import PathLike
 from pathlib import Path
 
@@ -5,6 +7,7 @@ import pytest
 
 from coconutools import COCO
 from coconutools.exceptions import DatasetCorrupted
+from coconutools.fingerprints import RefreshResult
 from tests.fixtures import Fixtures
 
 
@@ -28,7 +31,7 @@ class TestDataset:
 
     def test_load_corrupted_annotation(self):
         with pytest.raises(DatasetCorrupted):
-            COCO(annotation_file=Path(Fixtures.corrupted_annotation))
+            COCO(annotation_file=Path(Fixtures.corrupted_annotation.value))
 
     def test_dataset_repr(self):
         dataset = COCO(annotation_file=Fixtures.food_nutritions.value)
@@ -56,3 +59,44 @@ class TestDataset:
             "image_width",
             "image_height",
         }
+
+    def test_refresh(self, tmp_path: Path) -> None:
+        annotation_file = tmp_path / "shapes.json"
+
+        with open(Fixtures.shapes.value) as file:
+            content = json.load(file)
+
+        def write(modification_time: int) -> None:
+            with open(annotation_file, "w") as file:
+                json.dump(content, file, indent=2)
+
+            os.utime(annotation_file, ns=(modification_time, modification_time))
+
+        write(1)
+        dataset = COCO(annotation_file=annotation_file)
+        annotations = dataset.annotations
+
+        assert dataset.refresh() == RefreshResult.unchanged
+
+        content["annotations"].append(
+            {**content["annotations"][0], "id": 5, "image_id": 8}
+        )
+        write(2)
+
+        assert dataset.refresh() == RefreshResult.appended
+        assert dataset.annotations is annotations
+        assert [a.id for a in dataset.annotations] == [1, 2, 3, 4, 5]
+        assert (
+            dataset.annotations[-1].segmentation
+            == content["annotations"][0]["segmentation"]
+        )
+        assert dataset.image_boxes(8).tolist() == [[20, 10, 20, 10], [10, 10, 40, 40]]
+
+        content["images"][0]["width"] = 200
+        write(3)
+
+        assert dataset.refresh() == RefreshResult.reloaded
+        assert dataset.images[0].width == 200
+        assert len(dataset.annotations) == 5
+
+        assert dataset.refresh() == RefreshResult.unchanged
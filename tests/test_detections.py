@@ -0,0 +1,105 @@
+import json
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pytest
+
+from coconutools.detections import Detections, iter_json_records
+from coconutools.exceptions import DatasetFormatNotValid
+from tests.test_evaluation import box_dataset, noisy_detections
+
+
+class TestDetections:
+    def test_load_file(self, tmp_path: Path) -> None:
+        dataset = box_dataset(tmp_path)
+        records = noisy_detections(dataset)
+
+        with open(tmp_path / "detections.json", "w") as file:
+            json.dump(records, file, indent=2)
+
+        detections = dataset.load_results(tmp_path / "detections.json")
+
+        assert len(detections) == len(records)
+        assert detections.scores.dtype == np.float32
+        assert detections.image_ids.tolist() == [r["image_id"] for r in records]
+        assert np.allclose(detections.bboxes, [r["bbox"] for r in records])
+
+        # records are cut by buffer bounds
+        assert list(iter_json_records(tmp_path / "detections.json", 7)) == records
+
+    def test_load_arrays(self, tmp_path: Path) -> None:
+        dataset = box_dataset(tmp_path)
+        detections = dataset.load_results(
+            {
+                "image_id": [1, 2],
+                "category_id": [5, 1],
+                "bbox": np.array([[0, 0, 10, 10], [5, 5, 10, 20]]),
+                "score": [0.5, 0.9],
+            }
+        )
+
+        assert detections.areas.tolist() == [100, 200]
+
+    @pytest.mark.parametrize("content", ["", "{}", "[{}", '[{"image_id": 1},'])
+    def test_invalid_file(self, tmp_path: Path, content: str) -> None:
+        dataset = box_dataset(tmp_path)
+        (tmp_path / "detections.json").write_text(content)
+
+        with pytest.raises(DatasetFormatNotValid):
+            dataset.load_results(tmp_path / "detections.json")
+
+    def test_unknown_ids(self, tmp_path: Path) -> None:
+        dataset = box_dataset(tmp_path)
+        record = {"image_id": 1, "category_id": 1, "bbox": [0, 0, 1, 1], "score": 1}
+
+        with pytest.raises(ValueError, match="image IDs"):
+            dataset.load_results([record, {**record, "image_id": 1000}])
+
+        with pytest.raises(ValueError, match="category IDs"):
+            dataset.load_results([record, {**record, "category_id": 3}])
+
+    @pytest.mark.parametrize("per_category", [False, True])
+    def test_top_k(self, tmp_path: Path, per_category: bool) -> None:
+        dataset = box_dataset(tmp_path)
+        records = noisy_detections(dataset)
+
+        detections = dataset.load_results(
+            records, min_score=0.2, top_k=2, per_category=per_category
+        )
+
+        groups: Dict[Tuple[int, ...], List[int]] = defaultdict(list)
+
+        for position, record in enumerate(records):
+            if np.float32(record["score"]) >= 0.2:
+                key: Tuple[int, ...] = (record["image_id"],)
+
+                if per_category:
+                    key += (record["category_id"],)
+
+                groups[key].append(position)
+
+        expected = sorted(
+            position
+            for positions in groups.values()
+            for position in sorted(positions, key=lambda p: -records[p]["score"])[:2]
+        )
+
+        assert detections.scores.tolist() == pytest.approx(
+            [records[position]["score"] for position in expected]
+        )
+        assert detections.image_ids.tolist() == [
+            records[position]["image_id"] for position in expected
+        ]
+
+    def test_evaluation(self, tmp_path: Path) -> None:
+        dataset = box_dataset(tmp_path)
+        records = noisy_detections(dataset)
+
+        result = dataset.evaluate_boxes(dataset.load_results(records))
+
+        assert result.summary() == pytest.approx(
+            dataset.evaluate_boxes(records).summary(), abs=1e-6
+        )
+        assert len(Detections.concatenate([])) == 0
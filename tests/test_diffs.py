@@ -0,0 +1,102 @@
+import json
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+from coconutools import COCO, diff
+from tests.fixtures import Fixtures
+
+
+def modified_shapes(tmp_path: Path, modify: Callable[[Dict[str, Any]], None]) -> COCO:
+    with open(Fixtures.shapes.value) as file:
+        dataset = json.load(file)
+
+    modify(dataset)
+
+    with open(tmp_path / "modified.json", "w") as file:
+        json.dump(dataset, file)
+
+    return COCO(annotation_file=tmp_path / "modified.json")
+
+
+class TestDiff:
+    def test_same_dataset(self) -> None:
+        old = COCO(annotation_file=Fixtures.shapes.value)
+        new = COCO(annotation_file=Fixtures.shapes.value)
+
+        changes = diff(old, new)
+
+        assert not changes
+        assert changes.annotations.summary() == {
+            "added": 0,
+            "removed": 0,
+            "modified": 0,
+            "reassigned": 0,
+            "unchanged": 4,
+        }
+
+    def test_changes_by_ids(self, tmp_path: Path) -> None:
+        def modify(dataset: Dict[str, Any]) -> None:
+            annotations = dataset["annotations"]
+            annotations[0]["segmentation"][0][0] += 1  # polygon point moved
+            annotations[1]["iscrowd"] = 0
+            annotations[2]["bbox"] = [0, 0, 5, 5]
+            annotations[3]["id"] = 10
+            dataset["images"][1]["width"] = 60
+            dataset["categories"].append({"id": 4, "name": "triangle"})
+
+        changes = diff(
+            COCO(annotation_file=Fixtures.shapes.value),
+            modified_shapes(tmp_path, modify),
+            match_reassigned=False,
+        )
+
+        assert changes.annotations.modified.tolist() == [[1, 1], [2, 2], [3, 3]]
+        assert changes.annotations.added.tolist() == [10]
+        assert changes.annotations.removed.tolist() == [4]
+        assert changes.images.modified.tolist() == [[8, 8]]
+        assert changes.categories.added.tolist() == [4]
+        assert not changes.info_changed
+
+    def test_edited_polygons(self) -> None:
+        old = COCO(annotation_file=Fixtures.shapes.value)
+        new = COCO(annotation_file=Fixtures.shapes.value)
+
+        new.annotations[0].segmentation = [[10, 10, 50, 10, 50, 50, 11, 50]]
+        # polygons that are not attached to the dataset PolygonStore
+        new.annotations[2]._set_segmentation([[70, 70, 80, 70, 80, 80, 70, 81]])
+
+        assert diff(old, new).annotations.modified.tolist() == [[1, 1], [3, 3]]
+
+    def test_reassigned_ids(self, tmp_path: Path) -> None:
+        def modify(dataset: Dict[str, Any]) -> None:
+            for annotation in dataset["annotations"]:
+                annotation["id"] += 100
+                annotation["image_id"] += 10
+
+            for image in dataset["images"]:
+                image["id"] += 10
+
+            dataset["annotations"][0]["bbox"] = [11, 11, 40, 40]
+            dataset["annotations"][3]["bbox"] = [0, 0, 5, 5]
+
+        old = COCO(annotation_file=Fixtures.shapes.value)
+        new = modified_shapes(tmp_path, modify)
+
+        changes = diff(old, new, iou_threshold=0.5)
+
+        assert changes.images.reassigned.tolist() == [[7, 17], [8, 18]]
+        assert changes.images.modified.tolist() == []
+        assert changes.annotations.reassigned.tolist() == [
+            [1, 101],
+            [2, 102],
+            [3, 103],
+        ]
+        assert changes.annotations.modified.tolist() == [[1, 101]]
+        assert changes.annotations.unchanged == 2
+        assert changes.annotations.added.tolist() == [104]
+        assert changes.annotations.removed.tolist() == [4]
+
+        exact = diff(old, new, iou_threshold=None)
+
+        assert exact.annotations.reassigned.tolist() == [[2, 102], [3, 103]]
+        assert exact.annotations.added.tolist() == [101, 104]
@@ -0,0 +1,118 @@
+import json
+from pathlib import Path
+
+import numpy as np
+
+from coconutools import COCO
+from coconutools.boxes import paired_iou
+from coconutools.duplicates import _components, _sweep
+from tests.fixtures import Fixtures
+
+
+def shapes_with_duplicates(tmp_path: Path) -> COCO:
+    with open(Fixtures.shapes.value) as file:
+        dataset = json.load(file)
+
+    dataset["images"].append({**dataset["images"][0], "id": 9})
+    dataset["annotations"].extend(
+        [
+            # near-duplicate of the annotation 1
+            {**dataset["annotations"][0], "id": 5, "bbox": [11, 10, 40, 40]},
+            # duplicate of the annotation 3 labelled on the duplicate image record
+            {**dataset["annotations"][2], "id": 6, "image_id": 9},
+            # the same box as the annotation 1 but of another category
+            {**dataset["annotations"][0], "id": 7, "category_id": 2},
+        ]
+    )
+
+    with open(tmp_path / "duplicates.json", "w") as file:
+        json.dump(dataset, file)
+
+    return COCO(annotation_file=tmp_path / "duplicates.json")
+
+
+class TestDuplicates:
+    def test_no_duplicates(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+
+        assert not dataset.find_duplicates()
+
+    def test_find_duplicates(self, tmp_path: Path) -> None:
+        dataset = shapes_with_duplicates(tmp_path)
+
+        duplicates = dataset.find_duplicates(iou=0.9)
+
+        assert [cluster.tolist() for cluster in duplicates.images] == [[7, 9]]
+        assert [cluster.tolist() for cluster in duplicates.annotations] == [
+            [1, 5],
+            [3, 6],
+        ]
+        assert duplicates.summary() == {
+            "image_clusters": 1,
+            "duplicate_images": 1,
+            "annotation_clusters": 2,
+            "duplicate_annotations": 2,
+        }
+
+        any_category = dataset.find_duplicates(iou=0.9, same_category=False)
+
+        assert [cluster.tolist() for cluster in any_category.annotations] == [
+            [1, 5, 7],
+            [3, 6],
+        ]
+        assert [
+            cluster.tolist()
+            for cluster in dataset.find_duplicates(iou=0.96).annotations
+        ] == [[3, 6]]
+
+    def test_deduplicate(self, tmp_path: Path) -> None:
+        dataset = shapes_with_duplicates(tmp_path)
+        dataset._get_annotation(2).keypoints = [12, 14, 2, 0, 0, 0]
+
+        deduplicated = dataset.deduplicate(iou=0.9)
+
+        assert [image.id for image in deduplicated.images] == [7, 8]
+        assert [annotation.id for annotation in deduplicated.annotations] == [
+            1,
+            2,
+            3,
+            4,
+            7,
+        ]
+        assert deduplicated._get_annotation(3).image_id == 7
+        assert (
+            deduplicated._get_annotation(3).segmentation
+            == dataset._get_annotation(3).segmentation
+        )
+        assert deduplicated._get_annotation(2).to_dict() == (
+            dataset._get_annotation(2).to_dict()
+        )
+        assert not deduplicated.find_duplicates(iou=0.9)
+
+    def test_sweep_matches_brute_force(self) -> None:
+        rng = np.random.default_rng(7)
+        count, half = 400, 200
+
+        boxes = np.concatenate(
+            (rng.uniform(0, 100, (count, 2)), rng.uniform(1, 30, (count, 2))), axis=1
+        )
+        # jittered copies of some boxes
+        boxes[half:] = boxes[:half] + rng.normal(0, 0.5, (half, 4))
+        groups = rng.integers(0, 3, count)
+
+        order = np.lexsort((boxes[:, 0], groups))
+        found = order[_sweep((boxes[order], groups[order]), iou_threshold=0.8)]
+        found = {tuple(sorted(pair)) for pair in found.tolist()}
+
+        first, second = np.triu_indices(count, k=1)
+        same_group = groups[first] == groups[second]
+        first, second = first[same_group], second[same_group]
+        matched = paired_iou(boxes[first], boxes[second]) >= 0.8
+        expected = set(zip(first[matched].tolist(), second[matched].tolist()))
+
+        assert expected and found == expected
+
+    def test_components(self) -> None:
+        pairs = np.array([[4, 5], [0, 3], [5, 1], [3, 2]])
+
+        assert _components(7, pairs).tolist() == [0, 1, 0, 0, 1, 1, 6]
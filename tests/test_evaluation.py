@@ -0,0 +1,116 @@
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import pytest
+
+from coconutools import COCO, Annotation
+from tests.fixtures import Fixtures, generate_dataset, generate_detections
+
+BOX_CATEGORIES = [
+    {"id": category_id, "name": str(category_id)} for category_id in (1, 2, 5)
+]
+
+
+def random_box(rng: np.random.Generator) -> Dict[str, Any]:
+    x, y = rng.uniform(0, 400, 2)
+    width, height = rng.uniform(2, 150, 2)
+
+    return {
+        "category_id": int(rng.choice([1, 2, 5])),
+        "bbox": [x, y, width, height],
+        "area": width * height * 0.8,
+        "iscrowd": int(rng.random() < 0.1),
+        "segmentation": [],
+    }
+
+
+def box_dataset(tmp_path: Path, seed: int = 7, image_count: int = 40) -> COCO:
+    return generate_dataset(
+        tmp_path / "boxes.json", BOX_CATEGORIES, random_box, (0, 6), seed, image_count
+    )
+
+
+def noisy_box(rng: np.random.Generator, annotation: Annotation) -> Dict[str, Any]:
+    box = np.array(annotation.to_dict()["bbox"]) + rng.normal(0, 5, 4)
+    box[2:] = np.abs(box[2:]) + 1
+
+    return {
+        "image_id": annotation.image_id,
+        # some detections are misclassified
+        "category_id": annotation.category_id if rng.random() < 0.9 else 1,
+        "bbox": box.tolist(),
+        "score": float(rng.random()),
+    }
+
+
+def noisy_detections(dataset: COCO, seed: int = 7) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(seed)
+    detections = generate_detections(dataset, noisy_box, rng)
+
+    # false positives
+    for image_id in rng.integers(1, len(dataset.images) + 1, 20).tolist():
+        detections.append(
+            {
+                "image_id": image_id,
+                "category_id": 2,
+                "bbox": [10, 10, 30, 30],
+                "score": float(rng.random()),
+            }
+        )
+
+    return detections
+
+
+class TestBoxEvaluation:
+    def test_perfect_detections(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+        detections = [
+            {
+                "image_id": annotation.image_id,
+                "category_id": annotation.category_id,
+                "bbox": annotation.to_dict()["bbox"],
+                "score": 0.9,
+            }
+            for annotation in dataset.annotations
+        ]
+
+        result = dataset.evaluate_boxes(detections)
+
+        assert result.summary()["AP"] == pytest.approx(1.0)
+        # the only rectangle is a crowd annotation, so there is no ground truth to evaluate it on
+        assert result.category_ap() == {
+            1: pytest.approx(1.0),
+            2: -1,
+            3: pytest.approx(1.0),
+        }
+
+    def test_parallel_evaluation(self, tmp_path: Path) -> None:
+        dataset = box_dataset(tmp_path)
+        detections = noisy_detections(dataset)
+
+        result = dataset.evaluate_boxes(detections)
+        parallel_result = dataset.evaluate_boxes(detections, workers=2)
+
+        assert np.array_equal(result.precision, parallel_result.precision)
+        assert np.array_equal(result.recall, parallel_result.recall)
+
+    def test_matches_pycocotools(self, tmp_path: Path) -> None:
+        coco = pytest.importorskip("pycocotools.coco")
+        cocoeval = pytest.importorskip("pycocotools.cocoeval")
+
+        dataset = box_dataset(tmp_path)
+        detections = noisy_detections(dataset)
+
+        result = dataset.evaluate_boxes(detections)
+
+        reference_dataset = coco.COCO(str(tmp_path / "boxes.json"))
+        evaluation = cocoeval.COCOeval(
+            reference_dataset, reference_dataset.loadRes(detections), "bbox"
+        )
+        evaluation.evaluate()
+        evaluation.accumulate()
+
+        # the last max detections setting is 100
+        assert np.allclose(evaluation.eval["precision"][..., 2], result.precision)
+        assert np.allclose(evaluation.eval["recall"][..., 2], result.recall)
@@ -0,0 +1,401 @@
+import json
+import sqlite3
+import struct
+from pathlib import Path
+from typing import List
+from xml.etree import ElementTree
+
+import numpy as np
+import pytest
+
+from coconutools import COCO
+from coconutools.exceptions import DatasetFormatNotValid
+from coconutools.formats.headers import probe_image_size
+from tests.fixtures import Fixtures
+
+
+def images_dataset(file_names: List[str]) -> COCO:
+    return COCO.from_dict(
+        {
+            "categories": [{"id": 1, "name": "square"}],
+            "images": [
+                {"id": image_id, "file_name": file_name, "width": 10, "height": 10}
+                for image_id, file_name in enumerate(file_names, 1)
+            ],
+            "annotations": [],
+        }
+    )
+
+
+class TestExport:
+    @pytest.mark.parametrize("workers", [None, 2])
+    def test_export_yolo(self, tmp_path: Path, workers: int) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+
+        assert dataset.export("yolo", tmp_path, workers=workers) == 2
+
+        assert (tmp_path / "classes.txt").read_text().splitlines() == [
+            "square",
+            "rectangle",
+            "circle",
+        ]
+        assert (tmp_path / "shapes" / "1.txt").read_text().splitlines() == [
+            "0 0.300000 0.300000 0.400000 0.400000",
+            "1 0.600000 0.300000 0.600000 0.400000",
+            "0 0.750000 0.750000 0.100000 0.100000",
+        ]
+        assert (tmp_path / "shapes" / "2.txt").read_text().splitlines() == [
+            "2 0.600000 0.375000 0.400000 0.250000",
+        ]
+
+    def test_export_yolo_clipped(self, tmp_path: Path) -> None:
+        dataset = images_dataset(["a.jpg"])
+        dataset.add_annotation({"image_id": 1, "category_id": 1, "bbox": [-2, 6, 6, 8]})
+
+        dataset.export("yolo", tmp_path)
+
+        assert (tmp_path / "a.txt").read_text().splitlines() == [
+            "0 0.200000 0.800000 0.400000 0.400000"
+        ]
+
+    def test_export_yolo_paths(self, tmp_path: Path) -> None:
+        dataset = images_dataset(["/data/images/a.jpg", "b.jpg"])
+        out_dir = tmp_path / "labels"
+
+        assert dataset.export("yolo", out_dir) == 2
+        # absolute image paths are written relative to the output directory
+        assert (out_dir / "data" / "images" / "a.txt").exists()
+
+        with pytest.raises(ValueError, match="same file"):
+            images_dataset(["a.jpg", "a.png"]).export("yolo", tmp_path / "same")
+
+        with pytest.raises(ValueError, match="outside"):
+            images_dataset(["../a.jpg"]).export("yolo", tmp_path / "outside")
+
+    def test_export_voc(self, tmp_path: Path) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+
+        assert dataset.export("voc", tmp_path, workers=2) == 2
+
+        root = ElementTree.parse(tmp_path / "shapes" / "1.xml").getroot()
+
+        assert root.findtext("filename") == "1.png"
+        assert root.findtext("size/width") == "100"
+        assert [obj.findtext("name") for obj in root.iter("object")] == [
+            "square",
+            "rectangle",
+            "square",
+        ]
+        assert [obj.findtext("difficult") for obj in root.iter("object")] == [
+            "0",
+            "1",
+            "0",
+        ]
+        assert [
+            int(root.findtext(f"object/bndbox/{corner}") or 0)
+            for corner in ("xmin", "ymin", "xmax", "ymax")
+        ] == [11, 11, 50, 50]
+
+    def test_export_voc_paths(self, tmp_path: Path) -> None:
+        out_dir = tmp_path / "voc"
+
+        assert images_dataset(["/data/images/a.jpg"]).export("voc", out_dir) == 1
+        assert (out_dir / "data" / "images" / "a.xml").exists()
+
+        with pytest.raises(ValueError, match="same file"):
+            images_dataset(["a.jpg", "a.png"]).export("voc", tmp_path / "same")
+
+    def test_export_unknown_format(self, tmp_path: Path) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+
+        with pytest.raises(ValueError):
+            dataset.export("labelme", tmp_path)
+
+
+def write_png(path: Path, width: int, height: int) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(
+        b"\x89PNG\r\n\x1a\n" + struct.pack(">I4sII", 13, b"IHDR", width, height)
+    )
+
+
+class TestImport:
+    def test_probe_image_size(self, tmp_path: Path) -> None:
+        write_png(tmp_path / "image.png", 640, 480)
+        (tmp_path / "image.gif").write_bytes(b"GIF89a" + struct.pack("<HH", 32, 16))
+        (tmp_path / "image.bmp").write_bytes(
+            b"BM" + bytes(16) + struct.pack("<ii", 20, -10)
+        )
+        (tmp_path / "image.jpg").write_bytes(
+            b"\xff\xd8"
+            + b"\xff\xe0"
+            + struct.pack(">H", 4)
+            + b"\x00\x00"
+            + b"\xff\xc2"
+            + struct.pack(">HBHH", 11, 8, 300, 400)
+        )
+        (tmp_path / "image.txt").write_text("not an image")
+
+        assert probe_image_size(str(tmp_path / "image.png")) == (640, 480)
+        assert probe_image_size(str(tmp_path / "image.gif")) == (32, 16)
+        assert probe_image_size(str(tmp_path / "image.bmp")) == (20, 10)
+        assert probe_image_size(str(tmp_path / "image.jpg")) == (400, 300)
+        assert probe_image_size(str(tmp_path / "image.txt")) is None
+
+    @pytest.mark.parametrize("workers", [None, 2])
+    def test_from_yolo(self, tmp_path: Path, workers: int) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+        dataset.export("yolo", tmp_path / "labels")
+
+        write_png(tmp_path / "images" / "shapes" / "1.png", 100, 100)
+        write_png(tmp_path / "images" / "shapes" / "2.png", 50, 40)
+        write_png(tmp_path / "images" / "shapes" / "3.png", 20, 20)
+
+        imported = COCO.from_yolo(
+            tmp_path / "labels", tmp_path / "images", workers=workers
+        )
+
+        assert [category.name for category in imported.categories] == [
+            "square",
+            "rectangle",
+            "circle",
+        ]
+        assert [
+            (image.file_name, image.width, image.height) for image in imported.images
+        ] == [
+            ("shapes/1.png", 100, 100),
+            ("shapes/2.png", 50, 40),
+            ("shapes/3.png", 20, 20),
+        ]
+        assert [annotation.image_id for annotation in imported.annotations] == [
+            1,
+            1,
+            1,
+            2,
+        ]
+        assert [annotation.category_id for annotation in imported.annotations] == [
+            1,
+            2,
+            1,
+            3,
+        ]
+        np.testing.assert_allclose(imported.boxes(), dataset.boxes(), atol=1e-3)
+
+    def test_from_yolo_image_size(self, tmp_path: Path) -> None:
+        (tmp_path / "labels").mkdir()
+        (tmp_path / "labels" / "1.txt").write_text("4 0.5 0.5 0.5 0.25\n")
+        (tmp_path / "1.jpg").write_bytes(b"")
+
+        with pytest.raises(DatasetFormatNotValid):
+            COCO.from_yolo(tmp_path / "labels", tmp_path)
+
+        imported = COCO.from_yolo(tmp_path / "labels", tmp_path, image_size=(200, 100))
+
+        assert [category.name for category in imported.categories] == [
+            "0",
+            "1",
+            "2",
+            "3",
+            "4",
+        ]
+        assert imported.boxes().tolist() == [[50.0, 37.5, 100.0, 25.0]]
+
+    @pytest.mark.parametrize("workers", [None, 2])
+    def test_from_voc(self, tmp_path: Path, workers: int) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+        dataset.export("voc", tmp_path)
+
+        imported = COCO.from_voc(tmp_path, categories=["circle"], workers=workers)
+
+        assert [(c.id, c.name) for c in imported.categories] == [
+            (1, "circle"),
+            (2, "square"),
+            (3, "rectangle"),
+        ]
+        assert [
+            (image.file_name, image.width, image.height) for image in imported.images
+        ] == [("shapes/1.png", 100, 100), ("shapes/2.png", 50, 40)]
+        assert [annotation.iscrowd for annotation in imported.annotations] == [
+            False,
+            True,
+            False,
+            False,
+        ]
+        assert [annotation.category_id for annotation in imported.annotations] == [
+            2,
+            3,
+            2,
+            1,
+        ]
+        assert imported.boxes().tolist() == dataset.boxes().tolist()
+
+        with pytest.raises(ValueError, match="image directory"):
+            COCO.from_voc(tmp_path, probe_sizes=True)
+
+
+class TestSQLite:
+    def test_roundtrip(self, tmp_path: Path) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+        dataset.to_sqlite(tmp_path / "shapes.db")
+
+        loaded = COCO.from_sqlite(tmp_path / "shapes.db")
+
+        assert loaded.info == dataset.info
+        assert loaded.licences == dataset.licences
+        assert [c.to_dict() for c in loaded.categories] == [
+            c.to_dict() for c in dataset.categories
+        ]
+        assert [i.to_dict() for i in loaded.images] == [
+            i.to_dict() for i in dataset.images
+        ]
+        assert [a.to_dict() for a in loaded.annotations] == [
+            a.to_dict() for a in dataset.annotations
+        ]
+
+    def test_query_and_filtered_loading(self, tmp_path: Path) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+        dataset.to_sqlite(tmp_path / "shapes.db")
+
+        with sqlite3.connect(tmp_path / "shapes.db") as connection:
+            rows = connection.execute(
+                "SELECT c.name, COUNT(*) FROM annotations a "
+                "JOIN categories c ON c.id = a.category_id GROUP BY c.name ORDER BY c.name"
+            ).fetchall()
+            indexes = {
+                name
+                for (name,) in connection.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index'"
+                )
+            }
+
+        assert rows == [("circle", 1), ("rectangle", 1), ("square", 2)]
+        assert {"annotations_image_id", "annotations_category_id"} <= indexes
+
+        subset = COCO.from_sqlite(
+            tmp_path / "shapes.db",
+            where="category_id = ? AND area > ?",
+            parameters=(1, 500),
+        )
+
+        assert [image.id for image in subset.images] == [7]
+        assert [annotation.id for annotation in subset.annotations] == [1]
+        assert len(subset.categories) == 3
+
+    def test_keypoints_and_extras(self, tmp_path: Path) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+        annotation = dataset.annotations[0]
+        annotation.keypoints = [12, 14, 2, 0, 0, 0]
+        annotation.num_keypoints = 1
+        annotation.extra["attributes"] = {"occluded": True}
+        dataset.to_sqlite(tmp_path / "shapes.db")
+
+        loaded = COCO.from_sqlite(tmp_path / "shapes.db").annotations[0]
+
+        assert loaded.to_dict() == annotation.to_dict()
+        assert loaded.extra == {"attributes": {"occluded": True}}
+
+
+class TestArrow:
+    @staticmethod
+    def shapes_dataset(tmp_path: Path) -> COCO:
+        with open(Fixtures.shapes.value) as file:
+            dataset = json.load(file)
+
+        dataset["images"].append(
+            {"id": 9, "file_name": "empty.png", "width": 10, "height": 10}
+        )
+        dataset["annotations"][0]["keypoints"] = [12, 14, 2, 0, 0, 0]
+        dataset["annotations"][0]["num_keypoints"] = 1
+        dataset["annotations"][1]["attributes"] = {"occluded": True}
+
+        with open(tmp_path / "shapes.json", "w") as file:
+            json.dump(dataset, file)
+
+        return COCO(annotation_file=tmp_path / "shapes.json")
+
+    def test_to_arrow(self, tmp_path: Path) -> None:
+        pytest.importorskip("pyarrow")
+        dataset = self.shapes_dataset(tmp_path)
+
+        table = dataset.to_arrow()
+
+        assert table.num_rows == 5
+        assert table.column("id").to_pylist() == [1, 2, 3, 4, None]
+        assert table.column("file_name").to_pylist()[-1] == "empty.png"
+        assert table.column("bbox").to_pylist()[0] == {
+            "x": 10,
+            "y": 10,
+            "width": 40,
+            "height": 40,
+        }
+        assert (
+            table.column("segmentation").to_pylist()[0]
+            == dataset.annotations[0].segmentation
+        )
+
+        loaded = COCO.from_arrow(table)
+
+        assert [i.to_dict() for i in loaded.images] == [
+            i.to_dict() for i in dataset.images
+        ]
+        assert [a.to_dict() for a in loaded.annotations] == [
+            a.to_dict() for a in dataset.annotations
+        ]
+        assert [c.to_dict() for c in loaded.categories] == [
+            c.to_dict() for c in dataset.categories
+        ]
+
+    def test_parquet_roundtrip(self, tmp_path: Path) -> None:
+        pytest.importorskip("pyarrow")
+        dataset = self.shapes_dataset(tmp_path)
+        dataset.to_parquet(tmp_path / "shapes.parquet", row_group_size=2)
+
+        loaded = COCO.from_parquet(tmp_path / "shapes.parquet")
+
+        assert loaded.info == dataset.info
+        assert [i.to_dict() for i in loaded.images] == [
+            i.to_dict() for i in dataset.images
+        ]
+        assert [a.to_dict() for a in loaded.annotations] == [
+            a.to_dict() for a in dataset.annotations
+        ]
+        assert loaded.polygons().areas().tolist() == dataset.polygons().areas().tolist()
+
+    def test_parquet_mixed_extras(self, tmp_path: Path) -> None:
+        pytest.importorskip("pyarrow")
+        dataset = self.shapes_dataset(tmp_path)
+        dataset.annotations[0].extra["attr"] = 1
+        dataset.annotations[2].extra["attr"] = "x"
+        dataset.to_parquet(tmp_path / "shapes.parquet")
+
+        loaded = COCO.from_parquet(tmp_path / "shapes.parquet")
+
+        assert [a.to_dict() for a in loaded.annotations] == [
+            a.to_dict() for a in dataset.annotations
+        ]
+        assert [a.extra for a in loaded.annotations] == [
+            {"attr": 1},
+            {"attributes": {"occluded": True}},
+            {"attr": "x"},
+            {},
+        ]
+
+    def test_parquet_projection(self, tmp_path: Path) -> None:
+        pytest.importorskip("pyarrow")
+        dataset = self.shapes_dataset(tmp_path)
+        dataset.to_parquet(tmp_path / "shapes.parquet")
+
+        boxes_only = COCO.from_parquet(tmp_path / "shapes.parquet", columns=[])
+
+        assert boxes_only.boxes().tolist() == dataset.boxes().tolist()
+        assert all(a.segmentation == [] for a in boxes_only.annotations)
+        assert not any(a.has_keypoints or a.extra for a in boxes_only.annotations)
+
+        with_keypoints = COCO.from_parquet(
+            tmp_path / "shapes.parquet", columns=["keypoints", "num_keypoints"]
+        )
+
+        assert with_keypoints.keypoints().tolist() == dataset.keypoints().tolist()
+
+        with pytest.raises(ValueError):
+            COCO.from_parquet(tmp_path / "shapes.parquet", columns=["mask"])
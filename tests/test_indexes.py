@@ -0,0 +1,173 @@
+from typing import Any, Dict
+
+import numpy as np
+import pytest
+
+from coconutools import COCO
+from tests.fixtures import Fixtures
+
+
+class TestIndexes:
+    def test_add_annotation(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+
+        # indexes are built before the mutation and updated in place afterwards
+        assert [a.id for a in dataset.image_annotations(8)] == [4]
+
+        added = dataset.add_annotation(
+            {
+                "image_id": 8,
+                "category_id": 1,
+                "bbox": [1, 2, 3, 4],
+                "segmentation": [[0, 0, 4, 0, 4, 4]],
+                "keypoints": [1, 2, 2, 3, 4, 0],
+            }
+        )
+
+        assert added.id == 5
+        assert added.area == 12
+        assert not added.iscrowd
+        assert added.segmentation == [[0, 0, 4, 0, 4, 4]]
+        assert added.keypoints is not None
+        assert added.keypoints.tolist() == [[1, 2, 2], [3, 4, 0]]
+
+        assert [a.id for a in dataset.image_annotations(8)] == [4, 5]
+        assert [a.id for a in dataset.category_annotations(1)] == [1, 3, 5]
+        assert dataset.annotations[-1] is added
+        assert dataset.image_boxes(8)[1].tolist() == [1, 2, 3, 4]
+
+        # annotations of other datasets are copied together with their IDs
+        other = COCO(annotation_file=Fixtures.shapes.value)
+        dataset.remove_annotations([2])
+        copied = dataset.add_annotation(other.annotations[1])
+
+        assert copied.id == 2
+        assert copied is not other.annotations[1]
+        assert copied.segmentation == other.annotations[1].segmentation
+        assert [a.id for a in dataset.image_annotations(7)] == [1, 3, 2]
+
+    def test_invalid_add(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+
+        with pytest.raises(ValueError, match="already exists"):
+            dataset.add_annotation(
+                {"id": 1, "image_id": 7, "category_id": 1, "bbox": [0, 0, 1, 1]}
+            )
+
+        with pytest.raises(ValueError, match="unknown image"):
+            dataset.add_annotation(
+                {"image_id": 1, "category_id": 1, "bbox": [0, 0, 1, 1]}
+            )
+
+        with pytest.raises(ValueError, match="unknown category"):
+            dataset.add_annotation(
+                {"image_id": 7, "category_id": 9, "bbox": [0, 0, 1, 1]}
+            )
+
+        assert len(dataset.annotations) == 4
+
+    def test_remove_annotations(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+        boxes = dataset.boxes()
+
+        with pytest.raises(KeyError):
+            dataset.remove_annotations([1, 42])
+
+        dataset.remove_annotations([3])
+
+        # a single tombstone in a list of 4 annotations is left until the list is accessed
+        assert dataset._index is not None and dataset._index.tombstones == 1
+        assert [a.id for a in dataset.image_annotations(7)] == [1, 2]
+        assert [a.id for a in dataset.category_annotations(1)] == [1]
+        assert [a.id for a in dataset.annotations] == [1, 2, 4]
+        assert dataset._index.tombstones == 0
+        assert np.array_equal(dataset.boxes(), boxes[[0, 1, 3]])
+
+        with pytest.raises(KeyError):
+            dataset._get_annotation(3)
+
+        dataset.remove_annotations([1, 2])
+
+        # tombstones take more than a quarter of the list, so it's compacted right away
+        assert dataset._index.tombstones == 0
+        assert [a.id if a else None for a in dataset._annotations] == [4]
+        assert dataset.image_annotations(7) == []
+
+        added = dataset.add_annotation(
+            {"image_id": 7, "category_id": 2, "bbox": [0, 0, 2, 2]}
+        )
+
+        assert added.id == 5
+        assert [a.id for a in dataset.image_annotations(7)] == [5]
+        assert dataset.image_boxes(7).tolist() == [[0, 0, 2, 2]]
+
+    def test_update_annotation(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+
+        updated = dataset.update_annotation(
+            1,
+            image_id=8,
+            category_id=3,
+            bbox=[5, 5, 10, 10],
+            area=100,
+            segmentation=[[5, 5, 15, 5, 15, 15]],
+            score=0.5,
+        )
+
+        assert updated is dataset.annotations[0]
+        assert updated.bbox.width == 10
+        assert updated.area == 100
+        assert updated.segmentation == [[5, 5, 15, 5, 15, 15]]
+        assert updated.extra["score"] == 0.5
+        assert updated.category.id == 3
+
+        assert [a.id for a in dataset.image_annotations(7)] == [2, 3]
+        assert [a.id for a in dataset.image_annotations(8)] == [1, 4]
+        assert [a.id for a in dataset.category_annotations(3)] == [1, 4]
+        assert dataset.image_boxes(8)[0].tolist() == [5, 5, 10, 10]
+        assert dataset.polygons(8).get(0) == [[5, 5, 15, 5, 15, 15]]
+
+        with pytest.raises(ValueError, match="unknown image"):
+            dataset.update_annotation(1, image_id=42)
+
+        with pytest.raises(ValueError):
+            dataset.update_annotation(1, id=42)
+
+        with pytest.raises(KeyError):
+            dataset.update_annotation(42, area=1)
+
+    @pytest.mark.parametrize(
+        "changes",
+        [
+            {"bbox": [1, 2]},
+            {"keypoints": [1, 2]},
+            {"keypoints": [1, 1, 2], "segmentation": [[0, 0, "x", 0, 1, 1]]},
+        ],
+    )
+    def test_invalid_update(self, changes: Dict[str, Any]) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+        annotation = dataset._get_annotation(1)
+        expected = annotation.to_dict()
+
+        with pytest.raises((TypeError, ValueError)):
+            dataset.update_annotation(1, category_id=3, area=1, **changes)
+
+        assert annotation.to_dict() == expected
+        assert [a.id for a in dataset.category_annotations(1)] == [1, 3]
+        assert [a.id for a in dataset.category_annotations(3)] == [4]
+
+        updated = dataset.update_annotation(1, keypoints=[1, 1, 2], num_keypoints=1)
+
+        assert updated.to_dict()["keypoints"] == [1, 1, 2]
+        assert dataset.update_annotation(1, keypoints=None).keypoints is None
+
+    def test_shared(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value).share()
+
+        assert [a.id for a in dataset.image_annotations(7)] == [1, 2, 3]
+
+        with pytest.raises(TypeError):
+            dataset.remove_annotations([1])
+
+        with pytest.raises(TypeError):
+            dataset.update_annotation(1, category_id=2)
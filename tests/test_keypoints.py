@@ -0,0 +1,230 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import pytest
+
+from coconutools import COCO, Annotation
+from coconutools.keypoints import KeypointStore, oks
+from coconutools.transforms import hflip
+from tests.fixtures import generate_dataset, generate_detections
+
+CATEGORIES: List[Dict[str, Any]] = [
+    {
+        "id": 1,
+        "name": "person",
+        "supercategory": "person",
+        "keypoints": [str(index) for index in range(17)],
+        "skeleton": [[16, 14], [14, 12]],
+    },
+    {"id": 2, "name": "hand", "keypoints": ["wrist", "thumb", "index"]},
+    {"id": 3, "name": "ball"},
+]
+
+
+def random_keypoints(rng: np.random.Generator) -> Dict[str, Any]:
+    category_id = int(rng.integers(1, 3))
+    count = len(CATEGORIES[category_id - 1]["keypoints"])
+    # boxes stay inside 640x480 images
+    x, y = rng.uniform(0, 400), rng.uniform(0, 250)
+    width, height = rng.uniform(10, 200, 2)
+
+    visibility = rng.choice([0, 1, 2], count, p=[0.2, 0.2, 0.6])
+    keypoints = np.stack(
+        (
+            np.where(visibility > 0, rng.uniform(x, x + width, count), 0),
+            np.where(visibility > 0, rng.uniform(y, y + height, count), 0),
+            visibility,
+        ),
+        axis=1,
+    ).round(1)
+
+    return {
+        "category_id": category_id,
+        "bbox": [x, y, width, height],
+        "area": width * height * 0.7,
+        "iscrowd": 0,
+        "segmentation": [],
+        "keypoints": keypoints.ravel().tolist(),
+        "num_keypoints": int(np.count_nonzero(visibility)),
+    }
+
+
+def keypoint_dataset(tmp_path: Path, seed: int = 7, image_count: int = 20) -> COCO:
+    return generate_dataset(
+        tmp_path / "keypoints.json",
+        CATEGORIES,
+        random_keypoints,
+        (1, 5),
+        seed,
+        image_count,
+    )
+
+
+def noisy_keypoints(rng: np.random.Generator, annotation: Annotation) -> Dict[str, Any]:
+    keypoints = annotation.keypoints
+    assert keypoints is not None
+
+    noise = rng.normal(0, 0.05 * annotation.bbox.width, (len(keypoints), 2))
+    detected = np.hstack((keypoints[:, :2] + noise, np.ones((len(keypoints), 1))))
+
+    return {
+        "image_id": annotation.image_id,
+        "category_id": annotation.category_id,
+        "keypoints": detected.ravel().tolist(),
+        "score": float(rng.random()),
+    }
+
+
+def noisy_detections(dataset: COCO, seed: int = 7) -> List[Dict[str, Any]]:
+    return generate_detections(dataset, noisy_keypoints, np.random.default_rng(seed))
+
+
+class TestKeypoints:
+    def test_parsing(self, tmp_path: Path) -> None:
+        dataset = keypoint_dataset(tmp_path)
+        annotation = dataset.annotations[0]
+
+        with open(tmp_path / "keypoints.json") as file:
+            record = json.load(file)["annotations"][0]
+
+        assert "keypoints" not in annotation.extra
+        assert annotation.num_keypoints == record["num_keypoints"]
+        assert annotation.keypoints is not None
+        assert annotation.keypoints.shape == (len(record["keypoints"]) // 3, 3)
+        assert annotation.to_dict()["keypoints"] == pytest.approx(record["keypoints"])
+
+        person = dataset._get_category(1)
+        assert person.num_keypoints == 17
+        assert person.skeleton == [[16, 14], [14, 12]]
+        assert dataset._get_category(3).to_dict() == {
+            "id": 3,
+            "name": "ball",
+            "supercategory": None,
+        }
+
+    def test_columnar_keypoints(self, tmp_path: Path) -> None:
+        dataset = keypoint_dataset(tmp_path)
+
+        keypoints = dataset.keypoints()
+
+        assert keypoints.shape == (len(dataset.annotations), 17, 3)
+        assert keypoints.dtype == np.float32
+
+        for annotation, row in zip(dataset.annotations, keypoints):
+            annotation_keypoints = annotation.keypoints
+            assert annotation_keypoints is not None
+
+            count = len(annotation_keypoints)
+            assert np.array_equal(row[:count], annotation_keypoints)
+            assert not row[count:].any()
+
+        image_id = dataset.images[0].id
+        assert np.array_equal(
+            dataset.keypoints(image_id=image_id),
+            keypoints[dataset._get_columns().image_positions(image_id)],
+        )
+
+    def test_store(self) -> None:
+        store = KeypointStore()
+        indexes = store.extend([[1, 2, 2, 3, 4, 1], [], [5, 6, 2]])
+
+        assert list(indexes) == [0, 1, 2]
+        assert store.get(0).tolist() == [[1, 2, 2], [3, 4, 1]]
+        assert store.take(np.array([2, -1, 0])).counts.tolist() == [1, 0, 2]
+        assert store.dense().shape == (3, 2, 3)
+        assert store.dense()[2].tolist() == [[5, 6, 2], [0, 0, 0]]
+
+    def test_oks(self) -> None:
+        gt = np.array([[[10, 10, 2], [20, 20, 2], [0, 0, 0]]], dtype=np.float32)
+        detections = np.array(
+            [
+                # perfect on labelled keypoints
+                [[10, 10, 1], [20, 20, 1], [100, 100, 1]],
+                [[13, 10, 1], [20, 24, 1], [0, 0, 1]],
+            ],
+            dtype=np.float32,
+        )
+
+        similarity = oks(
+            gt, np.array([[5, 5, 20, 20]]), np.array([400]), detections, np.full(3, 0.1)
+        )
+
+        assert similarity.shape == (2, 1)
+        assert similarity[0, 0] == pytest.approx(1.0)
+        assert 0 < similarity[1, 0] < 1
+
+    def test_hflip_moves_keypoints(self, tmp_path: Path) -> None:
+        dataset = keypoint_dataset(tmp_path)
+
+        flipped = hflip(dataset)
+
+        for annotation in flipped.annotations:
+            original = dataset._get_annotation(annotation.id).keypoints
+            keypoints = annotation.keypoints
+            assert original is not None and keypoints is not None
+
+            labelled = original[:, 2] > 0
+            assert keypoints[labelled, 0] == pytest.approx(640 - original[labelled, 0])
+            assert not keypoints[~labelled].any()
+
+
+class TestKeypointEvaluation:
+    def test_perfect_detections(self, tmp_path: Path) -> None:
+        dataset = keypoint_dataset(tmp_path)
+        detections = [
+            {
+                "image_id": annotation.image_id,
+                "category_id": annotation.category_id,
+                "keypoints": annotation.to_dict()["keypoints"],
+                "score": 1.0,
+            }
+            for annotation in dataset.annotations
+        ]
+
+        result = dataset.evaluate_keypoints(detections, sigmas={2: [0.5, 0.3, 0.3]})
+
+        assert result.summary()["AP"] == pytest.approx(1.0)
+        assert result.category_ap() == {1: pytest.approx(1.0), 2: pytest.approx(1.0)}
+
+    def test_missing_sigmas(self, tmp_path: Path) -> None:
+        dataset = keypoint_dataset(tmp_path)
+
+        with pytest.raises(ValueError):
+            dataset.evaluate_keypoints([])
+
+    def test_matches_pycocotools(self, tmp_path: Path) -> None:
+        coco = pytest.importorskip("pycocotools.coco")
+        cocoeval = pytest.importorskip("pycocotools.cocoeval")
+
+        dataset = keypoint_dataset(tmp_path, image_count=60)
+        detections = noisy_detections(dataset)
+
+        # the reference evaluation supports only one set of sigmas, so categories are compared separately
+        result = dataset.evaluate_keypoints(detections, sigmas={2: [0.5, 0.3, 0.3]})
+
+        reference_dataset = coco.COCO(str(tmp_path / "keypoints.json"))
+        reference_detections = reference_dataset.loadRes(detections)
+
+        for position, (category_id, sigmas) in enumerate(
+            ((1, None), (2, np.array([0.5, 0.3, 0.3])))
+        ):
+            evaluation = cocoeval.COCOeval(
+                reference_dataset, reference_detections, "keypoints"
+            )
+            evaluation.params.catIds = [category_id]
+
+            if sigmas is not None:
+                evaluation.params.kpt_oks_sigmas = sigmas
+
+            evaluation.evaluate()
+            evaluation.accumulate()
+
+            assert np.allclose(
+                evaluation.eval["precision"][:, :, 0, :, 0],
+                result.precision[:, :, position],
+            )
+            assert np.allclose(
+                evaluation.eval["recall"][:, 0, :, 0], result.recall[:, position]
+            )
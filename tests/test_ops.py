@@ -0,0 +1,217 @@
+from typing import List, Set, Tuple
+
+import numpy as np
+import pytest
+
+from coconutools import ops
+from coconutools.boxes import box_iou
+from coconutools.detections import Detections
+from coconutools.ops import nms, soft_nms, weighted_box_fusion
+
+
+def random_detections(seed: int = 7, count: int = 500) -> Detections:
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(0, 200, (count, 2))
+    sizes = rng.uniform(10, 60, (count, 2))
+
+    return Detections.from_arrays(
+        image_ids=rng.integers(1, 6, count),
+        category_ids=rng.integers(1, 4, count),
+        bboxes=np.hstack((centers - sizes / 2, sizes)),
+        scores=rng.random(count),
+    )
+
+
+def reference_nms(
+    detections: Detections, iou_threshold: float
+) -> Set[Tuple[int, int, float]]:
+    kept: Set[Tuple[int, int, float]] = set()
+
+    for image_id, category_id in set(
+        zip(detections.image_ids.tolist(), detections.category_ids.tolist())
+    ):
+        group = np.flatnonzero(
+            (detections.image_ids == image_id)
+            & (detections.category_ids == category_id)
+        )
+        group = group[np.argsort(-detections.scores[group])]
+        kept_boxes: List[np.ndarray] = []
+
+        for position in group:
+            box = detections.bboxes[position]
+
+            if all(
+                box_iou(box[None], other[None])[0, 0] <= iou_threshold
+                for other in kept_boxes
+            ):
+                kept_boxes.append(box)
+                kept.add((image_id, category_id, float(detections.scores[position])))
+
+    return kept
+
+
+def two_boxes() -> Detections:
+    # the boxes overlap by IoU 1/3
+    return Detections.from_arrays(
+        image_ids=[1, 1],
+        category_ids=[1, 1],
+        bboxes=[[0, 0, 10, 10], [5, 0, 10, 10]],
+        scores=[0.9, 0.8],
+    )
+
+
+class TestOps:
+    @pytest.mark.parametrize("workers", [None, 2])
+    def test_nms(self, workers: int) -> None:
+        detections = random_detections()
+
+        kept = nms(detections, iou_threshold=0.3, workers=workers, batch_size=4)
+
+        assert set(
+            zip(
+                kept.image_ids.tolist(),
+                kept.category_ids.tolist(),
+                kept.scores.tolist(),
+            )
+        ) == reference_nms(detections, 0.3)
+        assert len(nms(Detections.concatenate([]))) == 0
+
+    def test_nms_categories(self) -> None:
+        detections = two_boxes()
+        detections.category_ids[1] = 2
+
+        assert len(nms(detections, iou_threshold=0.1)) == 2
+
+    def test_soft_nms(self) -> None:
+        linear = soft_nms(two_boxes(), method="linear", iou_threshold=0.3)
+        gaussian = soft_nms(two_boxes(), method="gaussian", sigma=0.5)
+
+        assert linear.scores.tolist() == pytest.approx([0.9, 0.8 * (1 - 1 / 3)])
+        assert gaussian.scores.tolist() == pytest.approx(
+            [0.9, 0.8 * np.exp(-((1 / 3) ** 2) / 0.5)]
+        )
+        assert len(soft_nms(two_boxes(), score_threshold=0.79)) == 1
+
+        with pytest.raises(ValueError):
+            soft_nms(two_boxes(), method="hard")
+
+    def test_soft_nms_matches_reference(self) -> None:
+        detections = random_detections()
+
+        result = soft_nms(detections, method="linear", score_threshold=0.1)
+
+        expected: List[Tuple[int, int, float]] = []
+
+        for image_id, category_id in sorted(
+            set(zip(detections.image_ids.tolist(), detections.category_ids.tolist()))
+        ):
+            group = np.flatnonzero(
+                (detections.image_ids == image_id)
+                & (detections.category_ids == category_id)
+            )
+            scores = detections.scores[group].astype(np.float64)
+            iou = box_iou(detections.bboxes[group], detections.bboxes[group])
+            remaining = list(np.flatnonzero(scores >= 0.1))
+
+            while remaining:
+                best = max(remaining, key=lambda position: scores[position])
+                expected.append((image_id, category_id, scores[best]))
+                remaining.remove(best)
+
+                for position in remaining:
+                    if iou[best, position] > 0.3:
+                        scores[position] *= 1 - iou[best, position]
+
+                remaining = [p for p in remaining if scores[p] >= 0.1]
+
+        assert result.image_ids.tolist() == [record[0] for record in expected]
+        assert result.category_ids.tolist() == [record[1] for record in expected]
+        assert result.scores.tolist() == pytest.approx(
+            [record[2] for record in expected], rel=1e-5
+        )
+
+    def test_soft_nms_keeps_all_scores(self) -> None:
+        detections = random_detections()
+
+        result = soft_nms(detections, score_threshold=0.0)
+
+        assert len(result) == len(detections)
+        assert np.all(np.sort(result.scores) <= np.sort(detections.scores) + 1e-6)
+
+    def test_large_groups(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        detections = random_detections()
+        expected = [
+            nms(detections, iou_threshold=0.3),
+            soft_nms(detections, method="linear", score_threshold=0.1),
+            soft_nms(detections, method="gaussian"),
+            weighted_box_fusion([detections]),
+        ]
+
+        # groups of more than 32 detections aren't padded
+        monkeypatch.setattr(ops, "PADDED_LIMIT", 1024)
+
+        results = [
+            nms(detections, iou_threshold=0.3),
+            soft_nms(detections, method="linear", score_threshold=0.1),
+            soft_nms(detections, method="gaussian"),
+            weighted_box_fusion([detections]),
+        ]
+
+        _, sizes = np.unique(
+            detections.image_ids * 10 + detections.category_ids, return_counts=True
+        )
+        assert sizes.min() <= 32 < sizes.max()
+
+        for result, expected_result in zip(results, expected):
+            assert result.image_ids.tolist() == expected_result.image_ids.tolist()
+            assert result.category_ids.tolist() == expected_result.category_ids.tolist()
+            assert result.bboxes.tolist() == expected_result.bboxes.tolist()
+            assert result.scores.tolist() == expected_result.scores.tolist()
+
+    def test_weighted_box_fusion(self) -> None:
+        first = two_boxes()
+        second = Detections.from_arrays(
+            image_ids=[1],
+            category_ids=[1],
+            bboxes=[[2, 0, 10, 10]],
+            scores=[0.2],
+        )
+
+        fused = weighted_box_fusion([first, second], iou_threshold=0.55)
+
+        # the box of the second set is fused with the first box, the second box of the first set is too far
+        assert np.allclose(
+            fused.bboxes, np.array([[0.4 / 1.1, 0, 10, 10], [5, 0, 10, 10]])
+        )
+        assert fused.scores.tolist() == pytest.approx([1.1 / 2, 0.8 / 2])
+
+        weighted = weighted_box_fusion([first, second], weights=[1, 3])
+
+        assert np.allclose(
+            weighted.bboxes, np.array([[0.8, 0, 10, 10], [5, 0, 10, 10]])
+        )
+        assert weighted.scores.tolist() == pytest.approx([1.5 / 2 * 2 / 4, 0.8 / 4])
+
+        with pytest.raises(ValueError):
+            weighted_box_fusion([first, second], weights=[1])
+
+    def test_weighted_box_fusion_batches(self) -> None:
+        sets = [random_detections(seed) for seed in (1, 2, 3)]
+
+        fused = weighted_box_fusion(sets, weights=[2, 1, 1])
+        batched = weighted_box_fusion(sets, weights=[2, 1, 1], batch_size=2, workers=2)
+
+        assert np.array_equal(fused.image_ids, batched.image_ids)
+        assert np.allclose(fused.bboxes, batched.bboxes)
+        assert np.allclose(fused.scores, batched.scores)
+        assert np.all(np.diff(fused.image_ids) >= 0)
+
+    def test_weighted_box_fusion_of_one_set(self) -> None:
+        detections = random_detections()
+
+        fused = weighted_box_fusion([detections], iou_threshold=1.0)
+
+        assert len(fused) == len(detections)
+        assert sorted(fused.scores.tolist()) == pytest.approx(
+            sorted(detections.scores.tolist())
+        )
@@ -0,0 +1,151 @@
+from typing import List
+
+import numpy as np
+import pytest
+
+from coconutools import COCO
+from coconutools.pyramids import MaskPyramid, PyramidCache, mask_iou
+from coconutools.segmentations import encode
+from tests.fixtures import Fixtures
+
+
+def random_masks(count: int, seed: int = 0) -> List[np.ndarray]:
+    rng = np.random.default_rng(seed)
+    masks = []
+
+    for _ in range(count):
+        mask = np.zeros((120, 160), dtype=np.uint8)
+        x, y = rng.integers(0, 140), rng.integers(0, 100)
+        width, height = rng.integers(3, 60), rng.integers(3, 60)
+
+        bottom, right = y + height, x + width
+
+        mask[y:bottom, x:right] = rng.random(mask[y:bottom, x:right].shape) < 0.9
+        masks.append(mask)
+
+    return masks
+
+
+def dense_intersections(masks: List[np.ndarray], other: List[np.ndarray]) -> np.ndarray:
+    return np.array(
+        [
+            [np.count_nonzero(mask & other_mask) for other_mask in other]
+            for mask in masks
+        ]
+    )
+
+
+def dense_iou(masks: List[np.ndarray], other: List[np.ndarray]) -> np.ndarray:
+    intersections = dense_intersections(masks, other)
+    areas = np.array([np.count_nonzero(mask) for mask in masks])
+    other_areas = np.array([np.count_nonzero(mask) for mask in other])
+
+    iou: np.ndarray = intersections / (
+        areas[:, None] + other_areas[None, :] - intersections
+    )
+
+    return iou
+
+
+class TestPyramids:
+    def test_pyramid(self) -> None:
+        mask = np.zeros((40, 50), dtype=np.uint8)
+        mask[5:20, 30:45] = 1
+
+        pyramid = MaskPyramid.from_rle(encode(mask), scales=(16, 4))
+
+        assert pyramid.area == 225
+        assert pyramid.box.tolist() == [30, 5, 45, 20]
+        # cells are aligned to the image grid
+        assert pyramid.levels[0].tolist() == [[22, 143], [8, 52]]
+        assert pyramid.levels[1].sum() == 225
+        assert pyramid.levels[1].shape == (4, 5)
+        assert pyramid.intersection(pyramid) == 225
+
+        empty = MaskPyramid.from_rle(encode(np.zeros((40, 50), dtype=np.uint8)))
+
+        assert empty.area == 0
+        assert empty.intersection(pyramid) == 0
+
+    def test_mask_iou(self) -> None:
+        masks, other = random_masks(30), random_masks(20, seed=1)
+        rles, other_rles = [encode(m) for m in masks], [encode(m) for m in other]
+        expected = dense_iou(masks, other)
+
+        assert mask_iou(rles, other_rles) == pytest.approx(expected)
+
+        thresholds = np.linspace(0.5, 0.95, 10).tolist()
+        estimated = mask_iou(rles, other_rles, thresholds=thresholds)
+
+        # coarse estimates keep all threshold decisions
+        for threshold in thresholds:
+            assert np.array_equal(estimated >= threshold, expected >= threshold)
+
+        crowd = np.zeros(20, dtype=bool)
+        crowd[::2] = True
+        crowd_iou = mask_iou(rles, other_rles, crowd=crowd)
+        areas = np.array([np.count_nonzero(mask) for mask in masks])[:, None]
+
+        # the union with a crowd mask is the area of the first mask
+        assert crowd_iou[:, ::2] == pytest.approx(
+            dense_intersections(masks, other)[:, ::2] / areas
+        )
+        assert crowd_iou[:, 1::2] == pytest.approx(expected[:, 1::2])
+
+        with pytest.raises(ValueError, match="same size"):
+            mask_iou(rles, [encode(np.zeros((10, 10), dtype=np.uint8))])
+
+    def test_cache(self) -> None:
+        masks = random_masks(10)
+        pyramids = [MaskPyramid.from_rle(encode(mask)) for mask in masks]
+        cache = PyramidCache(max_bytes=sum(p.nbytes for p in pyramids[:3]))
+
+        for key, mask in enumerate(masks[:3]):
+            cache.get(key, lambda: encode(mask))
+
+        cache.get(0, lambda: encode(masks[0]))  # 0 becomes the most recently used one
+        cache.get(3, lambda: encode(masks[3]))
+
+        assert 0 in cache and 3 in cache
+        assert 1 not in cache
+        assert cache.nbytes <= cache.max_bytes
+
+    def test_dataset(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+        cache = dataset.cache_mask_pyramids()
+
+        iou = dataset.mask_iou([1, 2, 3])
+        masks = [dataset._get_annotation(i).mask() for i in (1, 2, 3)]
+
+        # annotation 2 is a crowd one and annotation 3 has no polygons
+        intersection = np.count_nonzero(masks[0] & masks[1])
+        area, crowd_area = masks[0].sum(), masks[1].sum()
+
+        assert iou == pytest.approx(
+            np.array(
+                [
+                    [1, intersection / area, 0],
+                    [intersection / (area + crowd_area - intersection), 1, 0],
+                    [0, 0, 0],
+                ]
+            )
+        )
+        assert len(cache) == 3
+
+        detections = [encode(masks[0])]
+
+        assert dataset.mask_iou([1, 2, 3], detections)[0, 0] == 1
+        # the pair is far from the threshold, so its IoU is only estimated
+        assert dataset.mask_iou([1, 2, 3], detections, thresholds=[0.5])[0, 0] >= 0.5
+
+        dataset.update_annotation(1, segmentation=[[0, 0, 10, 0, 10, 10, 0, 10]])
+
+        assert 1 not in cache
+        assert dataset.mask_pyramid(1).area == dataset._get_annotation(1).mask().sum()
+
+        # segmentations assigned to annotations discard their pyramids too
+        dataset.mask_pyramid(1)
+        dataset._get_annotation(1).segmentation = [[0, 0, 20, 0, 20, 20, 0, 20]]
+
+        assert 1 not in cache
+        assert dataset.mask_pyramid(1).area == dataset._get_annotation(1).mask().sum()
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from coconutools import COCO
+from coconutools.samplers import (
+    AliasTable,
+    CategoryBalancedSampler,
+    ImageCategoryCounts,
+    ImageSampler,
+    RepeatFactorSampler,
+    category_balanced_weights,
+    repeat_factors,
+)
+from tests.fixtures import Fixtures
+
+
+class TestSamplers:
+    def test_image_category_counts(self) -> None:
+        counts = ImageCategoryCounts.from_dataset(
+            COCO(annotation_file=Fixtures.shapes.value)
+        )
+
+        assert counts.to_dense().tolist() == [[2, 1, 0], [0, 0, 1]]
+        assert counts.image_frequencies().tolist() == [0.5, 0.5, 0.5]
+
+    def test_image_weights(self) -> None:
+        counts = ImageCategoryCounts(
+            image_ids=np.array([1, 2, 3, 4]),
+            category_ids=np.array([1, 2]),
+            rows=np.array([0, 1, 2, 2]),
+            columns=np.array([0, 0, 0, 1]),
+            counts=np.array([1, 1, 2, 1]),
+        )
+
+        assert counts.image_frequencies().tolist() == [0.75, 0.25]
+        np.testing.assert_allclose(
+            repeat_factors(counts, threshold=0.5), [1.0, 1.0, np.sqrt(2), 1.0]
+        )
+        np.testing.assert_allclose(
+            category_balanced_weights(counts), [4 / 3, 4 / 3, 4.0, 4 / 3]
+        )
+
+    def test_alias_table(self) -> None:
+        table = AliasTable(np.array([1.0, 0.0, 3.0, 4.0]))
+        draws = table.draw(200_000, np.random.default_rng(0))
+
+        np.testing.assert_allclose(
+            np.bincount(draws, minlength=4) / len(draws),
+            [0.125, 0.0, 0.375, 0.5],
+            atol=0.01,
+        )
+
+        with pytest.raises(ValueError):
+            AliasTable(np.zeros(3))
+
+    def test_category_balanced_sampler(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+        sampler = CategoryBalancedSampler.from_dataset(dataset, num_samples=7, seed=3)
+
+        indices = sampler.epoch_indices(0)
+
+        assert len(indices) == len(sampler) == 7
+        assert np.array_equal(indices, sampler.epoch_indices(0))
+        assert set(sampler.epoch_image_ids(1).tolist()) <= {7, 8}
+
+    def test_sharding(self) -> None:
+        factors = np.array([1.0, 2.5, 1.0, 3.0, 1.2])
+        samplers = [
+            RepeatFactorSampler(factors, np.arange(5), seed=1, rank=rank, world_size=3)
+            for rank in range(3)
+        ]
+
+        shards = [sampler.epoch_indices(4) for sampler in samplers]
+        everything = np.concatenate(shards)
+        repeats = np.bincount(everything, minlength=5)
+
+        assert len({len(shard) for shard in shards}) == 1
+        assert (repeats >= np.floor(factors)).all()
+        assert not np.array_equal(samplers[0].epoch_indices(4), shards[1])
+
+        # fewer sampled images than ranks
+        small = [
+            CategoryBalancedSampler(
+                np.ones(2), np.arange(2), num_samples=2, rank=rank, world_size=5
+            ).epoch_indices(0)
+            for rank in range(5)
+        ]
+
+        assert [len(shard) for shard in small] == [1] * 5
+
+        with pytest.raises(ValueError):
+            RepeatFactorSampler(factors, np.arange(5), rank=3, world_size=3)
+
+        with pytest.raises(TypeError):
+            ImageSampler(np.arange(5))  # type: ignore[abstract]
@@ -1,5 +1,25 @@
-from coconutools import Annotation
-from tests.fixtures import SegmentationFormats, generate_annotation_dict
+import json
+
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
+
+from coconutools import COCO, Annotation
+from coconutools.segmentations import (
+    PolygonStore,
+    area,
+    decode,
+    decode_counts,
+    encode,
+    encode_counts,
+    from_polygon,
+    from_polygons,
+    intersect,
+    merge,
+    subtract,
+    to_bbox,
+)
+from tests.fixtures import Fixtures, SegmentationFormats, generate_annotation_dict
 
 
 class TestSegmentations:
@@ -19,3 +39,200 @@ class TestSegmentations:
 
         annotation: Annotation = Annotation(**annotation_dict)
         annotation.segmentation
+
+
+class TestPolygonStore:
+    def test_polygon_store(self) -> None:
+        store = PolygonStore.from_polygons(
+            [
+                [[0, 0, 4, 0, 4, 3], [10, 10, 12, 10, 12, 12, 10, 12]],
+                [],
+            ]
+        )
+        index = store.append([[0, 0, 2, 0, 2, 2, 0, 2]])
+
+        assert len(store) == 3
+        assert index == 2
+        assert store.points.dtype == np.float32
+        assert store.polygon_offsets.tolist() == [0, 3, 7, 11]
+        assert store.annotation_offsets.tolist() == [0, 2, 2, 3]
+
+        assert store.get(0) == [[0, 0, 4, 0, 4, 3], [10, 10, 12, 10, 12, 12, 10, 12]]
+        assert store.get(1) == []
+        assert_allclose(store.polygon_areas(), [6, 4, 4])
+        assert_allclose(store.areas(), [10, 0, 4])
+
+    def test_polygon_store_take(self) -> None:
+        store = PolygonStore.from_polygons(
+            [[[0, 0, 4, 0, 4, 3]], [[1, 1, 2, 1, 2, 2]], [[5, 5, 6, 5, 6, 6, 5, 6]]]
+        )
+
+        subset = store.take(np.array([2, -1, 0]))
+
+        assert len(subset) == 3
+        assert subset.get(0) == [[5, 5, 6, 5, 6, 6, 5, 6]]
+        assert subset.get(1) == []
+        assert subset.get(2) == [[0, 0, 4, 0, 4, 3]]
+        assert subset.tolist() == [subset.get(index) for index in range(3)]
+
+    def test_dataset_polygons(self) -> None:
+        raw_dataset = json.load(open(Fixtures.food_nutritions.value))
+        dataset = COCO(annotation_file=Fixtures.food_nutritions.value)
+
+        annotation = dataset.annotations[1]
+        segmentation = annotation.segmentation
+
+        assert annotation._segmentation is None
+        assert isinstance(segmentation, list)
+        assert_allclose(
+            segmentation[0],
+            raw_dataset["annotations"][1]["segmentation"][0],
+            rtol=1e-6,
+        )
+
+        polygons = dataset.polygons()
+
+        assert len(polygons) == len(dataset.annotations)
+        assert_allclose(polygons.areas(), dataset._get_columns().areas, rtol=1e-3)
+
+        image_polygons = dataset.polygons(image_id=annotation.image_id)
+
+        assert len(image_polygons) == 1
+        assert_allclose(image_polygons.get(0), segmentation)
+
+    def test_segmentation_assignment(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.food_nutritions.value)
+        annotation = dataset.annotations[0]
+
+        annotation.segmentation = [[0, 0, 1, 0, 1, 1]]
+
+        assert annotation.segmentation == [[0, 0, 1, 0, 1, 1]]
+
+        # the polygon is written to the dataset store, so columnar consumers see it
+        polygons = dataset.polygons()
+
+        assert polygons.get(0) == [[0, 0, 1, 0, 1, 1]]
+        assert dataset._get_columns().polygon_indexes[0] >= 0
+        assert polygons.areas()[0] == pytest.approx(0.5)
+
+        annotation.segmentation = {"counts": [0, 4], "size": [2, 2]}
+
+        assert dataset.polygons().get(0) == []
+
+        standalone = Annotation(
+            id=1,
+            image_id=1,
+            category_id=1,
+            iscrowd=False,
+            segmentation=[],
+            bbox=(0, 0, 1, 1),
+            area=1,
+        )
+        standalone.segmentation = [[0, 0, 1, 0, 1, 1]]
+
+        assert standalone._segmentation == [[0, 0, 1, 0, 1, 1]]
+
+
+class TestRLE:
+    def test_counts_encoding(self) -> None:
+        uncompressed = generate_annotation_dict(
+            segmentation_format=SegmentationFormats.uncompressed_rle
+        )["segmentation"]
+        compressed = generate_annotation_dict(
+            segmentation_format=SegmentationFormats.rle
+        )["segmentation"]
+
+        assert encode_counts(uncompressed["counts"]) == compressed["counts"]
+        assert decode_counts(compressed["counts"]).tolist() == uncompressed["counts"]
+
+    def test_mask_encoding(self) -> None:
+        mask = np.zeros((4, 5), dtype=np.uint8)
+        mask[1:3, 1:4] = 1
+
+        rle = encode(mask)
+
+        assert rle["size"] == [4, 5]
+        assert decode_counts(rle["counts"]).tolist() == [5, 2, 2, 2, 2, 2, 5]
+        assert (decode(rle) == mask).all()
+
+    def test_set_operations(self) -> None:
+        left, right = np.zeros((6, 6), dtype=bool), np.zeros((6, 6), dtype=bool)
+        left[0:4, 0:4] = True
+        right[2:6, 2:6] = True
+
+        rles = [encode(left), encode(right)]
+
+        assert (decode(merge(rles)) == (left | right)).all()
+        assert (decode(intersect(rles)) == (left & right)).all()
+        assert (decode(subtract(rles[0], rles[1:])) == (left & ~right)).all()
+        assert area(rles).tolist() == [16, 16]
+        assert to_bbox([*rles, intersect(rles)]).tolist() == [
+            [0, 0, 4, 4],
+            [2, 2, 4, 4],
+            [2, 2, 2, 2],
+        ]
+
+    def test_rle_area_and_bbox(self) -> None:
+        rle = generate_annotation_dict(segmentation_format=SegmentationFormats.rle)[
+            "segmentation"
+        ]
+        uncompressed_rle = generate_annotation_dict(
+            segmentation_format=SegmentationFormats.uncompressed_rle
+        )["segmentation"]
+
+        assert area([rle, uncompressed_rle]).tolist() == [6320, 6320]
+        assert to_bbox([rle]).tolist() == [[275, 207, 154, 149]]
+
+    def test_set_operations_match_pycocotools(self) -> None:
+        mask_api = pytest.importorskip("pycocotools.mask")
+
+        rng = np.random.default_rng(42)
+        masks = [rng.random((37, 23)) < 0.5 for _ in range(4)]
+
+        reference = [
+            mask_api.encode(np.asfortranarray(m, dtype=np.uint8)) for m in masks
+        ]
+        rles = [encode(m) for m in masks]
+
+        assert merge(rles)["counts"] == mask_api.merge(reference)["counts"].decode()
+        assert (
+            merge(rles, intersect=True)["counts"]
+            == mask_api.merge(reference, intersect=True)["counts"].decode()
+        )
+        assert area(rles).tolist() == mask_api.area(reference).tolist()
+        assert_allclose(to_bbox(rles), mask_api.toBbox(reference))
+
+    def test_polygon_rasterization(self) -> None:
+        square = [1.0, 1.0, 4.0, 1.0, 4.0, 3.0, 1.0, 3.0]
+
+        assert decode(from_polygon(square, 5, 6)).tolist() == [
+            [0, 0, 0, 0, 0, 0],
+            [0, 1, 1, 1, 0, 0],
+            [0, 1, 1, 1, 0, 0],
+            [0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0],
+        ]
+        assert area([from_polygons([square, square], 5, 6)]).tolist() == [6]
+        assert area([from_polygons([], 5, 6)]).tolist() == [0]
+
+    def test_polygon_rasterization_matches_pycocotools(self) -> None:
+        mask_api = pytest.importorskip("pycocotools.mask")
+
+        rng = np.random.default_rng(42)
+        polygons = [
+            rng.uniform(-5, 45, 2 * rng.integers(3, 9)).tolist() for _ in range(50)
+        ]
+
+        for polygon in polygons:
+            reference = mask_api.frPyObjects([polygon], 31, 40)[0]
+
+            assert (
+                from_polygon(polygon, 31, 40)["counts"] == reference["counts"].decode()
+            )
+
+        reference = mask_api.merge(mask_api.frPyObjects(polygons[:3], 31, 40))
+
+        assert (
+            from_polygons(polygons[:3], 31, 40)["counts"]
+            == reference["counts"].decode()
+        )
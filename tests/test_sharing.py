@@ -0,0 +1,162 @@
+import gc
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pytest
+
+from coconutools import COCO
+from coconutools.segmentations import encode
+from coconutools.sharing import SharedCOCO
+from tests.fixtures import Fixtures
+
+
+def shapes_dataset() -> COCO:
+    dataset = COCO(annotation_file=Fixtures.shapes.value)
+
+    annotation = dataset.annotations[0]
+    annotation.keypoints = [12, 14, 2, 0, 0, 0]
+    annotation.num_keypoints = 1
+    annotation.extra["attributes"] = {"occluded": True}
+
+    mask = np.zeros((20, 30), dtype=np.uint8)
+    mask[5:10, 5:15] = 1
+    dataset.annotations[1].segmentation = encode(mask)
+
+    return dataset
+
+
+def image_summary(
+    dataset: COCO, image_id: int
+) -> Tuple[List[List[float]], List[Dict[str, Any]], str]:
+    return (
+        dataset.image_boxes(image_id).tolist(),
+        [
+            annotation.to_dict()
+            for annotation in dataset.annotations
+            if annotation.image_id == image_id
+        ],
+        dataset._get_image(image_id).file_name,
+    )
+
+
+class TestSharing:
+    def test_pickle(self) -> None:
+        dataset = shapes_dataset()
+        shared = dataset.share()
+
+        attached = pickle.loads(pickle.dumps(shared))
+
+        assert isinstance(attached, SharedCOCO)
+        assert attached.path == shared.path
+        assert attached.info == dataset.info
+        assert attached.categories == dataset.categories
+        assert [image.to_dict() for image in attached.images] == [
+            image.to_dict() for image in dataset.images
+        ]
+        assert [annotation.to_dict() for annotation in attached.annotations] == [
+            annotation.to_dict() for annotation in dataset.annotations
+        ]
+        assert np.array_equal(attached.boxes(), dataset.boxes())
+        assert np.array_equal(
+            attached.polygons().points, dataset._aligned_polygons().points
+        )
+
+        annotation = dataset.annotations[2]
+        assert attached._get_annotation(annotation.id).to_dict() == annotation.to_dict()
+        assert attached._get_annotation(annotation.id).image.id == annotation.image_id
+
+        with pytest.raises(KeyError):
+            attached._get_annotation(-1)
+
+    def test_read_only(self) -> None:
+        shared = shapes_dataset().share()
+
+        assert not shared._get_columns().bboxes.flags.writeable
+        assert not shared._polygons.points.flags.writeable
+
+        with pytest.raises(TypeError):
+            shared._build_annotations([])
+
+        annotation = shared._get_annotation(1)
+
+        # objects are rebuilt per process, so assigned fields wouldn't reach other workers
+        with pytest.raises(TypeError):
+            annotation.segmentation = [[0, 0, 1, 0, 1, 1]]
+
+        with pytest.raises(TypeError):
+            annotation.area = 1
+
+        with pytest.raises(TypeError):
+            shared._get_image(7).file_name = "other.png"
+
+        assert shared._get_annotation(1).segmentation == [
+            [10, 10, 50, 10, 50, 50, 10, 50]
+        ]
+        assert list(shared._annotation_cache) == [0]
+
+        attached = pickle.loads(pickle.dumps(annotation))
+
+        assert attached.to_dict() == annotation.to_dict()
+        assert attached.extra == {"attributes": {"occluded": True}}
+        assert (
+            pickle.loads(pickle.dumps(shared._get_image(7))).file_name == "shapes/1.png"
+        )
+
+    def test_derived_datasets(self) -> None:
+        dataset = shapes_dataset()
+        dataset.add_annotation({**dataset.annotations[2].to_dict(), "id": 10})
+        shared = dataset.share()
+
+        remapped = shared.remap_categories({1: 2})
+
+        assert type(remapped) is COCO
+        assert [a.category_id for a in remapped.annotations] == [1, 1, 1, 2, 1]
+        assert remapped.annotations[0].keypoints is not None
+        assert remapped.polygons().areas().tolist() == (
+            shared.polygons().areas().tolist()
+        )
+
+        remapped.annotations[0].segmentation = [[0, 0, 4, 0, 4, 4]]
+
+        assert remapped.annotations[0].segmentation == [[0, 0, 4, 0, 4, 4]]
+
+        deduplicated = shared.deduplicate()
+
+        assert type(deduplicated) is COCO
+        assert [a.to_dict() for a in deduplicated.annotations] == [
+            a.to_dict() for a in shared.annotations[:4]
+        ]
+
+    def test_workers(self) -> None:
+        dataset = shapes_dataset()
+        shared = dataset.share()
+        image_ids = [image.id for image in dataset.images]
+
+        # spawned workers don't inherit the memory of the parent, so they have to attach to the file
+        with ProcessPoolExecutor(
+            max_workers=2, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            summaries = list(
+                executor.map(image_summary, [shared] * len(image_ids), image_ids)
+            )
+
+        assert summaries == [image_summary(dataset, image_id) for image_id in image_ids]
+
+    def test_cleanup(self) -> None:
+        shared = shapes_dataset().share()
+        path = shared.path
+        attached = pickle.loads(pickle.dumps(shared))
+
+        assert os.path.exists(path)
+
+        del attached
+        gc.collect()
+        assert os.path.exists(path)
+
+        del shared
+        gc.collect()
+        assert not os.path.exists(path)
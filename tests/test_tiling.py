@@ -0,0 +1,152 @@
+import json
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+import pytest
+
+from coconutools import COCO
+from coconutools.segmentations import decode, encode
+from coconutools.tiling import tile_offsets
+
+
+@pytest.fixture
+def large_image_dataset(tmp_path: Path) -> COCO:
+    mask = np.zeros((100, 100), dtype=bool)
+    mask[10:50, 30:90] = True
+
+    dataset: Dict[str, Any] = {
+        "info": {
+            "year": 2022,
+            "version": "1.0",
+            "description": "Aerial",
+            "contributor": "coconutools",
+            "url": "",
+            "date_created": "",
+        },
+        "categories": [{"id": 1, "name": "building"}],
+        "images": [{"id": 7, "file_name": "aerial/1.png", "width": 100, "height": 100}],
+        "annotations": [
+            {
+                "id": 1,
+                "image_id": 7,
+                "category_id": 1,
+                "iscrowd": 0,
+                "area": 1600,
+                "bbox": [10, 10, 40, 40],
+                "segmentation": [[10, 10, 50, 10, 50, 50, 10, 50]],
+            },
+            {
+                "id": 2,
+                "image_id": 7,
+                "category_id": 1,
+                "iscrowd": 1,
+                "area": 2400,
+                "bbox": [30, 10, 60, 40],
+                "segmentation": encode(mask),
+            },
+            {
+                "id": 3,
+                "image_id": 7,
+                "category_id": 1,
+                "iscrowd": 0,
+                "area": 100,
+                "bbox": [70, 70, 10, 10],
+                "segmentation": [],
+            },
+        ],
+    }
+
+    annotation_file = tmp_path / "aerial.json"
+    annotation_file.write_text(json.dumps(dataset))
+
+    return COCO(annotation_file=annotation_file)
+
+
+class TestTiling:
+    def test_tile_offsets(self) -> None:
+        assert tile_offsets(100, 60, 20).tolist() == [0, 40]
+        assert tile_offsets(130, 50, 0).tolist() == [0, 50, 80]
+        assert tile_offsets(30, 50, 10).tolist() == [0]
+
+    @pytest.mark.parametrize("workers", [None, 2])
+    def test_tile_dataset(
+        self, large_image_dataset: COCO, tmp_path: Path, workers: int
+    ) -> None:
+        tiled = large_image_dataset.tile(
+            60, overlap=20, output_file=tmp_path / "tiled.json", workers=workers
+        )
+
+        assert [image.file_name for image in tiled.images] == [
+            "aerial/1_0_0.png",
+            "aerial/1_40_0.png",
+            "aerial/1_0_40.png",
+            "aerial/1_40_40.png",
+        ]
+        assert {(image.width, image.height) for image in tiled.images} == {(60, 60)}
+        assert len(tiled.annotations) == 9
+
+        polygon, rle = tiled.annotations[2], tiled.annotations[3]
+
+        assert polygon.image.file_name == "aerial/1_40_0.png"
+        assert polygon.segmentation == [[0, 10, 10, 10, 10, 50, 0, 50]]
+        assert polygon.area == 400
+
+        assert isinstance(rle.segmentation, dict)
+        assert rle.area == 2000
+        assert (rle.bbox.x, rle.bbox.y, rle.bbox.width, rle.bbox.height) == (
+            0,
+            10,
+            50,
+            40,
+        )
+        assert decode(rle.segmentation)[10:50, 0:50].all()
+
+        bbox_only = tiled.annotations[-1]
+
+        assert bbox_only.image.file_name == "aerial/1_40_40.png"
+        assert (bbox_only.bbox.x, bbox_only.bbox.y) == (30, 30)
+
+    def test_min_visible_fraction(
+        self, large_image_dataset: COCO, tmp_path: Path
+    ) -> None:
+        tiled = large_image_dataset.tile(
+            60,
+            overlap=20,
+            min_visible_fraction=0.5,
+            output_file=tmp_path / "tiled.json",
+        )
+
+        assert all(
+            annotation.area >= 800 or annotation.area == 100
+            for annotation in tiled.annotations
+        )
+        assert len(tiled.annotations) == 4
+
+    def test_invalid_overlap(self, large_image_dataset: COCO, tmp_path: Path) -> None:
+        with pytest.raises(ValueError):
+            large_image_dataset.tile(
+                50, overlap=50, output_file=tmp_path / "tiled.json"
+            )
+
+    def test_empty_image(self, tmp_path: Path) -> None:
+        dataset = COCO.from_dict(
+            {
+                "categories": [{"id": 1, "name": "building"}],
+                "images": [
+                    {"id": 9, "file_name": "empty.png", "width": 120, "height": 120}
+                ],
+                "annotations": [],
+            }
+        )
+
+        tiled = dataset.tile(60, output_file=tmp_path / "tiled.json")
+
+        # tiles without annotations are kept as images
+        assert [image.file_name for image in tiled.images] == [
+            "empty_0_0.png",
+            "empty_60_0.png",
+            "empty_0_60.png",
+            "empty_60_60.png",
+        ]
+        assert not tiled.annotations
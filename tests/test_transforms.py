@@ -0,0 +1,153 @@
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
+
+from coconutools import COCO, Annotation, transforms
+from coconutools.segmentations import decode
+from tests.fixtures import Fixtures
+
+
+def bbox(annotation: Annotation) -> List[float]:
+    return [
+        annotation.bbox.x,
+        annotation.bbox.y,
+        annotation.bbox.width,
+        annotation.bbox.height,
+    ]
+
+
+class TestTransforms:
+    def test_resize(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+
+        resized = transforms.resize(dataset, scale=0.5)
+
+        assert [(image.width, image.height) for image in resized.images] == [
+            (50, 50),
+            (25, 20),
+        ]
+
+        polygon, rle, box, small_box = resized.annotations
+
+        assert polygon.segmentation == [[5, 5, 25, 5, 25, 25, 5, 25]]
+        assert polygon.area == 400
+        assert bbox(polygon) == [5, 5, 20, 20]
+
+        assert rle.area == 600
+        assert bbox(rle) == [15, 5, 30, 20]
+        assert isinstance(rle.segmentation, dict)
+        assert rle.segmentation["size"] == [50, 50]
+
+        assert box.area == 25
+        assert bbox(small_box) == [10, 5, 10, 5]
+
+        # the source dataset is left intact
+        assert dataset.images[0].width == 100
+        assert dataset.annotations[0].area == 1600
+
+    def test_resize_to_size(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+
+        resized = transforms.resize(dataset, size=(200, 100))
+
+        assert {(image.width, image.height) for image in resized.images} == {(200, 100)}
+        assert bbox(resized.annotations[0]) == [20, 10, 80, 40]
+
+        with pytest.raises(ValueError):
+            transforms.resize(dataset)
+
+    def test_flips(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+
+        flipped = transforms.hflip(dataset)
+        polygon, rle, _, small_box = flipped.annotations
+
+        assert bbox(polygon) == [50, 10, 40, 40]
+        assert bbox(rle) == [10, 10, 60, 40]
+        assert bbox(small_box) == [10, 10, 20, 10]
+
+        flipped = transforms.vflip(dataset, image_ids=[8])
+
+        assert bbox(flipped.annotations[0]) == [10, 10, 40, 40]
+        assert bbox(flipped.annotations[3]) == [20, 20, 20, 10]
+
+    def test_assigned_polygons(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+        dataset.annotations[1].segmentation = [[70, 70, 80, 70, 80, 80, 70, 80]]
+
+        flipped = transforms.hflip(dataset).annotations[1]
+
+        assert flipped.segmentation == [[30, 70, 20, 70, 20, 80, 30, 80]]
+        assert bbox(flipped) == [20, 70, 10, 10]
+        assert flipped.area == 100
+
+    def test_tile_transformed(self, tmp_path: Path) -> None:
+        flipped = transforms.hflip(COCO(annotation_file=Fixtures.shapes.value))
+
+        tiled = flipped.tile(60, overlap=20, output_file=tmp_path / "tiled.json")
+
+        assert [image.file_name for image in tiled.images] == [
+            "shapes/1_0_0.png",
+            "shapes/1_40_0.png",
+            "shapes/1_0_40.png",
+            "shapes/1_40_40.png",
+            "shapes/2_0_0.png",
+        ]
+
+        polygon = tiled.annotations[2]
+
+        assert polygon.image.file_name == "shapes/1_40_0.png"
+        assert polygon.segmentation == [[50, 10, 10, 10, 10, 50, 50, 50]]
+        assert polygon.area == 1600
+        assert [annotation.area for annotation in tiled.annotations] == [
+            400,
+            2000,
+            1600,
+            1200,
+            100,
+            500,
+            100,
+            400,
+            300,
+            200,
+        ]
+
+    def test_pad_and_crop(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+
+        padded = transforms.pad(dataset, left=10, top=5)
+
+        assert (padded.images[0].width, padded.images[0].height) == (110, 105)
+        assert bbox(padded.annotations[1]) == [40, 15, 60, 40]
+
+        cropped = transforms.crop(dataset, 20, 0, 30, 30)
+
+        assert [annotation.id for annotation in cropped.annotations] == [1, 2, 4]
+        assert cropped.annotations[0].segmentation == [[0, 10, 30, 10, 30, 30, 0, 30]]
+        assert cropped.annotations[0].area == 600
+        assert cropped.annotations[1].area == 400
+
+    def test_rotation(self) -> None:
+        dataset = COCO(annotation_file=Fixtures.shapes.value)
+
+        rotated = transforms.affine(
+            dataset, np.array([[0, -1, 100], [1, 0, 0]]), image_ids=[7]
+        )
+        polygon, rle, _, _ = rotated.annotations
+
+        assert bbox(polygon) == [50, 10, 40, 40]
+        assert rle.area == 2400
+        assert bbox(rle) == [50, 30, 40, 60]
+        assert isinstance(rle.segmentation, dict)
+        assert decode(rle.segmentation)[30:90, 50:90].all()
+
+    def test_transform_boxes(self) -> None:
+        boxes = np.array([[10, 20, 30, 40]])
+
+        assert_allclose(
+            transforms.transform_boxes(boxes, np.diag([2.0, 0.5, 1])),
+            [[20, 10, 60, 20]],
+        )